@@ -7,9 +7,12 @@ Housler - Интеллектуальный анализ недвижимости
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, send_file
 import os
+import re
 import uuid
+import inspect
+import queue
 import logging
 import json
 from typing import Dict, List, Optional
@@ -23,8 +26,12 @@ from src.config import settings
 from src.config.regions import detect_region_from_url, detect_region_from_address
 
 # Централизованные сервисы
-from src.services.validation import validate_url, sanitize_string
-from src.exceptions import URLValidationError, SSRFError
+from src.services.validation import validate_url
+from src.exceptions import URLValidationError, SSRFError, PDFRendererOverloadedError
+from src.services.pdf_renderer import get_pdf_renderer, inline_static_assets, report_cache_key
+from src.services.portfolio import (
+    ManualPropertyInput, PortfolioValuation, build_manual_property, resolve_search_region, stream_portfolio
+)
 
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL, logging.INFO))
 logger = logging.getLogger(__name__)
@@ -118,7 +125,8 @@ def safe_error_message(e: Exception, include_details: bool = False) -> str:
 
 # Task Queue (async operations)
 try:
-    from src.tasks import init_task_queue
+    from src.tasks import init_task_queue, portfolio_valuation_task
+    from src.tasks.queue import enqueue_task, get_task_queue, get_task_status
     from src.api import task_api
     TASK_QUEUE_AVAILABLE = True
 except ImportError as e:
@@ -157,7 +165,11 @@ property_cache = init_cache(
     db=settings.REDIS_DB,
     password=settings.REDIS_PASSWORD,
     namespace=settings.REDIS_NAMESPACE,
-    enabled=settings.REDIS_ENABLED
+    enabled=settings.REDIS_ENABLED,
+    compress_threshold=settings.CACHE_COMPRESS_THRESHOLD,
+    compression=settings.CACHE_COMPRESSION,
+    l1_max_items=settings.CACHE_L1_MAX_ITEMS if settings.CACHE_L1_ENABLED else 0,
+    l1_ttl_seconds=settings.CACHE_L1_TTL_SECONDS
 )
 
 # Хранилище сессий с поддержкой Redis
@@ -172,7 +184,9 @@ if PARSER_REGISTRY_AVAILABLE and settings.USE_BROWSER_POOL:
         max_browsers=settings.MAX_BROWSERS,
         max_age_seconds=3600,  # 1 час
         headless=settings.PARSER_HEADLESS,
-        block_resources=True
+        block_resources=True,
+        min_warm=settings.BROWSER_POOL_MIN_WARM,
+        recycle_interval=settings.BROWSER_POOL_RECYCLE_INTERVAL
     )
     browser_pool.start()
     logger.info(f"Browser pool initialized with max_browsers={settings.MAX_BROWSERS}")
@@ -259,7 +273,7 @@ except ImportError as e:
     logger.warning(f"⚠️ Contacts Blueprint недоступен: {e}")
 
 
-def get_parser_for_url(url: str, region: str = 'spb', proxy_config: Optional[Dict] = None):
+def get_parser_for_url(url: str, region: str = 'spb', proxy_config: Optional[Dict] = None, page_fetcher=None):
     """
     Получить парсер для заданного URL
 
@@ -271,10 +285,13 @@ def get_parser_for_url(url: str, region: str = 'spb', proxy_config: Optional[Dic
         url: URL объявления
         region: Регион (только для ЦИАН)
         proxy_config: Конфигурация прокси (опционально)
+        page_fetcher: Загрузка страниц внешним браузером (url -> html) вместо
+            browser_pool - для фоновых потоков, см. AsyncParsingService.fetch_page
 
     Returns:
         Парсер с методами parse_detail_page() и search_similar()
     """
+    pool = browser_pool if page_fetcher is None else None
     if not PARSER_REGISTRY_AVAILABLE:
         # Fallback: используем старый PlaywrightParser
         from src.parsers.playwright_parser import PlaywrightParser
@@ -283,8 +300,11 @@ def get_parser_for_url(url: str, region: str = 'spb', proxy_config: Optional[Dic
             delay=1.0,
             cache=property_cache,
             region=region,
-            browser_pool=browser_pool,
-            proxy_config=proxy_config
+            browser_pool=pool,
+            page_fetcher=page_fetcher,
+            proxy_config=proxy_config,
+            tiered_fetch=settings.PARSER_TIERED_FETCH,
+            http_timeout=settings.PARSER_HTTP_TIMEOUT
         )
 
     # Определяем источник
@@ -298,8 +318,11 @@ def get_parser_for_url(url: str, region: str = 'spb', proxy_config: Optional[Dic
             delay=1.0,
             cache=property_cache,
             region=region,
-            browser_pool=browser_pool,
-            proxy_config=proxy_config
+            browser_pool=pool,
+            page_fetcher=page_fetcher,
+            proxy_config=proxy_config,
+            tiered_fetch=settings.PARSER_TIERED_FETCH,
+            http_timeout=settings.PARSER_HTTP_TIMEOUT
         )
     elif source:
         # Для остальных источников используем registry
@@ -319,10 +342,36 @@ def get_parser_for_url(url: str, region: str = 'spb', proxy_config: Optional[Dic
             delay=1.0,
             cache=property_cache,
             region=region,
-            browser_pool=browser_pool
+            browser_pool=pool,
+            page_fetcher=page_fetcher,
+            tiered_fetch=settings.PARSER_TIERED_FETCH,
+            http_timeout=settings.PARSER_HTTP_TIMEOUT
         )
 
 
+def _search_similar_streaming(parser, target: Dict, limit: int, detail_pipeline, should_stop=None) -> List[Dict]:
+    """
+    Каскадный поиск аналогов с потоковой передачей результатов в детальный парсинг
+
+    Парсеры с поддержкой on_results (PlaywrightParser) отдают карточки после
+    каждого уровня каскада и останавливаются, когда лимит аналогов с полными
+    данными уже набран или should_stop() вернул True (клиент отключился).
+    Остальные парсеры отдают весь список после поиска.
+    """
+    params = inspect.signature(parser.search_similar).parameters
+    if 'on_results' in params and 'should_stop' in params:
+        return parser.search_similar(
+            target,
+            limit=limit,
+            on_results=detail_pipeline.submit,
+            should_stop=lambda: detail_pipeline.satisfied or bool(should_stop and should_stop())
+        )
+
+    similar = parser.search_similar(target, limit=limit)
+    detail_pipeline.submit(similar)
+    return similar
+
+
 # Rate limiting configuration
 # SECURITY: Комбинированный ключ для защиты от обхода через прокси
 import hashlib
@@ -382,57 +431,9 @@ if TASK_QUEUE_AVAILABLE:
 # Валидация входных данных с помощью Pydantic
 # ═══════════════════════════════════════════════════════════════════════════
 
-# Pydantic models для валидации входных данных
-from pydantic import BaseModel, Field, validator, ValidationError as PydanticValidationError
-
-class ManualPropertyInput(BaseModel):
-    """Валидация данных для ручного ввода объекта недвижимости"""
-    address: str = Field(..., min_length=5, max_length=500, description="Полный адрес")
-    price_raw: float = Field(..., gt=0, lt=1_000_000_000_000, description="Цена в рублях")
-    total_area: float = Field(..., gt=1, lt=10000, description="Общая площадь в м²")
-    rooms: str = Field(..., description="Количество комнат")
-    floor: str = Field(default='', max_length=20, description="Этаж в формате N/M")
-    living_area: Optional[float] = Field(default=None, gt=0, lt=10000, description="Жилая площадь в м²")
-    kitchen_area: Optional[float] = Field(default=None, gt=0, lt=500, description="Площадь кухни в м²")
-    repair_level: str = Field(default='стандартная', max_length=50)
-    view_type: str = Field(default='улица', max_length=50)
-
-    @validator('address')
-    def validate_address(cls, v):
-        """Санитизация адреса"""
-        v = sanitize_string(v, max_length=500)
-        if not v or len(v) < 5:
-            raise ValueError('Адрес слишком короткий')
-        # Блокируем SQL injection паттерны
-        dangerous_patterns = ['<script', 'javascript:', 'onerror=', 'onclick=', 'drop table', 'union select']
-        v_lower = v.lower()
-        for pattern in dangerous_patterns:
-            if pattern in v_lower:
-                raise ValueError(f'Адрес содержит недопустимые символы')
-        return v
-
-    @validator('rooms')
-    def validate_rooms(cls, v):
-        """Валидация комнат"""
-        allowed_values = ['Студия', '1', '2', '3', '4', '5', '5+']
-        if v not in allowed_values:
-            raise ValueError(f'Недопустимое значение для комнат: {v}. Разрешены: {allowed_values}')
-        return v
-
-    @validator('living_area')
-    def validate_living_area(cls, v, values):
-        """Проверка что жилая площадь не больше общей"""
-        if v and 'total_area' in values and v > values['total_area']:
-            raise ValueError('Жилая площадь не может быть больше общей')
-        return v
-
-    @validator('kitchen_area')
-    def validate_kitchen_area(cls, v, values):
-        """Проверка что площадь кухни не больше общей"""
-        if v and 'total_area' in values and v > values['total_area']:
-            raise ValueError('Площадь кухни не может быть больше общей')
-        return v
-
+# Модель ручного ввода (ManualPropertyInput) - в src.services.portfolio:
+# она же валидирует ручные объекты пакетной оценки
+from pydantic import ValidationError as PydanticValidationError
 
 # Timeout decorator для защиты от зависающих операций
 import signal
@@ -555,8 +556,8 @@ def index():
     # Load recent blog posts for preview
     recent_posts = []
     try:
-        from blog_database import BlogDatabase
-        blog_db = BlogDatabase()
+        from blog_database import get_blog_database
+        blog_db = get_blog_database()
         recent_posts = blog_db.get_recent_posts(limit=4)
     except Exception as e:
         logger.warning(f"Could not load blog posts: {e}")
@@ -1002,9 +1003,109 @@ def metrics():
             lines.append('# HELP housler_cache_keys_total Total number of cached keys')
             lines.append('# TYPE housler_cache_keys_total gauge')
             lines.append(f"housler_cache_keys_total {cache_stats.get('total_keys', 0)}")
+
+            by_type = cache_stats.get('by_type', {})
+            if by_type:
+                lines.append('# HELP housler_cache_keys Cached keys by key type')
+                lines.append('# TYPE housler_cache_keys gauge')
+                for key_type, type_stats in by_type.items():
+                    lines.append(f'housler_cache_keys{{type="{key_type}"}} {type_stats.get("keys", 0)}')
+
+                lines.append('# HELP housler_cache_lookups_total Cache lookups by key type and result')
+                lines.append('# TYPE housler_cache_lookups_total counter')
+                for key_type, type_stats in by_type.items():
+                    lines.append(f'housler_cache_lookups_total{{type="{key_type}",result="hit"}} {type_stats.get("hits", 0)}')
+                    lines.append(f'housler_cache_lookups_total{{type="{key_type}",result="miss"}} {type_stats.get("misses", 0)}')
     except:
         pass
 
+    # Трафик браузеров (политика блокировки ресурсов)
+    try:
+        from src.parsers.resource_policy import get_resource_policy
+        resource_stats = get_resource_policy().get_stats()
+
+        lines.append('# HELP housler_browser_requests_total Browser requests by page profile and result')
+        lines.append('# TYPE housler_browser_requests_total counter')
+        lines.append('# HELP housler_browser_bytes_total Browser response bytes (Content-Length) by page profile')
+        lines.append('# TYPE housler_browser_bytes_total counter')
+        for profile, counters in resource_stats['by_profile'].items():
+            lines.append(f'housler_browser_requests_total{{profile="{profile}",result="allowed"}} {counters["allowed"]}')
+            lines.append(f'housler_browser_requests_total{{profile="{profile}",result="blocked"}} {counters["blocked"]}')
+            lines.append(f'housler_browser_bytes_total{{profile="{profile}"}} {counters["bytes_received"]}')
+    except Exception:
+        pass
+
+    # Ожидание токенов общего rate limiter'а
+    try:
+        from src.cache.rate_limiter import get_rate_limiter
+        limiter_stats = get_rate_limiter(property_cache).get_stats()
+
+        lines.append('# HELP housler_ratelimit_wait_seconds Wait for a per-domain request token')
+        lines.append('# TYPE housler_ratelimit_wait_seconds histogram')
+        cumulative = 0
+        for bucket, count in limiter_stats['wait_histogram'].items():
+            cumulative += count
+            bound = '+Inf' if bucket == 'inf' else bucket[3:-1]
+            lines.append(f'housler_ratelimit_wait_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'housler_ratelimit_wait_seconds_sum {limiter_stats["wait_seconds_total"]}')
+        lines.append(f'housler_ratelimit_wait_seconds_count {limiter_stats["acquisitions"]}')
+        lines.append('# HELP housler_ratelimit_fallbacks_total Token reservations served by the local bucket')
+        lines.append('# TYPE housler_ratelimit_fallbacks_total counter')
+        lines.append(f'housler_ratelimit_fallbacks_total {limiter_stats["local_fallbacks"]}')
+    except Exception:
+        pass
+
+    # Постоянный сервис async парсинга
+    try:
+        from src.parsers.async_parser import get_async_parsing_service
+        service_stats = get_async_parsing_service(cache=property_cache).get_stats()
+
+        lines.append('# HELP housler_async_parser_queued Detail parses queued or running in the async service')
+        lines.append('# TYPE housler_async_parser_queued gauge')
+        lines.append(f'housler_async_parser_queued {service_stats["queued"]}')
+        lines.append('# HELP housler_async_parser_rejected_total Detail parses rejected because the queue was full')
+        lines.append('# TYPE housler_async_parser_rejected_total counter')
+        lines.append(f'housler_async_parser_rejected_total {service_stats["rejected"]}')
+        lines.append('# HELP housler_async_parser_browser_starts_total Browser launches by the async service')
+        lines.append('# TYPE housler_async_parser_browser_starts_total counter')
+        lines.append(f'housler_async_parser_browser_starts_total {service_stats["browser_starts"]}')
+    except Exception:
+        pass
+
+    # Адаптивные паузы имитации человека
+    try:
+        from src.parsers.pacing import get_pacing_controller
+        pacing = browser_pool.pacing if browser_pool else get_pacing_controller()
+        pacing_stats = pacing.get_stats()
+
+        lines.append('# HELP housler_pacing_pages_total Browser page loads by human-simulation mode')
+        lines.append('# TYPE housler_pacing_pages_total counter')
+        simulated = pacing_stats['simulated_pages']
+        lines.append(f'housler_pacing_pages_total{{simulated="true"}} {simulated}')
+        lines.append(f'housler_pacing_pages_total{{simulated="false"}} {pacing_stats["pages"] - simulated}')
+        lines.append('# HELP housler_pacing_seconds_total Seconds spent in human-simulation pauses')
+        lines.append('# TYPE housler_pacing_seconds_total counter')
+        lines.append(f'housler_pacing_seconds_total {pacing_stats["pacing_seconds_total"]}')
+    except Exception:
+        pass
+
+    # Прогретый рендерер PDF-отчетов
+    try:
+        renderer_stats = get_pdf_renderer().get_stats()
+
+        lines.append('# HELP housler_pdf_renders_total PDF reports rendered by result')
+        lines.append('# TYPE housler_pdf_renders_total counter')
+        for result in ('rendered', 'failed', 'rejected'):
+            lines.append(f'housler_pdf_renders_total{{result="{result}"}} {renderer_stats[result]}')
+        lines.append('# HELP housler_pdf_render_seconds_total Seconds spent rendering PDF reports')
+        lines.append('# TYPE housler_pdf_render_seconds_total counter')
+        lines.append(f'housler_pdf_render_seconds_total {renderer_stats["render_seconds_total"]}')
+        lines.append('# HELP housler_pdf_renderer_active Reports rendering right now')
+        lines.append('# TYPE housler_pdf_renderer_active gauge')
+        lines.append(f'housler_pdf_renderer_active {renderer_stats["active_jobs"]}')
+    except Exception:
+        pass
+
     return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain'}
 
 
@@ -1276,33 +1377,8 @@ def create_manual():
             }), 400
 
         # Создаем объект недвижимости из валидированных данных
-        property_data = {
-            'address': validated.address,
-            'price_raw': validated.price_raw,
-            'price': f"{int(validated.price_raw):,} ₽".replace(',', ' '),
-            'total_area': validated.total_area,
-            'area': f"{validated.total_area} м²",
-            'rooms': validated.rooms,
-            'floor': validated.floor,
-            'living_area': validated.living_area,
-            'kitchen_area': validated.kitchen_area,
-            'repair_level': validated.repair_level,
-            'view_type': validated.view_type,
-            'manual_input': True,
-            'title': f"{validated.rooms}-комн. квартира, {validated.total_area} м²",
-            'url': 'manual-input',  # Плейсхолдер для ручного ввода
-            'metro': [],
-            'residential_complex': None,
-            'characteristics': {}
-        }
-
-        # Определяем регион из адреса (поддержка всех регионов)
-        region = detect_region_from_address(data['address'])
-        if not region:
-            logger.warning(f"⚠️ Не удалось определить регион для ручного ввода, используем: msk")
-            region = 'msk'  # По умолчанию Москва
-
-        property_data['region'] = region
+        property_data = build_manual_property(validated)
+        region = property_data['region']
 
         logger.info(f"Создание объекта вручную: {property_data['address']} (регион: {region})")
 
@@ -1372,11 +1448,12 @@ def update_target():
         if not session_id or not session_storage.exists(session_id):
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        # Обновляем данные
-        session_data = session_storage.get(session_id)
-        session_data['target_property'].update(data)
-        session_data['step'] = 2
-        session_storage.set(session_id, session_data)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': 'Нет данных для обновления'}), 400
+
+        # Обновляем только целевой объект и шаг (аналоги и анализ не перечитываются)
+        session_storage.merge_field(session_id, 'target_property', data)
+        session_storage.update(session_id, {'step': 2})
 
         return jsonify({
             'status': 'success',
@@ -1391,6 +1468,345 @@ def update_target():
         }), 500
 
 
+def _resolve_search_region(target: Dict) -> str:
+    """Регион поиска аналогов: из данных целевого объекта, иначе по URL/адресу"""
+    return resolve_search_region(target)
+
+
+def _create_detail_pipeline(limit: int, region: str, on_complete=None):
+    """
+    Фоновый пул детального парсинга, работающий параллельно с каскадным поиском
+
+    Каждый уровень поиска сразу отдает карточки в async пул (см. StreamingDetailParser).
+    Парсинг идет в общем для процесса AsyncParsingService: браузер остается
+    прогретым между запросами, параллелизм - PARSER_DETAIL_CONCURRENCY.
+    """
+    from src.parsers.async_parser import StreamingDetailParser
+    detail_pipeline = StreamingDetailParser(
+        limit=limit,
+        headless=True,
+        cache=property_cache,
+        region=region,
+        max_retries=2,
+        on_complete=on_complete
+    )
+    detail_pipeline.start()
+    return detail_pipeline
+
+
+def _run_similar_search(
+    target: Dict,
+    search_type: str,
+    region: str,
+    limit: int,
+    detail_pipeline,
+    should_stop=None,
+    page_fetcher=None
+):
+    """
+    Поиск аналогов (в ЖК или по городу) с передачей карточек в детальный парсинг
+
+    Args:
+        should_stop: Callable -> bool, прервать каскад поиска (клиент отключился)
+        page_fetcher: Загрузка страниц поиска вместо browser_pool (см. get_parser_for_url)
+
+    Returns:
+        Tuple: (список аналогов, название ЖК или None)
+    """
+    # Используем URL целевого объекта для создания парсера
+    target_url = target.get('url', '')
+    is_manual_input = target.get('manual_input', False) or target_url == 'manual-input'
+
+    if is_manual_input:
+        logger.info(f"📝 Manual input detected - using citywide search")
+
+    logger.info(f"🔍 Starting search (type: {search_type}, limit: {limit})")
+    # Используем целевой URL для определения источника (или fallback на ЦИАН)
+    # Для ручного ввода всегда используем ЦИАН как источник
+    search_url = 'https://www.cian.ru/' if is_manual_input else (target_url or 'https://www.cian.ru/')
+    with get_parser_for_url(search_url, region=region, page_fetcher=page_fetcher) as parser:
+        # Для ручного ввода всегда используем citywide search (нет ЖК)
+        if search_type == 'building' and not is_manual_input:
+            # Поиск в том же ЖК
+            logger.info(f"🏢 Searching in building: {target.get('residential_complex', 'Unknown')}")
+            similar = parser.search_similar_in_building(target, limit=limit)
+            detail_pipeline.submit(similar)
+            residential_complex = target.get('residential_complex', 'Неизвестно')
+            logger.info(f"✅ Found {len(similar)} comparables in building")
+
+            # КРИТИЧЕСКИЙ ФИКС: Fallback если building search вернул 0
+            if len(similar) == 0 and not (should_stop and should_stop()):
+                logger.warning("⚠️ Building search returned 0 results! Trying citywide search as fallback...")
+                similar = _search_similar_streaming(parser, target, limit, detail_pipeline, should_stop)
+                residential_complex = None  # Т.к. теперь поиск по городу
+                logger.info(f"✅ Fallback citywide search found {len(similar)} comparables")
+        else:
+            # Широкий поиск по городу
+            logger.info(f"🌆 Searching in city: {region}")
+            similar = _search_similar_streaming(parser, target, limit, detail_pipeline, should_stop)
+            residential_complex = None
+            logger.info(f"✅ Found {len(similar)} comparables in city")
+
+    return similar, residential_complex
+
+
+def _merge_detail_results(similar: List[Dict], detail_pipeline):
+    """
+    Дождаться детального парсинга объектов без полных данных и обновить аналоги
+
+    Returns:
+        Tuple: (URL, отправленные на детальный парсинг, метрики качества парсинга или None)
+    """
+    parse_quality = None
+
+    urls_to_parse = [
+        c.get('url') for c in similar
+        if c.get('url') and not (c.get('price') and c.get('total_area'))
+    ]
+
+    logger.info(f"🔍 DEBUG: {len(similar)} comparables found, {len(urls_to_parse)} need detailed parsing")
+
+    if urls_to_parse:
+        try:
+            import time
+            parse_start = time.time()
+
+            # PATCH 1: Robust parsing with retry + quality metrics
+            detailed_results, parse_quality = detail_pipeline.collect(urls_to_parse)
+
+            parse_elapsed = time.time() - parse_start
+            logger.info(
+                f"⏱️ Detail parsing finished {parse_elapsed:.1f}s after search for {len(urls_to_parse)} URLs | "
+                f"Success: {parse_quality['successfully_parsed']}, "
+                f"Failed: {parse_quality['parse_failed']}, "
+                f"Retries: {parse_quality['total_retries']}, "
+                f"Streaming: {parse_quality['streaming']}"
+            )
+
+            # Логируем ошибки по типам
+            if parse_quality['error_breakdown']:
+                logger.warning(f"Parse errors breakdown: {parse_quality['error_breakdown']}")
+
+            # Обновляем данные аналогов детальной информацией
+            url_to_details = {d['url']: d for d in detailed_results}
+            updated_count = 0
+            for comparable in similar:
+                url = comparable.get('url')
+                if url in url_to_details:
+                    comparable.update(url_to_details[url])
+                    updated_count += 1
+
+            logger.info(f"✅ Enhanced {updated_count}/{len(similar)} comparables with detailed data")
+
+        except Exception as e:
+            logger.error(f"❌ Parallel parsing failed, using basic data: {e}", exc_info=True)
+
+    return urls_to_parse, parse_quality
+
+
+def _deduplicate_comparables(similar: List[Dict]) -> List[Dict]:
+    """Удаление строгих дубликатов среди найденных аналогов"""
+    # ═══════════════════════════════════════════════════════════════════════════
+    # ДЕТЕКЦИЯ И УДАЛЕНИЕ ДУБЛИКАТОВ
+    # При поиске по множественным источникам одна квартира может быть размещена
+    # на ЦИАН, Авито, Яндекс.Недвижимость с разными ценами
+    # ═══════════════════════════════════════════════════════════════════════════
+    if len(similar) > 0:
+        logger.info(f"🔍 Checking for duplicates among {len(similar)} comparables...")
+        unique_comparables, removed_duplicates = duplicate_detector.deduplicate_list(
+            similar,
+            keep_best_price=True  # Оставляем вариант с лучшей ценой
+        )
+
+        if removed_duplicates:
+            logger.info(f"✓ Removed {len(removed_duplicates)} strict duplicates")
+            for dup in removed_duplicates:
+                logger.debug(f"  - Removed: {dup.get('address', 'Unknown')} ({dup.get('price', 0):,.0f} ₽)")
+
+            # Обновляем список
+            similar = unique_comparables
+        else:
+            logger.info("✓ No strict duplicates found")
+
+    return similar
+
+
+# Причины сбоев детального парсинга, которые называются в предупреждении
+PARSE_ERROR_LABELS = (
+    ('rate_limited', 'rate limiting'),
+    ('timeout', 'timeout'),
+    ('captcha', 'captcha'),
+)
+
+# (доля сбоев парсинга больше %, тип, заголовок, префикс причин, вывод)
+PARSE_FAILURE_LEVELS = (
+    (50, 'error', 'Критическая проблема с загрузкой данных', 'Основные причины',
+     'Анализ может быть неточным. Попробуйте повторить позже или обратитесь в поддержку.'),
+    (20, 'warning', 'Проблемы с загрузкой данных', 'Причины',
+     'Точность анализа может быть снижена.'),
+)
+
+# (аналогов меньше чем, тип, заголовок, сообщение)
+COMPARABLES_COUNT_LEVELS = (
+    (1, 'error', 'Аналоги не найдены', 'Не найдено ни одного аналога.'),
+    (5, 'error', 'Недостаточно аналогов',
+     'Найдено всего {count} аналог(ов). Для точной оценки рекомендуется 10-15.'),
+    (10, 'warning', 'Мало аналогов',
+     'Найдено {count} аналогов. Для более точной оценки рекомендуется 15-20.'),
+)
+
+# (разброс цен за м² больше %, тип, заголовок, сообщение)
+PRICE_SPREAD_LEVELS = (
+    (50, 'error', 'Очень большой разброс цен',
+     'Разброс цен у аналогов составляет {percent:.0f}%. Это слишком много - возможно, аналоги подобраны некорректно. '
+     'Проверьте список и удалите неподходящие объекты.'),
+    (30, 'warning', 'Большой разброс цен',
+     'Разброс цен у аналогов составляет {percent:.0f}%. Рекомендуется проверить список аналогов '
+     'и убедиться, что все объекты действительно сопоставимы.'),
+)
+
+
+def _duplicate_warnings(similar: List[Dict]) -> List[Dict]:
+    """Предупреждение о возможных дубликатах среди аналогов"""
+    duplicate_warnings_count = sum(1 for c in similar if c.get('possible_duplicate'))
+    if duplicate_warnings_count == 0:
+        return []
+    return [{
+        'type': 'warning',
+        'title': 'Обнаружены возможные дубликаты',
+        'message': f'Найдено {duplicate_warnings_count} объект(ов), которые могут быть дубликатами (похожие адреса и параметры). '
+                   'Они помечены специальным значком. Рекомендуем проверить и удалить неподходящие.'
+    }]
+
+
+def _parse_quality_warnings(urls_to_parse: List[str], parse_quality: Optional[Dict]) -> List[Dict]:
+    """PATCH 4: Предупреждение о проблемах детального парсинга (если были)"""
+    if not urls_to_parse or not parse_quality:
+        return []
+    parse_failed = parse_quality.get('parse_failed', 0)
+    total_found = parse_quality.get('total_found', 0)
+    if parse_failed <= 0:
+        return []
+
+    failed_percent = (parse_failed / total_found * 100) if total_found > 0 else 0
+    error_breakdown = parse_quality.get('error_breakdown', {})
+    error_details = [
+        f"{label} ({error_breakdown[error_type]})"
+        for error_type, label in PARSE_ERROR_LABELS
+        if error_type in error_breakdown
+    ]
+
+    for threshold, warning_type, title, reasons_prefix, conclusion in PARSE_FAILURE_LEVELS:
+        if failed_percent > threshold:
+            return [{
+                'type': warning_type,
+                'title': title,
+                'message': f'Не удалось загрузить детальные данные для {parse_failed} из {total_found} аналогов ({failed_percent:.0f}%). ' +
+                           (f'{reasons_prefix}: {", ".join(error_details)}. ' if error_details else '') +
+                           conclusion
+            }]
+    return []
+
+
+def _comparables_context_tips(target_prop: Dict, count: int, rc_name: Optional[str]):
+    """Генерирует контекстные подсказки почему мало аналогов и что делать"""
+    tips = []
+    context_reason = None
+
+    rooms = target_prop.get('rooms', '')
+    price_sqm = target_prop.get('price_per_sqm', 0)
+    region = target_prop.get('region', '')
+
+    # Определяем контекст
+    if rc_name:
+        context_reason = f'В ЖК «{rc_name}» сейчас мало активных предложений на продажу'
+        tips.append('Посмотрите историю продаж в этом ЖК на ЦИАН')
+    elif rooms in ['5', '5+', '6', '7']:
+        context_reason = 'Квартиры с 5+ комнатами — редкий сегмент рынка'
+    elif price_sqm and price_sqm > 500000:
+        context_reason = 'Премиальный сегмент имеет ограниченное количество предложений'
+    elif region and region not in ['msk', 'spb']:
+        context_reason = 'Для регионов база данных ограничена'
+
+    # Общие советы
+    tips.append('Добавьте аналоги вручную через кнопку «Добавить по ссылке»')
+    if count > 0:
+        tips.append('Можно продолжить анализ с имеющимися аналогами')
+
+    return context_reason, tips
+
+
+def _comparables_count_warnings(target: Dict, similar: List[Dict], residential_complex: Optional[str]) -> List[Dict]:
+    """Проверка 1: Достаточно ли аналогов? (с контекстными подсказками)"""
+    count = len(similar)
+    for bound, warning_type, title, message in COMPARABLES_COUNT_LEVELS:
+        if count < bound:
+            context_reason, tips = _comparables_context_tips(target, count, residential_complex)
+            message = message.format(count=count)
+            if context_reason:
+                message += f' {context_reason}.'
+            return [{'type': warning_type, 'title': title, 'message': message, 'tips': tips}]
+    return []
+
+
+def _price_spread_warnings(similar: List[Dict]) -> List[Dict]:
+    """Проверка 2: Разброс цен (коэффициент вариации)"""
+    prices_per_sqm = [c.get('price_per_sqm', 0) for c in similar if c.get('price_per_sqm')]
+    if len(similar) < 3 or len(prices_per_sqm) < 3:
+        return []
+
+    import statistics
+    median_price = statistics.median(prices_per_sqm)
+    if median_price <= 0:
+        return []
+    cv = statistics.stdev(prices_per_sqm) / median_price  # Коэффициент вариации
+
+    for threshold, warning_type, title, message in PRICE_SPREAD_LEVELS:
+        if cv * 100 > threshold:
+            return [{'type': warning_type, 'title': title, 'message': message.format(percent=cv * 100)}]
+    return []
+
+
+def _price_coverage_warnings(similar: List[Dict]) -> List[Dict]:
+    """Проверка 3: Есть ли аналоги с ценой за м²?"""
+    if not similar:
+        return []
+    with_price = sum(1 for c in similar if c.get('price_per_sqm'))
+    if with_price == 0:
+        return [{
+            'type': 'error',
+            'title': 'Нет данных о ценах',
+            'message': 'Ни у одного аналога нет информации о цене за м². Невозможно провести анализ.'
+        }]
+    if with_price < len(similar) * 0.5:  # Меньше 50% с ценой
+        return [{
+            'type': 'warning',
+            'title': 'Неполные данные о ценах',
+            'message': f'Только у {with_price} из {len(similar)} аналогов есть данные о цене за м². Это может снизить точность оценки.'
+        }]
+    return []
+
+
+def _build_comparables_warnings(
+    target: Dict,
+    similar: List[Dict],
+    residential_complex: Optional[str],
+    urls_to_parse: List[str],
+    parse_quality: Optional[Dict]
+) -> List[Dict]:
+    """Предупреждения о качестве подобранных аналогов (для UI и сессии)"""
+    # ═══════════════════════════════════════════════════════════════════════════
+    # ДОРАБОТКА #4: ПРОВЕРКА КАЧЕСТВА ПОДОБРАННЫХ АНАЛОГОВ
+    # ═══════════════════════════════════════════════════════════════════════════
+    return (
+        _duplicate_warnings(similar)
+        + _parse_quality_warnings(urls_to_parse, parse_quality)
+        + _comparables_count_warnings(target, similar, residential_complex)
+        + _price_spread_warnings(similar)
+        + _price_coverage_warnings(similar)
+    )
+
+
 @app.route('/api/find-similar', methods=['POST'])
 @limiter.limit(settings.RATELIMIT_SEARCH)  # Expensive - поиск и парсинг аналогов
 def find_similar():
@@ -1423,302 +1839,45 @@ def find_similar():
 
         logger.info(f"📍 [STEP 2] find-similar request started (session: {session_id}, type: {search_type}, limit: {limit})")
 
-        if not session_id or not session_storage.exists(session_id):
+        session_data = session_storage.get(session_id, fields=['target_property']) if session_id else None
+        if session_data is None:
             logger.error(f"❌ Session not found: {session_id}")
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        session_data = session_storage.get(session_id)
         target = session_data['target_property']
 
-        # КРИТИЧНО: Используем регион, определенный при парсинге (не определяем заново!)
-        # Регион уже корректно определен по адресу в /api/parse
-        region = target.get('region')
-        if not region:
-            # Fallback: определяем по URL или адресу
-            target_url = target.get('url', '')
-            region = detect_region_from_url(target_url)
-            if not region:
-                address = target.get('address', '')
-                region = detect_region_from_address(address)
-                if not region:
-                    logger.warning(f"⚠️ Не удалось определить регион, используем fallback: msk")
-                    region = 'msk'
+        region = _resolve_search_region(target)
 
         logger.info(f"🔍 Searching for similar properties (session: {session_id}, type: {search_type}, region: {region}, limit: {limit})")
 
-        # Используем URL целевого объекта для создания парсера
-        target_url = target.get('url', '')
-        is_manual_input = target.get('manual_input', False) or target_url == 'manual-input'
+        detail_pipeline = _create_detail_pipeline(limit, region)
 
-        if is_manual_input:
-            logger.info(f"📝 Manual input detected - using citywide search")
-
-        # Поиск аналогов с кэшем и регионом
         try:
-            logger.info(f"🔍 Starting search (type: {search_type}, limit: {limit})")
-            # Используем целевой URL для определения источника (или fallback на ЦИАН)
-            # Для ручного ввода всегда используем ЦИАН как источник
-            search_url = 'https://www.cian.ru/' if is_manual_input else (target_url or 'https://www.cian.ru/')
-            with get_parser_for_url(search_url, region=region) as parser:
-                # Для ручного ввода всегда используем citywide search (нет ЖК)
-                if search_type == 'building' and not is_manual_input:
-                    # Поиск в том же ЖК
-                    logger.info(f"🏢 Searching in building: {target.get('residential_complex', 'Unknown')}")
-                    similar = parser.search_similar_in_building(target, limit=limit)
-                    residential_complex = target.get('residential_complex', 'Неизвестно')
-                    logger.info(f"✅ Found {len(similar)} comparables in building")
-
-                    # КРИТИЧЕСКИЙ ФИКС: Fallback если building search вернул 0
-                    if len(similar) == 0:
-                        logger.warning("⚠️ Building search returned 0 results! Trying citywide search as fallback...")
-                        similar = parser.search_similar(target, limit=limit)
-                        residential_complex = None  # Т.к. теперь поиск по городу
-                        logger.info(f"✅ Fallback citywide search found {len(similar)} comparables")
-                else:
-                    # Широкий поиск по городу
-                    logger.info(f"🌆 Searching in city: {region}")
-                    similar = parser.search_similar(target, limit=limit)
-                    residential_complex = None
-                    logger.info(f"✅ Found {len(similar)} comparables in city")
-        except Exception as search_error:
-            logger.error(f"❌ Search failed: {search_error}", exc_info=True)
-            return jsonify({
-                'status': 'error',
-                'message': 'search_failed',
-                'details': f'Не удалось выполнить поиск: {str(search_error)}'
-            }), 500
-
-        # Если найдено много аналогов с URL, парсим их параллельно
-        # Парсим детально объекты без полных данных (price, total_area, price_per_sqm)
-        urls_to_parse = [
-            c.get('url') for c in similar
-            if c.get('url') and not (c.get('price') and c.get('total_area'))
-        ]
-
-        logger.info(f"🔍 DEBUG: {len(similar)} comparables found, {len(urls_to_parse)} need detailed parsing")
-
-        if urls_to_parse:
+            # Поиск аналогов с кэшем и регионом
             try:
-                from src.parsers.async_parser import parse_multiple_urls_parallel
-                logger.info(f"🚀 Starting parallel parsing of {len(urls_to_parse)} URLs...")
-                import time
-                parse_start = time.time()
-
-                # PATCH 1: Robust parsing with retry + quality metrics
-                detailed_results, parse_quality = parse_multiple_urls_parallel(
-                    urls=urls_to_parse,
-                    headless=True,
-                    cache=property_cache,
-                    region=region,
-                    max_concurrent=3,  # Снижено с 5 до 3 для избежания rate limiting
-                    max_retries=2
-                )
-
-                parse_elapsed = time.time() - parse_start
-                logger.info(
-                    f"⏱️ Parallel parsing took {parse_elapsed:.1f}s for {len(urls_to_parse)} URLs | "
-                    f"Success: {parse_quality['successfully_parsed']}, "
-                    f"Failed: {parse_quality['parse_failed']}, "
-                    f"Retries: {parse_quality['total_retries']}"
-                )
-
-                # Логируем ошибки по типам
-                if parse_quality['error_breakdown']:
-                    logger.warning(f"Parse errors breakdown: {parse_quality['error_breakdown']}")
-
-                # Обновляем данные аналогов детальной информацией
-                url_to_details = {d['url']: d for d in detailed_results}
-                updated_count = 0
-                for comparable in similar:
-                    url = comparable.get('url')
-                    if url in url_to_details:
-                        comparable.update(url_to_details[url])
-                        updated_count += 1
-
-                logger.info(f"✅ Enhanced {updated_count}/{len(similar)} comparables with detailed data")
-
-            except Exception as e:
-                logger.error(f"❌ Parallel parsing failed, using basic data: {e}", exc_info=True)
-
-        # ═══════════════════════════════════════════════════════════════════════════
-        # ДЕТЕКЦИЯ И УДАЛЕНИЕ ДУБЛИКАТОВ
-        # При поиске по множественным источникам одна квартира может быть размещена
-        # на ЦИАН, Авито, Яндекс.Недвижимость с разными ценами
-        # ═══════════════════════════════════════════════════════════════════════════
-        if len(similar) > 0:
-            logger.info(f"🔍 Checking for duplicates among {len(similar)} comparables...")
-            unique_comparables, removed_duplicates = duplicate_detector.deduplicate_list(
-                similar,
-                keep_best_price=True  # Оставляем вариант с лучшей ценой
-            )
-
-            if removed_duplicates:
-                logger.info(f"✓ Removed {len(removed_duplicates)} strict duplicates")
-                for dup in removed_duplicates:
-                    logger.debug(f"  - Removed: {dup.get('address', 'Unknown')} ({dup.get('price', 0):,.0f} ₽)")
-
-                # Обновляем список
-                similar = unique_comparables
-            else:
-                logger.info("✓ No strict duplicates found")
-
-        # ═══════════════════════════════════════════════════════════════════════════
-        # ДОРАБОТКА #4: ПРОВЕРКА КАЧЕСТВА ПОДОБРАННЫХ АНАЛОГОВ
-        # ═══════════════════════════════════════════════════════════════════════════
-        warnings = []
-
-        # Предупреждения о дубликатах
-        duplicate_warnings_count = sum(1 for c in similar if c.get('possible_duplicate'))
-        if duplicate_warnings_count > 0:
-            warnings.append({
-                'type': 'warning',
-                'title': 'Обнаружены возможные дубликаты',
-                'message': f'Найдено {duplicate_warnings_count} объект(ов), которые могут быть дубликатами (похожие адреса и параметры). '
-                           'Они помечены специальным значком. Рекомендуем проверить и удалить неподходящие.'
-            })
-
-        # PATCH 4: Добавляем предупреждения о проблемах парсинга (если были)
-        if urls_to_parse and 'parse_quality' in locals():
-            parse_failed = parse_quality.get('parse_failed', 0)
-            total_found = parse_quality.get('total_found', 0)
-
-            if parse_failed > 0:
-                failed_percent = (parse_failed / total_found * 100) if total_found > 0 else 0
-                error_breakdown = parse_quality.get('error_breakdown', {})
-
-                error_details = []
-                if 'rate_limited' in error_breakdown:
-                    error_details.append(f"rate limiting ({error_breakdown['rate_limited']})")
-                if 'timeout' in error_breakdown:
-                    error_details.append(f"timeout ({error_breakdown['timeout']})")
-                if 'captcha' in error_breakdown:
-                    error_details.append(f"captcha ({error_breakdown['captcha']})")
-
-                if failed_percent > 50:
-                    warnings.append({
-                        'type': 'error',
-                        'title': 'Критическая проблема с загрузкой данных',
-                        'message': f'Не удалось загрузить детальные данные для {parse_failed} из {total_found} аналогов ({failed_percent:.0f}%). ' +
-                                   (f'Основные причины: {", ".join(error_details)}. ' if error_details else '') +
-                                   'Анализ может быть неточным. Попробуйте повторить позже или обратитесь в поддержку.'
-                    })
-                elif failed_percent > 20:
-                    warnings.append({
-                        'type': 'warning',
-                        'title': 'Проблемы с загрузкой данных',
-                        'message': f'Не удалось загрузить детальные данные для {parse_failed} из {total_found} аналогов ({failed_percent:.0f}%). ' +
-                                   (f'Причины: {", ".join(error_details)}. ' if error_details else '') +
-                                   'Точность анализа может быть снижена.'
-                    })
-
-        # Проверка 1: Достаточно ли аналогов?
-        # Генерируем контекстные подсказки на основе характеристик объекта
-        def get_context_tips(target_prop, count, rc_name):
-            """Генерирует контекстные подсказки почему мало аналогов и что делать"""
-            tips = []
-            context_reason = None
-
-            rooms = target_prop.get('rooms', '')
-            price_sqm = target_prop.get('price_per_sqm', 0)
-            region = target_prop.get('region', '')
-
-            # Определяем контекст
-            if rc_name:
-                context_reason = f'В ЖК «{rc_name}» сейчас мало активных предложений на продажу'
-                tips.append('Посмотрите историю продаж в этом ЖК на ЦИАН')
-            elif rooms in ['5', '5+', '6', '7']:
-                context_reason = 'Квартиры с 5+ комнатами — редкий сегмент рынка'
-            elif price_sqm and price_sqm > 500000:
-                context_reason = 'Премиальный сегмент имеет ограниченное количество предложений'
-            elif region and region not in ['msk', 'spb']:
-                context_reason = 'Для регионов база данных ограничена'
-
-            # Общие советы
-            tips.append('Добавьте аналоги вручную через кнопку «Добавить по ссылке»')
-            if count > 0:
-                tips.append('Можно продолжить анализ с имеющимися аналогами')
-
-            return context_reason, tips
-
-        if len(similar) == 0:
-            context_reason, tips = get_context_tips(target, 0, residential_complex)
-            message = 'Не найдено ни одного аналога.'
-            if context_reason:
-                message += f' {context_reason}.'
-            warnings.append({
-                'type': 'error',
-                'title': 'Аналоги не найдены',
-                'message': message,
-                'tips': tips
-            })
-        elif len(similar) < 5:
-            context_reason, tips = get_context_tips(target, len(similar), residential_complex)
-            message = f'Найдено всего {len(similar)} аналог(ов). Для точной оценки рекомендуется 10-15.'
-            if context_reason:
-                message += f' {context_reason}.'
-            warnings.append({
-                'type': 'error',
-                'title': 'Недостаточно аналогов',
-                'message': message,
-                'tips': tips
-            })
-        elif len(similar) < 10:
-            context_reason, tips = get_context_tips(target, len(similar), residential_complex)
-            message = f'Найдено {len(similar)} аналогов. Для более точной оценки рекомендуется 15-20.'
-            if context_reason:
-                message += f' {context_reason}.'
-            warnings.append({
-                'type': 'warning',
-                'title': 'Мало аналогов',
-                'message': message,
-                'tips': tips
-            })
+                similar, residential_complex = _run_similar_search(target, search_type, region, limit, detail_pipeline)
+            except Exception as search_error:
+                logger.error(f"❌ Search failed: {search_error}", exc_info=True)
+                return jsonify({
+                    'status': 'error',
+                    'message': 'search_failed',
+                    'details': f'Не удалось выполнить поиск: {str(search_error)}'
+                }), 500
+
+            # Дожидаемся детального парсинга объектов без полных данных (price, total_area)
+            # Часть из них уже распарсена, пока шли следующие уровни поиска
+            urls_to_parse, parse_quality = _merge_detail_results(similar, detail_pipeline)
+        finally:
+            detail_pipeline.close()
 
-        # Проверка 2: Разброс цен (коэффициент вариации)
-        if len(similar) >= 3:
-            prices_per_sqm = [c.get('price_per_sqm', 0) for c in similar if c.get('price_per_sqm')]
-
-            if len(prices_per_sqm) >= 3:
-                import statistics
-                median_price = statistics.median(prices_per_sqm)
-
-                if median_price > 0:
-                    stdev_price = statistics.stdev(prices_per_sqm)
-                    cv = stdev_price / median_price  # Коэффициент вариации
-
-                    if cv > 0.5:  # >50% - очень большой разброс
-                        warnings.append({
-                            'type': 'error',
-                            'title': 'Очень большой разброс цен',
-                            'message': f'Разброс цен у аналогов составляет {cv*100:.0f}%. Это слишком много - возможно, аналоги подобраны некорректно. Проверьте список и удалите неподходящие объекты.'
-                        })
-                    elif cv > 0.3:  # >30% - большой разброс
-                        warnings.append({
-                            'type': 'warning',
-                            'title': 'Большой разброс цен',
-                            'message': f'Разброс цен у аналогов составляет {cv*100:.0f}%. Рекомендуется проверить список аналогов и убедиться, что все объекты действительно сопоставимы.'
-                        })
-
-        # Проверка 3: Есть ли аналоги с ценой за м²?
-        if len(similar) > 0:
-            with_price = sum(1 for c in similar if c.get('price_per_sqm'))
-            if with_price == 0:
-                warnings.append({
-                    'type': 'error',
-                    'title': 'Нет данных о ценах',
-                    'message': 'Ни у одного аналога нет информации о цене за м². Невозможно провести анализ.'
-                })
-            elif with_price < len(similar) * 0.5:  # Меньше 50% с ценой
-                warnings.append({
-                    'type': 'warning',
-                    'title': 'Неполные данные о ценах',
-                    'message': f'Только у {with_price} из {len(similar)} аналогов есть данные о цене за м². Это может снизить точность оценки.'
-                })
+        similar = _deduplicate_comparables(similar)
+        warnings = _build_comparables_warnings(target, similar, residential_complex, urls_to_parse, parse_quality)
 
-        # Сохраняем в сессию
-        session_data['comparables'] = similar
-        session_data['comparables_warnings'] = warnings  # Сохраняем warnings в сессию
-        session_storage.set(session_id, session_data)
+        # Сохраняем в сессию (вместе с warnings)
+        session_storage.update(session_id, {
+            'comparables': similar,
+            'comparables_warnings': warnings
+        })
 
         # Debug logging - trace object count
         request_elapsed = time.time() - request_start
@@ -1771,6 +1930,246 @@ def find_similar():
         }), 500
 
 
+# Интервал keep-alive событий потокового поиска (чтобы прокси не рвали соединение)
+FIND_SIMILAR_STREAM_HEARTBEAT = 15.0
+
+
+def _format_stream_event(event: str, data: Dict, sse: bool) -> str:
+    """Сериализация события потокового поиска в SSE или NDJSON"""
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    return json.dumps({'event': event, **data}, ensure_ascii=False, default=str) + '\n'
+
+
+def _stream_search_target(session_id):
+    """
+    Целевой объект сессии для потокового поиска
+
+    Returns:
+        Tuple: (target, None) или (None, ответ с ошибкой)
+    """
+    if not isinstance(session_id, str) or not session_id:
+        return None, (jsonify({'status': 'error', 'message': 'Некорректный session_id'}), 400)
+
+    session_data = session_storage.get(session_id, fields=['target_property'])
+    if session_data is None:
+        logger.error(f"❌ Session not found: {session_id}")
+        return None, (jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404)
+
+    target = session_data.get('target_property')
+    if not target:
+        return None, (jsonify({'status': 'error', 'message': 'В сессии нет целевого объекта'}), 400)
+    return target, None
+
+
+def _stream_search(
+    session_id: str,
+    target: Dict,
+    search_type: str,
+    region: str,
+    limit: int,
+    page_fetcher,
+    events: queue.Queue,
+    cancelled: threading.Event
+):
+    """
+    Поиск аналогов и детальный парсинг для потокового поиска
+
+    Распарсенные аналоги сразу складываются в events.
+
+    Returns:
+        Tuple: (аналоги, название ЖК, urls_to_parse, parse_quality)
+        или None - поиск не удался (событие error уже в очереди) или клиент отключился
+    """
+    detail_pipeline = _create_detail_pipeline(
+        limit, region, on_complete=lambda comparable: events.put(('comparable', comparable))
+    )
+    try:
+        try:
+            # Фоновый поток не может брать браузеры пула: они привязаны к потоку Playwright
+            similar, residential_complex = _run_similar_search(
+                target, search_type, region, limit, detail_pipeline,
+                should_stop=cancelled.is_set, page_fetcher=page_fetcher
+            )
+        except Exception as search_error:
+            logger.error(f"❌ Search failed: {search_error}", exc_info=True)
+            events.put(('error', {
+                'status': 'error',
+                'message': 'search_failed',
+                'details': f'Не удалось выполнить поиск: {str(search_error)}'
+            }))
+            return None
+
+        if cancelled.is_set():
+            logger.info(f"⏹ find-similar stream cancelled by client (session: {session_id})")
+            return None
+
+        urls_to_parse, parse_quality = _merge_detail_results(similar, detail_pipeline)
+    finally:
+        detail_pipeline.close()
+
+    return similar, residential_complex, urls_to_parse, parse_quality
+
+
+def _stream_summary(session_id: str, target: Dict, search_type: str, found: tuple, request_start: float) -> Dict:
+    """Окончательный список аналогов: дедупликация, предупреждения, сохранение в сессию"""
+    import time
+    similar, residential_complex, urls_to_parse, parse_quality = found
+
+    similar = _deduplicate_comparables(similar)
+    warnings = _build_comparables_warnings(target, similar, residential_complex, urls_to_parse, parse_quality)
+
+    session_storage.update(session_id, {
+        'comparables': similar,
+        'comparables_warnings': warnings
+    })
+
+    request_elapsed = time.time() - request_start
+    logger.info(f"✅ [STEP 2] find-similar stream completed in {request_elapsed:.1f}s - {len(similar)} comparables")
+    return {
+        'status': 'success',
+        'comparables': similar,
+        'count': len(similar),
+        'search_type': search_type,
+        'residential_complex': residential_complex,
+        'elapsed_time': round(request_elapsed, 1),
+        'warnings': warnings
+    }
+
+
+def _run_stream_search(
+    session_id: str,
+    target: Dict,
+    search_type: str,
+    region: str,
+    limit: int,
+    page_fetcher,
+    events: queue.Queue,
+    cancelled: threading.Event,
+    request_start: float
+):
+    """Поиск + детальный парсинг в фоне; события складываются в очередь"""
+    try:
+        found = _stream_search(session_id, target, search_type, region, limit, page_fetcher, events, cancelled)
+        if found is not None:
+            events.put(('summary', _stream_summary(session_id, target, search_type, found, request_start)))
+    except Exception as e:
+        logger.error(f"❌ [STEP 2] find-similar stream failed: {e}", exc_info=True)
+        events.put(('error', {'status': 'error', 'message': 'Ошибка при поиске аналогов', 'details': str(e)}))
+
+
+def _accept_streamed_comparable(data: Dict, emitted: List[Dict], emitted_urls: set) -> bool:
+    """Отдаем только полные аналоги без строгих дубликатов среди уже отданных"""
+    url = data.get('url')
+    if url in emitted_urls or not (data.get('price') and data.get('total_area')):
+        return False
+    if any(m.recommendation == 'skip' for m in duplicate_detector.find_duplicates(data, emitted)):
+        return False
+
+    emitted.append(data)
+    emitted_urls.add(url)
+    return True
+
+
+def _stream_events(events: queue.Queue, started: Dict, use_sse: bool, request_start: float):
+    """События потокового поиска: started, аналоги по мере готовности, ping, summary/error"""
+    import time
+    yield _format_stream_event('started', started, use_sse)
+
+    emitted = []
+    emitted_urls = set()
+    while True:
+        try:
+            kind, data = events.get(timeout=FIND_SIMILAR_STREAM_HEARTBEAT)
+        except queue.Empty:
+            yield _format_stream_event('ping', {}, use_sse)
+            continue
+
+        if kind != 'comparable':
+            yield _format_stream_event(kind, data, use_sse)
+            return
+
+        if not _accept_streamed_comparable(data, emitted, emitted_urls):
+            continue
+        if len(emitted) == 1:
+            logger.info(f"⚡ First comparable streamed in {time.time() - request_start:.1f}s")
+        yield _format_stream_event('comparable', {'comparable': data, 'index': len(emitted) - 1}, use_sse)
+
+
+@app.route('/api/find-similar/stream', methods=['POST'])
+@limiter.limit(settings.RATELIMIT_SEARCH)  # Expensive - поиск и парсинг аналогов
+def find_similar_stream():
+    """
+    API: Потоковый поиск похожих объектов (Экран 2)
+
+    То же, что /api/find-similar, но аналоги отдаются по одному, как только
+    они найдены (или распарсены детально), проверены на полноту и на дубликаты.
+    Формат: SSE при Accept: text/event-stream (или "format": "sse"), иначе NDJSON.
+
+    Body:
+        {
+            "session_id": "uuid",
+            "limit": 20,
+            "search_type": "building"  // "building" или "city"
+        }
+
+    События:
+        started    - {"session_id", "search_type", "region", "limit"}
+        comparable - {"comparable": {...}, "index": N}
+        ping       - keep-alive
+        summary    - итог как в /api/find-similar ("comparables" - окончательный список)
+        error      - {"message", "details"}
+    """
+    import time
+    request_start = time.time()
+
+    payload = request.get_json(silent=True) or {}
+    session_id = payload.get('session_id')
+    limit = payload.get('limit', 50)
+    search_type = payload.get('search_type', 'building')
+    use_sse = payload.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+
+    logger.info(f"📍 [STEP 2] find-similar stream started (session: {session_id}, type: {search_type}, limit: {limit})")
+
+    target, error_response = _stream_search_target(session_id)
+    if error_response is not None:
+        return error_response
+
+    region = _resolve_search_region(target)
+    from src.parsers.async_parser import get_async_parsing_service
+    # Страницы поиска грузит прогретый браузер общего async сервиса (как и
+    # детальный парсинг): свой Chromium на каждый запрос не запускается
+    page_fetcher = get_async_parsing_service(cache=property_cache).fetch_page
+    events = queue.Queue()
+    cancelled = threading.Event()  # Клиент отключился - поиск прерывается
+
+    worker = threading.Thread(
+        target=_run_stream_search,
+        args=(session_id, target, search_type, region, limit, page_fetcher, events, cancelled, request_start),
+        name=f'find-similar-{session_id[:8]}',
+        daemon=True
+    )
+    worker.start()
+
+    started = {'session_id': session_id, 'search_type': search_type, 'region': region, 'limit': limit}
+
+    def generate():
+        try:
+            yield from _stream_events(events, started, use_sse, request_start)
+        finally:
+            # Клиент отключился (или поток завершен) - останавливаем поиск
+            cancelled.set()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # nginx: не буферизовать поток
+        }
+    )
+
+
 @app.route('/api/multi-source-search', methods=['POST'])
 @limiter.limit(settings.RATELIMIT_SEARCH)  # Expensive - мультиисточниковый поиск
 def multi_source_search():
@@ -1812,11 +2211,11 @@ def multi_source_search():
 
         logger.info(f"📍 [MULTI-SOURCE] search request started (session: {session_id}, sources: {sources}, strategy: {strategy})")
 
-        if not session_id or not session_storage.exists(session_id):
+        session_data = session_storage.get(session_id, fields=['target_property']) if session_id else None
+        if session_data is None:
             logger.error(f"❌ Session not found: {session_id}")
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        session_data = session_storage.get(session_id)
         target = session_data['target_property']
 
         # Определяем регион
@@ -1866,10 +2265,11 @@ def multi_source_search():
                 logger.info(f"🗑️ Removed {removed_duplicates} duplicates, {len(unique_results)} unique results remain")
 
             # Сохраняем в сессию
-            session_data['comparables'] = unique_results
-            session_data['multi_source_used'] = True
-            session_data['sources_stats'] = sources_stats
-            session_storage.set(session_id, session_data)
+            session_storage.update(session_id, {
+                'comparables': unique_results,
+                'multi_source_used': True,
+                'sources_stats': sources_stats
+            })
 
             request_elapsed = time.time() - request_start
             logger.info(f"✅ Multi-source search completed in {request_elapsed:.1f}s")
@@ -1934,8 +2334,7 @@ def add_comparable():
             return jsonify({'status': 'error', 'message': str(e)}), e.http_status
 
         # Получаем регион целевого объекта
-        session_data = session_storage.get(session_id)
-        target = session_data['target_property']
+        target = session_storage.get_field(session_id, 'target_property', {})
         target_region = target.get('region', 'spb')
 
         # Определяем регион добавляемого аналога по URL
@@ -1993,8 +2392,7 @@ def add_comparable():
             }), 400
 
         # Проверка на дубликаты
-        session_data = session_storage.get(session_id)
-        existing_comparables = session_data.get('comparables', [])
+        existing_comparables = session_storage.get_comparables(session_id) or []
 
         if existing_comparables:
             logger.info(f"🔍 Checking if new comparable is duplicate of {len(existing_comparables)} existing ones...")
@@ -2023,11 +2421,12 @@ def add_comparable():
                     comparable_data['duplicate_confidence'] = best_match.confidence
                     comparable_data['duplicate_type'] = best_match.duplicate_type
 
-        # Добавляем в список
-        session_data['comparables'].append(comparable_data)
-        session_storage.set(session_id, session_data)
+        # Добавляем в список (атомарно, без перезаписи остальных аналогов)
+        index = session_storage.append_comparable(session_id, comparable_data)
+        if index is None:
+            return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        logger.info(f"✅ Comparable added to session {session_id}, total: {len(session_data['comparables'])}")
+        logger.info(f"✅ Comparable added to session {session_id}, total: {index + 1}")
 
         return jsonify({
             'status': 'success',
@@ -2066,12 +2465,11 @@ def exclude_comparable():
         if not session_id or not session_storage.exists(session_id):
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        session_data = session_storage.get(session_id)
-        comparables = session_data['comparables']
+        if not isinstance(index, int) or isinstance(index, bool):
+            return jsonify({'status': 'error', 'message': 'Некорректный индекс аналога'}), 400
 
-        if 0 <= index < len(comparables):
-            comparables[index]['excluded'] = True
-            session_storage.set(session_id, session_data)
+        if session_storage.update_comparable(session_id, index, {'excluded': True}) is None:
+            return jsonify({'status': 'error', 'message': 'Аналог с таким индексом не найден'}), 400
 
         return jsonify({'status': 'success'})
 
@@ -2107,12 +2505,11 @@ def include_comparable():
         if not session_id or not session_storage.exists(session_id):
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        session_data = session_storage.get(session_id)
-        comparables = session_data['comparables']
+        if not isinstance(index, int) or isinstance(index, bool):
+            return jsonify({'status': 'error', 'message': 'Некорректный индекс аналога'}), 400
 
-        if 0 <= index < len(comparables):
-            comparables[index]['excluded'] = False
-            session_storage.set(session_id, session_data)
+        if session_storage.update_comparable(session_id, index, {'excluded': False}) is None:
+            return jsonify({'status': 'error', 'message': 'Аналог с таким индексом не найден'}), 400
 
         return jsonify({'status': 'success'})
 
@@ -2140,7 +2537,8 @@ def analyze():
     Returns:
         {
             "status": "success",
-            "analysis": {...}
+            "analysis": {...},
+            "cached": false  # true - результат с теми же входами взят из кэша
         }
     """
     try:
@@ -2149,40 +2547,45 @@ def analyze():
         filter_outliers = payload.get('filter_outliers', True)
         use_median = payload.get('use_median', True)
 
-        if not session_id or not session_storage.exists(session_id):
+        session_data = session_storage.get(session_id, fields=['target_property', 'comparables']) if session_id else None
+        if session_data is None:
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        session_data = session_storage.get(session_id)
-
         logger.info(f"Анализ для сессии {session_id}")
 
         # Валидация и создание моделей
         try:
             # Импортируем утилиты нормализации
             from src.models.property import normalize_property_data, validate_property_consistency
+            from src.analytics.result_cache import analysis_cache_key, to_cacheable
 
-            # Нормализуем целевой объект
+            # Нормализуем целевой объект и аналоги
             normalized_target = normalize_property_data(session_data['target_property'])
-            target_property = TargetProperty(**normalized_target)
-
-            # Проверяем консистентность
-            warnings = validate_property_consistency(target_property)
-            if warnings:
-                logger.warning(f"Предупреждения валидации: {warnings}")
-
-            # Нормализуем аналоги
-            comparables = [
-                ComparableProperty(**normalize_property_data(c))
-                for c in session_data['comparables']
-            ]
-
-            request_model = AnalysisRequest(
-                target_property=target_property,
-                comparables=comparables,
-                filter_outliers=filter_outliers,
-                use_median=use_median
+            normalized_comparables = [normalize_property_data(c) for c in session_data['comparables']]
+
+            # Те же входы и та же версия аналитики - готовый результат из кэша
+            cache_key = analysis_cache_key(normalized_target, normalized_comparables, filter_outliers, use_median)
+            cached_result = (
+                property_cache.get_analysis_result(cache_key) if settings.ANALYSIS_CACHE_ENABLED else None
             )
 
+            if cached_result is None:
+                target_property = TargetProperty(**normalized_target)
+
+                # Проверяем консистентность
+                warnings = validate_property_consistency(target_property)
+                if warnings:
+                    logger.warning(f"Предупреждения валидации: {warnings}")
+
+                comparables = [ComparableProperty(**c) for c in normalized_comparables]
+
+                request_model = AnalysisRequest(
+                    target_property=target_property,
+                    comparables=comparables,
+                    filter_outliers=filter_outliers,
+                    use_median=use_median
+                )
+
         except Exception as e:
             logger.error(f"Ошибка валидации: {e}", exc_info=True)
             return jsonify({
@@ -2192,6 +2595,18 @@ def analyze():
                 'technical_details': str(e)
             }), 400
 
+        if cached_result is not None:
+            logger.info(f"Результат анализа для сессии {session_id} взят из кэша")
+            session_storage.update(session_id, {
+                'analysis': cached_result,
+                'step': 3
+            })
+            return jsonify({
+                'status': 'success',
+                'analysis': cached_result,
+                'cached': True
+            })
+
         # Анализ
         analyzer = RealEstateAnalyzer()
         try:
@@ -2296,14 +2711,18 @@ def analyze():
             logger.warning(f"Ошибка генерации оффера: {offer_error}")
             result_dict['housler_offer'] = None
 
+        if settings.ANALYSIS_CACHE_ENABLED:
+            property_cache.set_analysis_result(
+                cache_key, to_cacheable(result_dict), ttl_minutes=settings.ANALYSIS_CACHE_TTL_MINUTES
+            )
+
         # Сохраняем в сессию
-        session_data['analysis'] = result_dict
-        session_data['step'] = 3
-        session_storage.set(session_id, session_data)
+        session_storage.update(session_id, {'analysis': result_dict, 'step': 3})
 
         return jsonify({
             'status': 'success',
-            'analysis': result_dict
+            'analysis': result_dict,
+            'cached': False
         })
 
     except Exception as e:
@@ -2326,12 +2745,13 @@ def get_session(session_id):
             "data": {...}
         }
     """
-    if not session_storage.exists(session_id):
+    session_data = session_storage.get(session_id)
+    if session_data is None:
         return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
     return jsonify({
         'status': 'success',
-        'data': session_storage.get(session_id)
+        'data': session_data
     })
 
 
@@ -2347,6 +2767,7 @@ def cache_stats():
                 "status": "active|disabled",
                 "hit_rate": 85.5,
                 "total_keys": 123,
+                "by_type": {"property": {"keys": 100, "hits": 10, "misses": 2, ...}, ...},
                 ...
             }
         }
@@ -2422,6 +2843,263 @@ def cache_clear():
         }), 500
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# ПАКЕТНАЯ ОЦЕНКА ПОРТФЕЛЯ
+# Машинный API (X-Admin-Key), поэтому без CSRF-токена
+# ═══════════════════════════════════════════════════════════════════════════
+
+PORTFOLIO_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+PORTFOLIO_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+
+def _check_admin_key(action: str):
+    """Проверка X-Admin-Key: None если ключ верный, иначе ответ с ошибкой"""
+    admin_key = os.environ.get('ADMIN_API_KEY')
+    provided_key = request.headers.get('X-Admin-Key')
+
+    if not admin_key:
+        logger.warning(f"ADMIN_API_KEY not configured, {action} disabled")
+        return jsonify({
+            'status': 'error',
+            'message': 'Admin API not configured'
+        }), 503
+
+    if not provided_key or provided_key != admin_key:
+        logger.warning(f"Unauthorized {action} attempt from IP: {request.remote_addr}")
+        return jsonify({
+            'status': 'error',
+            'message': 'Unauthorized'
+        }), 401
+
+    return None
+
+
+def _parse_portfolio_request():
+    """
+    Разбор тела запроса пакетной оценки
+
+    Returns:
+        (items, format, options) или (None, ответ с ошибкой)
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Передайте items: список URL объявлений или объектов ручного ввода'
+        }), 400)
+
+    if len(items) > settings.PORTFOLIO_MAX_TARGETS:
+        return None, (jsonify({
+            'status': 'error',
+            'message': f'Слишком много объектов: {len(items)} (максимум {settings.PORTFOLIO_MAX_TARGETS})'
+        }), 413)
+
+    fmt = data.get('format', 'ndjson')
+    if fmt not in PORTFOLIO_MIMETYPES:
+        return None, (jsonify({
+            'status': 'error',
+            'message': f'Неизвестный формат: {fmt} (допустимы: ndjson, csv)'
+        }), 400)
+
+    search_type = data.get('search_type', 'city')
+    if search_type not in ('city', 'building'):
+        return None, (jsonify({'status': 'error', 'message': 'search_type: city или building'}), 400)
+
+    try:
+        comparables_limit = int(data.get('comparables_limit', settings.PORTFOLIO_COMPARABLES_LIMIT))
+    except (TypeError, ValueError):
+        comparables_limit = settings.PORTFOLIO_COMPARABLES_LIMIT
+
+    options = {
+        'comparables_limit': max(1, min(comparables_limit, 50)),
+        'search_type': search_type,
+        'workers': settings.PORTFOLIO_ANALYSIS_WORKERS,
+    }
+    return (items, fmt, options), None
+
+
+@app.route('/api/portfolio/valuate', methods=['POST'])
+@csrf.exempt
+@limiter.limit(settings.RATELIMIT_PORTFOLIO)
+def portfolio_valuate():
+    """
+    API: Синхронная пакетная оценка небольшого портфеля (потоковый ответ)
+
+    Headers:
+        X-Admin-Key: <ADMIN_API_KEY from .env>
+
+    Body:
+        {
+            "items": ["https://www.cian.ru/sale/flat/123/", {"address": "...", "price_raw": ..., ...}],
+            "format": "ndjson",  # или csv
+            "search_type": "city",  # или building
+            "comparables_limit": 20
+        }
+
+    Returns:
+        NDJSON: {"type": "result", ...} по мере готовности, {"type": "progress", ...}
+        и итоговый {"type": "summary", ...}; CSV: строки результатов
+    """
+    auth_error = _check_admin_key('portfolio valuation')
+    if auth_error:
+        return auth_error
+
+    parsed, error = _parse_portfolio_request()
+    if error:
+        return error
+    items, fmt, options = parsed
+
+    if len(items) > settings.PORTFOLIO_SYNC_MAX_TARGETS:
+        return jsonify({
+            'status': 'error',
+            'message': (
+                f'Синхронно оцениваются до {settings.PORTFOLIO_SYNC_MAX_TARGETS} объектов, '
+                f'для {len(items)} используйте POST /api/portfolio/jobs'
+            )
+        }), 413
+
+    logger.info(f"📦 Portfolio valuation: {len(items)} targets, format={fmt}")
+    valuation = PortfolioValuation(cache=property_cache, parser_factory=get_parser_for_url, **options)
+
+    return Response(
+        stream_with_context(stream_portfolio(valuation, items, fmt=fmt)),
+        mimetype=PORTFOLIO_MIMETYPES[fmt],
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # nginx: не буферизовать поток
+        }
+    )
+
+
+@app.route('/api/portfolio/jobs', methods=['POST'])
+@csrf.exempt
+@limiter.limit(settings.RATELIMIT_PORTFOLIO)
+def portfolio_job_create():
+    """
+    API: Пакетная оценка портфеля в фоне (RQ)
+
+    Headers:
+        X-Admin-Key: <ADMIN_API_KEY from .env>
+
+    Body: как у /api/portfolio/valuate
+
+    Returns:
+        202 {"status": "queued", "job_id": "...", "status_url": "...", "result_url": "..."}
+    """
+    auth_error = _check_admin_key('portfolio job')
+    if auth_error:
+        return auth_error
+
+    parsed, error = _parse_portfolio_request()
+    if error:
+        return error
+    items, fmt, options = parsed
+
+    if not TASK_QUEUE_AVAILABLE or get_task_queue() is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Очередь задач недоступна, используйте /api/portfolio/valuate или portfolio_cli.py'
+        }), 503
+
+    job_id = uuid.uuid4().hex
+    output_path = os.path.join(settings.PORTFOLIO_OUTPUT_DIR, f"{job_id}.{fmt}")
+    try:
+        enqueue_task(
+            portfolio_valuation_task, items, output_path, fmt, options,
+            job_id=job_id,
+            # ~10 секунд на объект с запасом: парсинг, поиск, анализ
+            job_timeout=max(600, len(items) * 10),
+            result_ttl=7 * 24 * 3600
+        )
+    except Exception as e:
+        logger.error(f"Failed to enqueue portfolio valuation: {e}")
+        return jsonify({'status': 'error', 'message': safe_error_message(e)}), 503
+
+    logger.info(f"📦 Portfolio job {job_id} queued: {len(items)} targets")
+    return jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'total': len(items),
+        'status_url': f'/api/portfolio/jobs/{job_id}',
+        'result_url': f'/api/portfolio/jobs/{job_id}/result'
+    }), 202
+
+
+@app.route('/api/portfolio/jobs/<job_id>', methods=['GET'])
+def portfolio_job_status(job_id):
+    """API: Статус фоновой оценки портфеля (прогресс и метрики прогона)"""
+    auth_error = _check_admin_key('portfolio job status')
+    if auth_error:
+        return auth_error
+
+    if not PORTFOLIO_JOB_ID_PATTERN.match(job_id):
+        return jsonify({'status': 'error', 'message': 'Некорректный job_id'}), 400
+
+    if not TASK_QUEUE_AVAILABLE:
+        return jsonify({'status': 'error', 'message': 'Очередь задач недоступна'}), 503
+
+    status = get_task_status(job_id)
+    return jsonify(status), 404 if status.get('status') == 'error' else 200
+
+
+@app.route('/api/portfolio/jobs/<job_id>/result', methods=['GET'])
+def portfolio_job_result(job_id):
+    """API: Файл результатов оценки (доступен и частично, пока задача выполняется)"""
+    auth_error = _check_admin_key('portfolio job result')
+    if auth_error:
+        return auth_error
+
+    if not PORTFOLIO_JOB_ID_PATTERN.match(job_id):
+        return jsonify({'status': 'error', 'message': 'Некорректный job_id'}), 400
+
+    for fmt, mimetype in PORTFOLIO_MIMETYPES.items():
+        path = os.path.join(settings.PORTFOLIO_OUTPUT_DIR, f"{job_id}.{fmt}")
+        if os.path.exists(path):
+            return send_file(
+                os.path.abspath(path),
+                mimetype=mimetype,
+                as_attachment=True,
+                download_name=f"portfolio-{job_id}.{fmt}",
+                max_age=0
+            )
+
+    return jsonify({'status': 'error', 'message': 'Результаты не найдены'}), 404
+
+
+# Поля сессии, нужные для отчета (warnings и статистика источников не читаются)
+REPORT_SESSION_FIELDS = ['target_property', 'comparables', 'analysis']
+
+
+def _report_template_data(session_data: dict) -> dict:
+    """Данные шаблона report.html из сессии (исключенные аналоги в отчет не попадают)"""
+    analysis = session_data['analysis']
+    target = session_data.get('target_property', {})
+    comparables = [c for c in session_data.get('comparables', []) if not c.get('excluded', False)]
+
+    # Генерируем персонализированный оффер Housler
+    housler_offer = generate_housler_offer(
+        analysis=analysis,
+        property_info=target,
+        recommendations=analysis.get('recommendations', [])
+    )
+
+    return {
+        # Только день: по нему же строится ключ кэша PDF (report_cache_key)
+        'date': datetime.now().strftime('%Y-%m-%d'),
+        'property_info': target,
+        'comparables': comparables,
+        'fair_price_analysis': analysis.get('fair_price_analysis', {}),
+        'market_statistics': analysis.get('market_statistics', {}),
+        'recommendations': analysis.get('recommendations', []),
+        'price_scenarios': analysis.get('price_scenarios', []),
+        'time_forecast': analysis.get('time_forecast', {}),
+        'attractiveness_index': analysis.get('attractiveness_index', {}),
+        'strengths_weaknesses': analysis.get('strengths_weaknesses', {}),
+        'housler_offer': housler_offer
+    }
+
+
 @app.route('/api/export-report/<session_id>', methods=['GET'])
 def export_report(session_id):
     """
@@ -2431,11 +3109,10 @@ def export_report(session_id):
         PDF файл для скачивания с полным визуальным отчетом
     """
     try:
-        if not session_storage.exists(session_id):
+        session_data = session_storage.get(session_id, fields=REPORT_SESSION_FIELDS)
+        if session_data is None:
             return jsonify({'status': 'error', 'message': 'Сессия не найдена'}), 404
 
-        session_data = session_storage.get(session_id)
-
         # Проверяем, что анализ выполнен
         if 'analysis' not in session_data or not session_data['analysis']:
             return jsonify({
@@ -2445,48 +3122,28 @@ def export_report(session_id):
 
         logger.info(f"Экспорт PDF отчета для сессии {session_id}")
 
-        # Генерируем PDF используя Playwright
-        from datetime import datetime
-        import asyncio
-
         if not PLAYWRIGHT_AVAILABLE:
             # Fallback to markdown if playwright not available
             logger.warning("Playwright не доступен, возвращаем markdown")
             return _export_markdown_fallback(session_id, session_data)
 
-        # Генерируем PDF напрямую из HTML (без HTTP запроса)
+        # Генерируем PDF напрямую из HTML (без HTTP запроса) в прогретом рендерере
         try:
-            # Рендерим HTML шаблон напрямую
-            analysis = session_data['analysis']
-            target = session_data.get('target_property', {})
-            comparables = session_data.get('comparables', [])
-            comparables = [c for c in comparables if not c.get('excluded', False)]
-
-            housler_offer = generate_housler_offer(
-                analysis=analysis,
-                property_info=target,
-                recommendations=analysis.get('recommendations', [])
+            template_data = _report_template_data(session_data)
+            cache_key = report_cache_key(
+                session_data['analysis'], template_data['property_info'], template_data['comparables'],
+                report_date=template_data['date']
             )
 
-            template_data = {
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                'property_info': target,
-                'comparables': comparables,
-                'fair_price_analysis': analysis.get('fair_price_analysis', {}),
-                'market_statistics': analysis.get('market_statistics', {}),
-                'recommendations': analysis.get('recommendations', []),
-                'price_scenarios': analysis.get('price_scenarios', []),
-                'time_forecast': analysis.get('time_forecast', {}),
-                'attractiveness_index': analysis.get('attractiveness_index', {}),
-                'strengths_weaknesses': analysis.get('strengths_weaknesses', {}),
-                'housler_offer': housler_offer
-            }
-
-            html_content = render_template('report.html', **template_data)
-            pdf_bytes = asyncio.run(_generate_pdf_from_html(html_content))
+            pdf_bytes = property_cache.get_report_pdf(cache_key)
+            if pdf_bytes is None:
+                html_content = inline_static_assets(render_template('report.html', **template_data))
+                pdf_bytes = get_pdf_renderer().render(html_content)
+                property_cache.set_report_pdf(cache_key, pdf_bytes, ttl_hours=settings.REPORT_PDF_CACHE_TTL_HOURS)
+            else:
+                logger.info(f"PDF отчет для сессии {session_id} взят из кэша")
 
             # Возвращаем PDF файл
-            from flask import Response
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"housler_report_{session_id[:8]}_{timestamp}.pdf"
 
@@ -2498,6 +3155,9 @@ def export_report(session_id):
                     'Content-Type': 'application/pdf'
                 }
             )
+        except PDFRendererOverloadedError as overloaded:
+            logger.warning(f"PDF рендерер перегружен: {overloaded}")
+            return jsonify({'status': 'error', **overloaded.to_dict()}), overloaded.http_status
         except Exception as pdf_error:
             logger.warning(f"PDF генерация не удалась ({pdf_error}), переключаемся на markdown")
             return _export_markdown_fallback(session_id, session_data)
@@ -2516,44 +3176,14 @@ def view_report(session_id):
     Просмотр HTML отчета (для PDF генерации)
     """
     try:
-        if not session_storage.exists(session_id):
+        session_data = session_storage.get(session_id, fields=REPORT_SESSION_FIELDS)
+        if session_data is None:
             return "Сессия не найдена", 404
 
-        session_data = session_storage.get(session_id)
-
         if 'analysis' not in session_data or not session_data['analysis']:
             return "Анализ не выполнен", 400
 
-        analysis = session_data['analysis']
-        target = session_data.get('target_property', {})
-        comparables = session_data.get('comparables', [])
-
-        # Фильтруем исключенные аналоги
-        comparables = [c for c in comparables if not c.get('excluded', False)]
-
-        # Генерируем персонализированный оффер Housler
-        housler_offer = generate_housler_offer(
-            analysis=analysis,
-            property_info=target,
-            recommendations=analysis.get('recommendations', [])
-        )
-
-        # Подготавливаем данные для шаблона
-        template_data = {
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-            'property_info': target,
-            'comparables': comparables,
-            'fair_price_analysis': analysis.get('fair_price_analysis', {}),
-            'market_statistics': analysis.get('market_statistics', {}),
-            'recommendations': analysis.get('recommendations', []),
-            'price_scenarios': analysis.get('price_scenarios', []),
-            'time_forecast': analysis.get('time_forecast', {}),
-            'attractiveness_index': analysis.get('attractiveness_index', {}),
-            'strengths_weaknesses': analysis.get('strengths_weaknesses', {}),
-            'housler_offer': housler_offer
-        }
-
-        return render_template('report.html', **template_data)
+        return render_template('report.html', **_report_template_data(session_data))
 
     except Exception as e:
         logger.error(f"Ошибка отображения отчета: {e}", exc_info=True)
@@ -2566,43 +3196,6 @@ def view_report(session_id):
 # ═══════════════════════════════════════════════════════════════════════════
 
 
-async def _generate_pdf_from_html(html_content: str) -> bytes:
-    """
-    Генерирует PDF из HTML строки используя Playwright (без HTTP запроса)
-    """
-    from playwright.async_api import async_playwright
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-
-        # Загружаем HTML напрямую
-        logger.info("Загружаем HTML для PDF...")
-        await page.set_content(html_content, wait_until='networkidle', timeout=60000)
-
-        # Даем время на загрузку шрифтов и стилей из CDN
-        await page.wait_for_timeout(2000)
-
-        # Генерируем PDF
-        logger.info("Генерируем PDF...")
-        pdf_bytes = await page.pdf(
-            format='A4',
-            margin={
-                'top': '15mm',
-                'right': '12mm',
-                'bottom': '15mm',
-                'left': '12mm'
-            },
-            print_background=True,
-            prefer_css_page_size=False,
-            display_header_footer=False
-        )
-
-        await browser.close()
-        logger.info(f"PDF сгенерирован, размер: {len(pdf_bytes)} bytes")
-        return pdf_bytes
-
-
 def _export_markdown_fallback(session_id: str, session_data: dict):
     """
     Fallback функция для экспорта в markdown если playwright не доступен
@@ -2,16 +2,30 @@
 Database for Blog Posts
 SQLite storage for parsed and rewritten articles
 Includes article_queue for scheduled publishing
+
+Connections are reused: each thread keeps one connection per database
+(WAL mode, busy timeout, statement cache), so the web process, the RSS
+collector and the publisher cron jobs read while another process writes.
+View counts are accumulated in memory and flushed in one transaction
+every BLOG_VIEW_FLUSH_INTERVAL seconds instead of a write per page view.
 """
 
+import atexit
+import logging
 import os
 import re
 import sqlite3
 import json
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 # === Utility functions ===
 
@@ -42,19 +56,103 @@ DEFAULT_BLOG_DB_PATH = os.environ.get(
     '/var/www/housler_data/blog.db' if os.path.exists('/var/www/housler_data') else 'blog.db'
 )
 
+# Seconds between view count flushes (0 = write every view immediately)
+DEFAULT_VIEW_FLUSH_INTERVAL = float(os.environ.get('BLOG_VIEW_FLUSH_INTERVAL', '30'))
+# Flush earlier once this many views are pending
+VIEW_FLUSH_MAX_PENDING = 500
+
+# Wait for another process's write lock instead of failing with "database is locked"
+BUSY_TIMEOUT_MS = 5000
+# Prepared statements kept per connection (sqlite3 statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # Durable in WAL mode, fsync only at checkpoints
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+    'PRAGMA cache_size=-8000',  # 8 MB page cache per connection
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Instances with pending view counts are flushed at interpreter exit
+_instances = weakref.WeakSet()
+
 
 class BlogDatabase:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, view_flush_interval: Optional[float] = None):
         self.db_path = db_path or DEFAULT_BLOG_DB_PATH
+        self.view_flush_interval = (
+            DEFAULT_VIEW_FLUSH_INTERVAL if view_flush_interval is None else view_flush_interval
+        )
         # Ensure directory exists
         db_dir = os.path.dirname(self.db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        self._pending_views: Dict[str, int] = {}
+        self._views_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_views_flush = time.monotonic()
+
         self.init_db()
+        _instances.add(self)
+
+    # =========================================
+    # Connections
+    # =========================================
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread (opened on first use, reopened after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False  # Only close() touches it from another thread
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.OperationalError as e:
+                # Read-only database file: keep its journal mode
+                logger.warning(f"{pragma} failed for {self.db_path}: {e}")
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction on the thread's connection: commit, or rollback on error"""
+        conn = self._connection()
+        with conn:
+            yield conn
+
+    def close(self):
+        """Flush pending view counts and close connections of all threads"""
+        self.flush_view_counts()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
 
     def init_db(self):
         """Initialize database with blog_posts table"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connection()
         c = conn.cursor()
 
         c.execute('''
@@ -107,6 +205,24 @@ class BlogDatabase:
         except sqlite3.OperationalError:
             pass  # Column already exists
 
+        # Add content_html columns if they don't exist (migration)
+        # Sanitized HTML rendered from content; valid while content_html_hash
+        # matches the hash of the current content (see blog_routes.content_html_hash)
+        try:
+            c.execute('ALTER TABLE blog_posts ADD COLUMN content_html TEXT DEFAULT NULL')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        try:
+            c.execute('ALTER TABLE blog_posts ADD COLUMN content_html_hash TEXT DEFAULT NULL')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+        # Covering index for sitemaps: slug/dates without reading post bodies
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_posts_sitemap
+            ON blog_posts(is_published, published_at DESC, slug, updated_at)
+        ''')
+
         # === Article Queue table ===
         # Queue for articles waiting to be processed and published
         c.execute('''
@@ -132,7 +248,6 @@ class BlogDatabase:
         ''')
 
         conn.commit()
-        conn.close()
 
     def create_post(
         self,
@@ -149,9 +264,6 @@ class BlogDatabase:
         telegram_content: Optional[str] = None
     ) -> int:
         """Create new blog post"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
         now = datetime.now().isoformat()
         if not published_at:
             published_at = now
@@ -163,19 +275,16 @@ class BlogDatabase:
         # Serialize gallery_images to JSON
         gallery_json = json.dumps(gallery_images) if gallery_images else None
 
-        c.execute('''
-            INSERT INTO blog_posts
-            (slug, title, excerpt, content, original_url, original_title,
-             published_at, created_at, updated_at, telegram_post_type, cover_image, gallery_images, telegram_content)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (slug, title, excerpt, content, original_url, original_title,
-              published_at, now, now, telegram_post_type, cover_image, gallery_json, telegram_content))
-
-        post_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            c = conn.execute('''
+                INSERT INTO blog_posts
+                (slug, title, excerpt, content, original_url, original_title,
+                 published_at, created_at, updated_at, telegram_post_type, cover_image, gallery_images, telegram_content)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (slug, title, excerpt, content, original_url, original_title,
+                  published_at, now, now, telegram_post_type, cover_image, gallery_json, telegram_content))
 
-        return post_id
+        return c.lastrowid
 
     def _deserialize_post(self, row: sqlite3.Row) -> Dict:
         """Convert row to dict and deserialize JSON fields"""
@@ -188,21 +297,18 @@ class BlogDatabase:
                 post['gallery_images'] = []
         else:
             post['gallery_images'] = []
+        # Views not flushed yet
+        pending = self._pending_views.get(post.get('slug'))
+        if pending and post.get('view_count') is not None:
+            post['view_count'] += pending
         return post
 
     def get_post_by_slug(self, slug: str) -> Optional[Dict]:
         """Get single post by slug"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
-        c.execute('''
+        row = self._connection().execute('''
             SELECT * FROM blog_posts
             WHERE slug = ? AND is_published = 1
-        ''', (slug,))
-
-        row = c.fetchone()
-        conn.close()
+        ''', (slug,)).fetchone()
 
         if row:
             return self._deserialize_post(row)
@@ -214,10 +320,6 @@ class BlogDatabase:
         offset: int = 0
     ) -> List[Dict]:
         """Get all published posts"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
         # Validate and sanitize limit/offset to prevent SQL injection
         params = []
         if limit is not None:
@@ -237,51 +339,123 @@ class BlogDatabase:
                 ORDER BY published_at DESC
             '''
 
-        c.execute(query, params)
-        rows = c.fetchall()
-        conn.close()
+        rows = self._connection().execute(query, params).fetchall()
 
         return [self._deserialize_post(row) for row in rows]
 
+    def get_sitemap_entries(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Get slug and dates of published posts (newest first), without content"""
+        query = '''
+            SELECT slug, published_at, updated_at FROM blog_posts
+            WHERE is_published = 1
+            ORDER BY published_at DESC
+        '''
+        params = []
+        if limit is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params = [int(limit), int(offset)]
+
+        rows = self._connection().execute(query, params).fetchall()
+
+        return [dict(row) for row in rows]
+
+    def get_posts_version(self) -> Dict:
+        """
+        Count and latest dates of published posts
+
+        Changes whenever a post is published, unpublished or updated;
+        used to invalidate cached sitemaps.
+        """
+        row = self._connection().execute('''
+            SELECT COUNT(*), MAX(updated_at), MAX(published_at) FROM blog_posts
+            WHERE is_published = 1
+        ''').fetchone()
+
+        return {'count': row[0], 'last_updated': row[1], 'last_published': row[2]}
+
+    def save_content_html(self, post_id: int, content_hash: str, content_html: str):
+        """Store rendered HTML for post (does not change updated_at)"""
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE blog_posts
+                SET content_html = ?, content_html_hash = ?
+                WHERE id = ?
+            ''', (content_html, content_hash, post_id))
+
     def get_recent_posts(self, limit: int = 4) -> List[Dict]:
         """Get recent posts for homepage preview"""
         return self.get_all_posts(limit=limit)
 
     def increment_view_count(self, slug: str):
-        """Increment view count for post"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        """
+        Increment view count for post
 
-        c.execute('''
-            UPDATE blog_posts
-            SET view_count = view_count + 1
-            WHERE slug = ?
-        ''', (slug,))
+        Views are buffered in memory and written by flush_view_counts()
+        once view_flush_interval has passed (immediately if it is 0).
+        """
+        with self._views_lock:
+            self._pending_views[slug] = self._pending_views.get(slug, 0) + 1
+            pending_total = sum(self._pending_views.values())
+
+        if (
+            self.view_flush_interval <= 0
+            or pending_total >= VIEW_FLUSH_MAX_PENDING
+            or time.monotonic() - self._last_views_flush >= self.view_flush_interval
+        ):
+            self.flush_view_counts(raise_errors=self.view_flush_interval <= 0)
+
+    def flush_view_counts(self, raise_errors: bool = False) -> int:
+        """
+        Write buffered view counts in one transaction
 
-        conn.commit()
-        conn.close()
+        Returns:
+            Number of views written
+        """
+        # Another thread is already flushing - its batch will be picked up next time
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._views_lock:
+                pending, self._pending_views = self._pending_views, {}
+                self._last_views_flush = time.monotonic()
+            if not pending:
+                return 0
+
+            try:
+                with self._transaction() as conn:
+                    conn.executemany('''
+                        UPDATE blog_posts
+                        SET view_count = view_count + ?
+                        WHERE slug = ?
+                    ''', [(count, slug) for slug, count in pending.items()])
+            except sqlite3.Error as e:
+                # Read-only or locked database: views are dropped, not retried forever
+                if raise_errors:
+                    raise
+                logger.warning(f"Could not flush {sum(pending.values())} blog views: {e}")
+                return 0
+
+            return sum(pending.values())
+        finally:
+            self._flush_lock.release()
 
     def post_exists(self, slug: str) -> bool:
         """Check if post with slug exists"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('SELECT id FROM blog_posts WHERE slug = ?', (slug,))
-        result = c.fetchone()
-        conn.close()
+        result = self._connection().execute(
+            'SELECT id FROM blog_posts WHERE slug = ?', (slug,)
+        ).fetchone()
 
         return result is not None
 
     def count_posts(self) -> int:
         """Count total published posts"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('SELECT COUNT(*) FROM blog_posts WHERE is_published = 1')
-        count = c.fetchone()[0]
-        conn.close()
-
-        return count
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM blog_posts WHERE is_published = 1'
+        ).fetchone()[0]
 
     def get_posts_paginated(self, page: int = 1, per_page: int = 20) -> Dict:
         """Get paginated posts with metadata"""
@@ -303,11 +477,7 @@ class BlogDatabase:
 
     def get_unpublished_telegram(self, limit: int = 1) -> List[Dict]:
         """Get posts not yet published to Telegram (only with cover image)"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
-        c.execute('''
+        rows = self._connection().execute('''
             SELECT * FROM blog_posts
             WHERE is_published = 1
               AND telegram_published = 0
@@ -315,88 +485,54 @@ class BlogDatabase:
               AND cover_image != ''
             ORDER BY created_at ASC
             LIMIT ?
-        ''', (limit,))
-
-        rows = c.fetchall()
-        conn.close()
+        ''', (limit,)).fetchall()
 
         return [self._deserialize_post(row) for row in rows]
 
     def mark_telegram_published(self, post_id: int):
         """Mark post as published to Telegram"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('''
-            UPDATE blog_posts
-            SET telegram_published = 1
-            WHERE id = ?
-        ''', (post_id,))
-
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE blog_posts
+                SET telegram_published = 1
+                WHERE id = ?
+            ''', (post_id,))
 
     def count_unpublished_telegram(self) -> int:
         """Count posts not yet published to Telegram (only with cover image)"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('''
+        return self._connection().execute('''
             SELECT COUNT(*) FROM blog_posts
             WHERE is_published = 1
               AND telegram_published = 0
               AND cover_image IS NOT NULL
               AND cover_image != ''
-        ''')
-        count = c.fetchone()[0]
-        conn.close()
-
-        return count
+        ''').fetchone()[0]
 
     def count_posts_without_cover(self) -> int:
         """Count posts without cover image (waiting for YandexART)"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('''
+        return self._connection().execute('''
             SELECT COUNT(*) FROM blog_posts
             WHERE is_published = 1
               AND (cover_image IS NULL OR cover_image = '')
-        ''')
-        count = c.fetchone()[0]
-        conn.close()
-
-        return count
+        ''').fetchone()[0]
 
     def update_cover_image(self, post_id: int, cover_image: str):
         """Update cover image for existing post"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('''
-            UPDATE blog_posts
-            SET cover_image = ?, updated_at = ?
-            WHERE id = ?
-        ''', (cover_image, datetime.now().isoformat(), post_id))
-
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE blog_posts
+                SET cover_image = ?, updated_at = ?
+                WHERE id = ?
+            ''', (cover_image, datetime.now().isoformat(), post_id))
 
     def get_posts_without_cover(self, limit: int = 10) -> List[Dict]:
         """Get posts that don't have cover images"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
-        c.execute('''
+        rows = self._connection().execute('''
             SELECT * FROM blog_posts
             WHERE is_published = 1 AND (cover_image IS NULL OR cover_image = '')
             ORDER BY created_at DESC
             LIMIT ?
-        ''', (limit,))
-
-        rows = c.fetchall()
-        conn.close()
+        ''', (limit,)).fetchall()
 
         return [self._deserialize_post(row) for row in rows]
 
@@ -425,24 +561,17 @@ class BlogDatabase:
         Returns:
             Queue item ID or None if already exists
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
         try:
-            c.execute('''
-                INSERT INTO article_queue (url, title, source, excerpt, priority, created_at, status)
-                VALUES (?, ?, ?, ?, ?, ?, 'pending')
-            ''', (url, title, source, excerpt, priority, datetime.now().isoformat()))
-
-            queue_id = c.lastrowid
-            conn.commit()
-            return queue_id
+            with self._transaction() as conn:
+                c = conn.execute('''
+                    INSERT INTO article_queue (url, title, source, excerpt, priority, created_at, status)
+                    VALUES (?, ?, ?, ?, ?, ?, 'pending')
+                ''', (url, title, source, excerpt, priority, datetime.now().isoformat()))
+            return c.lastrowid
 
         except sqlite3.IntegrityError:
             # URL already in queue
             return None
-        finally:
-            conn.close()
 
     def get_next_from_queue(self) -> Optional[Dict]:
         """
@@ -450,45 +579,28 @@ class BlogDatabase:
 
         Returns highest priority pending article (FIFO within same priority)
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
-        c.execute('''
+        row = self._connection().execute('''
             SELECT * FROM article_queue
             WHERE status = 'pending'
             ORDER BY priority DESC, created_at ASC
             LIMIT 1
-        ''')
-
-        row = c.fetchone()
-        conn.close()
+        ''').fetchone()
 
         return dict(row) if row else None
 
     def mark_queue_processing(self, queue_id: int):
         """Mark queue item as currently being processed"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('''
-            UPDATE article_queue
-            SET status = 'processing', last_attempt_at = ?, attempts = attempts + 1
-            WHERE id = ?
-        ''', (datetime.now().isoformat(), queue_id))
-
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE article_queue
+                SET status = 'processing', last_attempt_at = ?, attempts = attempts + 1
+                WHERE id = ?
+            ''', (datetime.now().isoformat(), queue_id))
 
     def mark_queue_done(self, queue_id: int):
         """Remove successfully processed item from queue"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('DELETE FROM article_queue WHERE id = ?', (queue_id,))
-
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM article_queue WHERE id = ?', (queue_id,))
 
     def mark_queue_failed(self, queue_id: int, error: str, max_attempts: int = 3):
         """
@@ -497,111 +609,113 @@ class BlogDatabase:
         If attempts < max_attempts: reset to pending for retry
         If attempts >= max_attempts: mark as failed permanently
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        # Get current attempts
-        c.execute('SELECT attempts FROM article_queue WHERE id = ?', (queue_id,))
-        row = c.fetchone()
-
-        if row and row[0] >= max_attempts:
-            # Max retries reached - mark as failed
-            c.execute('''
-                UPDATE article_queue
-                SET status = 'failed', error_message = ?, last_attempt_at = ?
-                WHERE id = ?
-            ''', (error[:500], datetime.now().isoformat(), queue_id))
-        else:
-            # Retry later - reset to pending
-            c.execute('''
-                UPDATE article_queue
-                SET status = 'pending', error_message = ?, last_attempt_at = ?
-                WHERE id = ?
-            ''', (error[:500], datetime.now().isoformat(), queue_id))
-
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            # Get current attempts
+            row = conn.execute('SELECT attempts FROM article_queue WHERE id = ?', (queue_id,)).fetchone()
+
+            if row and row[0] >= max_attempts:
+                # Max retries reached - mark as failed
+                conn.execute('''
+                    UPDATE article_queue
+                    SET status = 'failed', error_message = ?, last_attempt_at = ?
+                    WHERE id = ?
+                ''', (error[:500], datetime.now().isoformat(), queue_id))
+            else:
+                # Retry later - reset to pending
+                conn.execute('''
+                    UPDATE article_queue
+                    SET status = 'pending', error_message = ?, last_attempt_at = ?
+                    WHERE id = ?
+                ''', (error[:500], datetime.now().isoformat(), queue_id))
 
     def is_url_in_queue(self, url: str) -> bool:
         """Check if URL is already in queue"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('SELECT id FROM article_queue WHERE url = ?', (url,))
-        result = c.fetchone()
-        conn.close()
+        result = self._connection().execute(
+            'SELECT id FROM article_queue WHERE url = ?', (url,)
+        ).fetchone()
 
         return result is not None
 
     def is_url_published(self, url: str) -> bool:
         """Check if URL was already published (by original_url)"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        c.execute('SELECT id FROM blog_posts WHERE original_url = ?', (url,))
-        result = c.fetchone()
-        conn.close()
+        result = self._connection().execute(
+            'SELECT id FROM blog_posts WHERE original_url = ?', (url,)
+        ).fetchone()
 
         return result is not None
 
     def get_queue_stats(self) -> Dict:
         """Get queue statistics"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
         stats = {'pending': 0, 'processing': 0, 'failed': 0, 'total': 0}
 
-        c.execute('''
+        rows = self._connection().execute('''
             SELECT status, COUNT(*) FROM article_queue GROUP BY status
-        ''')
+        ''').fetchall()
 
-        for row in c.fetchall():
+        for row in rows:
             stats[row[0]] = row[1]
 
         stats['total'] = sum(stats.values())
-        conn.close()
 
         return stats
 
     def cleanup_old_queue_items(self, days: int = 7):
         """Remove failed items older than specified days"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
         cutoff = (datetime.now() - timedelta(days=days)).isoformat()
 
-        c.execute('''
-            DELETE FROM article_queue
-            WHERE status = 'failed' AND created_at < ?
-        ''', (cutoff,))
+        with self._transaction() as conn:
+            c = conn.execute('''
+                DELETE FROM article_queue
+                WHERE status = 'failed' AND created_at < ?
+            ''', (cutoff,))
 
-        deleted = c.rowcount
-        conn.commit()
-        conn.close()
-
-        return deleted
+        return c.rowcount
 
     def get_queue_items(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
         """Get queue items for inspection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-
         if status:
-            c.execute('''
+            rows = self._connection().execute('''
                 SELECT * FROM article_queue
                 WHERE status = ?
                 ORDER BY priority DESC, created_at ASC
                 LIMIT ?
-            ''', (status, limit))
+            ''', (status, limit)).fetchall()
         else:
-            c.execute('''
+            rows = self._connection().execute('''
                 SELECT * FROM article_queue
                 ORDER BY priority DESC, created_at ASC
                 LIMIT ?
-            ''', (limit,))
-
-        rows = c.fetchall()
-        conn.close()
+            ''', (limit,)).fetchall()
 
         return [dict(row) for row in rows]
+
+
+_shared: Dict[tuple, BlogDatabase] = {}
+_shared_lock = threading.Lock()
+
+
+def get_blog_database(db_path: str = None) -> BlogDatabase:
+    """
+    Process-wide BlogDatabase for the web app
+
+    Reusing one instance keeps its per-thread connections and the view
+    count buffer; after fork the child gets its own instance.
+    """
+    key = (os.getpid(), db_path or DEFAULT_BLOG_DB_PATH)
+    with _shared_lock:
+        db = _shared.get(key)
+        if db is None:
+            db = _shared[key] = BlogDatabase(key[1])
+        return db
+
+
+def _flush_all_view_counts():
+    """Write buffered view counts of every live instance (atexit)"""
+    for db in list(_instances):
+        try:
+            db.flush_view_counts()
+        except Exception as e:
+            logger.warning(f"Could not flush blog views for {db.db_path}: {e}")
+
+
+atexit.register(_flush_all_view_counts)
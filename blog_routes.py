@@ -3,9 +3,13 @@ Blog Routes for Flask App
 """
 
 from flask import render_template, abort, Response, send_from_directory, request
-from blog_database import BlogDatabase
+from werkzeug.exceptions import HTTPException
+from blog_database import get_blog_database
+import hashlib
+import json
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, time
 import logging
 import markdown2
 import bleach
@@ -25,11 +29,112 @@ ALLOWED_ATTRS = {
     'th': ['colspan', 'rowspan', 'scope'],
 }
 ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+MARKDOWN_EXTRAS = ['fenced-code-blocks', 'tables', 'break-on-newline', 'target-blank-links']
+
+# Rendering settings are part of the content hash: changing them re-renders stored HTML
+CONTENT_HTML_VERSION = hashlib.sha1(json.dumps(
+    [MARKDOWN_EXTRAS, ALLOWED_TAGS, ALLOWED_ATTRS, ALLOWED_PROTOCOLS, markdown2.__version__, bleach.__version__],
+    sort_keys=True
+).encode('utf-8')).hexdigest()[:12]
+
+POSTS_PER_SITEMAP = 1000  # Google recommends max 50,000 URLs per sitemap
+SITEMAP_MAX_AGE = 3600  # Seconds crawlers may reuse a sitemap without revalidating
 
 logger = logging.getLogger(__name__)
 
-# Initialize database
-blog_db = BlogDatabase()
+# Shared per process: per-thread connections and buffered view counts.
+# Opened on first use, so importing this module does not create ./blog.db
+blog_db = None
+
+# Generated sitemaps: name -> (posts version, xml, etag, last_modified)
+_sitemap_cache = {}
+_sitemap_cache_lock = threading.Lock()
+
+
+def get_db():
+    """Blog database of the process (opened on first use)"""
+    global blog_db
+    if blog_db is None:
+        blog_db = get_blog_database()
+    return blog_db
+
+
+def render_post_html(content: str) -> str:
+    """Convert markdown to HTML and sanitize to prevent XSS"""
+    raw_html = markdown2.markdown(content, extras=MARKDOWN_EXTRAS)
+    # Sanitize HTML to remove any malicious scripts/attributes
+    return bleach.clean(
+        raw_html,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRS,
+        protocols=ALLOWED_PROTOCOLS,
+        strip=True
+    )
+
+
+def content_html_hash(content: str) -> str:
+    """Key of rendered HTML: post content + rendering settings"""
+    return hashlib.sha256(f'{CONTENT_HTML_VERSION}:{content}'.encode('utf-8')).hexdigest()
+
+
+def get_post_content_html(post: dict) -> str:
+    """Stored HTML of post if it matches current content, otherwise render and store it"""
+    content_hash = content_html_hash(post['content'])
+    if post.get('content_html') is not None and post.get('content_html_hash') == content_hash:
+        return post['content_html']
+
+    content_html = render_post_html(post['content'])
+    try:
+        get_db().save_content_html(post['id'], content_hash, content_html)
+    except Exception as e:
+        logger.warning(f"Could not store rendered HTML for {post.get('slug')}: {e}")
+    return content_html
+
+
+def _parse_post_date(value):
+    """Post date (ISO string) as datetime, None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    return parsed.replace(tzinfo=None)
+
+
+def _post_modified(post):
+    """Use updated_at if available, otherwise published_at"""
+    return _parse_post_date(post.get('updated_at')) or _parse_post_date(post.get('published_at'))
+
+
+def _sitemap_response(name: str, version, build):
+    """
+    Sitemap XML from cache (rebuilt when version changes) with ETag/Last-Modified
+
+    build() returns (xml, last_modified); conditional requests get 304.
+    """
+    with _sitemap_cache_lock:
+        cached = _sitemap_cache.get(name)
+    if cached is None or cached[0] != version:
+        xml, last_modified = build()
+        etag = hashlib.sha1(xml.encode('utf-8')).hexdigest()
+        cached = (version, xml, etag, last_modified)
+        with _sitemap_cache_lock:
+            _sitemap_cache[name] = cached
+
+    _, xml, etag, last_modified = cached
+    response = Response(xml, mimetype='application/xml')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = SITEMAP_MAX_AGE
+    return response.make_conditional(request)
+
+
+def _sitemap_version():
+    """Sitemaps change with posts and with the date (static pages use today's lastmod)"""
+    posts_version = get_db().get_posts_version()
+    return posts_version, datetime.now().date()
 
 
 def register_blog_routes(app):
@@ -41,7 +146,7 @@ def register_blog_routes(app):
         """Blog index page with paginated posts"""
         try:
             per_page = 20  # Posts per page
-            pagination = blog_db.get_posts_paginated(page=page, per_page=per_page)
+            pagination = get_db().get_posts_paginated(page=page, per_page=per_page)
 
             if page > pagination['total_pages'] and page > 1:
                 abort(404)
@@ -59,35 +164,26 @@ def register_blog_routes(app):
     def blog_post(slug):
         """Individual blog post page"""
         try:
-            post = blog_db.get_post_by_slug(slug)
+            post = get_db().get_post_by_slug(slug)
             if not post:
                 abort(404)
 
             # Increment view count (fail silently if DB is readonly)
             try:
-                blog_db.increment_view_count(slug)
+                get_db().increment_view_count(slug)
             except Exception as e:
                 logger.warning(f"Could not increment view count for {slug}: {e}")
 
-            # Convert markdown to HTML and sanitize to prevent XSS
+            # Rendered once per content change, not on every view
             if post.get('content'):
-                raw_html = markdown2.markdown(
-                    post['content'],
-                    extras=['fenced-code-blocks', 'tables', 'break-on-newline', 'target-blank-links']
-                )
-                # Sanitize HTML to remove any malicious scripts/attributes
-                post['content_html'] = bleach.clean(
-                    raw_html,
-                    tags=ALLOWED_TAGS,
-                    attributes=ALLOWED_ATTRS,
-                    protocols=ALLOWED_PROTOCOLS,
-                    strip=True
-                )
+                post['content_html'] = get_post_content_html(post)
 
             # Get recent posts for sidebar
-            recent_posts = blog_db.get_recent_posts(limit=5)
+            recent_posts = get_db().get_recent_posts(limit=5)
 
             return render_template('blog_post.html', post=post, recent_posts=recent_posts)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error loading blog post {slug}: {e}")
             abort(500)
@@ -96,30 +192,39 @@ def register_blog_routes(app):
     def sitemap_index():
         """Generate sitemap index for large sites"""
         try:
-            posts = blog_db.get_all_posts()
-            total_posts = len(posts)
-            posts_per_sitemap = 1000  # Google recommends max 50,000 URLs per sitemap
-
-            xml = ['<?xml version="1.0" encoding="UTF-8"?>']
-            xml.append('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-
-            # Main sitemap (static pages)
-            xml.append('  <sitemap>')
-            xml.append('    <loc>https://housler.ru/sitemap-main.xml</loc>')
-            xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
-            xml.append('  </sitemap>')
-
-            # Blog sitemaps (paginated)
-            num_sitemaps = (total_posts + posts_per_sitemap - 1) // posts_per_sitemap
-            for i in range(max(1, num_sitemaps)):
+            version = _sitemap_version()
+
+            def build():
+                today = datetime.combine(version[1], time.min)
+                entries = get_db().get_sitemap_entries()
+
+                xml = ['<?xml version="1.0" encoding="UTF-8"?>']
+                xml.append('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+
+                # Main sitemap (static pages)
                 xml.append('  <sitemap>')
-                xml.append(f'    <loc>https://housler.ru/sitemap-blog-{i + 1}.xml</loc>')
-                xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
+                xml.append('    <loc>https://housler.ru/sitemap-main.xml</loc>')
+                xml.append(f'    <lastmod>{today.date().isoformat()}</lastmod>')
                 xml.append('  </sitemap>')
 
-            xml.append('</sitemapindex>')
+                # Blog sitemaps (paginated), lastmod - latest post change in the page
+                num_sitemaps = (len(entries) + POSTS_PER_SITEMAP - 1) // POSTS_PER_SITEMAP
+                last_modified = today
+                for i in range(max(1, num_sitemaps)):
+                    chunk = entries[i * POSTS_PER_SITEMAP:(i + 1) * POSTS_PER_SITEMAP]
+                    dates = [d for d in map(_post_modified, chunk) if d]
+                    modified = max(dates) if dates else today
+                    last_modified = max(last_modified, modified)
+                    xml.append('  <sitemap>')
+                    xml.append(f'    <loc>https://housler.ru/sitemap-blog-{i + 1}.xml</loc>')
+                    xml.append(f'    <lastmod>{modified.date().isoformat()}</lastmod>')
+                    xml.append('  </sitemap>')
+
+                xml.append('</sitemapindex>')
+
+                return '\n'.join(xml), last_modified
 
-            return Response('\n'.join(xml), mimetype='application/xml')
+            return _sitemap_response('index', version, build)
         except Exception as e:
             logger.error(f"Error generating sitemap index: {e}")
             abort(500)
@@ -128,92 +233,98 @@ def register_blog_routes(app):
     def sitemap_main():
         """Static pages sitemap"""
         try:
-            xml = ['<?xml version="1.0" encoding="UTF-8"?>']
-            xml.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-
-            # Homepage
-            xml.append('  <url>')
-            xml.append('    <loc>https://housler.ru/</loc>')
-            xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
-            xml.append('    <changefreq>weekly</changefreq>')
-            xml.append('    <priority>1.0</priority>')
-            xml.append('  </url>')
-
-            # Blog index
-            xml.append('  <url>')
-            xml.append('    <loc>https://housler.ru/blog</loc>')
-            xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
-            xml.append('    <changefreq>daily</changefreq>')
-            xml.append('    <priority>0.9</priority>')
-            xml.append('  </url>')
-
-            # Calculator
-            xml.append('  <url>')
-            xml.append('    <loc>https://housler.ru/calculator</loc>')
-            xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
-            xml.append('    <changefreq>monthly</changefreq>')
-            xml.append('    <priority>0.8</priority>')
-            xml.append('  </url>')
-
-            # Consent page
-            xml.append('  <url>')
-            xml.append('    <loc>https://housler.ru/consent</loc>')
-            xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
-            xml.append('    <changefreq>monthly</changefreq>')
-            xml.append('    <priority>0.5</priority>')
-            xml.append('  </url>')
-
-            # Privacy policy
-            xml.append('  <url>')
-            xml.append('    <loc>https://housler.ru/doc/clients/politiki/</loc>')
-            xml.append(f'    <lastmod>{datetime.now().date().isoformat()}</lastmod>')
-            xml.append('    <changefreq>monthly</changefreq>')
-            xml.append('    <priority>0.5</priority>')
-            xml.append('  </url>')
-
-            xml.append('</urlset>')
-
-            return Response('\n'.join(xml), mimetype='application/xml')
+            today = datetime.now().date()
+            return _sitemap_response('main', today, lambda: _build_main_sitemap(today))
         except Exception as e:
             logger.error(f"Error generating main sitemap: {e}")
             abort(500)
 
+    def _build_main_sitemap(date):
+        """Static pages: lastmod is today's date"""
+        today = date.isoformat()
+
+        xml = ['<?xml version="1.0" encoding="UTF-8"?>']
+        xml.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+
+        # Homepage
+        xml.append('  <url>')
+        xml.append('    <loc>https://housler.ru/</loc>')
+        xml.append(f'    <lastmod>{today}</lastmod>')
+        xml.append('    <changefreq>weekly</changefreq>')
+        xml.append('    <priority>1.0</priority>')
+        xml.append('  </url>')
+
+        # Blog index
+        xml.append('  <url>')
+        xml.append('    <loc>https://housler.ru/blog</loc>')
+        xml.append(f'    <lastmod>{today}</lastmod>')
+        xml.append('    <changefreq>daily</changefreq>')
+        xml.append('    <priority>0.9</priority>')
+        xml.append('  </url>')
+
+        # Calculator
+        xml.append('  <url>')
+        xml.append('    <loc>https://housler.ru/calculator</loc>')
+        xml.append(f'    <lastmod>{today}</lastmod>')
+        xml.append('    <changefreq>monthly</changefreq>')
+        xml.append('    <priority>0.8</priority>')
+        xml.append('  </url>')
+
+        # Consent page
+        xml.append('  <url>')
+        xml.append('    <loc>https://housler.ru/consent</loc>')
+        xml.append(f'    <lastmod>{today}</lastmod>')
+        xml.append('    <changefreq>monthly</changefreq>')
+        xml.append('    <priority>0.5</priority>')
+        xml.append('  </url>')
+
+        # Privacy policy
+        xml.append('  <url>')
+        xml.append('    <loc>https://housler.ru/doc/clients/politiki/</loc>')
+        xml.append(f'    <lastmod>{today}</lastmod>')
+        xml.append('    <changefreq>monthly</changefreq>')
+        xml.append('    <priority>0.5</priority>')
+        xml.append('  </url>')
+
+        xml.append('</urlset>')
+
+        return '\n'.join(xml), datetime.combine(date, time.min)
+
     @app.route('/sitemap-blog-<int:page>.xml')
     def sitemap_blog(page):
         """Paginated blog sitemap"""
         try:
-            posts_per_sitemap = 1000
-            offset = (page - 1) * posts_per_sitemap
-
-            posts = blog_db.get_all_posts()
-            paginated_posts = posts[offset:offset + posts_per_sitemap]
+            version = _sitemap_version()
+            offset = (page - 1) * POSTS_PER_SITEMAP
 
-            if not paginated_posts and page > 1:
+            if page < 1 or (offset >= version[0]['count'] and page > 1):
                 abort(404)
 
-            xml = ['<?xml version="1.0" encoding="UTF-8"?>']
-            xml.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-
-            for post in paginated_posts:
-                xml.append('  <url>')
-                xml.append(f'    <loc>https://housler.ru/blog/{post["slug"]}</loc>')
-                # Use updated_at if available, otherwise published_at
-                try:
-                    mod_date = post.get('updated_at') or post.get('published_at')
-                    if mod_date:
-                        mod_date = datetime.fromisoformat(mod_date.replace('Z', '+00:00')).date().isoformat()
-                    else:
-                        mod_date = datetime.now().date().isoformat()
-                except:
-                    mod_date = datetime.now().date().isoformat()
-                xml.append(f'    <lastmod>{mod_date}</lastmod>')
-                xml.append('    <changefreq>monthly</changefreq>')
-                xml.append('    <priority>0.8</priority>')
-                xml.append('  </url>')
-
-            xml.append('</urlset>')
-
-            return Response('\n'.join(xml), mimetype='application/xml')
+            def build():
+                entries = get_db().get_sitemap_entries(limit=POSTS_PER_SITEMAP, offset=offset)
+                today = datetime.combine(version[1], time.min)
+                last_modified = None
+
+                xml = ['<?xml version="1.0" encoding="UTF-8"?>']
+                xml.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+
+                for entry in entries:
+                    modified = _post_modified(entry) or today
+                    last_modified = max(last_modified or modified, modified)
+                    xml.append('  <url>')
+                    xml.append(f'    <loc>https://housler.ru/blog/{entry["slug"]}</loc>')
+                    xml.append(f'    <lastmod>{modified.date().isoformat()}</lastmod>')
+                    xml.append('    <changefreq>monthly</changefreq>')
+                    xml.append('    <priority>0.8</priority>')
+                    xml.append('  </url>')
+
+                xml.append('</urlset>')
+
+                return '\n'.join(xml), last_modified or today
+
+            return _sitemap_response(f'blog-{page}', version, build)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error generating blog sitemap page {page}: {e}")
             abort(500)
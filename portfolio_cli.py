@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Portfolio Valuation CLI
+Batch valuation of listing URLs / manual targets with streamed NDJSON or CSV output
+
+Examples:
+    python portfolio_cli.py portfolio.txt -o results.ndjson
+    python portfolio_cli.py portfolio.csv -o results.csv --format csv --workers 4
+    python portfolio_cli.py portfolio.json --enqueue
+"""
+
+import argparse
+import logging
+import os
+import sys
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.config import settings
+from src.services.portfolio import FORMATS, PortfolioValuation, load_portfolio_items, stream_portfolio
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stderr
+)
+logger = logging.getLogger(__name__)
+
+
+def _init_cache():
+    """Shared Redis cache (pages and search results are reused across runs)"""
+    from src.cache import init_cache
+
+    return init_cache(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        password=settings.REDIS_PASSWORD,
+        namespace=settings.REDIS_NAMESPACE,
+        enabled=settings.REDIS_ENABLED,
+        compress_threshold=settings.CACHE_COMPRESS_THRESHOLD,
+        compression=settings.CACHE_COMPRESSION
+    )
+
+
+def _print_progress(metrics: dict):
+    sys.stderr.write(
+        f"\r{metrics['processed']}/{metrics['total']} ({metrics['progress_percent']}%) "
+        f"ok={metrics['succeeded']} failed={metrics['failed']} "
+        f"{metrics['throughput_per_min']}/min eta={metrics['eta_s']}s"
+    )
+    sys.stderr.flush()
+
+
+def run_local(args, items: list):
+    """Run the pipeline in this process and stream results to a file or stdout"""
+    valuation = PortfolioValuation(
+        cache=_init_cache(),
+        comparables_limit=args.comparables,
+        search_type=args.search_type,
+        workers=args.workers,
+        on_progress=None if args.quiet else _print_progress
+    )
+
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for chunk in stream_portfolio(valuation, items, fmt=args.format):
+            output.write(chunk)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    stats = valuation.get_stats()
+    sys.stderr.write('\n')
+    logger.info(
+        f"Done: {stats['succeeded']}/{stats['total']} ok, failed by stage: {stats['failures_by_stage']}, "
+        f"{stats['throughput_per_min']}/min, searches: {stats['searches']} for {stats['search_groups']} groups"
+    )
+    return 0 if stats['failed'] < stats['total'] else 1
+
+
+def run_enqueued(args, items: list):
+    """Queue the portfolio for an RQ worker (result: PORTFOLIO_OUTPUT_DIR/<job_id>.<format>)"""
+    from src.tasks import init_task_queue, portfolio_valuation_task
+    from src.tasks.queue import enqueue_task
+
+    if init_task_queue() is None:
+        logger.error("Task queue not available (check REDIS_URL)")
+        return 1
+
+    job_id = uuid.uuid4().hex
+    output_path = args.output or os.path.join(settings.PORTFOLIO_OUTPUT_DIR, f"{job_id}.{args.format}")
+    options = {
+        'comparables_limit': args.comparables,
+        'search_type': args.search_type,
+        'workers': args.workers,
+    }
+    enqueue_task(
+        portfolio_valuation_task, items, output_path, args.format, options,
+        job_id=job_id,
+        job_timeout=max(600, len(items) * 10),
+        result_ttl=7 * 24 * 3600
+    )
+    print(job_id)
+    logger.info(f"Queued {len(items)} targets as job {job_id}, results: {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Portfolio Valuation CLI')
+    parser.add_argument('input', help='Targets file: .txt (URL per line), .json, .ndjson/.jsonl or .csv')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--format', choices=FORMATS, default='ndjson', help='Output format')
+    parser.add_argument('-n', '--limit', type=int, help='Only value the first N targets')
+    parser.add_argument('--comparables', type=int, default=settings.PORTFOLIO_COMPARABLES_LIMIT,
+                        help='Comparables per area group')
+    parser.add_argument('--search-type', choices=['city', 'building'], default='city', help='Comparable search type')
+    parser.add_argument('--workers', type=int, default=settings.PORTFOLIO_ANALYSIS_WORKERS,
+                        help='Analysis processes (0 = analyze in this process)')
+    parser.add_argument('--enqueue', action='store_true', help='Queue for an RQ worker instead of running here')
+    parser.add_argument('-q', '--quiet', action='store_true', help='No progress line on stderr')
+
+    args = parser.parse_args()
+
+    items = load_portfolio_items(args.input)
+    if args.limit:
+        items = items[:args.limit]
+    if len(items) > settings.PORTFOLIO_MAX_TARGETS:
+        logger.error(f"Too many targets: {len(items)} (PORTFOLIO_MAX_TARGETS={settings.PORTFOLIO_MAX_TARGETS})")
+        sys.exit(1)
+
+    sys.exit(run_enqueued(args, items) if args.enqueue else run_local(args, items))
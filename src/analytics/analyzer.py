@@ -4,11 +4,12 @@
 
 import statistics
 import math
+import threading
+import time
 import logging
-from typing import Any, Dict, List, Tuple
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
-from functools import lru_cache
-from scipy import stats as scipy_stats
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,8 @@ except ImportError:
 
 # Новая логика расчета справедливой цены
 from .fair_price_calculator import calculate_fair_price_with_medians
+from .median_calculator import calculate_medians_from_comparables
+from .comparable_table import ComparableTable, confidence_critical_value, mean_stdev
 
 # Новые модули аналитики
 from .price_range import calculate_price_range
@@ -69,11 +72,38 @@ class RealEstateAnalyzer:
 
     Улучшения:
     - Валидация через Pydantic
-    - Кеширование расчетов
+    - Кеширование расчетов (граф этапов, каждый этап считается один раз за запрос)
     - Конфигурируемые параметры
-    - Метрики производительности
+    - Метрики производительности (время каждого этапа в metrics['stage_timings_ms'])
     """
 
+    # Граф этапов анализа: этап -> этапы, от которых он зависит.
+    # Результат этапа мемоизируется на время одного analyze().
+    STAGE_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+        'market_statistics': (),
+        'medians': (),
+        'fair_price': ('market_statistics', 'medians'),
+        'market_profile': (),
+        'price_scenarios': ('fair_price', 'market_profile'),
+        'strengths_weaknesses': ('fair_price',),
+        'comparison_chart': (),
+        'box_plot': (),
+        'price_range': ('fair_price', 'market_statistics'),
+        'attractiveness': ('fair_price', 'market_statistics'),
+        'time_forecast': ('fair_price', 'attractiveness', 'market_statistics'),
+        'price_sensitivity': ('fair_price', 'attractiveness'),
+        'confidence_interval': (),
+        'recommendations': ('fair_price', 'price_scenarios', 'market_statistics', 'market_profile'),
+    }
+
+    # Кривые вероятности продажи (самая дорогая часть этапа price_scenarios).
+    # Кривая зависит только от сценария, отношения стартовой цены к справедливой
+    # и округленного профиля рынка - при исключении или добавлении аналога эти
+    # входы, как правило, не меняются, и кривая берется из памяти процесса
+    PROBABILITY_CURVE_CACHE_SIZE = 512
+    _probability_curves: 'OrderedDict[Tuple, Tuple[float, ...]]' = OrderedDict()
+    _probability_curves_lock = threading.Lock()
+
     # Константы для расчетов (вынесены из кода)
     LARGE_APARTMENT_THRESHOLD = 150  # м², среднее по СПб для премиум
     LARGE_SIZE_MULTIPLIER = 0.10  # Коэффициент из исследования ЦИАН 2023
@@ -95,6 +125,11 @@ class RealEstateAnalyzer:
         self.filtered_comparables: List[ComparableProperty] = []
         self.data_quality: Dict = {}  # Результаты статистического анализа
         self.market_profile: Dict[str, Any] = {}
+        self._stage_results: Dict[str, Any] = {}
+
+        # Колоночная таблица аналогов (см. comparable_table)
+        self._table: Optional[ComparableTable] = None
+        self._filtered_table: Optional[ComparableTable] = None
 
         # Трекинг
         self.property_id = property_id
@@ -106,7 +141,8 @@ class RealEstateAnalyzer:
         self.metrics = {
             'calculation_time_ms': 0,
             'comparables_filtered': 0,
-            'cache_hits': 0
+            'cache_hits': 0,
+            'stage_timings_ms': {}
         }
 
         try:
@@ -129,6 +165,9 @@ class RealEstateAnalyzer:
 
         self.request = request
         self.market_profile = {}
+        self._reset_stages()
+        self._table = None
+        self._filtered_table = None
 
         # Инициализация трекинга
         if self.enable_tracking and self.property_id:
@@ -185,6 +224,9 @@ class RealEstateAnalyzer:
             comparables_to_process = request.comparables
             logger.info("⚠️ Валидация отключена - используются все аналоги")
 
+        # Таблица строится один раз: фильтры ниже выбирают из нее строки
+        self._table = ComparableTable.from_comparables(comparables_to_process)
+
         # === СТАТИСТИЧЕСКИЙ АНАЛИЗ И IQR-ФИЛЬТР (ФАЗА 2) ===
         if STATISTICAL_ANALYSIS_AVAILABLE:
             logger.info("=" * 60)
@@ -192,7 +234,7 @@ class RealEstateAnalyzer:
             logger.info("=" * 60)
 
             # Оценка качества данных
-            data_quality = calculate_data_quality(comparables_to_process)
+            data_quality = calculate_data_quality(comparables_to_process, table=self._table)
             logger.info(f"Коэффициент вариации (CV): {data_quality['cv']:.1%}")
             desc = data_quality.get('description', '')
             if desc:
@@ -204,7 +246,7 @@ class RealEstateAnalyzer:
             # PATCH 3: АДАПТИВНАЯ IQR-фильтрация выбросов (только если n >= 5)
             n = len(comparables_to_process)
             if n >= 5:
-                comparables_after_iqr, iqr_outliers = detect_outliers_iqr(comparables_to_process)
+                comparables_after_iqr, iqr_outliers = detect_outliers_iqr(comparables_to_process, table=self._table)
 
                 if len(iqr_outliers) > 0:
                     logger.info(f"IQR фильтр исключил {len(iqr_outliers)} статистических выбросов")
@@ -258,6 +300,8 @@ class RealEstateAnalyzer:
         else:
             self.filtered_comparables = [c for c in comparables_to_process if not c.excluded]
 
+        self._filtered_table = self._table.select(self.filtered_comparables)
+
         # Сохраняем аналоги в лог
         if self.enable_tracking and self.property_log:
             self.property_log.comparables_data = [
@@ -281,69 +325,27 @@ class RealEstateAnalyzer:
 
             raise ValueError(error_msg)
 
-        # Расчеты
-        market_stats = self.calculate_market_statistics()
-        fair_price = self.calculate_fair_price()
-        scenarios = self.generate_price_scenarios()
-        strengths_weaknesses = self.calculate_strengths_weaknesses()
-        comparison_chart = self.generate_comparison_chart_data()
-        box_plot = self.generate_box_plot_data()
+        # Расчеты (граф этапов, каждый этап считается один раз)
+        market_stats = self._stage('market_statistics')
+        fair_price = self._stage('fair_price')
+        scenarios = self._stage('price_scenarios')
+        strengths_weaknesses = self._stage('strengths_weaknesses')
+        comparison_chart = self._stage('comparison_chart')
+        box_plot = self._stage('box_plot')
 
         # НОВЫЕ РАСЧЕТЫ
-        # 1. Диапазон справедливой цены
-        price_range = calculate_price_range(
-            fair_price=fair_price.get('fair_price_total', 0),
-            confidence_interval=fair_price.get('confidence_interval_95'),
-            overpricing_percent=fair_price.get('overpricing_percent', 0),
-            market_stats=market_stats
-        )
-
-        # 2. Индекс привлекательности
-        attractiveness = calculate_attractiveness_index(
-            target=request.target_property,
-            fair_price_analysis=fair_price,
-            market_stats=market_stats
-        )
-
-        # 3. Прогноз времени продажи
-        time_forecast = forecast_time_to_sell(
-            current_price=request.target_property.price or 0,
-            fair_price=fair_price.get('fair_price_total', 0),
-            attractiveness_index=attractiveness.get('total_index', 50),
-            market_stats=market_stats
-        )
-
-        # 4. Анализ чувствительности к цене
-        price_sensitivity = forecast_at_different_prices(
-            fair_price=fair_price.get('fair_price_total', 0),
-            attractiveness_index=attractiveness.get('total_index', 50)
-        )
-
-        # 5. Доверительные интервалы цены
-        confidence_interval = calculate_price_confidence(
-            target=request.target_property,
-            comparables=self.filtered_comparables
-        )
+        price_range = self._stage('price_range')
+        attractiveness = self._stage('attractiveness')
+        time_forecast = self._stage('time_forecast')
+        price_sensitivity = self._stage('price_sensitivity')
+        confidence_interval = self._stage('confidence_interval')
 
         # Метрики
         end_time = datetime.now()
         self.metrics['calculation_time_ms'] = int((end_time - start_time).total_seconds() * 1000)
 
         # Генерация рекомендаций
-        try:
-            rec_engine = RecommendationEngine({
-                'target_property': request.target_property.model_dump(),
-                'fair_price_analysis': fair_price,
-                'price_scenarios': scenarios,
-                'comparables': [c.model_dump() for c in self.filtered_comparables],
-                'market_statistics': market_stats,
-                'market_profile': self.market_profile
-            })
-            recommendations_objects = rec_engine.generate()
-            recommendations = [rec.to_dict() for rec in recommendations_objects]
-        except Exception as e:
-            logger.warning(f"Не удалось сгенерировать рекомендации: {e}")
-            recommendations = []
+        recommendations = self._stage('recommendations')
 
         # Завершение трекинга
         if self.enable_tracking and self.property_log:
@@ -379,6 +381,124 @@ class RealEstateAnalyzer:
             recommendations=recommendations
         )
 
+    # ═══════════════════════════════════════════════════════════════════════
+    # ГРАФ ЭТАПОВ АНАЛИЗА
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def _reset_stages(self):
+        """Сбросить мемоизированные результаты этапов (новый запрос)"""
+        self._stage_results = {}
+        self.metrics['stage_timings_ms'] = {}
+
+    def _stage(self, name: str) -> Any:
+        """
+        Получить результат этапа анализа, вычислив его (и его зависимости) один раз
+
+        Время этапа без учета зависимостей пишется в metrics['stage_timings_ms'].
+
+        Args:
+            name: Имя этапа из STAGE_DEPENDENCIES
+
+        Returns:
+            Результат этапа
+        """
+        if name in self._stage_results:
+            self.metrics['cache_hits'] += 1
+            return self._stage_results[name]
+
+        # Зависимости считаем заранее, чтобы время этапа было "чистым"
+        for dependency in self.STAGE_DEPENDENCIES[name]:
+            self._stage(dependency)
+
+        compute: Callable[[], Any] = getattr(self, f'_compute_{name}')
+        started = time.perf_counter()
+        result = compute()
+        self.metrics['stage_timings_ms'][name] = round((time.perf_counter() - started) * 1000, 3)
+        self._stage_results[name] = result
+        return result
+
+    def _comparable_table(self) -> ComparableTable:
+        """ComparableTable текущего filtered_comparables (перестраивается, если список подменили)"""
+        table = self._filtered_table
+        comparables = self.filtered_comparables
+        if (table is None or len(table) != len(comparables)
+                or any(a is not b for a, b in zip(table.comparables, comparables))):
+            table = self._filtered_table = ComparableTable.from_comparables(comparables)
+        return table
+
+    def _compute_medians(self) -> Dict[str, Any]:
+        """Медианы переменных параметров аналогов"""
+        return calculate_medians_from_comparables(self.filtered_comparables, table=self._comparable_table())
+
+    def _compute_comparison_chart(self) -> Dict:
+        return self.generate_comparison_chart_data()
+
+    def _compute_box_plot(self) -> Dict:
+        return self.generate_box_plot_data()
+
+    def _compute_strengths_weaknesses(self) -> Dict:
+        return self.calculate_strengths_weaknesses()
+
+    def _compute_price_range(self) -> Dict:
+        """Диапазон справедливой цены"""
+        fair_price = self._stage('fair_price')
+        return calculate_price_range(
+            fair_price=fair_price.get('fair_price_total', 0),
+            confidence_interval=fair_price.get('confidence_interval_95'),
+            overpricing_percent=fair_price.get('overpricing_percent', 0),
+            market_stats=self._stage('market_statistics')
+        )
+
+    def _compute_attractiveness(self) -> Dict:
+        """Индекс привлекательности"""
+        return calculate_attractiveness_index(
+            target=self.request.target_property,
+            fair_price_analysis=self._stage('fair_price'),
+            market_stats=self._stage('market_statistics')
+        )
+
+    def _compute_time_forecast(self) -> Dict:
+        """Прогноз времени продажи"""
+        fair_price = self._stage('fair_price')
+        return forecast_time_to_sell(
+            current_price=self.request.target_property.price or 0,
+            fair_price=fair_price.get('fair_price_total', 0),
+            attractiveness_index=self._stage('attractiveness').get('total_index', 50),
+            market_stats=self._stage('market_statistics')
+        )
+
+    def _compute_price_sensitivity(self) -> List[Dict]:
+        """Анализ чувствительности к цене"""
+        return forecast_at_different_prices(
+            fair_price=self._stage('fair_price').get('fair_price_total', 0),
+            attractiveness_index=self._stage('attractiveness').get('total_index', 50)
+        )
+
+    def _compute_confidence_interval(self) -> Dict:
+        """Доверительные интервалы цены"""
+        return calculate_price_confidence(
+            target=self.request.target_property,
+            comparables=self.filtered_comparables,
+            table=self._comparable_table()
+        )
+
+    def _compute_recommendations(self) -> List[Dict]:
+        """Рекомендации по продаже"""
+        try:
+            rec_engine = RecommendationEngine({
+                'target_property': self.request.target_property.model_dump(),
+                'fair_price_analysis': self._stage('fair_price'),
+                'price_scenarios': self._stage('price_scenarios'),
+                'comparables': [c.model_dump() for c in self.filtered_comparables],
+                'market_statistics': self._stage('market_statistics'),
+                'market_profile': self._stage('market_profile')
+            })
+            recommendations_objects = rec_engine.generate()
+            return [rec.to_dict() for rec in recommendations_objects]
+        except Exception as e:
+            logger.warning(f"Не удалось сгенерировать рекомендации: {e}")
+            return []
+
     def _get_empty_fair_price_result(self) -> Dict:
         """
         Возвращает валидную структуру справедливой цены с нулевыми значениями
@@ -464,45 +584,34 @@ class RealEstateAnalyzer:
 
     def _calculate_confidence_interval(
         self,
-        data: List[float],
+        data: Sequence[float],
         confidence: float = 0.95
     ) -> Tuple[float, float]:
         """
         Расчет доверительного интервала для среднего
 
         Args:
-            data: Список значений
+            data: Значения (список или массив колонки ComparableTable)
             confidence: Уровень доверия (0.95 = 95%)
 
         Returns:
             (нижняя граница, верхняя граница)
         """
-        if not data or len(data) < 2:
+        if data is None or len(data) < 2:
             return (0.0, 0.0)
 
         n = len(data)
-        mean = statistics.mean(data)
-        stdev = statistics.stdev(data)
-
-        # t-распределение Стьюдента для малых выборок (n < 30)
-        # Для больших выборок (n >= 30) можно использовать нормальное
-        if n < 30:
-            # Степени свободы
-            df = n - 1
-            # t-критерий для заданного уровня доверия
-            t_critical = scipy_stats.t.ppf((1 + confidence) / 2, df)
-            margin = t_critical * (stdev / math.sqrt(n))
-        else:
-            # z-критерий для нормального распределения
-            z_critical = scipy_stats.norm.ppf((1 + confidence) / 2)
-            margin = z_critical * (stdev / math.sqrt(n))
+        mean, stdev = mean_stdev(data)
+
+        # t-распределение Стьюдента для малых выборок (n < 30),
+        # для больших выборок (n >= 30) - нормальное
+        margin = confidence_critical_value(n, confidence) * (stdev / math.sqrt(n))
 
         lower = mean - margin
         upper = mean + margin
 
         return (lower, upper)
 
-    @lru_cache(maxsize=128)
     def calculate_market_statistics(self) -> Dict:
         """
         Рыночная статистика по аналогам
@@ -510,6 +619,10 @@ class RealEstateAnalyzer:
         Returns:
             Словарь со статистикой
         """
+        return self._stage('market_statistics')
+
+    def _compute_market_statistics(self) -> Dict:
+        """Расчет рыночной статистики (этап market_statistics)"""
         filtered = self.filtered_comparables
 
         if not filtered:
@@ -541,27 +654,32 @@ class RealEstateAnalyzer:
                 }
             }
 
-        prices_per_sqm = [c.price_per_sqm for c in filtered if c.price_per_sqm]
+        table = self._comparable_table()
+        has_price = table.truthy('price_per_sqm')
+        prices_per_sqm = table.values('price_per_sqm', has_price)
 
         # Разделить по типу отделки
-        with_design = [c for c in filtered if c.has_design]
-        without_design = [c for c in filtered if not c.has_design]
-
-        prices_with_design = [c.price_per_sqm for c in with_design if c.price_per_sqm]
-        prices_without_design = [c.price_per_sqm for c in without_design if c.price_per_sqm]
+        with_design = table.column('has_design')
+        prices_with_design = table.values('price_per_sqm', has_price & with_design)
+        prices_without_design = table.values('price_per_sqm', has_price & ~with_design)
 
         # Расчет доверительных интервалов (95%)
         ci_95_lower, ci_95_upper = self._calculate_confidence_interval(
             prices_per_sqm, confidence=0.95
         ) if len(prices_per_sqm) >= 3 else (0, 0)
 
+        def mean(values) -> float:
+            return mean_stdev(values)[0] if len(values) else 0
+
+        has_prices = len(prices_per_sqm) > 0
+
         stats = {
             'all': {
-                'mean': statistics.mean(prices_per_sqm) if prices_per_sqm else 0,
-                'median': statistics.median(prices_per_sqm) if prices_per_sqm else 0,
-                'min': min(prices_per_sqm) if prices_per_sqm else 0,
-                'max': max(prices_per_sqm) if prices_per_sqm else 0,
-                'stdev': statistics.stdev(prices_per_sqm) if len(prices_per_sqm) > 1 else 0,
+                'mean': mean(prices_per_sqm),
+                'median': table.median('price_per_sqm', has_price) if has_prices else 0,
+                'min': float(prices_per_sqm.min()) if has_prices else 0,
+                'max': float(prices_per_sqm.max()) if has_prices else 0,
+                'stdev': mean_stdev(prices_per_sqm)[1] if len(prices_per_sqm) > 1 else 0,
                 'count': len(prices_per_sqm),
                 'filtered_out': self.metrics['comparables_filtered'],
                 # Доверительные интервалы
@@ -572,14 +690,14 @@ class RealEstateAnalyzer:
                 }
             },
             'with_design': {
-                'mean': statistics.mean(prices_with_design) if prices_with_design else 0,
-                'median': statistics.median(prices_with_design) if prices_with_design else 0,
-                'count': len(with_design)
+                'mean': mean(prices_with_design),
+                'median': table.median('price_per_sqm', has_price & with_design) if len(prices_with_design) else 0,
+                'count': int(with_design.sum())
             },
             'without_design': {
-                'mean': statistics.mean(prices_without_design) if prices_without_design else 0,
-                'median': statistics.median(prices_without_design) if prices_without_design else 0,
-                'count': len(without_design)
+                'mean': mean(prices_without_design),
+                'median': table.median('price_per_sqm', has_price & ~with_design) if len(prices_without_design) else 0,
+                'count': int((~with_design).sum())
             }
         }
 
@@ -604,7 +722,11 @@ class RealEstateAnalyzer:
         Returns:
             Словарь с расчетом справедливой цены
         """
-        market_stats = self.calculate_market_statistics()
+        return self._stage('fair_price')
+
+    def _compute_fair_price(self) -> Dict:
+        """Расчет справедливой цены (этап fair_price)"""
+        market_stats = self._stage('market_statistics')
 
         if not market_stats or not self.request:
             logger.warning("Невозможно рассчитать справедливую цену - отсутствуют данные")
@@ -631,7 +753,8 @@ class RealEstateAnalyzer:
             target=target,
             comparables=self.filtered_comparables,
             base_price_per_sqm=base_price_per_sqm,
-            method=method
+            method=method,
+            medians=self._stage('medians')
         )
 
         # Сохраняем для использования в calculate_strengths_weaknesses()
@@ -640,7 +763,7 @@ class RealEstateAnalyzer:
         # Добавляем доверительные интервалы для справедливой цены
         if target.total_area and len(self.filtered_comparables) >= 3:
             # Получаем цены/м² аналогов
-            prices_per_sqm = [c.price_per_sqm for c in self.filtered_comparables if c.price_per_sqm]
+            prices_per_sqm = self._comparable_table().values('price_per_sqm')
 
             # Рассчитываем CI для базовой цены/м²
             ci_lower_sqm, ci_upper_sqm = self._calculate_confidence_interval(prices_per_sqm, confidence=0.95)
@@ -965,11 +1088,15 @@ class RealEstateAnalyzer:
         Returns:
             Список сценариев
         """
+        return self._stage('price_scenarios')
+
+    def _compute_price_scenarios(self) -> List[PriceScenario]:
+        """Генерация ценовых сценариев (этап price_scenarios)"""
         target = self.request.target_property
         current_price = target.price or 0
-        fair_price_data = self.calculate_fair_price()
+        fair_price_data = self._stage('fair_price')
         fair_price = fair_price_data.get('fair_price_total', current_price)
-        market_profile = self._build_market_profile()
+        market_profile = self._stage('market_profile')
 
         # 3 сценария: Быстро / Оптимально (рекомендуем) / Максимум
         scenarios_config = [
@@ -1115,9 +1242,10 @@ class RealEstateAnalyzer:
 
     def _build_market_profile(self) -> Dict[str, Any]:
         """Строит профиль ликвидности и кеширует его для анализа."""
-        if self.market_profile:
-            return self.market_profile
+        return self._stage('market_profile')
 
+    def _compute_market_profile(self) -> Dict[str, Any]:
+        """Построение профиля ликвидности (этап market_profile)"""
         try:
             profile = build_liquidity_profile(self.request.target_property, self.filtered_comparables)
         except Exception as exc:  # pragma: no cover - защитный код
@@ -1165,10 +1293,42 @@ class RealEstateAnalyzer:
         profile = self.market_profile or self._build_market_profile()
         expected_dom = max(1, int(profile.get('expected_dom_months') or 4))
         probability_multiplier = profile.get('probability_multiplier', 1.0) or 1.0
+        price_ratio = start_price / fair_price if fair_price > 0 else 1.0
+
+        key = (
+            scenario_type,
+            self._price_adjustment(price_ratio),
+            expected_dom,
+            probability_multiplier,
+            base_probability,
+            months
+        )
+        with self._probability_curves_lock:
+            curve = self._probability_curves.get(key)
+            if curve is not None:
+                self._probability_curves.move_to_end(key)
+
+        if curve is None:
+            curve = tuple(self._build_probability_curve(*key))
+            with self._probability_curves_lock:
+                self._probability_curves[key] = curve
+                while len(self._probability_curves) > self.PROBABILITY_CURVE_CACHE_SIZE:
+                    self._probability_curves.popitem(last=False)
 
+        return list(curve)
+
+    def _build_probability_curve(
+        self,
+        scenario_type: str,
+        price_adjustment: float,
+        expected_dom: int,
+        probability_multiplier: float,
+        base_probability: float,
+        months: int
+    ) -> List[float]:
+        """Расчет кривой вероятностей (без кэша, см. _calculate_monthly_probability)"""
         base_curve = self._get_base_probability_curve(scenario_type, months)
-        price_ratio = start_price / fair_price if fair_price > 0 else 1.0
-        price_adjusted_curve = self._apply_price_adjustment(base_curve, price_ratio)
+        price_adjusted_curve = [min(0.98, max(0.0, value * price_adjustment)) for value in base_curve]
 
         empirical_curve = self._build_empirical_curve(expected_dom, months)
         blended_curve = self._blend_probability_curves(
@@ -1209,17 +1369,15 @@ class RealEstateAnalyzer:
         return (curve + [curve[-1]] * months)[:months]
 
     @staticmethod
-    def _apply_price_adjustment(curve: List[float], price_ratio: float) -> List[float]:
+    def _price_adjustment(price_ratio: float) -> float:
+        """Множитель вероятности за отношение стартовой цены к справедливой"""
         if price_ratio > 1.1:
-            adjustment = 0.7
-        elif price_ratio > 1.05:
-            adjustment = 0.85
-        elif price_ratio < 0.95:
-            adjustment = 1.15
-        else:
-            adjustment = 1.0
-
-        return [min(0.98, max(0.0, value * adjustment)) for value in curve]
+            return 0.7
+        if price_ratio > 1.05:
+            return 0.85
+        if price_ratio < 0.95:
+            return 1.15
+        return 1.0
 
     def _build_empirical_curve(self, expected_dom: int, months: int) -> List[float]:
         base_lambda = min(0.65, 1.0 / max(expected_dom, 1))
@@ -0,0 +1,384 @@
+"""
+Колоночная таблица аналогов (NumPy) для векторизованной статистики
+
+Статистические функции анализа (медианы, IQR, качество данных, доверительные
+интервалы) раньше каждая заново обходила Pydantic-модели через getattr и
+собирала списки. Таблица строится один раз на анализ: по каждому числовому
+полю - массив float64 (NaN вместо отсутствующих значений) и маска наличия.
+Подвыборки (после валидации и фильтров) - индексация массивов, без повторного
+чтения моделей.
+
+Медиана и квартили считаются по тем же формулам, что statistics.median и
+statistics.quantiles(n=4) (метод 'exclusive'), поэтому совпадают бит в бит;
+среднее и стандартное отклонение - NumPy (расхождение в последнем знаке).
+
+Много объектов оценки по одной таблице (портфель: объекты одного района
+делят найденные аналоги) - ComparableBatch: выборка каждого объекта задается
+маской строк, статистики считаются одной операцией по всем объектам.
+
+Использование:
+    table = ComparableTable.from_comparables(comparables)
+    prices = table.values('price_per_sqm')
+    median = table.median('price_per_sqm')
+
+    batch = ComparableBatch(table, rows)            # rows: объекты x строки
+    medians = batch.medians('price_per_sqm')        # по медиане на объект
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import stats as scipy_stats
+
+# Числовые поля таблицы: атрибуты модели + производный процент жилой площади
+NUMERIC_FIELDS = (
+    'price', 'price_per_sqm', 'total_area', 'living_area', 'ceiling_height', 'bathrooms',
+    'floor', 'total_floors', 'build_year', 'rooms', 'living_area_percent',
+)
+
+# Логические поля (отсутствующее значение - False)
+FLAG_FIELDS = ('has_design', 'excluded')
+
+
+def sorted_median(sorted_values: np.ndarray, counts: Any) -> Any:
+    """
+    Медиана отсортированных выборок (как statistics.median)
+
+    Args:
+        sorted_values: Отсортированные значения по последней оси (NaN в конце)
+        counts: Количество значений в каждой выборке (больше 0)
+    """
+    counts = np.asarray(counts)
+    lower = np.take_along_axis(sorted_values, ((counts - 1) // 2)[..., None], axis=-1)[..., 0]
+    upper = np.take_along_axis(sorted_values, (counts // 2)[..., None], axis=-1)[..., 0]
+    return (lower + upper) / 2
+
+
+def sorted_quartiles(sorted_values: np.ndarray, counts: Any) -> Tuple[Any, Any, Any]:
+    """
+    Q1, Q2, Q3 отсортированных выборок (как statistics.quantiles(n=4), метод 'exclusive')
+
+    Args:
+        sorted_values: Отсортированные значения по последней оси (NaN в конце)
+        counts: Количество значений в каждой выборке (не меньше 2)
+    """
+    counts = np.asarray(counts)
+    m = counts + 1
+    result = []
+    for i in range(1, 4):
+        j = np.clip(i * m // 4, 1, counts - 1)
+        delta = i * m - j * 4
+        left = np.take_along_axis(sorted_values, (j - 1)[..., None], axis=-1)[..., 0]
+        right = np.take_along_axis(sorted_values, j[..., None], axis=-1)[..., 0]
+        result.append((left * (4 - delta) + right * delta) / 4)
+    return tuple(result)
+
+
+def mean_stdev(values: Sequence[float]) -> Tuple[float, float]:
+    """Среднее и выборочное стандартное отклонение (ddof=1; 0 для одного значения)"""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        raise ValueError('mean of empty sample')
+    stdev = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    return float(values.mean()), stdev
+
+
+class ComparableTable:
+    """
+    Аналоги в колоночном виде: массив значений и маска наличия на поле
+
+    Attributes:
+        comparables: Исходные модели (в порядке строк таблицы)
+    """
+
+    def __init__(
+        self,
+        comparables: List[Any],
+        columns: Dict[str, np.ndarray],
+        integer_fields: Iterable[str] = ()
+    ):
+        self.comparables = comparables
+        self._columns = columns
+        self._integer_fields = frozenset(integer_fields)
+        self._row_index: Optional[Dict[int, int]] = None
+
+    @classmethod
+    def from_comparables(cls, comparables: Sequence[Any]) -> 'ComparableTable':
+        """Построить таблицу (единственный проход по моделям)"""
+        table = cls(list(comparables), {})
+        for field in NUMERIC_FIELDS[:-1]:
+            table._add_column(field)
+
+        living, total = table.column('living_area'), table.column('total_area')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table._columns['living_area_percent'] = np.where(
+                (living != 0) & (total != 0), living / total * 100, np.nan
+            )
+        for field in FLAG_FIELDS:
+            table._columns[field] = np.array(
+                [bool(getattr(comp, field, False)) for comp in table.comparables], dtype=bool
+            )
+        return table
+
+    def _add_column(self, field: str) -> np.ndarray:
+        values = [getattr(comp, field, None) for comp in self.comparables]
+        column = self._columns[field] = np.array(
+            [np.nan if value is None else value for value in values], dtype=float
+        )
+        # statistics.median нечетной выборки целых возвращает int - сохраняем тип
+        if any(value is not None for value in values) and all(
+            value is None or (isinstance(value, int) and not isinstance(value, bool)) for value in values
+        ):
+            self._integer_fields = self._integer_fields | {field}
+        return column
+
+    def __len__(self) -> int:
+        return len(self.comparables)
+
+    # ─────────────────────────────────────────────────────────────────
+    # Колонки и маски
+    # ─────────────────────────────────────────────────────────────────
+
+    def column(self, field: str) -> np.ndarray:
+        """Значения поля по строкам (NaN - нет значения; поля вне NUMERIC_FIELDS читаются при первом обращении)"""
+        column = self._columns.get(field)
+        if column is None:
+            column = self._add_column(field)
+        return column
+
+    def present(self, field: str) -> np.ndarray:
+        """Маска строк, где значение поля задано"""
+        column = self.column(field)
+        if column.dtype == bool:
+            return np.ones(len(column), dtype=bool)
+        return ~np.isnan(column)
+
+    def truthy(self, field: str) -> np.ndarray:
+        """Маска строк со значением, истинным в Python (задано и не 0)"""
+        column = self.column(field)
+        if column.dtype == bool:
+            return column.copy()
+        return self.present(field) & (column != 0)
+
+    def positive(self, field: str) -> np.ndarray:
+        """Маска строк с положительным значением"""
+        return self.present(field) & (self.column(field) > 0)
+
+    def values(self, field: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Значения поля по маске (по умолчанию - истинные значения, как `if comp.field`)"""
+        return self.column(field)[self.truthy(field) if mask is None else mask]
+
+    # ─────────────────────────────────────────────────────────────────
+    # Подвыборки
+    # ─────────────────────────────────────────────────────────────────
+
+    def subset(self, rows: np.ndarray) -> 'ComparableTable':
+        """Таблица из строк по булевой маске или индексам"""
+        rows = np.asarray(rows)
+        indices = np.flatnonzero(rows) if rows.dtype == bool else rows.astype(int)
+        return ComparableTable(
+            [self.comparables[i] for i in indices],
+            {field: column[indices] for field, column in self._columns.items()},
+            self._integer_fields
+        )
+
+    def select(self, comparables: Sequence[Any]) -> 'ComparableTable':
+        """
+        Таблица для подсписка исходных моделей (результат фильтра)
+
+        Строки ищутся по идентичности объектов; модели, которых нет в
+        таблице, вызывают KeyError.
+        """
+        if self._row_index is None:
+            self._row_index = {id(comp): i for i, comp in enumerate(self.comparables)}
+        return self.subset(np.array([self._row_index[id(comp)] for comp in comparables], dtype=int))
+
+    # ─────────────────────────────────────────────────────────────────
+    # Статистики
+    # ─────────────────────────────────────────────────────────────────
+
+    def median(self, field: str, mask: Optional[np.ndarray] = None) -> Optional[float]:
+        """Медиана значений поля по маске (None - значений нет)"""
+        values = np.sort(self.values(field, mask))
+        if not len(values):
+            return None
+        median = float(sorted_median(values, len(values)))
+        if field in self._integer_fields and len(values) % 2:
+            return int(median)
+        return median
+
+    def quartiles(self, field: str, mask: Optional[np.ndarray] = None) -> Optional[Tuple[float, float, float]]:
+        """Q1, Q2, Q3 значений поля по маске (None - меньше 2 значений)"""
+        values = np.sort(self.values(field, mask))
+        if len(values) < 2:
+            return None
+        return tuple(float(q) for q in sorted_quartiles(values, len(values)))
+
+
+class ComparableBatch:
+    """
+    Выборки многих объектов из одной таблицы аналогов
+
+    Строка rows[i] - маска строк таблицы, которые являются аналогами i-го
+    объекта. Значения поля по всем выборкам выравниваются в матрицу
+    (объекты x строки) с NaN вместо невыбранных строк и сортируются по
+    строкам (NaN - в конце), поэтому медианы, квартили, средние и интервалы
+    считаются одной операцией NumPy по всем объектам и совпадают с
+    однообъектными ComparableTable.median()/quartiles(). Там, где значений
+    недостаточно, - NaN.
+    """
+
+    def __init__(self, table: ComparableTable, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=bool)
+        if rows.ndim != 2 or rows.shape[1] != len(table):
+            raise ValueError(f'rows must have shape (targets, {len(table)}), got {rows.shape}')
+        self.table = table
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def sizes(self) -> np.ndarray:
+        """Количество аналогов каждого объекта"""
+        return self.rows.sum(axis=1)
+
+    def restrict(self, rows: np.ndarray) -> 'ComparableBatch':
+        """Тот же набор объектов с более узкими выборками (результат фильтра)"""
+        return ComparableBatch(self.table, self.rows & rows)
+
+    def select(self, index: int) -> ComparableTable:
+        """Таблица аналогов одного объекта"""
+        return self.table.subset(self.rows[index])
+
+    # ─────────────────────────────────────────────────────────────────
+    # Статистики по объектам
+    # ─────────────────────────────────────────────────────────────────
+
+    def _selected(self, field: str, rule: str) -> np.ndarray:
+        return self.rows & getattr(self.table, rule)(field)
+
+    def matrix(self, field: str, rule: str = 'truthy') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Отсортированные значения поля по объектам и их количество
+
+        Args:
+            field: Поле таблицы
+            rule: Отбор значений - 'truthy', 'positive' или 'present'
+
+        Returns:
+            (массив объекты x строки, NaN в конце строк; количества по объектам)
+        """
+        selected = self._selected(field, rule)
+        # Хотя бы один столбец: индексы медианы пустой выборки не выходят за массив
+        matrix = np.full((len(self), max(len(self.table), 1)), np.nan)
+        matrix[:, :len(self.table)] = np.where(selected, self.table.column(field), np.nan)
+        matrix.sort(axis=1)
+        return matrix, selected.sum(axis=1)
+
+    def medians(self, field: str, rule: str = 'truthy') -> np.ndarray:
+        matrix, counts = self.matrix(field, rule)
+        result = sorted_median(matrix, np.maximum(counts, 1))
+        return np.where(counts > 0, result, np.nan)
+
+    def median_values(self, field: str, rule: str = 'truthy') -> List[Optional[float]]:
+        """Медианы как у ComparableTable.median(): None без значений, int для целых полей"""
+        _, counts = self.matrix(field, rule)
+        integer = field in self.table._integer_fields
+        return [
+            None if count == 0 else int(median) if integer and count % 2 else float(median)
+            for median, count in zip(self.medians(field, rule), counts)
+        ]
+
+    def quartiles(self, field: str, rule: str = 'truthy') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        matrix, counts = self.matrix(field, rule)
+        enough = counts >= 2
+        if matrix.shape[1] < 2:
+            return tuple(np.full(len(self), np.nan) for _ in range(3))
+        return tuple(
+            np.where(enough, q, np.nan) for q in sorted_quartiles(matrix, np.maximum(counts, 2))
+        )
+
+    def mean_stdev(self, field: str, rule: str = 'truthy') -> Tuple[np.ndarray, np.ndarray]:
+        """Средние и выборочные стандартные отклонения (0 для одного значения, NaN без значений)"""
+        selected = self._selected(field, rule)
+        counts = selected.sum(axis=1)
+        values = np.where(selected, self.table.column(field), 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, values.sum(axis=1) / np.maximum(counts, 1), np.nan)
+            squares = np.where(selected, (values - mean[:, None]) ** 2, 0.0).sum(axis=1)
+            stdev = np.where(counts > 1, np.sqrt(squares / np.maximum(counts - 1, 1)), 0.0)
+        return mean, np.where(counts > 0, stdev, np.nan)
+
+    def confidence_intervals(
+        self,
+        field: str = 'price_per_sqm',
+        confidence: float = 0.95,
+        rule: str = 'truthy'
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Границы доверительного интервала среднего (t до 30 значений, далее z; 0 - меньше 2 значений)"""
+        mean, stdev = self.mean_stdev(field, rule)
+        counts = self._selected(field, rule).sum(axis=1)
+        quantile = (1 + confidence) / 2
+        critical = np.where(
+            counts < 30,
+            scipy_stats.t.ppf(quantile, np.maximum(counts - 1, 1)),
+            scipy_stats.norm.ppf(quantile)
+        )
+        margin = critical * stdev / np.sqrt(np.maximum(counts, 1))
+        enough = counts >= 2
+        return np.where(enough, mean - margin, 0.0), np.where(enough, mean + margin, 0.0)
+
+    # ─────────────────────────────────────────────────────────────────
+    # Фильтры выбросов по объектам
+    # ─────────────────────────────────────────────────────────────────
+
+    def without_iqr_outliers(
+        self,
+        field: str = 'price_per_sqm',
+        multiplier: float = 1.5,
+        min_rows: int = 4
+    ) -> 'ComparableBatch':
+        """
+        Выборки без IQR-выбросов (правила как у detect_outliers_iqr)
+
+        Строки без положительного значения сохраняются; фильтр не применяется
+        к объектам, у которых меньше min_rows аналогов или меньше 4 значений.
+        """
+        q1, _, q3 = self.quartiles(field, 'positive')
+        counts = self._selected(field, 'positive').sum(axis=1)
+        iqr = q3 - q1
+        lower, upper = q1 - multiplier * iqr, q3 + multiplier * iqr
+
+        column = self.table.column(field)
+        with np.errstate(invalid='ignore'):
+            outside = (column < lower[:, None]) | (column > upper[:, None])
+        applies = (self.sizes() >= max(min_rows, 4)) & (counts >= 4)
+        outlier = applies[:, None] & self.table.positive(field) & outside
+        return self.restrict(~outlier)
+
+    def without_sigma_outliers(self, field: str = 'price_per_sqm', sigmas: float = 3.0) -> 'ComparableBatch':
+        """
+        Выборки без выбросов за ±sigmas·σ и без исключенных пользователем строк
+
+        Правила как у RealEstateAnalyzer._filter_outliers: при меньше 2 аналогах
+        выборка не меняется, строки без значения сохраняются, при меньше
+        2 значениях отбрасываются только исключенные.
+        """
+        excluded = self.table.column('excluded')
+        kept = self.restrict(~excluded)
+        mean, stdev = kept.mean_stdev(field)
+        counts = kept._selected(field, 'truthy').sum(axis=1)
+
+        column = self.table.column(field)
+        with np.errstate(invalid='ignore'):
+            inside = np.abs(column - mean[:, None]) <= sigmas * stdev[:, None]
+        keep = ~excluded & (~self.table.truthy(field) | inside | (counts < 2)[:, None])
+        return self.restrict(keep | (self.sizes() < 2)[:, None])
+
+
+def confidence_critical_value(n: int, confidence: float) -> float:
+    """Критическое значение интервала среднего: t Стьюдента до 30 значений, далее z"""
+    quantile = (1 + confidence) / 2
+    if n < 30:
+        return float(scipy_stats.t.ppf(quantile, n - 1))
+    return float(scipy_stats.norm.ppf(quantile))
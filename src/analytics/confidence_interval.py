@@ -3,8 +3,9 @@
 from __future__ import annotations
 
 import math
-import statistics
-from typing import Any, Dict, List, Sequence, TYPE_CHECKING
+from typing import Any, Dict, Optional, Sequence, TYPE_CHECKING
+
+from .comparable_table import ComparableTable, mean_stdev
 
 if TYPE_CHECKING:  # pragma: no cover - только для типизации
     from ..models.property import TargetProperty, ComparableProperty
@@ -14,13 +15,16 @@ Z_SCORE_95 = 1.960  # 95% доверительный интервал
 
 
 def calculate_price_confidence(
-    target: "TargetProperty", comparables: Sequence["ComparableProperty"]
+    target: "TargetProperty",
+    comparables: Sequence["ComparableProperty"],
+    table: Optional[ComparableTable] = None,
 ) -> Dict[str, Any]:
     """Строит доверительные интервалы цены продажи.
 
     Интервалы рассчитываются по цене за квадратный метр (mean +/- z * SE)
     и затем переводятся в абсолютную стоимость, учитывая площадь объекта.
     Если данных недостаточно, функция возвращает пояснение и безопасные значения.
+    Готовая ComparableTable тех же аналогов избавляет от повторного чтения моделей.
     """
 
     base_result: Dict[str, Any] = {
@@ -48,7 +52,9 @@ def calculate_price_confidence(
         base_result["note"] = "Неизвестна площадь объекта — нечего умножать на кв.метр."
         return base_result
 
-    usable_prices: List[float] = [c.price_per_sqm for c in comparables if c.price_per_sqm]
+    if table is None:
+        table = ComparableTable.from_comparables(comparables)
+    usable_prices = table.values("price_per_sqm")
     sample_size = len(usable_prices)
     base_result["sample_size"] = sample_size
 
@@ -56,8 +62,8 @@ def calculate_price_confidence(
         base_result["note"] = "Ни один аналог не содержит цены за м² — интервал не построен."
         return base_result
 
-    mean_ppsm = statistics.mean(usable_prices)
-    median_ppsm = statistics.median(usable_prices)
+    mean_ppsm, stdev_ppsm = mean_stdev(usable_prices)
+    median_ppsm = table.median("price_per_sqm")
     base_result["inputs"]["mean_price_per_sqm"] = mean_ppsm
     base_result["inputs"]["median_price_per_sqm"] = median_ppsm
 
@@ -81,7 +87,6 @@ def calculate_price_confidence(
         )
         return base_result
 
-    stdev_ppsm = statistics.stdev(usable_prices)
     base_result["inputs"]["stdev_price_per_sqm"] = stdev_ppsm
     se_ppsm = stdev_ppsm / math.sqrt(sample_size)
 
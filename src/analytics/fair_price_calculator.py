@@ -9,7 +9,7 @@
 """
 
 import logging
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 from ..models.property import TargetProperty, ComparableProperty
@@ -56,7 +56,8 @@ def calculate_fair_price_with_medians(
     target: TargetProperty,
     comparables: List[ComparableProperty],
     base_price_per_sqm: float,
-    method: str = 'median'
+    method: str = 'median',
+    medians: Optional[Dict[str, Any]] = None
 ) -> Dict:
     """
     НОВАЯ ЛОГИКА РАСЧЕТА: Аддитивная модель с усреднением
@@ -74,6 +75,7 @@ def calculate_fair_price_with_medians(
         comparables: Список аналогов
         base_price_per_sqm: Базовая цена за м² (медиана из аналогов)
         method: Метод расчета ('median' или 'mean')
+        medians: Заранее рассчитанные медианы аналогов (если None - считаются здесь)
 
     Returns:
         Результат с полным расчетом
@@ -81,7 +83,8 @@ def calculate_fair_price_with_medians(
     import statistics
 
     # ШАГ 1: Рассчитываем медианы по переменным параметрам
-    medians = calculate_medians_from_comparables(comparables)
+    if medians is None:
+        medians = calculate_medians_from_comparables(comparables)
 
     if not medians:
         logger.warning("Не удалось рассчитать медианы - используем упрощенную схему")
@@ -2,7 +2,7 @@
 Экспорт логов обработки объектов в Markdown формат
 """
 
-from typing import List, Dict, Any
+from typing import List, Any, Optional
 from datetime import datetime
 from .property_tracker import PropertyLog, PropertyTracker, EventType
 
@@ -858,10 +858,16 @@ class MarkdownExporter:
 
         return "\n".join(md)
 
-    def export_tracker_summary(self, tracker: PropertyTracker) -> str:
-        """Экспорт краткой сводки по всем объектам"""
+    def export_tracker_summary(self, tracker: PropertyTracker, limit: Optional[int] = None) -> str:
+        """
+        Экспорт краткой сводки по всем объектам
+
+        Args:
+            tracker: Tracker (логи из памяти и хранилища)
+            limit: Показать в таблице только последние N объектов
+        """
         summary = tracker.get_summary()
-        logs = tracker.get_all_logs()
+        logs = tracker.query(limit=limit)
 
         md = []
 
@@ -881,6 +887,9 @@ class MarkdownExporter:
         # Таблица объектов
         md.append("## Список объектов")
         md.append("")
+        if len(logs) < summary['total']:
+            md.append(f"Показаны последние {len(logs)} из {summary['total']}")
+            md.append("")
         md.append("| ID | URL | Статус | Начало | Завершение |")
         md.append("|----|-----|--------|--------|-----------|")
 
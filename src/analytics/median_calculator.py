@@ -6,19 +6,28 @@
 """
 
 import statistics
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
 from ..models.property import ComparableProperty, TargetProperty
+from .comparable_table import ComparableBatch, ComparableTable
 from .parameter_classifier import get_variable_parameters
 
+# Числовые параметры медиан (остальные - категориальные, берется мода)
+NUMERIC_MEDIAN_PARAMS = (
+    'total_area', 'living_area', 'ceiling_height', 'bathrooms', 'floor', 'total_floors',
+    'build_year', 'living_area_percent', 'price_per_sqm',
+)
+
 
 def calculate_medians_from_comparables(
-    comparables: List[ComparableProperty]
+    comparables: List[ComparableProperty],
+    table: Optional[ComparableTable] = None
 ) -> Dict[str, Any]:
     """
     Рассчитать медианы по всем переменным параметрам аналогов
 
     Args:
         comparables: Список аналогов
+        table: ComparableTable тех же аналогов (строится, если не передана)
 
     Returns:
         Словарь с медианами: {parameter_name: median_value}
@@ -26,115 +35,40 @@ def calculate_medians_from_comparables(
     if not comparables:
         return {}
 
-    medians = {}
     get_variable_parameters()
+    if table is None:
+        table = ComparableTable.from_comparables(comparables)
 
-    # Числовые параметры
-    numeric_params = {
-        'total_area': [],
-        'living_area': [],
-        'ceiling_height': [],
-        'bathrooms': [],
-        'floor': [],
-        'total_floors': [],
-    }
-
-    # Категориальные параметры (будем искать моду)
-    categorical_params = {
-        'repair_level': [],
-        'window_type': [],
-        'elevator_count': [],
-        'view_type': [],
-        'photo_type': [],
-        'object_status': [],
-    }
-
-    # Специальные параметры
-    build_years = []
-    living_area_percents = []
-
-    # Собираем данные из аналогов
-    for comp in comparables:
-        # Числовые параметры
-        if comp.total_area:
-            numeric_params['total_area'].append(comp.total_area)
-
-        if hasattr(comp, 'living_area') and comp.living_area:
-            numeric_params['living_area'].append(comp.living_area)
-
-        if hasattr(comp, 'ceiling_height') and comp.ceiling_height:
-            numeric_params['ceiling_height'].append(comp.ceiling_height)
-
-        if hasattr(comp, 'bathrooms') and comp.bathrooms is not None:
-            numeric_params['bathrooms'].append(comp.bathrooms)
-
-        if comp.floor:
-            numeric_params['floor'].append(comp.floor)
-
-        if comp.total_floors:
-            numeric_params['total_floors'].append(comp.total_floors)
-
-        # Категориальные параметры
-        if hasattr(comp, 'repair_level') and comp.repair_level:
-            categorical_params['repair_level'].append(comp.repair_level)
-
-        if hasattr(comp, 'window_type') and comp.window_type:
-            categorical_params['window_type'].append(comp.window_type)
-
-        if hasattr(comp, 'elevator_count') and comp.elevator_count:
-            categorical_params['elevator_count'].append(comp.elevator_count)
-
-        if hasattr(comp, 'view_type') and comp.view_type:
-            categorical_params['view_type'].append(comp.view_type)
-
-        if hasattr(comp, 'photo_type') and comp.photo_type:
-            categorical_params['photo_type'].append(comp.photo_type)
+    def median_of(param_name: str) -> Optional[float]:
+        # Число ванных может быть 0 - берутся все заданные значения
+        mask = table.present(param_name) if param_name == 'bathrooms' else None
+        return table.median(param_name, mask)
 
-        if hasattr(comp, 'object_status') and comp.object_status:
-            categorical_params['object_status'].append(comp.object_status)
+    return _assemble_medians(comparables, median_of)
 
-        # Специальные расчеты
-        if hasattr(comp, 'build_year') and comp.build_year:
-            build_years.append(comp.build_year)
 
-        if hasattr(comp, 'living_area') and comp.living_area and comp.total_area:
-            living_percent = (comp.living_area / comp.total_area) * 100
-            living_area_percents.append(living_percent)
-
-    # Рассчитываем медианы для числовых параметров
-    for param_name, values in numeric_params.items():
-        if values and len(values) >= 2:
-            medians[param_name] = statistics.median(values)
-        elif values:
-            medians[param_name] = values[0]
+def calculate_medians_batch(batch: ComparableBatch) -> List[Dict[str, Any]]:
+    """
+    Медианы переменных параметров для каждого объекта ComparableBatch
 
-    # Рассчитываем моду (наиболее частое значение) для категориальных
-    # Используем multimode для корректной обработки мультимодальных распределений
-    for param_name, values in categorical_params.items():
-        if values:
-            modes = statistics.multimode(values)
-            if modes:
-                medians[param_name] = modes[0]
-
-    # Специальные медианы
-    if build_years and len(build_years) >= 2:
-        medians['build_year'] = statistics.median(build_years)
-    elif build_years:
-        medians['build_year'] = build_years[0]
-
-    if living_area_percents and len(living_area_percents) >= 2:
-        medians['living_area_percent'] = statistics.median(living_area_percents)
-    elif living_area_percents:
-        medians['living_area_percent'] = living_area_percents[0]
-
-    # Добавляем медиану цены за м²
-    prices_per_sqm = [c.price_per_sqm for c in comparables if c.price_per_sqm]
-    if prices_per_sqm and len(prices_per_sqm) >= 2:
-        medians['price_per_sqm'] = statistics.median(prices_per_sqm)
-    elif prices_per_sqm:
-        medians['price_per_sqm'] = prices_per_sqm[0]
+    Числовые медианы считаются одной операцией по всем объектам; результат
+    i-го объекта совпадает с calculate_medians_from_comparables() его аналогов.
+    """
+    get_variable_parameters()
+    numeric = {
+        # Отбор значений как в calculate_medians_from_comparables()
+        param_name: batch.median_values(param_name, 'present' if param_name == 'bathrooms' else 'truthy')
+        for param_name in NUMERIC_MEDIAN_PARAMS
+    }
 
-    return medians
+    result = []
+    for index, size in enumerate(batch.sizes()):
+        if not size:
+            result.append({})
+            continue
+        comparables = batch.select(index).comparables
+        result.append(_assemble_medians(comparables, lambda param_name: numeric[param_name][index]))
+    return result
 
 
 def compare_target_with_medians(
@@ -268,3 +202,34 @@ def get_readable_comparison_summary(comparison: Dict[str, Dict[str, Any]]) -> st
     lines.append("Коэффициенты применяются только для отличающихся параметров!")
 
     return "\n".join(lines)
+
+
+def _categorical_modes(comparables: List[ComparableProperty]) -> Dict[str, Any]:
+    """Мода категориальных параметров (в порядке первого появления, как multimode)"""
+    modes = {}
+    for param_name in ('repair_level', 'window_type', 'elevator_count', 'view_type', 'photo_type', 'object_status'):
+        values = [getattr(comp, param_name, None) for comp in comparables]
+        values = [value for value in values if value]
+        if values:
+            modes[param_name] = statistics.multimode(values)[0]
+    return modes
+
+
+def _assemble_medians(
+    comparables: List[ComparableProperty],
+    median_of: Callable[[str], Optional[float]]
+) -> Dict[str, Any]:
+    """Медианы числовых параметров (median_of) и моды категориальных в едином порядке ключей"""
+    medians = {}
+
+    def add_median(param_name: str):
+        median = median_of(param_name)
+        if median is not None:
+            medians[param_name] = median
+
+    for param_name in ('total_area', 'living_area', 'ceiling_height', 'bathrooms', 'floor', 'total_floors'):
+        add_median(param_name)
+    medians.update(_categorical_modes(comparables))
+    for param_name in ('build_year', 'living_area_percent', 'price_per_sqm'):
+        add_median(param_name)
+    return medians
@@ -1,14 +1,40 @@
 """
 Система отслеживания обработки объектов недвижимости
 Логирует все этапы: парсинг → анализ → расчёты → результаты
+
+Память процесса ограничена:
+- в памяти держится не более max_logs логов (LRU: вытесняется давно не
+  использовавшийся лог);
+- число событий в логе ограничено max_events_per_log, частые типы событий
+  можно прореживать (event_sampling), ошибки сохраняются всегда;
+- завершенные логи можно сбрасывать в append-only хранилище (JSONL или
+  SQLite) в фоновом потоке - get_log/query/export_to_json читают и из него.
+
+Использование:
+    tracker = get_tracker()
+    log = tracker.start_tracking('prop-1', url)
+    log.add_event(EventType.DATA_EXTRACTED, 'Извлечены данные')
+    tracker.complete_property('prop-1')
+    tracker.query(status='failed', limit=50)
 """
 
+import atexit
 import json
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from dataclasses import dataclass, field, fields
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
 
 class EventType(Enum):
     """Типы событий в процессе обработки"""
@@ -35,6 +61,47 @@ class EventType(Enum):
     ERROR = "error"
 
 
+# События, которые не прореживаются и не отбрасываются лимитом
+ALWAYS_KEPT_EVENTS = frozenset({
+    EventType.PARSING_FAILED,
+    EventType.ANALYSIS_FAILED,
+    EventType.ERROR,
+})
+
+
+def parse_event_sampling(value: str) -> Dict[str, float]:
+    """
+    Доли сохраняемых событий из строки вида "data_extracted=0.1,adjustment_applied=0.5"
+
+    Неизвестные типы и некорректные значения пропускаются с предупреждением.
+    """
+    known = {event_type.value for event_type in EventType}
+    rates: Dict[str, float] = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition('=')
+        name = name.strip().lower()
+        try:
+            rate_value = float(rate)
+        except ValueError:
+            logger.warning(f"Некорректная доля событий в TRACKER_EVENT_SAMPLING: {item!r}")
+            continue
+        if name not in known:
+            logger.warning(f"Неизвестный тип события в TRACKER_EVENT_SAMPLING: {name!r}")
+            continue
+        rates[name] = min(max(rate_value, 0.0), 1.0)
+    return rates
+
+
+def _is_sampled(index: int, rate: float) -> bool:
+    """
+    Детерминированное прореживание: из каждых 1/rate событий типа сохраняется
+    одно, начиная с первого (rate=0.5 → 1-е, 3-е, 5-е...)
+    """
+    return math.floor(index * rate) > math.floor((index - 1) * rate)
+
+
 @dataclass
 class ProcessingEvent:
     """Событие в процессе обработки объекта"""
@@ -51,6 +118,15 @@ class ProcessingEvent:
             'details': self.details
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProcessingEvent':
+        return cls(
+            timestamp=data['timestamp'],
+            event_type=EventType(data['event_type']),
+            message=data.get('message', ''),
+            details=data.get('details') or {}
+        )
+
 
 @dataclass
 class PropertyLog:
@@ -85,8 +161,24 @@ class PropertyLog:
     # Метрики производительности
     metrics: Dict[str, Any] = field(default_factory=dict)
 
+    # Ограничение событий (задается трекером): None - без лимита
+    max_events: Optional[int] = field(default=None, repr=False, compare=False)
+    event_sampling: Dict[str, float] = field(default_factory=dict, repr=False, compare=False)
+    dropped_events: int = 0
+    _event_counts: Dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+
     def add_event(self, event_type: EventType, message: str, details: Dict[str, Any] = None):
-        """Добавить событие в лог"""
+        """Добавить событие в лог (с учетом прореживания и лимита событий)"""
+        if event_type not in ALWAYS_KEPT_EVENTS:
+            index = self._event_counts.get(event_type.value, 0)
+            self._event_counts[event_type.value] = index + 1
+            rate = self.event_sampling.get(event_type.value, 1.0)
+            if not _is_sampled(index, rate) or (
+                self.max_events is not None and len(self.events) >= self.max_events
+            ):
+                self.dropped_events += 1
+                return
+
         event = ProcessingEvent(
             timestamp=datetime.now().isoformat(),
             event_type=event_type,
@@ -110,38 +202,270 @@ class PropertyLog:
             'status': self.status,
             'property_info': self.property_info,
             'events': [e.to_dict() for e in self.events],
+            'dropped_events': self.dropped_events,
             'parsing_data': self.parsing_data,
             'comparables_data': self.comparables_data,
             'market_stats': self.market_stats,
             'adjustments': self.adjustments,
             'fair_price_result': self.fair_price_result,
             'scenarios': self.scenarios,
+            'price_range': self.price_range,
+            'attractiveness_index': self.attractiveness_index,
+            'time_forecast': self.time_forecast,
+            'price_sensitivity': self.price_sensitivity,
+            'recommendations': self.recommendations,
             'metrics': self.metrics
         }
 
     def to_json(self, indent: int = 2) -> str:
         """Экспорт в JSON"""
-        return json.dumps(self.to_dict(), indent=indent, ensure_ascii=False)
+        return json.dumps(self.to_dict(), indent=indent, ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PropertyLog':
+        """Восстановить лог из to_dict() (чтение из хранилища)"""
+        names = {f.name for f in fields(cls) if f.init} - {'events', 'max_events', 'event_sampling'}
+        log = cls(**{name: value for name, value in data.items() if name in names})
+        log.events = [ProcessingEvent.from_dict(event) for event in data.get('events', [])]
+        return log
+
+
+@dataclass
+class LogSummary:
+    """Краткие сведения о логе (для сводок без загрузки событий и расчетов)"""
+    property_id: str
+    url: Optional[str]
+    status: str
+    started_at: str
+    completed_at: Optional[str] = None
+    events_count: int = 0
+    dropped_events: int = 0
+
+    @classmethod
+    def of(cls, log: PropertyLog) -> 'LogSummary':
+        return cls(
+            property_id=log.property_id,
+            url=log.url,
+            status=log.status,
+            started_at=log.started_at,
+            completed_at=log.completed_at,
+            events_count=len(log.events),
+            dropped_events=log.dropped_events
+        )
+
+    @classmethod
+    def from_record(cls, data: Dict[str, Any]) -> 'LogSummary':
+        return cls(
+            property_id=data['property_id'],
+            url=data.get('url'),
+            status=data.get('status', 'processing'),
+            started_at=data['started_at'],
+            completed_at=data.get('completed_at'),
+            events_count=len(data.get('events', [])),
+            dropped_events=data.get('dropped_events', 0)
+        )
+
+
+class JsonlLogStore:
+    """
+    Append-only JSONL: одна строка - один завершенный лог
+
+    Повторная запись того же property_id дописывает новую строку, при чтении
+    побеждает последняя. Чтение - полным проходом по файлу (отладочный
+    экспорт, не горячий путь).
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def write(self, records: List[Tuple[LogSummary, str]]):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            for _, payload in records:
+                f.write(payload + '\n')
+
+    def _records(self) -> Iterator[Dict[str, Any]]:
+        if not self.path.exists():
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Поврежденная строка в {self.path}, пропущена")
+
+    def iter_logs(self) -> Iterator[Dict[str, Any]]:
+        # Два прохода, чтобы не держать в памяти весь файл
+        last_seen: Dict[str, int] = {}
+        for position, record in enumerate(self._records()):
+            last_seen[record['property_id']] = position
+        for position, record in enumerate(self._records()):
+            if last_seen.get(record['property_id']) == position:
+                yield record
+
+    def load(self, property_id: str) -> Optional[Dict[str, Any]]:
+        found = None
+        for record in self._records():
+            if record['property_id'] == property_id:
+                found = record
+        return found
+
+    def summaries(self) -> List[LogSummary]:
+        return [LogSummary.from_record(record) for record in self.iter_logs()]
+
+    def close(self):
+        pass
+
+
+class SqliteLogStore:
+    """SQLite: сводные поля в колонках (быстрые сводки), полный лог - JSON в data"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS property_logs (
+                property_id TEXT PRIMARY KEY,
+                url TEXT,
+                status TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                completed_at TEXT,
+                events_count INTEGER NOT NULL DEFAULT 0,
+                dropped_events INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            )
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_property_logs_started ON property_logs(started_at)'
+        )
+        self._conn.commit()
+
+    def write(self, records: List[Tuple[LogSummary, str]]):
+        rows = [
+            (s.property_id, s.url, s.status, s.started_at, s.completed_at,
+             s.events_count, s.dropped_events, payload)
+            for s, payload in records
+        ]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO property_logs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            self._conn.commit()
+
+    def iter_logs(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                'SELECT property_id FROM property_logs ORDER BY started_at'
+            )]
+        for property_id in ids:
+            record = self.load(property_id)
+            if record is not None:
+                yield record
+
+    def load(self, property_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM property_logs WHERE property_id = ?', (property_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def summaries(self) -> List[LogSummary]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT property_id, url, status, started_at, completed_at, events_count, dropped_events '
+                'FROM property_logs ORDER BY started_at'
+            ).fetchall()
+        return [LogSummary(*row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_log_store(path: str):
+    """Хранилище по расширению файла: .db/.sqlite/.sqlite3 - SQLite, иначе JSONL"""
+    if Path(path).suffix.lower() in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteLogStore(path)
+    return JsonlLogStore(path)
+
+
+_STOP = object()
 
 
 class PropertyTracker:
     """
     Менеджер для отслеживания обработки множества объектов
+
+    Args:
+        max_logs: Логов в памяти (LRU), None - без ограничения
+        max_events_per_log: Событий в одном логе, None - без ограничения
+        event_sampling: Доля сохраняемых событий по типу ({'data_extracted': 0.1})
+        store: Хранилище завершенных логов (JsonlLogStore/SqliteLogStore)
+        spill_async: Писать в хранилище из фонового потока
+        spill_queue_size: Очередь записи; при переполнении лог не сохраняется
     """
 
-    def __init__(self):
-        self.logs: Dict[str, PropertyLog] = {}
+    def __init__(
+        self,
+        max_logs: Optional[int] = 200,
+        max_events_per_log: Optional[int] = 500,
+        event_sampling: Optional[Dict[str, float]] = None,
+        store=None,
+        spill_async: bool = True,
+        spill_queue_size: int = 1000
+    ):
+        self.max_logs = max_logs
+        self.max_events_per_log = max_events_per_log
+        self.event_sampling = dict(event_sampling or {})
+        self.store = store
+        self.spill_async = spill_async
+
+        self.logs: 'OrderedDict[str, PropertyLog]' = OrderedDict()
         self.current_property_id: Optional[str] = None
+        self._lock = threading.RLock()
+
+        self.stats = {
+            'tracked': 0,
+            'evicted': 0,
+            'evicted_unfinished': 0,
+            'spilled': 0,
+            'spill_dropped': 0,
+            'spill_errors': 0,
+        }
+
+        self._spill_queue: Optional[queue.Queue] = None
+        self._spill_thread: Optional[threading.Thread] = None
+        if store is not None and spill_async:
+            self._spill_queue = queue.Queue(maxsize=spill_queue_size)
+            self._spill_thread = threading.Thread(
+                target=self._spill_loop, name='property-tracker-spill', daemon=True
+            )
+            self._spill_thread.start()
+
+    # ═══════════════════════════════════════════════════════════════════════
+    # ЛОГИ В ПАМЯТИ
+    # ═══════════════════════════════════════════════════════════════════════
 
     def start_tracking(self, property_id: str, url: Optional[str] = None) -> PropertyLog:
         """Начать отслеживание объекта"""
         log = PropertyLog(
             property_id=property_id,
             url=url,
-            started_at=datetime.now().isoformat()
+            started_at=datetime.now().isoformat(),
+            max_events=self.max_events_per_log,
+            event_sampling=self.event_sampling
         )
-        self.logs[property_id] = log
-        self.current_property_id = property_id
+        with self._lock:
+            self.logs.pop(property_id, None)
+            self.logs[property_id] = log
+            self.current_property_id = property_id
+            self.stats['tracked'] += 1
+            self._evict()
 
         log.add_event(
             EventType.PARSING_STARTED,
@@ -151,49 +475,195 @@ class PropertyTracker:
 
         return log
 
+    def _evict(self):
+        """Вытеснить давно не использовавшиеся логи сверх max_logs"""
+        if self.max_logs is None:
+            return
+        while len(self.logs) > self.max_logs:
+            _, evicted = self.logs.popitem(last=False)
+            self.stats['evicted'] += 1
+            if evicted.status == 'processing':
+                # Анализ еще идет, но завершение лога уже не будет сохранено
+                self.stats['evicted_unfinished'] += 1
+
     def get_log(self, property_id: str) -> Optional[PropertyLog]:
-        """Получить лог по ID объекта"""
-        return self.logs.get(property_id)
+        """Получить лог по ID объекта (из памяти или из хранилища)"""
+        with self._lock:
+            log = self.logs.get(property_id)
+            if log is not None:
+                self.logs.move_to_end(property_id)
+                return log
+
+        if self.store is not None:
+            record = self.store.load(property_id)
+            if record is not None:
+                return PropertyLog.from_dict(record)
+        return None
 
     def get_current_log(self) -> Optional[PropertyLog]:
         """Получить лог текущего объекта"""
-        if self.current_property_id:
-            return self.logs.get(self.current_property_id)
+        with self._lock:
+            if self.current_property_id:
+                return self.logs.get(self.current_property_id)
         return None
 
     def add_event(self, property_id: str, event_type: EventType, message: str, details: Dict = None):
         """Добавить событие для объекта"""
-        log = self.get_log(property_id)
+        with self._lock:
+            log = self.logs.get(property_id)
         if log:
             log.add_event(event_type, message, details)
 
     def complete_property(self, property_id: str, status: str = "completed"):
-        """Завершить обработку объекта"""
-        log = self.get_log(property_id)
+        """Завершить обработку объекта (и сбросить лог в хранилище)"""
+        with self._lock:
+            log = self.logs.get(property_id)
         if log:
             log.complete(status)
+            self._spill(log)
 
     def get_all_logs(self) -> List[PropertyLog]:
-        """Получить все логи"""
-        return list(self.logs.values())
+        """Получить все логи, находящиеся в памяти"""
+        with self._lock:
+            return list(self.logs.values())
+
+    # ═══════════════════════════════════════════════════════════════════════
+    # ХРАНИЛИЩЕ
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def _spill(self, log: PropertyLog):
+        """Сбросить завершенный лог в хранилище"""
+        if self.store is None:
+            return
+        # Снимок сериализуется в вызывающем потоке: лог может измениться позже
+        record = (LogSummary.of(log), json.dumps(log.to_dict(), ensure_ascii=False, default=str))
+
+        if self._spill_queue is None:
+            self._write([record])
+            return
+        try:
+            self._spill_queue.put_nowait(record)
+        except queue.Full:
+            self.stats['spill_dropped'] += 1
+            logger.warning(f"Очередь записи логов переполнена, лог {log.property_id} не сохранен")
+
+    def _write(self, records: List[Tuple[LogSummary, str]]):
+        try:
+            self.store.write(records)
+            self.stats['spilled'] += len(records)
+        except Exception as e:
+            self.stats['spill_errors'] += 1
+            logger.error(f"Не удалось сохранить логи обработки: {e}")
+
+    def _spill_loop(self):
+        """Фоновая запись: накопившиеся в очереди логи пишутся одной пачкой"""
+        while True:
+            item = self._spill_queue.get()
+            batch, stop = [], item is _STOP
+            if not stop:
+                batch.append(item)
+            while not stop:
+                try:
+                    item = self._spill_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + int(stop)):
+                self._spill_queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь логов"""
+        if self._spill_queue is not None and self._spill_thread.is_alive():
+            self._spill_queue.join()
+
+    def close(self):
+        """Дописать очередь и закрыть хранилище"""
+        if self._spill_thread is not None and self._spill_thread.is_alive():
+            self._spill_queue.put(_STOP)
+            self._spill_thread.join(timeout=10)
+        if self.store is not None:
+            self.store.close()
+
+    # ═══════════════════════════════════════════════════════════════════════
+    # ЗАПРОСЫ И ЭКСПОРТ
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[LogSummary]:
+        """
+        Сводки логов из памяти и хранилища по времени начала
+
+        Args:
+            status: Только с этим статусом (processing, completed, failed)
+            since: Только начатые не раньше (ISO datetime)
+            limit: Только последние N
+
+        Returns:
+            LogSummary по возрастанию started_at
+        """
+        merged: Dict[str, LogSummary] = {}
+        if self.store is not None:
+            for summary in self.store.summaries():
+                merged[summary.property_id] = summary
+        with self._lock:
+            # Лог в памяти актуальнее записи в хранилище
+            for log in self.logs.values():
+                merged[log.property_id] = LogSummary.of(log)
+
+        result = [
+            summary for summary in merged.values()
+            if (status is None or summary.status == status)
+            and (since is None or summary.started_at >= since)
+        ]
+        result.sort(key=lambda summary: summary.started_at)
+        if limit is not None:
+            result = result[-limit:] if limit > 0 else []
+        return result
+
+    def iter_logs(self) -> Iterator[PropertyLog]:
+        """Все логи: сохраненные в хранилище, затем не сохраненные из памяти"""
+        with self._lock:
+            in_memory = OrderedDict(self.logs)
+        if self.store is not None:
+            for record in self.store.iter_logs():
+                log = in_memory.pop(record['property_id'], None)
+                yield log if log is not None else PropertyLog.from_dict(record)
+        yield from in_memory.values()
 
     def export_to_json(self, filepath: str):
-        """Экспорт всех логов в JSON"""
-        data = {
-            'export_time': datetime.now().isoformat(),
-            'total_properties': len(self.logs),
-            'logs': [log.to_dict() for log in self.logs.values()]
-        }
+        """Экспорт всех логов в JSON (потоково, логи по одному)"""
+        self.flush()
+        total = len(self.query())
 
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dumps(data, f, indent=2, ensure_ascii=False)
+            f.write('{\n')
+            f.write(f'  "export_time": {json.dumps(datetime.now().isoformat())},\n')
+            f.write(f'  "total_properties": {total},\n')
+            f.write('  "logs": [')
+            for i, log in enumerate(self.iter_logs()):
+                f.write(',\n' if i else '\n')
+                json.dump(log.to_dict(), f, indent=2, ensure_ascii=False, default=str)
+            f.write('\n  ]\n}\n')
 
     def get_summary(self) -> Dict[str, Any]:
         """Получить сводку по всем объектам"""
-        total = len(self.logs)
-        completed = sum(1 for log in self.logs.values() if log.status == "completed")
-        failed = sum(1 for log in self.logs.values() if log.status == "failed")
-        processing = sum(1 for log in self.logs.values() if log.status == "processing")
+        summaries = self.query()
+        total = len(summaries)
+        completed = sum(1 for s in summaries if s.status == "completed")
+        failed = sum(1 for s in summaries if s.status == "failed")
+        processing = sum(1 for s in summaries if s.status == "processing")
 
         return {
             'total': total,
@@ -203,11 +673,77 @@ class PropertyTracker:
             'success_rate': (completed / total * 100) if total > 0 else 0
         }
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики трекера (память, вытеснение, запись в хранилище)"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_memory'] = len(self.logs)
+            stats['events_dropped'] = sum(log.dropped_events for log in self.logs.values())
+        stats['max_logs'] = self.max_logs
+        stats['spill_pending'] = self._spill_queue.qsize() if self._spill_queue is not None else 0
+        return stats
+
+
+_trackers: Dict[int, PropertyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def _tracker_settings() -> Dict[str, Any]:
+    keys = ('TRACKER_MAX_LOGS', 'TRACKER_MAX_EVENTS_PER_LOG', 'TRACKER_EVENT_SAMPLING', 'TRACKER_SPILL_PATH')
+    try:
+        from ..config import get_settings
+        settings = get_settings()
+        return {key: getattr(settings, key) for key in keys}
+    except (ImportError, ValueError):
+        # Запуск вне пакета src (src/export_logs.py) - напрямую из окружения
+        return {
+            'TRACKER_MAX_LOGS': int(os.getenv('TRACKER_MAX_LOGS', '200')),
+            'TRACKER_MAX_EVENTS_PER_LOG': int(os.getenv('TRACKER_MAX_EVENTS_PER_LOG', '500')),
+            'TRACKER_EVENT_SAMPLING': os.getenv('TRACKER_EVENT_SAMPLING', ''),
+            'TRACKER_SPILL_PATH': os.getenv('TRACKER_SPILL_PATH', ''),
+        }
+
 
-# Глобальный tracker для использования во всём приложении
-global_tracker = PropertyTracker()
+def _create_tracker() -> PropertyTracker:
+    settings = _tracker_settings()
+
+    store = None
+    spill_path = settings['TRACKER_SPILL_PATH']
+    if spill_path:
+        try:
+            store = open_log_store(spill_path)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Хранилище логов обработки недоступно ({spill_path}): {e}")
+
+    return PropertyTracker(
+        max_logs=settings['TRACKER_MAX_LOGS'] or None,
+        max_events_per_log=settings['TRACKER_MAX_EVENTS_PER_LOG'] or None,
+        event_sampling=parse_event_sampling(settings['TRACKER_EVENT_SAMPLING']),
+        store=store
+    )
 
 
 def get_tracker() -> PropertyTracker:
-    """Получить глобальный tracker"""
-    return global_tracker
+    """
+    Получить tracker процесса (параметры - из настроек)
+
+    После fork дочерний процесс создает свой tracker: поток записи не
+    переживает fork.
+    """
+    pid = os.getpid()
+    with _trackers_lock:
+        tracker = _trackers.get(pid)
+        if tracker is None:
+            tracker = _trackers[pid] = _create_tracker()
+        return tracker
+
+
+def shutdown_trackers():
+    """Дописать логи tracker'а текущего процесса (atexit)"""
+    with _trackers_lock:
+        tracker = _trackers.pop(os.getpid(), None)
+    if tracker is not None:
+        tracker.close()
+
+
+atexit.register(shutdown_trackers)
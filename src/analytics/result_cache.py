@@ -0,0 +1,94 @@
+"""
+Кэш результатов /api/analyze по содержимому входов
+
+Интерфейс повторно запрашивает анализ при навигации и открытии отчета, хотя
+данные не менялись. Результат хранится в Redis (PropertyCache, тип ключа
+'analysis') под отпечатком входов:
+
+- нормализованный целевой объект;
+- нормализованные аналоги вместе с флагом excluded (исключенные аналоги
+  влияют на IQR-квартили и оценку качества данных);
+- filter_outliers и use_median;
+- версия аналитики: хэш исходников src/analytics (формулы, коэффициенты,
+  оффер) - после деплоя с изменениями старые результаты не читаются.
+
+Использование:
+    key = analysis_cache_key(target, comparables, filter_outliers, use_median)
+    result = cache.get_analysis_result(key)
+    if result is None:
+        result = ...  # полный анализ
+        cache.set_analysis_result(key, to_cacheable(result), ttl_minutes=60)
+"""
+
+import hashlib
+import json
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Версия формата записи: увеличивается при изменении структуры ответа /api/analyze
+RESULT_CACHE_FORMAT = 1
+
+ANALYTICS_DIR = Path(__file__).resolve().parent
+
+
+def _json_default(obj: Any) -> Any:
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=str)
+    return str(obj)
+
+
+def to_json(obj: Any) -> str:
+    """Каноническая JSON-строка (основа отпечатков)"""
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=_json_default)
+
+
+def fingerprint(obj: Any) -> str:
+    """Отпечаток значения: одинаковые данные - одинаковый отпечаток"""
+    return hashlib.sha1(to_json(obj).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def analytics_code_version() -> str:
+    """Хэш исходников пакета analytics (считается один раз на процесс)"""
+    digest = hashlib.sha1(str(RESULT_CACHE_FORMAT).encode('utf-8'))
+    for path in sorted(ANALYTICS_DIR.glob('*.py')):
+        digest.update(path.name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def analysis_cache_key(
+    target: Dict[str, Any],
+    comparables: List[Dict[str, Any]],
+    filter_outliers: bool,
+    use_median: bool
+) -> str:
+    """
+    Ключ кэша результата анализа
+
+    Args:
+        target: Нормализованный целевой объект (normalize_property_data)
+        comparables: Нормализованные аналоги (включая исключенные)
+        filter_outliers: Параметр запроса
+        use_median: Параметр запроса
+
+    Returns:
+        Отпечаток входов с версией аналитики
+    """
+    return f"{analytics_code_version()}:" + fingerprint({
+        'target': target,
+        'comparables': comparables,
+        'filter_outliers': bool(filter_outliers),
+        'use_median': bool(use_median),
+    })
+
+
+def to_cacheable(result: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-совместимая копия результата (datetime → ISO) для записи в Redis"""
+    return json.loads(to_json(result))
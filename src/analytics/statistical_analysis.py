@@ -19,7 +19,10 @@ import logging
 from typing import List, Tuple, Dict, Any, Optional
 from math import sqrt
 
+import numpy as np
+
 from ..models.property import ComparableProperty
+from .comparable_table import ComparableTable, mean_stdev, sorted_quartiles
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +34,8 @@ logger = logging.getLogger(__name__)
 def detect_outliers_iqr(
     comparables: List[ComparableProperty],
     field: str = 'price_per_sqm',
-    multiplier: float = 1.5
+    multiplier: float = 1.5,
+    table: Optional[ComparableTable] = None
 ) -> Tuple[List[ComparableProperty], List[Dict[str, Any]]]:
     """
     Фильтрация статистических выбросов методом IQR (Interquartile Range)
@@ -49,6 +53,7 @@ def detect_outliers_iqr(
         comparables: Список аналогов для фильтрации
         field: Поле для анализа ('price_per_sqm', 'total_area', etc.)
         multiplier: Множитель IQR (обычно 1.5 или 3.0)
+        table: ComparableTable тех же аналогов (строится, если не передана)
 
     Returns:
         Tuple[List, List]:
@@ -64,78 +69,57 @@ def detect_outliers_iqr(
         logger.debug(f"Слишком мало данных для IQR ({len(comparables)} < 4) - пропускаем фильтрацию")
         return comparables, []
 
-    # Извлекаем значения
-    values = []
-    value_map = {}  # Сопоставление значение -> аналог
+    if table is None:
+        table = ComparableTable.from_comparables(comparables)
+    column = table.column(field)
+    has_value = table.positive(field)
+    count = int(has_value.sum())
 
-    for comp in comparables:
-        value = getattr(comp, field, None)
-        if value is not None and value > 0:
-            values.append(value)
-            # Сохраняем для обратного поиска
-            if value not in value_map:
-                value_map[value] = []
-            value_map[value].append(comp)
-
-    if len(values) < 4:
-        logger.debug(f"Недостаточно валидных значений {field} ({len(values)} < 4)")
+    if count < 4:
+        logger.debug(f"Недостаточно валидных значений {field} ({count} < 4)")
         return comparables, []
 
     # Вычисляем квартили
-    try:
-        quartiles = statistics.quantiles(values, n=4)
-        q1 = quartiles[0]  # 25-й перцентиль
-        q3 = quartiles[2]  # 75-й перцентиль
-        iqr = q3 - q1
-
-        # Границы
-        lower_bound = q1 - multiplier * iqr
-        upper_bound = q3 + multiplier * iqr
-
-        logger.info(f"IQR статистика для {field}:")
-        logger.info(f"  Q1 (25%): {q1:,.0f}")
-        logger.info(f"  Q3 (75%): {q3:,.0f}")
-        logger.info(f"  IQR: {iqr:,.0f}")
-        logger.info(f"  Границы: [{lower_bound:,.0f}, {upper_bound:,.0f}]")
-
-    except statistics.StatisticsError as e:
-        logger.warning(f"Не удалось рассчитать квартили: {e}")
-        return comparables, []
-
-    # Фильтруем выбросы
-    valid = []
+    quartiles = sorted_quartiles(np.sort(column[has_value]), count)
+    q1 = float(quartiles[0])  # 25-й перцентиль
+    q3 = float(quartiles[2])  # 75-й перцентиль
+    iqr = q3 - q1
+
+    # Границы
+    lower_bound = q1 - multiplier * iqr
+    upper_bound = q3 + multiplier * iqr
+
+    logger.info(f"IQR статистика для {field}:")
+    logger.info(f"  Q1 (25%): {q1:,.0f}")
+    logger.info(f"  Q3 (75%): {q3:,.0f}")
+    logger.info(f"  IQR: {iqr:,.0f}")
+    logger.info(f"  Границы: [{lower_bound:,.0f}, {upper_bound:,.0f}]")
+
+    # Фильтруем выбросы: аналоги без значения сохраняются (валидация должна была их отфильтровать)
+    is_outlier = has_value & ((column < lower_bound) | (column > upper_bound))
+    valid = [comp for comp, outlier in zip(table.comparables, is_outlier) if not outlier]
     outliers_reports = []
 
-    for comp in comparables:
-        value = getattr(comp, field, None)
-
-        if value is None or value <= 0:
-            # Нет значения - пропускаем (валидация должна была отфильтровать)
-            valid.append(comp)
-            continue
-
-        if lower_bound <= value <= upper_bound:
-            # В пределах нормы
-            valid.append(comp)
-        else:
-            # Выброс
-            outlier_type = 'верхний' if value > upper_bound else 'нижний'
-            deviation = ((value - q3) / iqr) if value > upper_bound else ((q1 - value) / iqr)
-
-            outliers_reports.append({
-                'comparable': comp,
-                'field': field,
-                'value': value,
-                'type': outlier_type,
-                'deviation_iqr': abs(deviation),
-                'bounds': (lower_bound, upper_bound),
-                'url': getattr(comp, 'url', None)
-            })
-
-            logger.debug(
-                f"✗ Выброс {outlier_type}: {value:,.0f} "
-                f"(отклонение {abs(deviation):.1f} × IQR)"
-            )
+    for index in np.flatnonzero(is_outlier):
+        comp = table.comparables[index]
+        value = getattr(comp, field)
+        outlier_type = 'верхний' if value > upper_bound else 'нижний'
+        deviation = ((value - q3) / iqr) if value > upper_bound else ((q1 - value) / iqr)
+
+        outliers_reports.append({
+            'comparable': comp,
+            'field': field,
+            'value': value,
+            'type': outlier_type,
+            'deviation_iqr': abs(deviation),
+            'bounds': (lower_bound, upper_bound),
+            'url': getattr(comp, 'url', None)
+        })
+
+        logger.debug(
+            f"✗ Выброс {outlier_type}: {value:,.0f} "
+            f"(отклонение {abs(deviation):.1f} × IQR)"
+        )
 
     logger.info(f"IQR фильтр: {len(comparables)} → {len(valid)} (исключено {len(outliers_reports)})")
 
@@ -148,7 +132,8 @@ def detect_outliers_iqr(
 
 def calculate_data_quality(
     comparables: List[ComparableProperty],
-    field: str = 'price_per_sqm'
+    field: str = 'price_per_sqm',
+    table: Optional[ComparableTable] = None
 ) -> Dict[str, Any]:
     """
     Оценка качества данных по коэффициенту вариации (CV)
@@ -164,6 +149,7 @@ def calculate_data_quality(
     Args:
         comparables: Список аналогов
         field: Поле для анализа
+        table: ComparableTable тех же аналогов (строится, если не передана)
 
     Returns:
         Dict с метриками качества:
@@ -180,11 +166,10 @@ def calculate_data_quality(
         >>> if quality['quality'] == 'poor':
         >>>     logger.warning("Высокий разброс данных!")
     """
-    values = [
-        getattr(comp, field, None)
-        for comp in comparables
-        if getattr(comp, field, None) is not None and getattr(comp, field) > 0
-    ]
+    if table is None:
+        table = ComparableTable.from_comparables(comparables)
+    has_value = table.positive(field)
+    values = table.values(field, has_value)
 
     if len(values) < 2:
         return {
@@ -199,9 +184,8 @@ def calculate_data_quality(
         }
 
     # Статистики
-    mean = statistics.mean(values)
-    median = statistics.median(values)
-    std_dev = statistics.stdev(values) if len(values) > 1 else 0
+    mean, std_dev = mean_stdev(values)
+    median = table.median(field, has_value)
 
     # Коэффициент вариации
     cv = std_dev / mean if mean > 0 else 1.0
@@ -239,7 +223,8 @@ def calculate_data_quality(
 
 def calculate_distribution_stats(
     comparables: List[ComparableProperty],
-    field: str = 'price_per_sqm'
+    field: str = 'price_per_sqm',
+    table: Optional[ComparableTable] = None
 ) -> Dict[str, Any]:
     """
     Расширенная статистика распределения
@@ -254,15 +239,15 @@ def calculate_distribution_stats(
     Args:
         comparables: Список аналогов
         field: Поле для анализа
+        table: ComparableTable тех же аналогов (строится, если не передана)
 
     Returns:
         Dict с полной статистикой распределения
     """
-    values = [
-        getattr(comp, field, None)
-        for comp in comparables
-        if getattr(comp, field, None) is not None and getattr(comp, field) > 0
-    ]
+    if table is None:
+        table = ComparableTable.from_comparables(comparables)
+    has_value = table.positive(field)
+    values = table.values(field, has_value)
 
     if len(values) < 2:
         return {'error': 'Недостаточно данных', 'count': len(values)}
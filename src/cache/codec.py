@@ -0,0 +1,183 @@
+"""
+Бинарный формат значений кэша (версионируемый)
+
+Формат: [1 байт заголовка][payload]
+
+    0x01 - JSON (utf-8), без сжатия
+    0x02 - JSON + zlib
+    0x03 - JSON + zstd
+
+Старые записи (plain JSON-текст без заголовка) читаются прозрачно: JSON
+никогда не начинается с управляющих байтов 0x01-0x03.
+
+Сериализация через orjson (если установлен, иначе stdlib json), сжатие -
+zstd (если установлен zstandard, иначе zlib) для значений больше порога.
+"""
+
+import json
+import zlib
+import logging
+from typing import Any, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+CODEC_JSON = 0x01
+CODEC_JSON_ZLIB = 0x02
+CODEC_JSON_ZSTD = 0x03
+
+# Порог сжатия по умолчанию (байт сериализованного JSON)
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class CacheCodecError(ValueError):
+    """Значение кэша не удалось декодировать (неизвестный кодек, битые данные)"""
+
+
+def serialize_value(value: Any) -> bytes:
+    """JSON-сериализация значения (без заголовка и сжатия)"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # orjson строже к типам - fallback на stdlib
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def resolve_compression(compression: str = 'auto') -> Optional[str]:
+    """
+    Выбор алгоритма сжатия
+
+    Args:
+        compression: 'auto' | 'zstd' | 'zlib' | 'none'
+
+    Returns:
+        'zstd', 'zlib' или None (без сжатия)
+    """
+    if compression == 'none':
+        return None
+    if compression in ('auto', 'zstd'):
+        if ZSTD_AVAILABLE:
+            return 'zstd'
+        if compression == 'zstd':
+            logger.warning("zstandard не установлен, используем zlib для кэша")
+    return 'zlib'
+
+
+def encode_value(
+    value: Any,
+    compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+    compression: Optional[str] = 'zlib'
+) -> bytes:
+    """
+    Сериализация значения в формат кэша
+
+    Args:
+        value: JSON-совместимое значение
+        compress_threshold: Сжимать, если JSON больше порога (байт)
+        compression: 'zstd', 'zlib' или None (результат resolve_compression)
+
+    Returns:
+        Байты с заголовком кодека
+    """
+    return pack_payload(serialize_value(value), compress_threshold, compression)
+
+
+def pack_payload(
+    payload: bytes,
+    compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+    compression: Optional[str] = 'zlib'
+) -> bytes:
+    """Добавление заголовка кодека (и сжатие, если payload больше порога)"""
+    if compression and len(payload) > compress_threshold:
+        if compression == 'zstd':
+            return bytes([CODEC_JSON_ZSTD]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+        return bytes([CODEC_JSON_ZLIB]) + zlib.compress(payload, ZLIB_LEVEL)
+
+    return bytes([CODEC_JSON]) + payload
+
+
+def decode_value(raw: Any) -> Any:
+    """
+    Десериализация значения из кэша (новый формат или старый plain JSON)
+
+    Raises:
+        CacheCodecError: Неизвестный кодек или поврежденные данные
+    """
+    return deserialize_value(unpack_payload(raw))
+
+
+def _decompress_zstd(body: bytes) -> bytes:
+    if not ZSTD_AVAILABLE:
+        raise CacheCodecError("zstd value but zstandard is not installed")
+    return zstandard.ZstdDecompressor().decompress(body)
+
+
+# Заголовок кодека -> распаковка тела значения в JSON payload
+_DECODERS = {
+    CODEC_JSON: lambda body: body,
+    CODEC_JSON_ZLIB: zlib.decompress,
+    CODEC_JSON_ZSTD: _decompress_zstd,
+}
+
+
+def unpack_payload(raw: Any) -> bytes:
+    """
+    Снятие заголовка кодека и распаковка: значение кэша -> JSON payload
+
+    Raises:
+        CacheCodecError: Неизвестный кодек или поврежденные данные
+    """
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+
+    if not raw:
+        raise CacheCodecError("Empty cache value")
+
+    header = raw[0]
+    decoder = _DECODERS.get(header)
+    if decoder is None:
+        if header < 0x20:
+            raise CacheCodecError(f"Unknown cache codec: 0x{header:02x}")
+        # Старый формат: plain JSON-текст
+        return raw
+
+    try:
+        return decoder(raw[1:])
+    except CacheCodecError:
+        raise
+    except Exception as e:
+        # zlib.error, zstandard.ZstdError - у них нет общего базового класса
+        raise CacheCodecError(f"Corrupted cache value: {e}") from e
+
+
+def deserialize_value(payload: bytes) -> Any:
+    """
+    JSON payload -> значение
+
+    Raises:
+        CacheCodecError: Невалидный JSON
+    """
+    try:
+        if ORJSON_AVAILABLE:
+            return orjson.loads(payload)
+        return json.loads(payload)
+    except ValueError as e:
+        raise CacheCodecError(f"Corrupted cache value: {e}") from e
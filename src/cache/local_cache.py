@@ -0,0 +1,84 @@
+"""
+In-process LRU кэш (L1) перед Redis
+
+Хранит JSON payload (bytes), а не объекты: вызывающий код свободно мутирует
+полученные dict, а десериализация через orjson дешевле deepcopy.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+class LocalLRUCache:
+    """
+    Потокобезопасный LRU с ограничением по количеству записей и TTL
+
+    Используется PropertyCache как L1: попадание экономит round trip в Redis.
+    Согласованность между воркерами обеспечивается инвалидацией через pub/sub
+    (см. PropertyCache), TTL ограничивает устаревание при потере сообщений.
+    """
+
+    def __init__(self, max_items: int = 1000, ttl_seconds: float = 60.0):
+        """
+        Args:
+            max_items: Максимум записей (самые давние вытесняются)
+            ttl_seconds: Время жизни записи (секунды)
+        """
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'evictions': 0, 'expired': 0, 'invalidations': 0}
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Payload по ключу или None (нет записи / истек TTL)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+
+            expires_at, payload = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                self.stats['expired'] += 1
+                return None
+
+            self._items.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: bytes):
+        """Сохранить payload (вытесняя самые давно использованные записи)"""
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, payload)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def delete(self, key: str) -> bool:
+        """Удалить запись (инвалидация)"""
+        with self._lock:
+            removed = self._items.pop(key, None) is not None
+            if removed:
+                self.stats['invalidations'] += 1
+            return removed
+
+    def clear(self) -> int:
+        """Очистить все записи"""
+        with self._lock:
+            count = len(self._items)
+            self._items.clear()
+            self.stats['invalidations'] += count
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'items': len(self._items),
+                'max_items': self.max_items,
+                'ttl_seconds': self.ttl_seconds,
+                **self.stats
+            }
@@ -0,0 +1,290 @@
+"""
+Глобальный rate limiter запросов к сайтам-источникам (token bucket в Redis)
+
+Бюджет запросов к домену общий для всех gunicorn- и RQ-воркеров: каждый путь
+загрузки (браузер, HTTP-уровни, async пул) перед запросом берет токен из
+ведра {ns}:_meta:ratelimit:{домен}[:{прокси}]. Ведро пополняется со
+скоростью rate токенов в секунду до burst.
+
+Токен резервируется сразу (баланс может уйти в минус), вызывающий ждет,
+пока резерв не покроется пополнением: ожидающие обслуживаются в порядке
+резервирования, без повторных опросов Redis.
+
+Без Redis (или при его ошибке) используется локальное ведро процесса -
+ограничение остается, но уже на воркер.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from redis.exceptions import RedisError, WatchError
+
+logger = logging.getLogger(__name__)
+
+# Запросов в секунду на домен (на все воркеры)
+DEFAULT_RATE = 2.0
+# Емкость ведра: сколько запросов можно сделать подряд без ожидания
+DEFAULT_BURST = 5
+# Максимальное ожидание токена: дальше запрос идет сверх бюджета
+DEFAULT_MAX_WAIT = 30.0
+# Повторы транзакции при конкурентном изменении ведра
+MAX_CAS_RETRIES = 10
+
+# Границы корзин гистограммы ожидания (секунды)
+WAIT_HISTOGRAM_BUCKETS = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+class DomainRateLimiter:
+    """
+    Token bucket по домену (и, опционально, по прокси)
+
+    Использование:
+        limiter = get_rate_limiter(cache)
+        limiter.acquire(url, proxy)           # потоки
+        await limiter.acquire_async(url)      # корутины
+    """
+
+    def __init__(
+        self,
+        cache=None,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        per_proxy: bool = False,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            cache: PropertyCache (Redis для общего бюджета), опционально
+            rate: Токенов в секунду на ведро
+            burst: Емкость ведра
+            per_proxy: Отдельное ведро для каждого прокси (бюджет домена x прокси)
+            max_wait: Максимальное ожидание токена (секунды)
+            enabled: False - лимитер пропускает все запросы
+        """
+        self.cache = cache
+        self.rate = rate
+        self.burst = burst
+        self.per_proxy = per_proxy
+        self.max_wait = max_wait
+        self.enabled = enabled and rate > 0
+
+        self._lock = threading.Lock()
+        self._local_buckets: Dict[str, Tuple[float, float]] = {}
+
+        self.stats = {
+            'acquisitions': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'wait_timeouts': 0,
+            'local_fallbacks': 0,
+            'redis_errors': 0,
+        }
+        self._wait_buckets = [0] * (len(WAIT_HISTOGRAM_BUCKETS) + 1)
+        self._by_domain: Dict[str, Dict[str, float]] = {}
+
+    # ─────────────────────────────────────────────────────────────────
+    # Ключи
+    # ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def domain_of(url: str) -> str:
+        host = (urlsplit(url).hostname or '').lower()
+        # Региональные поддомены (spb.cian.ru) делят бюджет основного домена
+        return '.'.join(host.split('.')[-2:]) if host else ''
+
+    def bucket_name(self, url: str, proxy: Optional[str] = None) -> str:
+        domain = self.domain_of(url)
+        if self.per_proxy and proxy:
+            return f"{domain}:{hashlib.sha1(proxy.encode('utf-8')).hexdigest()[:12]}"
+        return domain
+
+    def _redis_key(self, bucket: str) -> str:
+        return f"{self.cache.namespace}:_meta:ratelimit:{bucket}"
+
+    def _redis_available(self) -> bool:
+        return bool(self.cache is not None and getattr(self.cache, '_is_available', False))
+
+    # ─────────────────────────────────────────────────────────────────
+    # Резервирование токена
+    # ─────────────────────────────────────────────────────────────────
+
+    def reserve(self, url: str, proxy: Optional[str] = None) -> float:
+        """
+        Зарезервировать токен
+
+        Returns:
+            Сколько секунд подождать до запроса (0 - токен доступен сразу)
+        """
+        if not self.enabled:
+            return 0.0
+
+        bucket = self.bucket_name(url, proxy)
+        if self._redis_available():
+            try:
+                return self._reserve_redis(bucket)
+            except (RedisError, WatchError) as e:
+                with self._lock:
+                    self.stats['redis_errors'] += 1
+                logger.debug(f"Rate limiter Redis error, using local bucket: {e}")
+
+        if self.cache is not None and getattr(self.cache, 'enabled', False):
+            # Redis настроен, но недоступен: бюджет временно на процесс
+            with self._lock:
+                self.stats['local_fallbacks'] += 1
+        return self._reserve_local(bucket)
+
+    def _take(self, tokens: float) -> float:
+        """Списать токен; долг не растет дальше max_wait (сверх него запросы идут вне бюджета)"""
+        return max(tokens - 1, -self.rate * self.max_wait)
+
+    def _reserve_redis(self, bucket: str) -> float:
+        key = self._redis_key(bucket)
+        # Ведро, не используемое дольше полного пополнения, можно забыть
+        ttl = max(60, int(self.burst / self.rate) + 60)
+
+        with self.cache.redis_client.pipeline() as pipe:
+            for _ in range(MAX_CAS_RETRIES):
+                try:
+                    pipe.watch(key)
+                    tokens_raw, updated_raw = pipe.hmget(key, 'tokens', 'ts')
+                    now = time.time()
+                    if tokens_raw is None or updated_raw is None:
+                        tokens = float(self.burst)
+                    else:
+                        tokens = _refill(float(tokens_raw), float(updated_raw), now, self.rate, self.burst)
+
+                    tokens = self._take(tokens)
+                    pipe.multi()
+                    pipe.hset(key, mapping={'tokens': repr(tokens), 'ts': repr(now)})
+                    pipe.expire(key, ttl)
+                    pipe.execute()
+                    return max(0.0, -tokens / self.rate)
+                except WatchError:
+                    continue
+
+        raise WatchError(f"Rate limiter bucket {bucket} is too contended")
+
+    def _reserve_local(self, bucket: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._local_buckets.get(bucket, (float(self.burst), now))
+            tokens = self._take(_refill(tokens, updated_at, now, self.rate, self.burst))
+            self._local_buckets[bucket] = (tokens, now)
+        return max(0.0, -tokens / self.rate)
+
+    def _planned_wait(self, url: str, proxy: Optional[str]) -> float:
+        wait = min(self.reserve(url, proxy), self.max_wait)
+        if self.enabled and self.max_wait > 0 and wait >= self.max_wait:
+            with self._lock:
+                self.stats['wait_timeouts'] += 1
+            logger.warning(f"Rate limiter: budget of {self.domain_of(url)} exhausted, waiting max {self.max_wait}s")
+        return wait
+
+    # ─────────────────────────────────────────────────────────────────
+    # Ожидание
+    # ─────────────────────────────────────────────────────────────────
+
+    def acquire(self, url: str, proxy: Optional[str] = None) -> float:
+        """
+        Дождаться токена перед запросом к url (блокирующе)
+
+        Returns:
+            Время ожидания (секунды)
+        """
+        wait = self._planned_wait(url, proxy)
+        if wait > 0:
+            time.sleep(wait)
+        self._record(url, wait)
+        return wait
+
+    async def acquire_async(self, url: str, proxy: Optional[str] = None) -> float:
+        """Async-версия acquire()"""
+        # Клиент Redis синхронный - резервирование (CAS-цикл) не должно останавливать event loop
+        loop = asyncio.get_running_loop()
+        wait = await loop.run_in_executor(None, self._planned_wait, url, proxy)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(url, wait)
+        return wait
+
+    def _record(self, url: str, wait: float):
+        if not self.enabled:
+            return
+        domain = self.domain_of(url)
+        with self._lock:
+            self.stats['acquisitions'] += 1
+            if wait > 0:
+                self.stats['waits'] += 1
+                self.stats['wait_seconds_total'] += wait
+                self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], wait)
+
+            for i, bound in enumerate(WAIT_HISTOGRAM_BUCKETS):
+                if wait <= bound:
+                    self._wait_buckets[i] += 1
+                    break
+            else:
+                self._wait_buckets[-1] += 1
+
+            counters = self._by_domain.setdefault(domain, {'acquisitions': 0, 'wait_seconds_total': 0.0})
+            counters['acquisitions'] += 1
+            counters['wait_seconds_total'] += wait
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            histogram = {
+                f"le_{bound}s": count
+                for bound, count in zip(WAIT_HISTOGRAM_BUCKETS, self._wait_buckets)
+            }
+            histogram['inf'] = self._wait_buckets[-1]
+            return {
+                'enabled': self.enabled,
+                'backend': 'redis' if self._redis_available() else 'local',
+                'rate': self.rate,
+                'burst': self.burst,
+                'per_proxy': self.per_proxy,
+                **self.stats,
+                'wait_seconds_total': round(self.stats['wait_seconds_total'], 3),
+                'wait_seconds_max': round(self.stats['wait_seconds_max'], 3),
+                'wait_histogram': histogram,
+                'by_domain': {
+                    domain: {**c, 'wait_seconds_total': round(c['wait_seconds_total'], 3)}
+                    for domain, c in self._by_domain.items()
+                },
+            }
+
+
+_limiters: Dict[int, DomainRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(cache=None) -> DomainRateLimiter:
+    """
+    Общий для процесса лимитер для данного кэша (параметры - из настроек)
+
+    Парсеры создаются на каждый запрос, поэтому счетчики и локальные
+    ведра должны жить на уровне процесса.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(id(cache))
+        if limiter is None or limiter.cache is not cache:
+            from ..config import get_settings
+            settings = get_settings()
+            limiter = _limiters[id(cache)] = DomainRateLimiter(
+                cache,
+                rate=settings.PARSER_RATE_LIMIT_RPS,
+                burst=settings.PARSER_RATE_LIMIT_BURST,
+                per_proxy=settings.PARSER_RATE_LIMIT_PER_PROXY,
+                max_wait=settings.PARSER_RATE_LIMIT_MAX_WAIT,
+            )
+        return limiter
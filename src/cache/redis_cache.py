@@ -7,14 +7,30 @@ Redis-based caching layer для парсера недвижимости
 - Данные о ЖК (7 дней TTL)
 """
 
-import json
+import time
+import base64
+import uuid
 import hashlib
 import logging
-from typing import Optional, Dict, Any
+import threading
+from collections import defaultdict
+from typing import Optional, Dict, Any, List
 from datetime import timedelta
 import redis
 from redis.exceptions import RedisError
 
+from .codec import (
+    CODEC_JSON,
+    DEFAULT_COMPRESS_THRESHOLD,
+    CacheCodecError,
+    deserialize_value,
+    pack_payload,
+    resolve_compression,
+    serialize_value,
+    unpack_payload,
+)
+from .local_cache import LocalLRUCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,11 +40,34 @@ class PropertyCache:
 
     Features:
     - Автоматический fallback при недоступности Redis
-    - Compression для больших JSON (>1KB)
+    - Compression для больших JSON (>1KB): бинарный формат с заголовком кодека
+      (orjson + zstd/zlib, см. codec.py), старые plain JSON записи читаются прозрачно
     - TTL-based expiration
     - Namespace isolation (dev/prod)
+    - Счетчики ключей и hit/miss по типам без KEYS (не блокируют Redis)
+    - Опциональный L1: in-process LRU перед Redis, инвалидация через pub/sub
+
+    Счетчики ключей: для каждого типа ведется sorted set {namespace}:_meta:index:{type}
+    (member = ключ, score = время истечения TTL), истекшие члены удаляются
+    ZREMRANGEBYSCORE при каждой записи (индекс не больше числа живых ключей),
+    размер считается через ZCARD. Hit/miss считаются в приложении и пачками
+    сбрасываются в hash {namespace}:_meta:stats (общие для всех воркеров).
+
+    L1: каждая запись/удаление публикует ключ в канал {namespace}:_meta:invalidate,
+    фоновый поток других воркеров удаляет его из своего L1. Если подписка
+    обрывается, L1 очищается при переподключении; TTL L1 ограничивает
+    устаревание в худшем случае.
     """
 
+    # Типы ключей, для которых ведутся счетчики
+    KEY_TYPES = ('property', 'search', 'complex', 'analysis', 'report')
+
+    # Через сколько обращений локальные hit/miss сбрасываются в Redis
+    STATS_FLUSH_EVERY = 100
+
+    # Размер батча для SCAN/UNLINK
+    SCAN_BATCH_SIZE = 500
+
     def __init__(
         self,
         host: str = 'localhost',
@@ -36,7 +75,11 @@ class PropertyCache:
         db: int = 0,
         password: Optional[str] = None,
         namespace: str = 'cian',
-        enabled: bool = True
+        enabled: bool = True,
+        compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+        compression: str = 'auto',
+        l1_max_items: int = 0,
+        l1_ttl_seconds: float = 60.0
     ):
         """
         Args:
@@ -46,12 +89,34 @@ class PropertyCache:
             password: Auth password (if required)
             namespace: Prefix для ключей (изоляция окружений)
             enabled: Включен ли кэш (False = pass-through)
+            compress_threshold: Сжимать значения больше порога (байт JSON)
+            compression: 'auto' | 'zstd' | 'zlib' | 'none'
+            l1_max_items: Размер in-process L1 (0 = L1 выключен)
+            l1_ttl_seconds: TTL записей L1 (секунды)
         """
         self.namespace = namespace
         self.enabled = enabled
+        self.compress_threshold = compress_threshold
+        self.compression = resolve_compression(compression)
         self.redis_client: Optional[redis.Redis] = None
         self._is_available = False
 
+        # Hit/miss по типам ключей (локальные + еще не сброшенные в Redis)
+        self._stats_lock = threading.Lock()
+        self._local_stats = {key_type: {'hits': 0, 'misses': 0} for key_type in self.KEY_TYPES}
+        self._pending_stats: Dict[str, int] = defaultdict(int)
+        self._pending_count = 0
+
+        # Эффективность сжатия (локально для процесса)
+        self._codec_stats = {'writes': 0, 'compressed_writes': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+
+        # L1 (in-process LRU), включается через enable_local_cache()
+        self._l1: Optional[LocalLRUCache] = None
+        self._l1_stats = {key_type: {'hits': 0, 'misses': 0} for key_type in self.KEY_TYPES}
+        self._l1_stop = threading.Event()
+        self._l1_thread: Optional[threading.Thread] = None
+        self._instance_id = uuid.uuid4().hex
+
         if not enabled:
             logger.info("Redis cache DISABLED (pass-through mode)")
             return
@@ -62,7 +127,7 @@ class PropertyCache:
                 port=port,
                 db=db,
                 password=password,
-                decode_responses=True,
+                decode_responses=False,  # значения в бинарном формате (codec.py)
                 socket_connect_timeout=2,
                 socket_timeout=2,
                 health_check_interval=30
@@ -73,6 +138,11 @@ class PropertyCache:
             self._is_available = True
             logger.info(f"Redis cache connected: {host}:{port}/{db} (namespace: {namespace})")
 
+            self._ensure_index()
+
+            if l1_max_items > 0:
+                self.enable_local_cache(l1_max_items, l1_ttl_seconds)
+
         except RedisError as e:
             logger.warning(f"Redis unavailable: {e}. Running without cache.")
             self.redis_client = None
@@ -83,7 +153,7 @@ class PropertyCache:
         Генерация ключа с namespace
 
         Args:
-            key_type: Тип данных (property, search, complex)
+            key_type: Тип данных (property, search, complex, analysis, report)
             identifier: Уникальный идентификатор (URL, query hash)
 
         Returns:
@@ -95,6 +165,248 @@ class PropertyCache:
 
         return f"{self.namespace}:{key_type}:{identifier}"
 
+    def _index_key(self, key_type: str) -> str:
+        """Sorted set с ключами типа key_type (score = время истечения)"""
+        return f"{self.namespace}:_meta:index:{key_type}"
+
+    def _stats_key(self) -> str:
+        """Hash с общими для всех воркеров счетчиками hit/miss"""
+        return f"{self.namespace}:_meta:stats"
+
+    def _key_type_of(self, key: str) -> Optional[str]:
+        """Тип данных по полному ключу (None для служебных ключей)"""
+        parts = key.split(':', 2)
+        if len(parts) == 3 and parts[0] == self.namespace and parts[1] in self.KEY_TYPES:
+            return parts[1]
+        return None
+
+    def _get(self, key_type: str, identifier: str) -> Optional[Any]:
+        """Чтение значения (L1 -> Redis) + учет hit/miss по типу ключа"""
+        key = self._make_key(key_type, identifier)
+
+        if self._l1 is not None:
+            payload = self._l1.get(key)
+            self._record_l1_lookup(key_type, payload is not None)
+            if payload is not None:
+                self._record_lookup(key_type, True)
+                return deserialize_value(payload)
+
+        data = self.redis_client.get(key)
+        self._record_lookup(key_type, bool(data))
+        if not data:
+            return None
+
+        payload = unpack_payload(data)
+        value = deserialize_value(payload)
+        if self._l1 is not None:
+            self._l1.set(key, payload)
+        return value
+
+    def _set(self, key_type: str, identifier: str, value: Any, ttl: timedelta):
+        """Запись значения с TTL + регистрация ключа в индексе типа (один round trip)"""
+        key = self._make_key(key_type, identifier)
+        payload = serialize_value(value)
+        serialized = pack_payload(payload, self.compress_threshold, self.compression)
+
+        now = time.time()
+        index_key = self._index_key(key_type)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.setex(key, ttl, serialized)
+        pipe.zremrangebyscore(index_key, '-inf', now)
+        pipe.zadd(index_key, {key: now + ttl.total_seconds()})
+        if self._l1 is not None:
+            self._publish_invalidation(pipe, key)
+        pipe.execute()
+
+        if self._l1 is not None:
+            self._l1.set(key, payload)
+
+        with self._stats_lock:
+            self._codec_stats['writes'] += 1
+            self._codec_stats['compressed_writes'] += serialized[0] != CODEC_JSON
+            self._codec_stats['raw_bytes'] += len(payload)
+            self._codec_stats['stored_bytes'] += len(serialized)
+
+    def _record_l1_lookup(self, key_type: str, hit: bool):
+        with self._stats_lock:
+            self._l1_stats[key_type]['hits' if hit else 'misses'] += 1
+
+    # ─────────────────────────────────────────────────────────────────
+    # L1: in-process LRU + инвалидация через pub/sub
+    # ─────────────────────────────────────────────────────────────────
+
+    def _invalidation_channel(self) -> str:
+        return f"{self.namespace}:_meta:invalidate"
+
+    def enable_local_cache(self, max_items: int = 1000, ttl_seconds: float = 60.0):
+        """
+        Включить L1 (in-process LRU) и подписку на инвалидацию от других воркеров
+
+        Args:
+            max_items: Максимум записей в L1
+            ttl_seconds: TTL записей L1 (секунды)
+        """
+        if not self._is_available or self._l1 is not None:
+            return
+
+        self._l1 = LocalLRUCache(max_items=max_items, ttl_seconds=ttl_seconds)
+        self._l1_stop.clear()
+        self._l1_thread = threading.Thread(
+            target=self._invalidation_loop,
+            name='cache-l1-invalidation',
+            daemon=True
+        )
+        self._l1_thread.start()
+        logger.info(f"L1 cache enabled (max_items={max_items}, ttl={ttl_seconds}s)")
+
+    def close(self):
+        """Остановить поток инвалидации L1"""
+        self._l1_stop.set()
+        if self._l1_thread:
+            self._l1_thread.join(timeout=5)
+            self._l1_thread = None
+
+    def _publish_invalidation(self, pipe, target: str):
+        """Добавить в pipeline публикацию инвалидации (target = ключ или '*')"""
+        pipe.publish(self._invalidation_channel(), f"{self._instance_id}|{target}")
+
+    def _invalidation_loop(self):
+        """Фоновый поток: применяет инвалидации L1 от других воркеров"""
+        pubsub = None
+        while not self._l1_stop.is_set():
+            try:
+                if pubsub is None:
+                    pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self._invalidation_channel())
+                    # Пока подписки не было, инвалидации могли быть пропущены
+                    self._l1.clear()
+
+                message = pubsub.get_message(timeout=1.0)
+                if message and message.get('type') == 'message':
+                    self._handle_invalidation(message['data'])
+
+            except RedisError as e:
+                logger.debug(f"L1 invalidation subscription error: {e}")
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+                pubsub = None
+                self._l1_stop.wait(1.0)
+
+        if pubsub is not None:
+            pubsub.close()
+
+    def _handle_invalidation(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        sender, _, target = data.partition('|')
+        if sender == self._instance_id or self._l1 is None:
+            return
+
+        if target == '*':
+            self._l1.clear()
+        else:
+            self._l1.delete(target)
+
+    def _record_lookup(self, key_type: str, hit: bool):
+        """Учет hit/miss; в Redis сбрасывается пачками раз в STATS_FLUSH_EVERY обращений"""
+        field = 'hits' if hit else 'misses'
+        with self._stats_lock:
+            self._local_stats[key_type][field] += 1
+            self._pending_stats[f"{key_type}:{field}"] += 1
+            self._pending_count += 1
+            should_flush = self._pending_count >= self.STATS_FLUSH_EVERY
+
+        if should_flush:
+            self._flush_stats()
+
+    def _flush_stats(self):
+        """Сброс накопленных hit/miss в общий hash (HINCRBY)"""
+        with self._stats_lock:
+            pending = dict(self._pending_stats)
+            self._pending_stats.clear()
+            self._pending_count = 0
+
+        if not pending:
+            return
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for field, value in pending.items():
+                pipe.hincrby(self._stats_key(), field, value)
+            pipe.execute()
+        except RedisError as e:
+            logger.debug(f"Cache stats flush error: {e}")
+            # Возвращаем дельты, чтобы не потерять при следующем сбросе
+            with self._stats_lock:
+                for field, value in pending.items():
+                    self._pending_stats[field] += value
+                    self._pending_count += value
+
+    def _ensure_index(self):
+        """
+        Однократное построение индексов для ключей, записанных до появления счетчиков
+
+        Выполняется одним воркером (SET NX) в фоне, через SCAN - Redis не блокируется
+        """
+        try:
+            flag_key = f"{self.namespace}:_meta:index_built"
+            if self.redis_client.set(flag_key, int(time.time()), nx=True):
+                threading.Thread(target=self.rebuild_index, name='cache-index-rebuild', daemon=True).start()
+        except RedisError as e:
+            logger.warning(f"Cache index check error: {e}")
+
+    def rebuild_index(self) -> int:
+        """
+        Перестроить индексы ключей по типам через SCAN + TTL
+
+        Returns:
+            Количество проиндексированных ключей
+        """
+        if not self._is_available:
+            return 0
+
+        indexed = 0
+        try:
+            batch: List[str] = []
+            for key in self._scan_keys(f"{self.namespace}:*"):
+                if self._key_type_of(key):
+                    batch.append(key)
+                if len(batch) >= self.SCAN_BATCH_SIZE:
+                    indexed += self._index_batch(batch)
+                    batch = []
+            if batch:
+                indexed += self._index_batch(batch)
+
+            logger.info(f"Cache index rebuilt: {indexed} keys")
+        except RedisError as e:
+            logger.warning(f"Cache index rebuild error: {e}")
+
+        return indexed
+
+    def _scan_keys(self, pattern: str):
+        """SCAN по паттерну (ключи как str - клиент работает без decode_responses)"""
+        for key in self.redis_client.scan_iter(match=pattern, count=self.SCAN_BATCH_SIZE):
+            yield key.decode('utf-8') if isinstance(key, bytes) else key
+
+    def _index_batch(self, keys: List[str]) -> int:
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        indexed = 0
+        for key, ttl in zip(keys, ttls):
+            if ttl is None or ttl < 0:
+                continue  # ключ истек или без TTL
+            pipe.zadd(self._index_key(self._key_type_of(key)), {key: now + ttl})
+            indexed += 1
+        pipe.execute()
+        return indexed
+
     def get_property(self, url: str) -> Optional[Dict[str, Any]]:
         """
         Получить кэшированные данные объекта
@@ -109,17 +421,16 @@ class PropertyCache:
             return None
 
         try:
-            key = self._make_key('property', url)
-            data = self.redis_client.get(key)
+            data = self._get('property', url)
 
-            if data:
+            if data is not None:
                 logger.debug(f"Cache HIT: {url[:50]}...")
-                return json.loads(data)
+                return data
 
             logger.debug(f"Cache MISS: {url[:50]}...")
             return None
 
-        except (RedisError, json.JSONDecodeError) as e:
+        except (RedisError, CacheCodecError) as e:
             logger.warning(f"Cache read error: {e}")
             return None
 
@@ -139,14 +450,7 @@ class PropertyCache:
             return False
 
         try:
-            key = self._make_key('property', url)
-            serialized = json.dumps(data, ensure_ascii=False)
-
-            self.redis_client.setex(
-                key,
-                timedelta(hours=ttl_hours),
-                serialized
-            )
+            self._set('property', url, data, timedelta(hours=ttl_hours))
 
             logger.debug(f"Cached property: {url[:50]}... (TTL: {ttl_hours}h)")
             return True
@@ -169,17 +473,16 @@ class PropertyCache:
             return None
 
         try:
-            key = self._make_key('search', query_hash)
-            data = self.redis_client.get(key)
+            data = self._get('search', query_hash)
 
-            if data:
+            if data is not None:
                 logger.debug(f"Search cache HIT: {query_hash}")
-                return json.loads(data)
+                return data
 
             logger.debug(f"Search cache MISS: {query_hash}")
             return None
 
-        except (RedisError, json.JSONDecodeError) as e:
+        except (RedisError, CacheCodecError) as e:
             logger.warning(f"Search cache read error: {e}")
             return None
 
@@ -199,14 +502,7 @@ class PropertyCache:
             return False
 
         try:
-            key = self._make_key('search', query_hash)
-            serialized = json.dumps(results, ensure_ascii=False)
-
-            self.redis_client.setex(
-                key,
-                timedelta(hours=ttl_hours),
-                serialized
-            )
+            self._set('search', query_hash, results, timedelta(hours=ttl_hours))
 
             logger.debug(f"Cached search: {query_hash} ({len(results)} results, TTL: {ttl_hours}h)")
             return True
@@ -229,16 +525,15 @@ class PropertyCache:
             return None
 
         try:
-            key = self._make_key('complex', complex_name)
-            data = self.redis_client.get(key)
+            data = self._get('complex', complex_name)
 
-            if data:
+            if data is not None:
                 logger.debug(f"Complex cache HIT: {complex_name}")
-                return json.loads(data)
+                return data
 
             return None
 
-        except (RedisError, json.JSONDecodeError) as e:
+        except (RedisError, CacheCodecError) as e:
             logger.warning(f"Complex cache read error: {e}")
             return None
 
@@ -263,14 +558,7 @@ class PropertyCache:
             return False
 
         try:
-            key = self._make_key('complex', complex_name)
-            serialized = json.dumps(data, ensure_ascii=False)
-
-            self.redis_client.setex(
-                key,
-                timedelta(days=ttl_days),
-                serialized
-            )
+            self._set('complex', complex_name, data, timedelta(days=ttl_days))
 
             logger.debug(f"Cached complex: {complex_name} (TTL: {ttl_days}d)")
             return True
@@ -279,6 +567,111 @@ class PropertyCache:
             logger.warning(f"Complex cache write error: {e}")
             return False
 
+    def get_analysis_result(self, input_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Получить кэшированный результат анализа
+
+        Args:
+            input_hash: Хэш входов анализа (см. analytics.result_cache)
+
+        Returns:
+            Результат анализа или None
+        """
+        if not self._is_available:
+            return None
+
+        try:
+            data = self._get('analysis', input_hash)
+
+            if data is not None:
+                logger.debug(f"Analysis cache HIT: {input_hash}")
+                return data
+
+            logger.debug(f"Analysis cache MISS: {input_hash}")
+            return None
+
+        except (RedisError, CacheCodecError) as e:
+            logger.warning(f"Analysis cache read error: {e}")
+            return None
+
+    def set_analysis_result(self, input_hash: str, result: Dict[str, Any], ttl_minutes: int = 60) -> bool:
+        """
+        Сохранить результат анализа
+
+        Args:
+            input_hash: Хэш входов анализа
+            result: Результат анализа (JSON-совместимый dict)
+            ttl_minutes: Время жизни (минуты: рыночные ставки в анализе меняются)
+
+        Returns:
+            True если сохранено успешно
+        """
+        if not self._is_available:
+            return False
+
+        try:
+            self._set('analysis', input_hash, result, timedelta(minutes=ttl_minutes))
+
+            logger.debug(f"Cached analysis: {input_hash} (TTL: {ttl_minutes}m)")
+            return True
+
+        except (RedisError, TypeError) as e:
+            logger.warning(f"Analysis cache write error: {e}")
+            return False
+
+    def get_report_pdf(self, report_hash: str) -> Optional[bytes]:
+        """
+        Получить готовый PDF отчета
+
+        Args:
+            report_hash: Ключ отчета (см. services.pdf_renderer.report_cache_key)
+
+        Returns:
+            PDF или None
+        """
+        if not self._is_available:
+            return None
+
+        try:
+            data = self._get('report', report_hash)
+
+            if data is not None:
+                logger.debug(f"Report cache HIT: {report_hash}")
+                return base64.b64decode(data['pdf'])
+
+            logger.debug(f"Report cache MISS: {report_hash}")
+            return None
+
+        except (RedisError, CacheCodecError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Report cache read error: {e}")
+            return None
+
+    def set_report_pdf(self, report_hash: str, pdf_bytes: bytes, ttl_hours: int = 24) -> bool:
+        """
+        Сохранить готовый PDF отчета (base64 внутри JSON-формата кэша)
+
+        Args:
+            report_hash: Ключ отчета
+            pdf_bytes: PDF
+            ttl_hours: Время жизни (часы)
+
+        Returns:
+            True если сохранено успешно
+        """
+        if not self._is_available:
+            return False
+
+        try:
+            self._set('report', report_hash, {'pdf': base64.b64encode(pdf_bytes).decode('ascii')},
+                      timedelta(hours=ttl_hours))
+
+            logger.debug(f"Cached report: {report_hash} ({len(pdf_bytes)} bytes, TTL: {ttl_hours}h)")
+            return True
+
+        except (RedisError, TypeError) as e:
+            logger.warning(f"Report cache write error: {e}")
+            return False
+
     def invalidate_property(self, url: str) -> bool:
         """
         Удалить объект из кэша (для обновления данных)
@@ -294,7 +687,13 @@ class PropertyCache:
 
         try:
             key = self._make_key('property', url)
-            deleted = self.redis_client.delete(key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.zrem(self._index_key('property'), key)
+            if self._l1 is not None:
+                self._l1.delete(key)
+                self._publish_invalidation(pipe, key)
+            deleted = pipe.execute()[0]
             logger.debug(f"Invalidated: {url[:50]}...")
             return deleted > 0
 
@@ -306,6 +705,9 @@ class PropertyCache:
         """
         Очистить кэш по паттерну (ОСТОРОЖНО!)
 
+        Использует SCAN + UNLINK пачками по SCAN_BATCH_SIZE: Redis не блокируется
+        на весь keyspace, память освобождается в фоне.
+
         Args:
             pattern: Паттерн для удаления (default: все в namespace)
 
@@ -317,25 +719,54 @@ class PropertyCache:
 
         try:
             full_pattern = f"{self.namespace}:{pattern}"
-            keys = self.redis_client.keys(full_pattern)
-
-            if keys:
-                deleted = self.redis_client.delete(*keys)
+            deleted = 0
+            batch: List[str] = []
+
+            for key in self._scan_keys(full_pattern):
+                batch.append(key)
+                if len(batch) >= self.SCAN_BATCH_SIZE:
+                    deleted += self._unlink_batch(batch)
+                    batch = []
+            if batch:
+                deleted += self._unlink_batch(batch)
+
+            if self._l1 is not None:
+                self._l1.clear()
+                pipe = self.redis_client.pipeline(transaction=False)
+                self._publish_invalidation(pipe, '*')
+                pipe.execute()
+
+            if deleted:
                 logger.warning(f"Cleared {deleted} keys matching: {full_pattern}")
-                return deleted
-
-            return 0
+            return deleted
 
         except RedisError as e:
             logger.error(f"Cache clear error: {e}")
             return 0
 
+    def _unlink_batch(self, keys: List[str]) -> int:
+        """UNLINK пачки ключей + удаление их из индексов типов"""
+        by_type: Dict[str, List[str]] = defaultdict(list)
+        for key in keys:
+            key_type = self._key_type_of(key)
+            if key_type:
+                by_type[key_type].append(key)
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.unlink(*keys)
+        for key_type, typed_keys in by_type.items():
+            pipe.zrem(self._index_key(key_type), *typed_keys)
+        return pipe.execute()[0]
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Статистика кэша
 
+        Не использует KEYS: размер берется из индексов типов, hit/miss - из
+        счетчиков приложения (общих для всех воркеров).
+
         Returns:
-            Dict с метриками (размер, hit rate, etc.)
+            Dict с метриками (размер, hit rate, разбивка по типам ключей)
         """
         if not self._is_available:
             return {
@@ -344,17 +775,53 @@ class PropertyCache:
             }
 
         try:
-            info = self.redis_client.info('stats')
-            keys_count = len(self.redis_client.keys(f"{self.namespace}:*"))
+            self._flush_stats()
+
+            now = time.time()
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key_type in self.KEY_TYPES:
+                pipe.zremrangebyscore(self._index_key(key_type), '-inf', now)
+                pipe.zcard(self._index_key(key_type))
+            pipe.hgetall(self._stats_key())
+            results = pipe.execute()
+            counters = {
+                (field.decode('utf-8') if isinstance(field, bytes) else field): value
+                for field, value in (results[-1] or {}).items()
+            }
+
+            by_type = {}
+            for i, key_type in enumerate(self.KEY_TYPES):
+                hits = int(counters.get(f"{key_type}:hits", 0))
+                misses = int(counters.get(f"{key_type}:misses", 0))
+                with self._stats_lock:
+                    local = dict(self._local_stats[key_type])
+                    l1 = dict(self._l1_stats[key_type])
+                by_type[key_type] = {
+                    'keys': results[i * 2 + 1],
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': self._calculate_hit_rate(hits, misses),
+                    'local_hits': local['hits'],
+                    'local_misses': local['misses'],
+                    'l1_hits': l1['hits'],
+                    'l1_misses': l1['misses'],
+                    'l1_hit_rate': self._calculate_hit_rate(l1['hits'], l1['misses']),
+                }
+
+            total_hits = sum(t['hits'] for t in by_type.values())
+            total_misses = sum(t['misses'] for t in by_type.values())
 
             return {
                 'status': 'active',
                 'available': True,
                 'namespace': self.namespace,
-                'total_keys': keys_count,
-                'keyspace_hits': info.get('keyspace_hits', 0),
-                'keyspace_misses': info.get('keyspace_misses', 0),
-                'hit_rate': self._calculate_hit_rate(info)
+                'total_keys': sum(t['keys'] for t in by_type.values()),
+                'hits': total_hits,
+                'misses': total_misses,
+                'hit_rate': self._calculate_hit_rate(total_hits, total_misses),
+                'by_type': by_type,
+                'codec': self._get_codec_stats(),
+                'l1': {'enabled': True, **self._l1.get_stats()} if self._l1 is not None else {'enabled': False}
             }
 
         except RedisError as e:
@@ -365,10 +832,19 @@ class PropertyCache:
                 'error': str(e)
             }
 
-    def _calculate_hit_rate(self, info: Dict) -> float:
+    def _get_codec_stats(self) -> Dict[str, Any]:
+        """Эффективность сжатия значений (по записям этого процесса)"""
+        with self._stats_lock:
+            stats = dict(self._codec_stats)
+        stats['compression'] = self.compression or 'none'
+        stats['compress_threshold'] = self.compress_threshold
+        stats['compression_ratio'] = round(stats['raw_bytes'] / stats['stored_bytes'], 2) \
+            if stats['stored_bytes'] else 0.0
+        return stats
+
+    @staticmethod
+    def _calculate_hit_rate(hits: int, misses: int) -> float:
         """Расчет hit rate в процентах"""
-        hits = info.get('keyspace_hits', 0)
-        misses = info.get('keyspace_misses', 0)
         total = hits + misses
 
         if total == 0:
@@ -424,7 +900,11 @@ def init_cache(
     db: int = 0,
     password: Optional[str] = None,
     namespace: str = 'cian',
-    enabled: bool = True
+    enabled: bool = True,
+    compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+    compression: str = 'auto',
+    l1_max_items: int = 0,
+    l1_ttl_seconds: float = 60.0
 ) -> PropertyCache:
     """
     Инициализация глобального кэша
@@ -436,6 +916,10 @@ def init_cache(
         password: Auth password
         namespace: Namespace prefix
         enabled: Enable/disable caching
+        compress_threshold: Порог сжатия значений (байт)
+        compression: Алгоритм сжатия ('auto' | 'zstd' | 'zlib' | 'none')
+        l1_max_items: Размер in-process L1 (0 = выключен)
+        l1_ttl_seconds: TTL записей L1 (секунды)
 
     Returns:
         Инициализированный PropertyCache
@@ -448,7 +932,11 @@ def init_cache(
         db=db,
         password=password,
         namespace=namespace,
-        enabled=enabled
+        enabled=enabled,
+        compress_threshold=compress_threshold,
+        compression=compression,
+        l1_max_items=l1_max_items,
+        l1_ttl_seconds=l1_ttl_seconds
     )
 
     return _cache_instance
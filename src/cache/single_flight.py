@@ -0,0 +1,335 @@
+"""
+Single-flight: объединение одновременных загрузок одного URL
+
+Когда два пользователя вставляют одно объявление или две сессии делят аналоги,
+оба вызова промахиваются мимо кэша одновременно и открывают по странице
+браузера. SingleFlight пропускает к загрузке только одного "лидера":
+
+- внутри процесса: потоки ждут threading.Event, корутины - asyncio.Future
+  (в пределах своего event loop) и получают копию результата лидера;
+- между процессами (gunicorn / RQ воркеры): лидер берет Redis-лок
+  SET NX EX, остальные ждут освобождения лока (EXISTS - не трогает
+  hit/miss кэша), затем берут лок и один раз читают кэш: результат
+  лидера уже там, иначе грузят сами. Async-версия выполняет вызовы
+  Redis в executor, не блокируя event loop.
+
+Без Redis работает только внутрипроцессный уровень.
+"""
+
+import copy
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from redis.exceptions import RedisError, WatchError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Время жизни Redis-лока: с запасом на детальный парсинг с retry
+DEFAULT_LOCK_TTL = 120
+# Сколько ждать чужой загрузки, прежде чем грузить самим
+DEFAULT_WAIT_TIMEOUT = 90.0
+# Интервал проверки лока, пока его держит другой воркер
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class _Call:
+    """Загрузка в процессе (для ожидающих потоков)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Объединение одновременных вызовов по ключу (URL)
+
+    Использование:
+        flight = get_single_flight(cache)
+        data = flight.do(url, lambda: fetch(url), lookup=lambda: cache.get_property(url))
+        result = await flight.do_async(url, lambda: fetch_async(url), lookup=...)
+
+    lookup - чтение результата из общего кэша: им пользуются воркеры, ждущие
+    чужой Redis-лок. Без lookup межпроцессное объединение не выполняется.
+    """
+
+    def __init__(
+        self,
+        cache=None,
+        lock_ttl: int = DEFAULT_LOCK_TTL,
+        wait_timeout: float = DEFAULT_WAIT_TIMEOUT,
+        poll_interval: float = DEFAULT_POLL_INTERVAL
+    ):
+        """
+        Args:
+            cache: PropertyCache (Redis для межпроцессных локов), опционально
+            lock_ttl: TTL Redis-лока (секунды)
+            wait_timeout: Максимальное ожидание чужой загрузки (секунды)
+            poll_interval: Интервал проверки чужого лока при ожидании (секунды)
+        """
+        self.cache = cache
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[tuple, asyncio.Future] = {}
+
+        self.stats = {
+            'leaders': 0,
+            'coalesced': 0,
+            'remote_waits': 0,
+            'remote_hits': 0,
+            'wait_timeouts': 0,
+        }
+
+    # ─────────────────────────────────────────────────────────────────
+    # Потоки
+    # ─────────────────────────────────────────────────────────────────
+
+    def do(self, key: str, fn: Callable[[], T], lookup: Optional[Callable[[], Optional[T]]] = None) -> T:
+        """
+        Выполнить fn один раз на все одновременные вызовы с тем же ключом
+
+        Args:
+            key: Ключ (URL)
+            fn: Загрузка
+            lookup: Чтение готового результата из кэша (для межпроцессного ожидания)
+
+        Returns:
+            Результат fn (ожидающие получают копию)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['leaders'] += 1
+                leader = True
+
+        if not leader:
+            logger.debug(f"Single-flight: waiting for in-flight fetch {key[:60]}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = self._run_with_remote_lock(key, fn, lookup)
+            # Снимок для ожидающих: вызывающий лидер может мутировать свой результат
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run_with_remote_lock(self, key: str, fn: Callable[[], T], lookup) -> T:
+        if lookup is None or not self._redis_available():
+            return fn()
+
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            token = self._acquire(key)
+            if token is not None:
+                try:
+                    # Лок освободился после чужой загрузки - результат уже в кэше
+                    if waited:
+                        cached = lookup()
+                        if cached is not None:
+                            self._count('remote_hits')
+                            return cached
+                    return fn()
+                finally:
+                    self._release(key, token)
+
+            if not waited:
+                self._count('remote_waits')
+                waited = True
+            while self._lock_held(key):
+                if time.monotonic() >= deadline:
+                    self._count('wait_timeouts')
+                    logger.warning(f"Single-flight: lock wait timeout, fetching anyway: {key[:60]}")
+                    return fn()
+                time.sleep(self.poll_interval)
+
+    # ─────────────────────────────────────────────────────────────────
+    # Корутины
+    # ─────────────────────────────────────────────────────────────────
+
+    async def do_async(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        lookup: Optional[Callable[[], Optional[T]]] = None
+    ) -> T:
+        """
+        Async-версия do(): объединяет корутины одного event loop
+
+        Корутины разных event loop (и потоки) объединяются через Redis-лок,
+        если он доступен.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+
+        with self._lock:
+            future = self._async_calls.get(flight_key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                future = self._async_calls[flight_key] = loop.create_future()
+                self.stats['leaders'] += 1
+                leader = True
+
+        if not leader:
+            logger.debug(f"Single-flight: waiting for in-flight fetch {key[:60]}")
+            try:
+                # shield: отмена ожидающего не отменяет загрузку лидера
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # отменили нас самих
+                # Лидера отменили - загрузка не состоялась, пробуем заново
+                return await self.do_async(key, fn, lookup)
+            return copy.deepcopy(result)
+
+        try:
+            result = await self._run_with_remote_lock_async(key, fn, lookup)
+            future.set_result(copy.deepcopy(result))
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение получит вызывающий; помечаем как полученное,
+            # чтобы asyncio не ругался, если ожидающих не было
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(flight_key, None)
+
+    async def _run_with_remote_lock_async(self, key: str, fn, lookup):
+        if lookup is None or not self._redis_available():
+            return await fn()
+
+        # Клиент Redis синхронный - его вызовы не должны останавливать event loop
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            token = await loop.run_in_executor(None, self._acquire, key)
+            if token is not None:
+                try:
+                    if waited:
+                        cached = await loop.run_in_executor(None, lookup)
+                        if cached is not None:
+                            self._count('remote_hits')
+                            return cached
+                    return await fn()
+                finally:
+                    await loop.run_in_executor(None, self._release, key, token)
+
+            if not waited:
+                self._count('remote_waits')
+                waited = True
+            while await loop.run_in_executor(None, self._lock_held, key):
+                if time.monotonic() >= deadline:
+                    self._count('wait_timeouts')
+                    logger.warning(f"Single-flight: lock wait timeout, fetching anyway: {key[:60]}")
+                    return await fn()
+                await asyncio.sleep(self.poll_interval)
+
+    # ─────────────────────────────────────────────────────────────────
+    # Redis-лок
+    # ─────────────────────────────────────────────────────────────────
+
+    def _redis_available(self) -> bool:
+        return bool(self.cache is not None and getattr(self.cache, '_is_available', False))
+
+    def _lock_key(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return f"{self.cache.namespace}:_meta:lock:{digest}"
+
+    def _acquire(self, key: str) -> Optional[str]:
+        """Взять лок (SET NX EX); токен или None. При ошибке Redis - грузим без лока"""
+        token = uuid.uuid4().hex
+        try:
+            if self.cache.redis_client.set(self._lock_key(key), token, nx=True, ex=self.lock_ttl):
+                return token
+            return None
+        except RedisError as e:
+            logger.debug(f"Single-flight lock error: {e}")
+            return token
+
+    def _lock_held(self, key: str) -> bool:
+        """Держит ли кто-то лок (EXISTS: без чтения кэша и учета hit/miss)"""
+        try:
+            return bool(self.cache.redis_client.exists(self._lock_key(key)))
+        except RedisError as e:
+            logger.debug(f"Single-flight lock check error: {e}")
+            return False
+
+    def _release(self, key: str, token: str):
+        """Снять лок, только если он все еще наш (истекший лок мог взять другой воркер)"""
+        lock_key = self._lock_key(key)
+        try:
+            with self.cache.redis_client.pipeline() as pipe:
+                pipe.watch(lock_key)
+                current = pipe.get(lock_key)
+                if isinstance(current, bytes):
+                    current = current.decode('utf-8')
+                if current == token:
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    pipe.execute()
+                else:
+                    pipe.unwatch()
+        except (RedisError, WatchError) as e:
+            logger.debug(f"Single-flight unlock error: {e}")
+
+    def _count(self, field: str):
+        with self._lock:
+            self.stats[field] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self.stats,
+                'in_flight': len(self._calls) + len(self._async_calls),
+            }
+
+
+_flights: Dict[int, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(cache=None) -> SingleFlight:
+    """
+    Общий для процесса SingleFlight для данного кэша
+
+    Парсеры создаются на каждый запрос, поэтому объединение должно жить
+    на уровне процесса, а не экземпляра парсера.
+    """
+    with _flights_lock:
+        flight = _flights.get(id(cache))
+        if flight is None or flight.cache is not cache:
+            flight = _flights[id(cache)] = SingleFlight(cache)
+        return flight
@@ -47,6 +47,13 @@ class Settings:
         self.REDIS_DB: int = int(os.getenv('REDIS_DB', '0'))
         self.REDIS_PASSWORD: Optional[str] = os.getenv('REDIS_PASSWORD') or None
         self.REDIS_NAMESPACE: str = os.getenv('REDIS_NAMESPACE', 'housler')
+        self.CACHE_COMPRESS_THRESHOLD: int = int(os.getenv('CACHE_COMPRESS_THRESHOLD', '1024'))
+        self.CACHE_COMPRESSION: str = os.getenv('CACHE_COMPRESSION', 'auto')
+        self.CACHE_L1_ENABLED: bool = os.getenv('CACHE_L1_ENABLED', 'false').lower() == 'true'
+        self.CACHE_L1_MAX_ITEMS: int = int(os.getenv('CACHE_L1_MAX_ITEMS', '1000'))
+        self.CACHE_L1_TTL_SECONDS: float = float(os.getenv('CACHE_L1_TTL_SECONDS', '60'))
+        self.ANALYSIS_CACHE_ENABLED: bool = os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+        self.ANALYSIS_CACHE_TTL_MINUTES: int = int(os.getenv('ANALYSIS_CACHE_TTL_MINUTES', '60'))
 
         # ═══════════════════════════════════════════════════════════════════
         # GUNICORN
@@ -71,6 +78,40 @@ class Settings:
         self.MAX_CONCURRENT_PARSING: int = int(os.getenv('MAX_CONCURRENT_PARSING', '5'))
         self.MAX_BROWSERS: int = int(os.getenv('MAX_BROWSERS', '3'))
         self.USE_BROWSER_POOL: bool = os.getenv('USE_BROWSER_POOL', 'false').lower() == 'true'
+        self.BROWSER_POOL_MIN_WARM: int = int(os.getenv('BROWSER_POOL_MIN_WARM', '1'))
+        self.BROWSER_POOL_RECYCLE_INTERVAL: float = float(os.getenv('BROWSER_POOL_RECYCLE_INTERVAL', '60'))
+
+        # Блокировка ресурсов в контекстах Playwright (типы через запятую)
+        self.RESOURCE_BLOCK_TYPES_SEARCH: List[str] = self._split_list(
+            os.getenv('RESOURCE_BLOCK_TYPES_SEARCH', 'image,media,font,stylesheet,texttrack,manifest')
+        )
+        self.RESOURCE_BLOCK_TYPES_DETAIL: List[str] = self._split_list(
+            os.getenv('RESOURCE_BLOCK_TYPES_DETAIL', 'image,media,font,texttrack,manifest')
+        )
+        # Дополнительные паттерны доменов к встроенным спискам ('host', '*.host', 'host/path')
+        self.RESOURCE_DENY_DOMAINS: List[str] = self._split_list(os.getenv('RESOURCE_DENY_DOMAINS', ''))
+        self.RESOURCE_ALLOW_DOMAINS: List[str] = self._split_list(os.getenv('RESOURCE_ALLOW_DOMAINS', ''))
+
+        # Загрузка страниц ЦИАН: сначала HTTP (curl_cffi, httpx), браузер - только при неудаче
+        self.PARSER_TIERED_FETCH: bool = os.getenv('PARSER_TIERED_FETCH', 'true').lower() == 'true'
+        self.PARSER_HTTP_TIMEOUT: int = int(os.getenv('PARSER_HTTP_TIMEOUT', '15'))
+
+        # Имитация человека (паузы, мышь, скроллинг) только при риске блокировки
+        self.PACING_ADAPTIVE: bool = os.getenv('PACING_ADAPTIVE', 'true').lower() == 'true'
+        self.PACING_RISK_THRESHOLD: float = float(os.getenv('PACING_RISK_THRESHOLD', '0.1'))
+        self.PACING_WINDOW_SECONDS: float = float(os.getenv('PACING_WINDOW_SECONDS', '600'))
+
+        # Общий для всех воркеров бюджет запросов к домену (token bucket в Redis)
+        self.PARSER_RATE_LIMIT_RPS: float = float(os.getenv('PARSER_RATE_LIMIT_RPS', '2.0'))
+        self.PARSER_RATE_LIMIT_BURST: int = int(os.getenv('PARSER_RATE_LIMIT_BURST', '5'))
+        self.PARSER_RATE_LIMIT_PER_PROXY: bool = os.getenv('PARSER_RATE_LIMIT_PER_PROXY', 'false').lower() == 'true'
+        self.PARSER_RATE_LIMIT_MAX_WAIT: float = float(os.getenv('PARSER_RATE_LIMIT_MAX_WAIT', '30'))
+        # Параллельный детальный парсинг аналогов на один запрос
+        self.PARSER_DETAIL_CONCURRENCY: int = int(os.getenv('PARSER_DETAIL_CONCURRENCY', '5'))
+        # Постоянный сервис async парсинга: очередь и время жизни прогретого браузера
+        self.ASYNC_PARSER_MAX_QUEUE: int = int(os.getenv('ASYNC_PARSER_MAX_QUEUE', '100'))
+        self.ASYNC_PARSER_QUEUE_TIMEOUT: float = float(os.getenv('ASYNC_PARSER_QUEUE_TIMEOUT', '10'))
+        self.ASYNC_PARSER_IDLE_TIMEOUT: float = float(os.getenv('ASYNC_PARSER_IDLE_TIMEOUT', '300'))
 
         # Лимиты для поиска
         self.SEARCH_LIMIT_DEFAULT: int = int(os.getenv('SEARCH_LIMIT_DEFAULT', '50'))
@@ -83,6 +124,7 @@ class Settings:
         self.RATELIMIT_PARSE: str = os.getenv('RATELIMIT_PARSE', '10 per minute')
         self.RATELIMIT_SEARCH: str = os.getenv('RATELIMIT_SEARCH', '15 per minute')
         self.RATELIMIT_ANALYZE: str = os.getenv('RATELIMIT_ANALYZE', '20 per minute')
+        self.RATELIMIT_PORTFOLIO: str = os.getenv('RATELIMIT_PORTFOLIO', '10 per hour')
 
         # ═══════════════════════════════════════════════════════════════════
         # SECURITY
@@ -141,6 +183,37 @@ class Settings:
             os.getenv('RECOMMENDED_COMPARABLES', '10')
         )
 
+        # Пакетная оценка портфеля (src/services/portfolio.py)
+        self.PORTFOLIO_ANALYSIS_WORKERS: int = int(
+            os.getenv('PORTFOLIO_ANALYSIS_WORKERS', '2')  # 0 = анализ в процессе запроса
+        )
+        self.PORTFOLIO_COMPARABLES_LIMIT: int = int(
+            os.getenv('PORTFOLIO_COMPARABLES_LIMIT', '20')
+        )
+        self.PORTFOLIO_SYNC_MAX_TARGETS: int = int(
+            os.getenv('PORTFOLIO_SYNC_MAX_TARGETS', '50')  # Больше - только через очередь
+        )
+        self.PORTFOLIO_MAX_TARGETS: int = int(
+            os.getenv('PORTFOLIO_MAX_TARGETS', '5000')
+        )
+        self.PORTFOLIO_OUTPUT_DIR: str = os.getenv('PORTFOLIO_OUTPUT_DIR', 'data/portfolio')
+
+        # Трекинг обработки объектов (src/analytics/property_tracker.py)
+        self.TRACKER_MAX_LOGS: int = int(os.getenv('TRACKER_MAX_LOGS', '200'))  # 0 = без ограничения
+        self.TRACKER_MAX_EVENTS_PER_LOG: int = int(os.getenv('TRACKER_MAX_EVENTS_PER_LOG', '500'))
+        self.TRACKER_EVENT_SAMPLING: str = os.getenv('TRACKER_EVENT_SAMPLING', '')  # data_extracted=0.1,...
+        self.TRACKER_SPILL_PATH: str = os.getenv('TRACKER_SPILL_PATH', '')  # .jsonl или .db; пусто = только память
+
+        # ═══════════════════════════════════════════════════════════════════
+        # PDF REPORTS (src/services/pdf_renderer.py)
+        # ═══════════════════════════════════════════════════════════════════
+        self.PDF_RENDERER_PAGES: int = int(os.getenv('PDF_RENDERER_PAGES', '2'))  # Одновременных рендеров
+        self.PDF_RENDERER_MAX_QUEUE: int = int(os.getenv('PDF_RENDERER_MAX_QUEUE', '10'))
+        self.PDF_RENDERER_QUEUE_TIMEOUT: float = float(os.getenv('PDF_RENDERER_QUEUE_TIMEOUT', '5'))
+        self.PDF_RENDERER_IDLE_TIMEOUT: float = float(os.getenv('PDF_RENDERER_IDLE_TIMEOUT', '600'))
+        self.PDF_RENDER_TIMEOUT: float = float(os.getenv('PDF_RENDER_TIMEOUT', '30'))
+        self.REPORT_PDF_CACHE_TTL_HOURS: int = int(os.getenv('REPORT_PDF_CACHE_TTL_HOURS', '24'))
+
         # ═══════════════════════════════════════════════════════════════════
         # MONITORING
         # ═══════════════════════════════════════════════════════════════════
@@ -164,6 +237,11 @@ class Settings:
         self.APP_NAME: str = 'HOUSLER'
         self.APP_VERSION: str = os.getenv('APP_VERSION', '2.1.0')
 
+    @staticmethod
+    def _split_list(value: str) -> List[str]:
+        """Список из строки через запятую"""
+        return [item.strip() for item in value.split(',') if item.strip()]
+
     # ═══════════════════════════════════════════════════════════════════════
     # COMPUTED PROPERTIES
     # ═══════════════════════════════════════════════════════════════════════
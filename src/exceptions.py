@@ -22,7 +22,8 @@
     │   ├── SessionNotFoundError (сессия не найдена)
     │   └── SessionExpiredError (сессия истекла)
     └── ExportError (ошибки экспорта)
-        └── PDFGenerationError (ошибка генерации PDF)
+        ├── PDFGenerationError (ошибка генерации PDF)
+        └── PDFRendererOverloadedError (очередь рендера PDF заполнена)
 """
 
 from typing import Optional, Dict, Any
@@ -192,6 +193,16 @@ class ContentBlockedError(ParsingError):
         super().__init__(message, url=url, details={'reason': reason} if reason else {})
 
 
+class ParserOverloadedError(ParsingError):
+    """Очередь фонового парсинга заполнена (backpressure)"""
+    error_code = 'PARSER_OVERLOADED'
+    http_status = 503
+
+    def __init__(self, queue_size: int):
+        message = "Сервис парсинга перегружен. Попробуйте через минуту."
+        super().__init__(message, details={'queue_size': queue_size})
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # ANALYSIS ERRORS (422 Unprocessable Entity)
 # ═══════════════════════════════════════════════════════════════════════════
@@ -272,6 +283,16 @@ class PDFGenerationError(ExportError):
         super().__init__(message, details={'reason': reason})
 
 
+class PDFRendererOverloadedError(ExportError):
+    """Очередь рендера PDF заполнена (backpressure)"""
+    error_code = 'PDF_RENDERER_OVERLOADED'
+    http_status = 503
+
+    def __init__(self, queue_size: int):
+        message = "Сервис генерации отчетов перегружен. Попробуйте через минуту."
+        super().__init__(message, details={'queue_size': queue_size})
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # UTILITY FUNCTIONS
 # ═══════════════════════════════════════════════════════════════════════════
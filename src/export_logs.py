@@ -13,18 +13,19 @@ from analytics.property_tracker import get_tracker
 from analytics.markdown_exporter import MarkdownExporter
 
 
-def export_logs(output_file: str = None, summary_only: bool = False):
+def export_logs(output_file: str = None, summary_only: bool = False, limit: int = None):
     """
     Экспортировать логи в Markdown
 
     Args:
         output_file: Путь к выходному файлу (по умолчанию: property_logs.md)
         summary_only: Только краткая сводка (без детальных отчётов)
+        limit: В сводке - только последние N объектов
     """
     tracker = get_tracker()
     exporter = MarkdownExporter()
 
-    if not tracker.logs:
+    if not tracker.query(limit=1):
         print("❌ Нет логов для экспорта")
         return
 
@@ -36,9 +37,9 @@ def export_logs(output_file: str = None, summary_only: bool = False):
 
     # Генерируем Markdown
     if summary_only:
-        content = exporter.export_tracker_summary(tracker)
+        content = exporter.export_tracker_summary(tracker, limit=limit)
     else:
-        logs = tracker.get_all_logs()
+        logs = list(tracker.iter_logs())
         if len(logs) == 1:
             content = exporter.export_single_property(logs[0])
         else:
@@ -93,13 +94,14 @@ def main():
     parser.add_argument('-o', '--output', help='Путь к выходному файлу')
     parser.add_argument('-s', '--summary', action='store_true', help='Только краткая сводка')
     parser.add_argument('-p', '--property-id', help='Экспортировать только один объект по ID')
+    parser.add_argument('-n', '--limit', type=int, help='В сводке - только последние N объектов')
 
     args = parser.parse_args()
 
     if args.property_id:
         export_single_property(args.property_id, args.output)
     else:
-        export_logs(args.output, args.summary)
+        export_logs(args.output, args.summary, args.limit)
 
 
 if __name__ == '__main__':
@@ -6,14 +6,23 @@
 """
 
 import asyncio
+import atexit
+import concurrent.futures
 import logging
+import math
+import os
 import random
-from typing import List, Dict, Optional
+import threading
+from typing import Callable, List, Dict, Optional
 from dataclasses import dataclass, field
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 import time
 
 from .base_parser import BaseCianParser, ParsingError
+from .resource_policy import get_resource_policy
+from .cian_state import parse_offer_state
+from ..cache.single_flight import get_single_flight
+from ..exceptions import ParserOverloadedError
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +53,9 @@ class AsyncPlaywrightParser(BaseCianParser):
     - Graceful degradation при ошибках
     """
 
+    # Загрузок на один контекст, после чего он пересоздается (cookies, память)
+    CONTEXT_MAX_USES = 20
+
     def __init__(
         self,
         headless: bool = True,
@@ -56,8 +68,8 @@ class AsyncPlaywrightParser(BaseCianParser):
         """
         Args:
             headless: Запускать браузер в фоновом режиме
-            delay: Минимальная задержка между запросами (сек)
-            block_resources: Блокировать картинки/шрифты
+            delay: Не используется (темп задает rate_limiter), оставлен для совместимости
+            block_resources: Блокировать лишние ресурсы (см. resource_policy)
             cache: PropertyCache instance
             region: Регион ('spb' или 'msk')
             max_concurrent: Максимум параллельных запросов
@@ -76,6 +88,8 @@ class AsyncPlaywrightParser(BaseCianParser):
         self.playwright = None
         self.browser: Optional[Browser] = None
         self._contexts: List[BrowserContext] = []
+        self._idle_contexts: List[BrowserContext] = []
+        self._context_uses: Dict[int, int] = {}
         self._semaphore = None
 
         logger.info(f"AsyncParser initialized: region={region}, max_concurrent={max_concurrent}")
@@ -131,6 +145,8 @@ class AsyncPlaywrightParser(BaseCianParser):
                 errors.append(f"Context: {e}")
 
         self._contexts.clear()
+        self._idle_contexts.clear()
+        self._context_uses.clear()
 
         # Закрываем браузер
         if self.browser:
@@ -174,14 +190,38 @@ class AsyncPlaywrightParser(BaseCianParser):
 
         # Блокировка ресурсов
         if self.block_resources:
-            await context.route(
-                "**/*.{png,jpg,jpeg,gif,svg,webp,woff,woff2,ttf,mp4,mp3,pdf}",
-                lambda route: route.abort()
-            )
+            await get_resource_policy().attach_async(context)
 
         self._contexts.append(context)
         return context
 
+    async def _acquire_context(self) -> BrowserContext:
+        """Свободный прогретый контекст или новый"""
+        if self._idle_contexts:
+            return self._idle_contexts.pop()
+        return await self._create_context()
+
+    async def _release_context(self, context: BrowserContext, healthy: bool = True):
+        """
+        Вернуть контекст в пул или закрыть
+
+        Долгоживущий парсер (AsyncParsingService) не должен копить контексты:
+        в пуле остается не больше max_concurrent, каждый - до CONTEXT_MAX_USES загрузок.
+        """
+        uses = self._context_uses.get(id(context), 0) + 1
+        if healthy and uses < self.CONTEXT_MAX_USES and len(self._idle_contexts) < self.max_concurrent:
+            self._context_uses[id(context)] = uses
+            self._idle_contexts.append(context)
+            return
+
+        self._context_uses.pop(id(context), None)
+        if context in self._contexts:
+            self._contexts.remove(context)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"Error closing context: {e}")
+
     async def _fetch_page_content(self, url: str, context: BrowserContext) -> Optional[str]:
         """
         Загрузка HTML через Playwright
@@ -198,6 +238,8 @@ class AsyncPlaywrightParser(BaseCianParser):
         try:
             logger.debug(f"Fetching: {url[:60]}...")
 
+            # Токен общего бюджета запросов к домену (вместо паузы после каждой страницы)
+            await self.rate_limiter.acquire_async(url)
             await page.goto(url, wait_until='domcontentloaded', timeout=60000)
 
             # Ждем появления контента
@@ -226,7 +268,6 @@ class AsyncPlaywrightParser(BaseCianParser):
 
         finally:
             await page.close()
-            await asyncio.sleep(self.delay)
 
     def _classify_error(self, error_msg: str) -> str:
         """
@@ -251,6 +292,48 @@ class AsyncPlaywrightParser(BaseCianParser):
         else:
             return 'parse_error'
 
+    def _extract_detail_data(self, html: str, url: str) -> Dict:
+        """
+        Данные детальной страницы: встроенное состояние (без DOM),
+        при его отсутствии - разбор HTML через BeautifulSoup
+        """
+        data = parse_offer_state(html, url)
+        if data is not None:
+            self.stats['state_parsed'] += 1
+            self._promote_key_fields(data)
+            return data
+
+        self.stats['html_fallback'] += 1
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'lxml')
+
+        data = {
+            'url': url,
+            'title': None,
+            'price': None,
+            'price_raw': None,
+        }
+
+        # Извлекаем JSON-LD (самый надежный источник)
+        json_ld = self._extract_json_ld(soup)
+        if json_ld:
+            data['title'] = json_ld.get('name')
+            offers = json_ld.get('offers', {})
+            if offers:
+                data['price_raw'] = offers.get('price')
+                data['currency'] = offers.get('priceCurrency')
+                if data['price_raw']:
+                    data['price'] = data['price_raw']
+
+        # Дополняем данные из HTML
+        self._extract_basic_info(soup, data)
+        data['characteristics'] = self._extract_characteristics(soup)
+        data['images'] = self._extract_images(soup)
+
+        # Переносим ключевые поля из characteristics в корень
+        self._promote_key_fields(data)
+        return data
+
     async def _parse_with_retry(
         self,
         url: str,
@@ -268,73 +351,66 @@ class AsyncPlaywrightParser(BaseCianParser):
         Returns:
             ParseResult с информацией об успехе/неудаче
         """
+        if self.cache:
+            cached_data = self.cache.get_property(url)
+            if cached_data:
+                self.stats['cache_hits'] += 1
+                logger.debug(f"✅ Cache HIT: {url[:60]}")
+
+                # Миграция старых данных: заполняем total_area из characteristics
+                if not cached_data.get('total_area') and cached_data.get('characteristics'):
+                    self._promote_key_fields(cached_data)
+                    if cached_data.get('total_area'):
+                        self.cache.set_property(url, cached_data, ttl_hours=24)
+                        logger.debug(f"Cache migrated: total_area={cached_data.get('total_area')}")
+
+                return ParseResult(
+                    url=url,
+                    ok=True,
+                    data=cached_data,
+                    retries_used=0
+                )
+            else:
+                self.stats['cache_misses'] += 1
+
+        # Одновременные запросы того же URL (корутины/воркеры) ждут одну загрузку
+        return await get_single_flight(self.cache).do_async(
+            url,
+            lambda: self._fetch_with_retry(url, max_retries, base_delay),
+            lookup=self._cached_parse_result(url) if self.cache else None
+        )
+
+    def _cached_parse_result(self, url: str) -> Callable[[], Optional[ParseResult]]:
+        """lookup для single-flight: ParseResult из кэша, если другой воркер уже загрузил URL"""
+        def lookup() -> Optional[ParseResult]:
+            cached_data = self.cache.get_property(url)
+            if cached_data:
+                return ParseResult(url=url, ok=True, data=cached_data, retries_used=0)
+            return None
+        return lookup
+
+    async def _fetch_with_retry(self, url: str, max_retries: int, base_delay: float) -> ParseResult:
+        """Загрузка и парсинг с retry (без проверки кэша)"""
         last_error = None
         last_error_type = None
 
         for attempt in range(max_retries + 1):
             try:
-                # Проверяем кэш только на первой попытке
-                if attempt == 0 and self.cache:
-                    cached_data = self.cache.get_property(url)
-                    if cached_data:
-                        self.stats['cache_hits'] += 1
-                        logger.debug(f"✅ Cache HIT: {url[:60]}")
-
-                        # Миграция старых данных: заполняем total_area из characteristics
-                        if not cached_data.get('total_area') and cached_data.get('characteristics'):
-                            self._promote_key_fields(cached_data)
-                            if cached_data.get('total_area'):
-                                self.cache.set_property(url, cached_data, ttl_hours=24)
-                                logger.debug(f"Cache migrated: total_area={cached_data.get('total_area')}")
-
-                        return ParseResult(
-                            url=url,
-                            ok=True,
-                            data=cached_data,
-                            retries_used=0
-                        )
-                    else:
-                        self.stats['cache_misses'] += 1
-
                 # Используем semaphore для ограничения параллелизма
                 async with self._semaphore:
-                    # Создаем отдельный контекст для изоляции
-                    context = await self._create_context()
-
-                    # Загружаем HTML
-                    html = await self._fetch_page_content(url, context)
+                    # Контекст из пула (изоляция между параллельными загрузками)
+                    context = await self._acquire_context()
+                    healthy = False
+                    try:
+                        # Загружаем HTML
+                        html = await self._fetch_page_content(url, context)
+                        healthy = True
+                    finally:
+                        await self._release_context(context, healthy)
                     if not html:
                         raise ParsingError(f"Failed to fetch content: {url}")
 
-                    # Парсинг HTML
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(html, 'lxml')
-
-                    data = {
-                        'url': url,
-                        'title': None,
-                        'price': None,
-                        'price_raw': None,
-                    }
-
-                    # Извлекаем JSON-LD (самый надежный источник)
-                    json_ld = self._extract_json_ld(soup)
-                    if json_ld:
-                        data['title'] = json_ld.get('name')
-                        offers = json_ld.get('offers', {})
-                        if offers:
-                            data['price_raw'] = offers.get('price')
-                            data['currency'] = offers.get('priceCurrency')
-                            if data['price_raw']:
-                                data['price'] = data['price_raw']
-
-                    # Дополняем данные из HTML
-                    self._extract_basic_info(soup, data)
-                    data['characteristics'] = self._extract_characteristics(soup)
-                    data['images'] = self._extract_images(soup)
-
-                    # Переносим ключевые поля из characteristics в корень
-                    self._promote_key_fields(data)
+                    data = self._extract_detail_data(html, url)
 
                     # Сохраняем в кэш
                     if self.cache:
@@ -413,44 +489,19 @@ class AsyncPlaywrightParser(BaseCianParser):
         # Используем semaphore для ограничения параллелизма
         async with self._semaphore:
             try:
-                # Создаем отдельный контекст для изоляции
-                context = await self._create_context()
-
-                # Загружаем HTML
-                html = await self._fetch_page_content(url, context)
+                # Контекст из пула (изоляция между параллельными загрузками)
+                context = await self._acquire_context()
+                healthy = False
+                try:
+                    # Загружаем HTML
+                    html = await self._fetch_page_content(url, context)
+                    healthy = True
+                finally:
+                    await self._release_context(context, healthy)
                 if not html:
                     raise ParsingError(f"Failed to fetch content: {url}")
 
-                # Парсинг HTML (используем синхронный метод из базового класса)
-                # TODO: можно сделать полностью async, но пока используем sync BeautifulSoup
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(html, 'lxml')
-
-                data = {
-                    'url': url,
-                    'title': None,
-                    'price': None,
-                    'price_raw': None,
-                }
-
-                # Извлекаем JSON-LD (самый надежный источник)
-                json_ld = self._extract_json_ld(soup)
-                if json_ld:
-                    data['title'] = json_ld.get('name')
-                    offers = json_ld.get('offers', {})
-                    if offers:
-                        data['price_raw'] = offers.get('price')
-                        data['currency'] = offers.get('priceCurrency')
-                        if data['price_raw']:
-                            data['price'] = data['price_raw']
-
-                # Дополняем данные из HTML
-                self._extract_basic_info(soup, data)
-                data['characteristics'] = self._extract_characteristics(soup)
-                data['images'] = self._extract_images(soup)
-
-                # Переносим ключевые поля из characteristics в корень
-                self._promote_key_fields(data)
+                data = self._extract_detail_data(html, url)
 
                 # Сохраняем в кэш
                 if self.cache:
@@ -470,6 +521,44 @@ class AsyncPlaywrightParser(BaseCianParser):
                     'error': str(e)
                 }
 
+    async def _parse_with_timeout(
+        self,
+        url: str,
+        timeout_per_url: float = 45,
+        max_retries: int = 2
+    ) -> ParseResult:
+        """
+        Парсинг одного URL с retry и общим timeout
+
+        Никогда не бросает исключения (кроме отмены) - ошибки возвращаются в ParseResult
+        """
+        try:
+            # Используем новый метод с retry
+            return await asyncio.wait_for(
+                self._parse_with_retry(url, max_retries=max_retries),
+                timeout=timeout_per_url
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"⏱️ Timeout ({timeout_per_url}s) parsing {url}")
+            return ParseResult(
+                url=url,
+                ok=False,
+                data={'url': url, 'title': 'Timeout при парсинге'},
+                error_type='timeout',
+                error_message=f'Превышено время ожидания ({timeout_per_url}s)',
+                retries_used=max_retries
+            )
+        except Exception as e:
+            logger.error(f"❌ Error parsing {url}: {e}")
+            return ParseResult(
+                url=url,
+                ok=False,
+                data={'url': url, 'title': 'Ошибка парсинга'},
+                error_type='parse_error',
+                error_message=str(e),
+                retries_used=max_retries
+            )
+
     async def parse_multiple_async(
         self,
         urls: List[str],
@@ -496,37 +585,7 @@ class AsyncPlaywrightParser(BaseCianParser):
         )
         start_time = time.time()
 
-        # Создаем задачи для параллельного выполнения с timeout для каждой
-        async def parse_with_timeout(url):
-            try:
-                # Используем новый метод с retry
-                result = await asyncio.wait_for(
-                    self._parse_with_retry(url, max_retries=max_retries),
-                    timeout=timeout_per_url
-                )
-                return result
-            except asyncio.TimeoutError:
-                logger.error(f"⏱️ Timeout ({timeout_per_url}s) parsing {url}")
-                return ParseResult(
-                    url=url,
-                    ok=False,
-                    data={'url': url, 'title': 'Timeout при парсинге'},
-                    error_type='timeout',
-                    error_message=f'Превышено время ожидания ({timeout_per_url}s)',
-                    retries_used=max_retries
-                )
-            except Exception as e:
-                logger.error(f"❌ Error parsing {url}: {e}")
-                return ParseResult(
-                    url=url,
-                    ok=False,
-                    data={'url': url, 'title': 'Ошибка парсинга'},
-                    error_type='parse_error',
-                    error_message=str(e),
-                    retries_used=max_retries
-                )
-
-        tasks = [parse_with_timeout(url) for url in urls]
+        tasks = [self._parse_with_timeout(url, timeout_per_url, max_retries) for url in urls]
 
         # Запускаем все задачи параллельно
         results = await asyncio.gather(*tasks, return_exceptions=False)
@@ -546,6 +605,12 @@ class AsyncPlaywrightParser(BaseCianParser):
 
         return results
 
+    def get_stats(self) -> Dict:
+        """Статистика парсера + счетчики запросов/трафика браузера"""
+        stats = super().get_stats()
+        stats['resources'] = get_resource_policy().get_stats()
+        return stats
+
     def _get_page_content(self, url: str) -> Optional[str]:
         """
         Sync метод (требуется для совместимости с BaseCianParser)
@@ -559,50 +624,17 @@ class AsyncPlaywrightParser(BaseCianParser):
 # SYNC WRAPPER для использования в sync коде
 # ═══════════════════════════════════════════════════════════════════════
 
-def parse_multiple_urls_parallel(
-    urls: List[str],
-    headless: bool = True,
-    cache=None,
-    region: str = 'spb',
-    max_concurrent: int = 3,
-    max_retries: int = 2
-) -> tuple[List[Dict], Dict]:
+def summarize_parse_results(total_found: int, parse_results: List[ParseResult]) -> tuple[List[Dict], Dict]:
     """
-    Sync обертка для параллельного парсинга (для использования в Flask)
+    Конвертация ParseResult в dict + сбор метрик качества парсинга
 
     Args:
-        urls: Список URL для парсинга
-        headless: Headless режим
-        cache: Cache instance
-        region: Регион
-        max_concurrent: Макс параллельных запросов (снижено до 3 для избежания rate limiting)
-        max_retries: Максимум повторов для каждого URL
+        total_found: Сколько URL отправлено на детальный парсинг
+        parse_results: Результаты парсинга
 
     Returns:
         Tuple: (список результатов парсинга, метрики качества)
     """
-    async def _run():
-        async with AsyncPlaywrightParser(
-            headless=headless,
-            cache=cache,
-            region=region,
-            max_concurrent=max_concurrent
-        ) as parser:
-            return await parser.parse_multiple_async(urls, max_retries=max_retries)
-
-    # Запускаем async код, обходя проблему с running event loop
-    try:
-        # Проверяем есть ли активный event loop
-        asyncio.get_running_loop()
-        # Есть активный loop - запускаем в отдельном потоке
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(asyncio.run, _run())
-            parse_results: List[ParseResult] = future.result()
-    except RuntimeError:
-        # Нет активного loop - можем использовать asyncio.run() напрямую
-        parse_results: List[ParseResult] = asyncio.run(_run())
-
     # Конвертируем ParseResult в dict для обратной совместимости
     results_data = []
     for pr in parse_results:
@@ -616,7 +648,7 @@ def parse_multiple_urls_parallel(
 
     # Собираем метрики качества
     quality_metrics = {
-        'total_found': len(urls),
+        'total_found': total_found,
         'successfully_parsed': sum(1 for pr in parse_results if pr.ok),
         'parse_failed': sum(1 for pr in parse_results if not pr.ok),
         'total_retries': sum(pr.retries_used for pr in parse_results),
@@ -630,3 +662,796 @@ def parse_multiple_urls_parallel(
                 quality_metrics['error_breakdown'].get(pr.error_type, 0) + 1
 
     return results_data, quality_metrics
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# ПОСТОЯННЫЙ СЕРВИС ПАРСИНГА (один event loop и прогретый браузер на процесс)
+# ═══════════════════════════════════════════════════════════════════════
+
+class AsyncParsingService:
+    """
+    Долгоживущий фоновый сервис async парсинга
+
+    Один поток с event loop владеет AsyncPlaywrightParser: браузер запускается
+    при первой задаче и остается прогретым между запросами (закрывается после
+    idle_timeout без работы). Sync-код (Flask handlers, RQ) отдает URL и
+    получает concurrent.futures.Future с ParseResult.
+
+    Очередь ограничена max_queue задачами: при заполнении submit() ждет
+    освобождения места до queue_timeout и затем бросает ParserOverloadedError.
+
+    Кроме детального парсинга сервис отдает сырой HTML страниц (fetch_page):
+    так sync-парсеры в фоновых потоках загружают страницы прогретым браузером
+    сервиса, не запуская свой.
+
+    Пример:
+        service = get_async_parsing_service(cache=cache)
+        futures = service.submit_batch(urls)
+        results = service.parse_many(urls)   # то же, с ожиданием
+        html = service.fetch_page(search_url)
+    """
+
+    # Период проверки простоя браузера (секунды)
+    IDLE_CHECK_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        headless: bool = True,
+        cache=None,
+        region: str = 'spb',
+        max_concurrent: int = 5,
+        max_queue: int = 100,
+        queue_timeout: float = 10.0,
+        idle_timeout: float = 300.0,
+        parser_factory: Optional[Callable[[], 'AsyncPlaywrightParser']] = None
+    ):
+        """
+        Args:
+            headless: Headless режим
+            cache: PropertyCache instance
+            region: Регион
+            max_concurrent: Макс параллельных загрузок в браузере
+            max_queue: Макс задач в очереди и в работе
+            queue_timeout: Сколько submit() ждет места в очереди (секунды)
+            idle_timeout: Закрыть браузер после простоя (секунды, 0 - держать всегда)
+            parser_factory: Фабрика async парсера (для тестов)
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.idle_timeout = idle_timeout
+        self._parser_factory = parser_factory or (lambda: AsyncPlaywrightParser(
+            headless=headless,
+            cache=cache,
+            region=region,
+            max_concurrent=max_concurrent
+        ))
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._parser = None
+        self._parser_lock: Optional[asyncio.Lock] = None
+        self._job_slots: Optional[asyncio.Semaphore] = None
+        self._active_jobs = 0
+        self._last_activity = time.monotonic()
+        self._pending: set = set()
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'cancelled': 0,
+            'rejected': 0,
+            'browser_starts': 0,
+            'browser_idle_stops': 0,
+        }
+
+    # ─────────────────────────────────────────────────────────────────
+    # Жизненный цикл
+    # ─────────────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Запуск потока с event loop (браузер стартует при первой задаче)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._parser_lock = asyncio.Lock()
+            self._job_slots = asyncio.Semaphore(self.max_concurrent)
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                name='async-parsing-service',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        if self.idle_timeout > 0:
+            self._loop.create_task(self._idle_watch())
+        self._loop.run_forever()
+
+        # Остановка: отменяем фоновые задачи (idle watcher), чтобы закрыть loop чисто
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+    def close(self, timeout: float = 30.0):
+        """Отмена задач, закрытие браузера и остановка event loop"""
+        with self._lock:
+            if not self._thread:
+                return
+            thread, loop = self._thread, self._loop
+            pending = list(self._pending)
+
+        for future in pending:
+            future.cancel()
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop_parser(), loop).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Error closing async parsing service: {e}")
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            # Закрыть работающий loop нельзя - оставляем его daemon-потоку
+            logger.warning(f"Async parsing service loop did not stop within {timeout}s")
+        else:
+            loop.close()
+        with self._lock:
+            self._thread = None
+            self._loop = None
+
+    async def _stop_parser(self):
+        async with self._parser_lock:
+            if self._parser is not None:
+                parser, self._parser = self._parser, None
+                await parser.close()
+
+    async def _ensure_parser(self):
+        async with self._parser_lock:
+            browser = getattr(self._parser, 'browser', None)
+            if self._parser is not None and browser is not None and not browser.is_connected():
+                logger.warning("Async parsing service: browser disconnected, restarting")
+                parser, self._parser = self._parser, None
+                try:
+                    await parser.close()
+                except Exception as e:
+                    logger.debug(f"Error closing disconnected browser: {e}")
+
+            if self._parser is None:
+                parser = self._parser_factory()
+                await parser.start()
+                self._parser = parser
+                self.stats['browser_starts'] += 1
+            return self._parser
+
+    async def _idle_watch(self):
+        """Закрыть браузер после idle_timeout без задач (память между всплесками)"""
+        while True:
+            await asyncio.sleep(min(self.IDLE_CHECK_INTERVAL, self.idle_timeout))
+            idle = time.monotonic() - self._last_activity
+            if self._parser is not None and self._active_jobs == 0 and idle >= self.idle_timeout:
+                logger.info(f"Async parsing service idle for {idle:.0f}s, closing browser")
+                await self._stop_parser()
+                self.stats['browser_idle_stops'] += 1
+
+    # ─────────────────────────────────────────────────────────────────
+    # Задачи
+    # ─────────────────────────────────────────────────────────────────
+
+    def _check_not_cancelled(self, handle: list):
+        # Future мог быть отменен до первого шага задачи: без этой проверки
+        # задача без точек ожидания успела бы отработать до доставки отмены
+        with self._lock:
+            future = handle[0] if handle else None
+        if future is None or future.cancelled():
+            raise asyncio.CancelledError()
+
+    async def _job(self, handle: list, url: str, max_retries: int, timeout_per_url: float) -> ParseResult:
+        self._check_not_cancelled(handle)
+
+        self._active_jobs += 1
+        self._last_activity = time.monotonic()
+        try:
+            try:
+                parser = await self._ensure_parser()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Failed to start async parser: {e}")
+                return ParseResult(
+                    url=url,
+                    ok=False,
+                    data={'url': url, 'title': 'Ошибка парсинга'},
+                    error_type='parse_error',
+                    error_message=str(e)
+                )
+            # timeout_per_url отсчитывается с начала загрузки, а не с постановки в очередь
+            async with self._job_slots:
+                return await parser._parse_with_timeout(url, timeout_per_url, max_retries)
+        finally:
+            self._active_jobs -= 1
+            self._last_activity = time.monotonic()
+
+    async def _fetch_job(self, handle: list, url: str, timeout: float) -> str:
+        self._check_not_cancelled(handle)
+
+        self._active_jobs += 1
+        self._last_activity = time.monotonic()
+        try:
+            parser = await self._ensure_parser()
+            context = await parser._acquire_context()
+            healthy = False
+            try:
+                html = await asyncio.wait_for(parser._fetch_page_content(url, context), timeout=timeout)
+                healthy = True
+                return html
+            finally:
+                await parser._release_context(context, healthy)
+        finally:
+            self._active_jobs -= 1
+            self._last_activity = time.monotonic()
+
+    def submit(
+        self,
+        url: str,
+        max_retries: int = 2,
+        timeout_per_url: float = 45,
+        queue_timeout: Optional[float] = None
+    ) -> concurrent.futures.Future:
+        """
+        Поставить URL в очередь парсинга
+
+        Args:
+            url: URL объявления
+            max_retries: Максимум повторов
+            timeout_per_url: Timeout парсинга (секунды)
+            queue_timeout: Ожидание места в очереди (None - self.queue_timeout)
+
+        Returns:
+            Future с ParseResult (отмена future отменяет загрузку)
+
+        Raises:
+            ParserOverloadedError: Очередь заполнена дольше queue_timeout
+        """
+        return self._enqueue(
+            url, queue_timeout, lambda handle: self._job(handle, url, max_retries, timeout_per_url)
+        )
+
+    def submit_fetch(
+        self,
+        url: str,
+        timeout: float = 60,
+        queue_timeout: Optional[float] = None
+    ) -> concurrent.futures.Future:
+        """
+        Поставить в очередь загрузку HTML страницы (без разбора)
+
+        Returns:
+            Future с HTML (исключение загрузки - в future)
+
+        Raises:
+            ParserOverloadedError: Очередь заполнена дольше queue_timeout
+        """
+        return self._enqueue(url, queue_timeout, lambda handle: self._fetch_job(handle, url, timeout))
+
+    def fetch_page(self, url: str, timeout: float = 60) -> Optional[str]:
+        """Загрузить HTML страницы браузером сервиса и дождаться результата (sync)"""
+        future = self.submit_fetch(url, timeout)
+        try:
+            return future.result(timeout=timeout + self.queue_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Page fetch timed out after {timeout}s: {url[:60]}")
+
+    def _enqueue(self, url: str, queue_timeout: Optional[float], make_job) -> concurrent.futures.Future:
+        self.start()
+
+        wait = self.queue_timeout if queue_timeout is None else queue_timeout
+        if not self._slots.acquire(timeout=wait):
+            with self._lock:
+                self.stats['rejected'] += 1
+            logger.warning(f"Async parsing queue is full ({self.max_queue}), rejecting {url[:60]}")
+            raise ParserOverloadedError(self.max_queue)
+
+        handle = []
+        with self._lock:
+            try:
+                future = asyncio.run_coroutine_threadsafe(make_job(handle), self._loop)
+            except BaseException:
+                self._slots.release()
+                raise
+            handle.append(future)
+            self.stats['submitted'] += 1
+            self._pending.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: concurrent.futures.Future):
+        self._slots.release()
+        with self._lock:
+            self._pending.discard(future)
+            if future.cancelled():
+                self.stats['cancelled'] += 1
+            else:
+                self.stats['completed'] += 1
+
+    def submit_batch(self, urls: List[str], max_retries: int = 2, timeout_per_url: float = 45) -> List[concurrent.futures.Future]:
+        """
+        Поставить пачку URL (все или ничего)
+
+        Raises:
+            ParserOverloadedError: Если вся пачка не поместилась - поставленные отменяются
+        """
+        futures = []
+        try:
+            for url in urls:
+                futures.append(self.submit(url, max_retries, timeout_per_url))
+        except ParserOverloadedError:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    def parse_many(
+        self,
+        urls: List[str],
+        max_retries: int = 2,
+        timeout_per_url: float = 45,
+        timeout: Optional[float] = None
+    ) -> List[ParseResult]:
+        """
+        Распарсить URL и дождаться результатов (sync)
+
+        Задачи выполняются волнами по max_concurrent, поэтому общее ожидание
+        по умолчанию растет с размером пачки.
+
+        Args:
+            timeout: Общее ожидание (None - timeout_per_url на каждую волну
+                с запасом на запуск браузера и очередь)
+
+        Returns:
+            ParseResult для каждого URL в исходном порядке
+        """
+        if not urls:
+            return []
+
+        futures = self.submit_batch(urls, max_retries, timeout_per_url)
+        if timeout is not None:
+            total_timeout = timeout
+        else:
+            waves = math.ceil(len(urls) / self.max_concurrent)
+            total_timeout = timeout_per_url * (waves + 1) + self.queue_timeout
+        concurrent.futures.wait(futures, timeout=total_timeout)
+
+        results = []
+        for url, future in zip(urls, futures):
+            if future.done() and not future.cancelled():
+                results.append(future.result())
+                continue
+            future.cancel()
+            results.append(ParseResult(
+                url=url,
+                ok=False,
+                data={'url': url, 'title': 'Timeout при парсинге'},
+                error_type='timeout',
+                error_message=f'Превышено время ожидания ({total_timeout}s)'
+            ))
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['queued'] = len(self._pending)
+        stats.update({
+            'max_queue': self.max_queue,
+            'running': self.running,
+            'browser_running': self._parser is not None,
+            'active_jobs': self._active_jobs,
+        })
+        return stats
+
+
+_services: Dict[tuple, AsyncParsingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_async_parsing_service(cache=None, headless: bool = True) -> AsyncParsingService:
+    """
+    Общий для процесса сервис async парсинга (параметры очереди - из настроек)
+
+    После fork (gunicorn --preload) дочерний процесс создает свой сервис:
+    поток event loop родителя в нем не существует.
+    """
+    key = (os.getpid(), id(cache), headless)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            from ..config import get_settings
+            settings = get_settings()
+            service = _services[key] = AsyncParsingService(
+                headless=headless,
+                cache=cache,
+                max_concurrent=settings.PARSER_DETAIL_CONCURRENCY,
+                max_queue=settings.ASYNC_PARSER_MAX_QUEUE,
+                queue_timeout=settings.ASYNC_PARSER_QUEUE_TIMEOUT,
+                idle_timeout=settings.ASYNC_PARSER_IDLE_TIMEOUT,
+            )
+        return service
+
+
+def shutdown_async_parsing_services():
+    """Остановить сервисы текущего процесса (atexit)"""
+    with _services_lock:
+        services = [s for (pid, _, _), s in _services.items() if pid == os.getpid()]
+        _services.clear()
+    for service in services:
+        service.close(timeout=10.0)
+
+
+atexit.register(shutdown_async_parsing_services)
+
+
+def parse_multiple_urls_parallel(
+    urls: List[str],
+    headless: bool = True,
+    cache=None,
+    region: str = 'spb',
+    max_concurrent: int = 3,
+    max_retries: int = 2
+) -> tuple[List[Dict], Dict]:
+    """
+    Sync обертка для параллельного парсинга (для использования в Flask)
+
+    Парсинг идет в общем для процесса AsyncParsingService: браузер не
+    запускается заново на каждый вызов.
+
+    Args:
+        urls: Список URL для парсинга
+        headless: Headless режим
+        cache: Cache instance
+        region: Не используется (детальный парсинг не зависит от региона)
+        max_concurrent: Не используется (параллелизм сервиса - PARSER_DETAIL_CONCURRENCY)
+        max_retries: Максимум повторов для каждого URL
+
+    Returns:
+        Tuple: (список результатов парсинга, метрики качества)
+
+    Raises:
+        ParserOverloadedError: Очередь сервиса заполнена
+    """
+    service = get_async_parsing_service(cache=cache, headless=headless)
+    parse_results = service.parse_many(urls, max_retries=max_retries)
+    return summarize_parse_results(len(urls), parse_results)
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# ПОТОКОВЫЙ ДЕТАЛЬНЫЙ ПАРСИНГ (параллельно с каскадным поиском)
+# ═══════════════════════════════════════════════════════════════════════
+
+class StreamingDetailParser:
+    """
+    Пул детального парсинга, который работает параллельно с каскадным поиском
+
+    Каскад search_similar() отдает карточки каждого уровня через submit(),
+    а детальный парсинг карточек без цены/площади сразу ставится в
+    AsyncParsingService (общий для процесса, с прогретым браузером). Браузер
+    запускается лениво - только если хотя бы одной карточке нужен детальный
+    парсинг.
+
+    Ранняя остановка: как только набрано `limit` аналогов с полными данными
+    (price + total_area), новые URL не ставятся в очередь, а ожидающие
+    задачи отменяются. Флаг satisfied можно передать в каскад как should_stop.
+
+    Пример:
+        with StreamingDetailParser(limit=20, cache=cache) as pipeline:
+            similar = parser.search_similar(target, on_results=pipeline.submit,
+                                            should_stop=lambda: pipeline.satisfied)
+            detailed, quality = pipeline.collect([c['url'] for c in similar])
+    """
+
+    def __init__(
+        self,
+        limit: int = 20,
+        headless: bool = True,
+        cache=None,
+        region: str = 'spb',
+        max_concurrent: int = 3,
+        max_retries: int = 2,
+        timeout_per_url: float = 45,
+        parser_factory: Optional[Callable[[], 'AsyncPlaywrightParser']] = None,
+        on_complete: Optional[Callable[[Dict], None]] = None,
+        service: Optional[AsyncParsingService] = None
+    ):
+        """
+        Args:
+            limit: Сколько аналогов с полными данными достаточно для ранней остановки
+            headless: Headless режим
+            cache: PropertyCache instance
+            region: Регион
+            max_concurrent: Макс параллельных запросов (только для собственного сервиса)
+            max_retries: Максимум повторов для каждого URL
+            timeout_per_url: Timeout для каждого URL (секунды)
+            parser_factory: Фабрика async парсера (для тестов) - пул получает
+                собственный сервис и закрывает его в close()
+            on_complete: Callback для каждого аналога с полными данными - из поиска
+                или после детального парсинга (вызывается из потока поиска или event loop).
+                Получает копию: исходную карточку дальше меняет поток поиска
+            service: Сервис парсинга (по умолчанию - общий для процесса)
+        """
+        self.limit = limit
+        self.max_retries = max_retries
+        self.timeout_per_url = timeout_per_url
+        self.on_complete = on_complete
+
+        self._owns_service = service is None and parser_factory is not None
+        if self._owns_service:
+            service = AsyncParsingService(
+                headless=headless,
+                cache=cache,
+                region=region,
+                max_concurrent=max_concurrent,
+                idle_timeout=0,
+                parser_factory=parser_factory
+            )
+        self._service = service
+        self._cache = cache
+        self._headless = headless
+
+        # RLock: done-callback может вызваться синхронно внутри submit()/cancel()
+        self._lock = threading.RLock()
+        self._started = False
+
+        self._futures: Dict[str, concurrent.futures.Future] = {}
+        self._cards: Dict[str, Dict] = {}
+        self._results: Dict[str, ParseResult] = {}
+        self._complete_urls: set = set()
+        self._seen_urls: set = set()
+        self._required_urls: set = set()
+
+        self.stats = {
+            'submitted': 0,
+            'complete_from_search': 0,
+            'scheduled': 0,
+            'parsed': 0,
+            'cancelled': 0,
+            'overloaded': 0,
+            'early_stopped': False,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ─────────────────────────────────────────────────────────────────
+    # Жизненный цикл
+    # ─────────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Подключение к сервису парсинга (браузер стартует лениво)"""
+        if self._started:
+            return
+        if self._service is None:
+            self._service = get_async_parsing_service(cache=self._cache, headless=self._headless)
+        self._service.start()
+        self._started = True
+
+    def close(self, timeout: float = 30.0):
+        """
+        Отмена незавершенных задач
+
+        Общий сервис (и его прогретый браузер) продолжает работать,
+        собственный сервис закрывается.
+        """
+        if not self._started:
+            return
+
+        with self._lock:
+            pending = [f for f in self._futures.values() if not f.done()]
+        for future in pending:
+            future.cancel()
+
+        if self._owns_service:
+            self._service.close(timeout=timeout)
+        self._started = False
+
+    # ─────────────────────────────────────────────────────────────────
+    # Прием результатов поиска
+    # ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _is_complete(data: Dict) -> bool:
+        return bool(data.get('price') and data.get('total_area'))
+
+    @property
+    def satisfied(self) -> bool:
+        """Набрано ли `limit` аналогов с полными данными"""
+        with self._lock:
+            return len(self._complete_urls) >= self.limit
+
+    def submit(self, comparables: List[Dict]) -> int:
+        """
+        Принять карточки очередного уровня поиска
+
+        Карточки с ценой и площадью засчитываются сразу, для остальных
+        ставится детальный парсинг (если лимит еще не набран).
+
+        Returns:
+            Количество URL, поставленных в очередь детального парсинга
+        """
+        if not self._started:
+            raise RuntimeError("StreamingDetailParser is not started")
+
+        scheduled = 0
+        completed = []
+        with self._lock:
+            for comparable in comparables:
+                url = comparable.get('url')
+                if not url or url in self._seen_urls:
+                    continue
+                self._seen_urls.add(url)
+                self._cards[url] = comparable
+                self.stats['submitted'] += 1
+
+                if self._is_complete(comparable):
+                    self._complete_urls.add(url)
+                    self.stats['complete_from_search'] += 1
+                    completed.append(comparable)
+                    continue
+
+                if len(self._complete_urls) >= self.limit:
+                    continue
+
+                self._schedule_locked(url)
+                scheduled += 1
+
+            self._check_satisfied_locked()
+
+        for comparable in completed:
+            self._notify_complete(comparable)
+
+        return scheduled
+
+    def _notify_complete(self, comparable: Dict):
+        if not self.on_complete:
+            return
+        try:
+            # Снимок: карточку в _cards позже дополняет дедупликация в потоке поиска
+            self.on_complete(dict(comparable))
+        except Exception as e:
+            logger.warning(f"on_complete callback failed: {e}")
+
+    def _schedule_locked(self, url: str):
+        # Под блокировкой пула место в очереди не ждем: при перегрузке URL
+        # сразу получает неудачный результат, аналог остается с данными карточки
+        try:
+            future = self._service.submit(
+                url, self.max_retries, self.timeout_per_url, queue_timeout=0
+            )
+        except ParserOverloadedError as e:
+            self._results[url] = ParseResult(
+                url=url,
+                ok=False,
+                data={'url': url, 'title': 'Ошибка парсинга'},
+                error_type='overloaded',
+                error_message=e.message
+            )
+            self.stats['overloaded'] += 1
+            return
+        self._futures[url] = future
+        self.stats['scheduled'] += 1
+        future.add_done_callback(lambda f, u=url: self._on_done(u, f))
+
+    def _on_done(self, url: str, future: concurrent.futures.Future):
+        with self._lock:
+            if self._futures.get(url) is not future:
+                return
+            if future.cancelled():
+                del self._futures[url]
+                self.stats['cancelled'] += 1
+                return
+
+            result = future.result()
+            self._results[url] = result
+            self.stats['parsed'] += 1
+            completed = None
+            if result.ok and self._is_complete(result.data):
+                self._complete_urls.add(url)
+                completed = {**self._cards.get(url, {}), **result.data}
+            self._check_satisfied_locked()
+
+        if completed is not None:
+            self._notify_complete(completed)
+
+    def _check_satisfied_locked(self):
+        """Ранняя остановка: лимит набран - отменяем ожидающие задачи"""
+        if len(self._complete_urls) < self.limit:
+            return
+        pending = [
+            f for u, f in self._futures.items()
+            if not f.done() and u not in self._required_urls
+        ]
+        if pending and not self.stats['early_stopped']:
+            logger.info(
+                f"⏹️ {len(self._complete_urls)} complete comparables collected, "
+                f"cancelling {len(pending)} pending detail parses"
+            )
+        self.stats['early_stopped'] = True
+        for future in pending:
+            future.cancel()
+
+    # ─────────────────────────────────────────────────────────────────
+    # Сбор результатов
+    # ─────────────────────────────────────────────────────────────────
+
+    def collect(self, urls: List[str], timeout: Optional[float] = None) -> tuple[List[Dict], Dict]:
+        """
+        Дождаться детального парсинга для итогового списка аналогов
+
+        URL, не попавшие в итоговый список, отменяются. URL из списка, которые
+        еще не парсились (или были отменены ранней остановкой), ставятся в очередь.
+
+        Args:
+            urls: URL итоговых аналогов, которым нужны детальные данные
+            timeout: Общий timeout ожидания (секунды)
+
+        Returns:
+            Tuple: (список результатов парсинга, метрики качества) -
+            тот же формат, что у parse_multiple_urls_parallel()
+        """
+        wanted = list(dict.fromkeys(u for u in urls if u))
+
+        with self._lock:
+            self._required_urls.update(wanted)
+            for url, future in list(self._futures.items()):
+                if url not in self._required_urls and not future.done():
+                    future.cancel()
+            for url in wanted:
+                self._seen_urls.add(url)
+                if url not in self._futures and url not in self._results:
+                    self._schedule_locked(url)
+            futures = [self._futures[url] for url in wanted if url in self._futures]
+
+        concurrent.futures.wait(futures, timeout=timeout)
+
+        parse_results = []
+        for url in wanted:
+            future = self._futures.get(url)
+            if future is not None and future.done() and not future.cancelled():
+                parse_results.append(future.result())
+            elif url in self._results:
+                parse_results.append(self._results[url])
+            else:
+                if future is not None:
+                    future.cancel()
+                parse_results.append(ParseResult(
+                    url=url,
+                    ok=False,
+                    data={'url': url, 'title': 'Timeout при парсинге'},
+                    error_type='timeout',
+                    error_message=f'Превышено время ожидания ({timeout}s)'
+                ))
+
+        results_data, quality_metrics = summarize_parse_results(len(wanted), parse_results)
+        quality_metrics['streaming'] = self.get_stats()
+        return results_data, quality_metrics
+
+    def get_stats(self) -> Dict:
+        """Статистика потокового парсинга"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['complete'] = len(self._complete_urls)
+            stats['in_flight'] = sum(1 for f in self._futures.values() if not f.done())
+        return stats
@@ -3,22 +3,95 @@
 """
 
 import json
-import time
+import hashlib
 import logging
 import re
 from typing import Optional, Dict, List
+from urllib.parse import urlsplit, parse_qsl
 from abc import ABC, abstractmethod
 from bs4 import BeautifulSoup
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import requests
 
 # Импортируем исключения из единого места
-from ..exceptions import ParsingError
+from ..exceptions import ParsingError, CaptchaError, ContentBlockedError
+from ..cache.single_flight import get_single_flight
+from ..cache.rate_limiter import get_rate_limiter
+from .cian_state import parse_offer_state, state_text
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def search_query_hash(url: str) -> str:
+    """
+    Канонический хэш поискового запроса (ключ кэша результатов поиска)
+
+    Учитываются хост, путь и набор параметров без учета их порядка:
+    один и тот же поиск, собранный разными уровнями каскада, дает один ключ.
+
+    Args:
+        url: URL страницы поиска (cat.php?...)
+
+    Returns:
+        sha256 hex
+    """
+    parts = urlsplit(url)
+    params = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    canonical = json.dumps([parts.netloc.lower(), parts.path, params], ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def check_for_captcha_or_block(html: str, url: str) -> None:
+    """
+    Проверяет HTML на наличие капчи или блокировки.
+    Вызывает исключение если обнаружена проблема.
+
+    Args:
+        html: HTML контент страницы
+        url: URL для диагностики
+
+    Raises:
+        CaptchaError: если страница содержит активную капчу
+        ContentBlockedError: если контент заблокирован
+    """
+    html_lower = html.lower()
+
+    # Признаки активной капчи (не просто наличие скрипта, а блокирующей капчи)
+    captcha_blocking_signs = [
+        'g-recaptcha' in html_lower and 'offertitle' not in html_lower,
+        'captcha-form' in html_lower,
+        'please verify you are human' in html_lower,
+        'подтвердите, что вы не робот' in html_lower,
+        'пройдите проверку' in html_lower and 'offertitle' not in html_lower,
+    ]
+
+    if any(captcha_blocking_signs):
+        logger.warning(f"Обнаружена блокирующая капча для {url}")
+        raise CaptchaError(url)
+
+    # Признаки блокировки доступа
+    block_signs = [
+        'доступ заблокирован' in html_lower,
+        'access denied' in html_lower,
+        'доступ запрещен' in html_lower,
+        'вы заблокированы' in html_lower,
+    ]
+
+    if any(block_signs):
+        logger.warning(f"Обнаружена блокировка доступа для {url}")
+        raise ContentBlockedError(url, reason="access_denied")
+
+    # Проверка на пустую страницу (есть HTML но нет контента)
+    content_indicators = ['offertitle', 'offerprice', 'application/ld+json']
+    has_content = any(ind in html_lower for ind in content_indicators)
+
+    if not has_content and len(html) > 10000:
+        # Большая страница без контента - возможно редирект или ошибка
+        logger.warning(f"Страница загружена ({len(html)} bytes) но контент не найден: {url}")
+        raise ContentBlockedError(url, reason="no_content_found")
+
+
 class BaseCianParser(ABC):
     """
     Базовый класс для всех парсеров Cian
@@ -40,12 +113,19 @@ class BaseCianParser(ABC):
         self.delay = delay
         self.base_url = "https://www.cian.ru"
         self.cache = cache
+        # Общий бюджет запросов к домену для всех воркеров (см. rate_limiter)
+        self.rate_limiter = get_rate_limiter(cache)
         self.stats = {
             'requests': 0,
             'errors': 0,
             'retries': 0,
             'cache_hits': 0,
-            'cache_misses': 0
+            'cache_misses': 0,
+            'search_cache_hits': 0,
+            'search_cache_misses': 0,
+            'state_parsed': 0,
+            'html_fallback': 0,
+            'pacing_seconds': 0.0
         }
 
     @abstractmethod
@@ -79,9 +159,9 @@ class BaseCianParser(ABC):
             requests.RequestException: После 3 неудачных попыток
         """
         self.stats['requests'] += 1
+        self.rate_limiter.acquire(url)
         response = requests.get(url, timeout=30, **kwargs)
         response.raise_for_status()
-        time.sleep(self.delay)
         return response
 
     def _extract_json_ld(self, soup: BeautifulSoup) -> Optional[Dict]:
@@ -471,10 +551,18 @@ class BaseCianParser(ABC):
             soup: BeautifulSoup объект страницы
             data: Словарь с данными (модифицируется in-place)
         """
-
         # Получаем полный текст страницы для анализа
         page_text = soup.get_text(separator=' ', strip=True).lower()
+        self._detect_premium_features(page_text, data)
+
+    def _detect_premium_features(self, page_text: str, data: Dict) -> None:
+        """
+        Премиум-характеристики по тексту страницы, описанию и characteristics
 
+        Args:
+            page_text: Текст страницы в нижнем регистре (или текст встроенного состояния)
+            data: Словарь с данными (модифицируется in-place)
+        """
         # Получаем описание объекта
         description = data.get('description', '').lower() if data.get('description') else ''
 
@@ -687,6 +775,15 @@ class BaseCianParser(ABC):
             else:
                 self.stats['cache_misses'] += 1
 
+        # Одновременные запросы того же URL (другие потоки/воркеры) ждут одну загрузку
+        return get_single_flight(self.cache).do(
+            url,
+            lambda: self._parse_detail_page_uncached(url),
+            lookup=(lambda: self.cache.get_property(url)) if self.cache else None
+        )
+
+    def _parse_detail_page_uncached(self, url: str) -> Dict:
+        """Загрузка и парсинг детальной страницы (без проверки кэша)"""
         logger.info(f"Парсинг детальной страницы: {url}")
 
         try:
@@ -694,48 +791,15 @@ class BaseCianParser(ABC):
             if not html:
                 raise ParsingError(f"Не удалось получить контент: {url}")
 
-            soup = BeautifulSoup(html, 'lxml')
-
-            data = {
-                'url': url,
-                'title': None,
-                'price': None,
-                'price_raw': None,
-                'currency': None,
-                'description': None,
-                'address': None,
-                'residential_complex': None,
-                'residential_complex_url': None,  # Ссылка на страницу ЖК
-                'metro': [],
-                'characteristics': {},
-                'images': [],
-                'seller': {},
-            }
-
-            # JSON-LD данные (приоритет)
-            json_ld = self._extract_json_ld(soup)
-            if json_ld:
-                logger.info("Using JSON-LD data")
-                data['title'] = json_ld.get('name')
-
-                offers = json_ld.get('offers', {})
-                if offers:
-                    data['price_raw'] = offers.get('price')
-                    data['currency'] = offers.get('priceCurrency')
-                    if data['price_raw']:
-                        data['price'] = data['price_raw']
-
-            # Дополняем из HTML
-            data = self._extract_basic_info(soup, data)
-            data['characteristics'] = self._extract_characteristics(soup)
-            data['images'] = self._extract_images(soup)
-            data['seller'] = self._extract_seller_info(soup)
-
-            # Извлекаем ключевые поля из characteristics в корень для удобства
-            self._promote_key_fields(data)
-
-            # Извлекаем премиум-характеристики
-            self._extract_premium_features(soup, data)
+            # Быстрый путь: встроенное состояние страницы, без построения DOM
+            data = parse_offer_state(html, url)
+            if data is not None:
+                self.stats['state_parsed'] += 1
+                self._promote_key_fields(data)
+                self._detect_premium_features(state_text(data), data)
+            else:
+                self.stats['html_fallback'] += 1
+                data = self._parse_detail_html(html, url)
 
             logger.info(f"Успешно спарсен: {data.get('title', 'Без названия')}")
 
@@ -758,6 +822,53 @@ class BaseCianParser(ABC):
             logger.error(f"Ошибка при парсинге {url}: {e}", exc_info=True)
             raise ParsingError(f"Ошибка парсинга: {e}") from e
 
+    def _parse_detail_html(self, html: str, url: str) -> Dict:
+        """Разбор детальной страницы через BeautifulSoup (fallback без встроенного состояния)"""
+        soup = BeautifulSoup(html, 'lxml')
+
+        data = {
+            'url': url,
+            'title': None,
+            'price': None,
+            'price_raw': None,
+            'currency': None,
+            'description': None,
+            'address': None,
+            'residential_complex': None,
+            'residential_complex_url': None,  # Ссылка на страницу ЖК
+            'metro': [],
+            'characteristics': {},
+            'images': [],
+            'seller': {},
+        }
+
+        # JSON-LD данные (приоритет)
+        json_ld = self._extract_json_ld(soup)
+        if json_ld:
+            logger.info("Using JSON-LD data")
+            data['title'] = json_ld.get('name')
+
+            offers = json_ld.get('offers', {})
+            if offers:
+                data['price_raw'] = offers.get('price')
+                data['currency'] = offers.get('priceCurrency')
+                if data['price_raw']:
+                    data['price'] = data['price_raw']
+
+        # Дополняем из HTML
+        data = self._extract_basic_info(soup, data)
+        data['characteristics'] = self._extract_characteristics(soup)
+        data['images'] = self._extract_images(soup)
+        data['seller'] = self._extract_seller_info(soup)
+
+        # Извлекаем ключевые поля из characteristics в корень для удобства
+        self._promote_key_fields(data)
+
+        # Извлекаем премиум-характеристики
+        self._extract_premium_features(soup, data)
+
+        return data
+
     def get_stats(self) -> Dict:
         """Получить статистику работы парсера"""
         return self.stats.copy()
@@ -768,5 +879,11 @@ class BaseCianParser(ABC):
             'requests': 0,
             'errors': 0,
             'retries': 0,
-            'cache_hits': 0
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'search_cache_hits': 0,
+            'search_cache_misses': 0,
+            'state_parsed': 0,
+            'html_fallback': 0,
+            'pacing_seconds': 0.0
         }
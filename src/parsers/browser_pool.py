@@ -11,20 +11,32 @@ Features:
 - Переиспользование браузеров
 - Автоматическая очистка при ошибках
 - Thread-safe операции с блокировками
+- Честная (FIFO) очередь ожидания на condition variable, без polling
+- Запуск Chromium вне блокировки пула
+- Прогретые браузеры (min_warm) и утилизация устаревших при acquire()
+  и release() в потоке, запустившем Playwright (sync API привязан к потоку)
+- Гистограмма времени ожидания acquire() в get_stats()
+- Общий для парсеров контроллер адаптивных пауз (pool.pacing)
 """
 
 import logging
 import threading
 import time
-from typing import Optional, List, Dict
+from collections import deque
+from typing import Optional, List, Dict, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 from playwright.sync_api import sync_playwright, Browser, BrowserContext
 
 from ..config import get_settings
+from .resource_policy import get_resource_policy
+from .pacing import create_pacing_controller
 
 logger = logging.getLogger(__name__)
 
+# Границы корзин гистограммы времени ожидания acquire() (мс)
+WAIT_HISTOGRAM_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
 
 @dataclass
 class BrowserInstance:
@@ -47,8 +59,12 @@ class BrowserPool:
     - Предотвращает утечки памяти
     - Защищает от DoS атак через парсинг
 
+    Ожидающие потоки обслуживаются строго по очереди (FIFO): освободившийся
+    браузер получает тот, кто ждет дольше всех. Запуск нового Chromium
+    происходит вне блокировки, слот под него резервируется заранее.
+
     Usage:
-        pool = BrowserPool(max_browsers=5)
+        pool = BrowserPool(max_browsers=5, min_warm=1)
         pool.start()
 
         browser, context = pool.acquire()
@@ -67,20 +83,28 @@ class BrowserPool:
         max_age_seconds: int = 3600,  # 1 час
         headless: bool = True,
         block_resources: bool = True,
-        proxy_config: Optional[Dict] = None
+        proxy_config: Optional[Dict] = None,
+        min_warm: int = 0,
+        recycle_interval: float = 60.0
     ):
         """
         Args:
             max_browsers: Максимальное количество браузеров в пуле
             max_age_seconds: Максимальный возраст браузера (секунды)
             headless: Запускать браузеры в headless режиме
-            block_resources: Блокировать ненужные ресурсы (картинки, шрифты)
+            block_resources: Блокировать ненужные ресурсы (см. resource_policy)
             proxy_config: Конфигурация прокси (если None - берётся из settings)
+            min_warm: Сколько свободных браузеров держать запущенными заранее
+            recycle_interval: Минимальный период обслуживания пула (секунды):
+                утилизация устаревших и дозапуск min_warm выполняются в acquire()
+                и release() потока-владельца не чаще раза за период, 0 - при каждом вызове
         """
         self.max_browsers = max_browsers
         self.max_age_seconds = max_age_seconds
         self.headless = headless
         self.block_resources = block_resources
+        self.min_warm = max(0, min(min_warm, max_browsers))
+        self.recycle_interval = recycle_interval
 
         # Получаем прокси из настроек если не передан явно
         if proxy_config is None:
@@ -92,15 +116,34 @@ class BrowserPool:
         self.playwright = None
         self.browsers: List[BrowserInstance] = []
         self.lock = threading.Lock()  # Thread-safety
+        self._available = threading.Condition(self.lock)
+        self._waiters: deque = deque()  # FIFO очередь ожидающих acquire()
+        self._launching = 0  # Слоты, зарезервированные под запускаемые браузеры
+
+        # Риск блокировок, общий для всех парсеров пула (см. pacing)
+        self.pacing = create_pacing_controller()
+
+        # Обслуживание: объекты sync API Playwright можно трогать только
+        # из потока, запустившего Playwright (владельца пула)
+        self._owner_thread: Optional[threading.Thread] = None
+        self._last_maintenance = 0.0
 
         # Метрики
         self.total_acquisitions = 0
         self.total_releases = 0
         self.total_created = 0
         self.total_destroyed = 0
+        self.total_timeouts = 0
+        self._wait_buckets = [0] * (len(WAIT_HISTOGRAM_BUCKETS_MS) + 1)
+        self._wait_count = 0
+        self._wait_sum_ms = 0.0
+        self._wait_max_ms = 0.0
 
         proxy_info = f", proxy={self.proxy_config['server']}" if self.proxy_config else ""
-        logger.info(f"Browser Pool initialized: max_browsers={max_browsers}, headless={headless}{proxy_info}")
+        logger.info(
+            f"Browser Pool initialized: max_browsers={max_browsers}, min_warm={self.min_warm}, "
+            f"headless={headless}{proxy_info}"
+        )
 
     def start(self):
         """Запуск Playwright (необходимо перед использованием)"""
@@ -111,11 +154,16 @@ class BrowserPool:
         try:
             logger.info("Starting Playwright...")
             self.playwright = sync_playwright().start()
+            self._owner_thread = threading.current_thread()
             logger.info("✓ Playwright started")
         except Exception as e:
             logger.error(f"Failed to start Playwright: {e}")
             raise
 
+        # Прогреваем браузеры до первого запроса
+        self._ensure_warm()
+        self._last_maintenance = time.monotonic()
+
     def _create_browser(self) -> BrowserInstance:
         """Создает новый инстанс браузера"""
         if not self.playwright:
@@ -160,13 +208,11 @@ class BrowserPool:
 
             # Блокируем ненужные ресурсы
             if self.block_resources:
-                context.route(
-                    "**/*.{png,jpg,jpeg,gif,svg,webp,woff,woff2,ttf,mp4,mp3,pdf}",
-                    lambda route: route.abort()
-                )
+                get_resource_policy().attach(context)
 
             instance = BrowserInstance(browser=browser, context=context)
-            self.total_created += 1
+            with self.lock:
+                self.total_created += 1
 
             logger.info(f"✓ Browser instance created (total created: {self.total_created})")
             return instance
@@ -193,7 +239,8 @@ class BrowserPool:
             except Exception as e:
                 errors.append(f"Browser: {e}")
 
-        self.total_destroyed += 1
+        with self.lock:
+            self.total_destroyed += 1
 
         if errors:
             logger.warning(f"Errors during browser cleanup: {'; '.join(errors)}")
@@ -216,10 +263,14 @@ class BrowserPool:
 
         return False
 
-    def acquire(self, timeout: float = 30.0) -> tuple[Browser, BrowserContext]:
+    def acquire(self, timeout: float = 30.0) -> Tuple[Browser, BrowserContext]:
         """
         Получить браузер из пула
 
+        Ожидающие вызовы обслуживаются в порядке очереди. Если свободных
+        браузеров нет, но есть место в пуле - новый браузер запускается
+        вне блокировки, остальные ожидающие при этом не блокируются.
+
         Args:
             timeout: Максимальное время ожидания (секунды)
 
@@ -229,51 +280,120 @@ class BrowserPool:
         Raises:
             TimeoutError: если не удалось получить браузер за timeout секунд
         """
-        start_time = time.time()
+        self._maintain()
 
-        while True:
-            with self.lock:
-                # Ищем свободный браузер
-                for instance in self.browsers:
-                    if not instance.in_use and not self._is_browser_stale(instance):
-                        instance.in_use = True
-                        instance.last_used = datetime.now()
-                        instance.use_count += 1
-                        self.total_acquisitions += 1
-
-                        logger.info(
-                            f"Browser acquired from pool "
-                            f"(in_use: {sum(1 for b in self.browsers if b.in_use)}/{len(self.browsers)}, "
-                            f"use_count: {instance.use_count})"
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+        ticket = object()
+        stale: List[BrowserInstance] = []
+        instance: Optional[BrowserInstance] = None
+
+        with self._available:
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    if self._waiters[0] is ticket:
+                        instance = self._take_free_locked(stale)
+                        if instance is not None:
+                            break
+
+                        # Резервируем слот и запускаем браузер вне блокировки
+                        if len(self.browsers) + self._launching < self.max_browsers:
+                            self._launching += 1
+                            break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.total_timeouts += 1
+                        raise TimeoutError(
+                            f"Failed to acquire browser within {timeout}s. "
+                            f"Pool is full ({self.max_browsers} browsers all in use)"
                         )
-                        return instance.browser, instance.context
-
-                # Если все браузеры заняты, но есть место для нового
-                if len(self.browsers) < self.max_browsers:
-                    instance = self._create_browser()
-                    instance.in_use = True
-                    instance.use_count = 1
-                    self.browsers.append(instance)
-                    self.total_acquisitions += 1
-
-                    logger.info(f"New browser created (pool size: {len(self.browsers)}/{self.max_browsers})")
-                    return instance.browser, instance.context
-
-                # Очищаем устаревшие браузеры
-                stale_browsers = [b for b in self.browsers if not b.in_use and self._is_browser_stale(b)]
-                for stale in stale_browsers:
-                    self._destroy_browser(stale)
-                    self.browsers.remove(stale)
-
-            # Проверка таймаута
-            if time.time() - start_time > timeout:
-                raise TimeoutError(
-                    f"Failed to acquire browser within {timeout}s. "
-                    f"Pool is full ({self.max_browsers} browsers all in use)"
-                )
-
-            # Ждем перед следующей попыткой
-            time.sleep(0.5)
+                    self._available.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                # Следующий в очереди может проверить пул
+                self._available.notify_all()
+
+        self._destroy_many(stale)
+
+        if instance is None:
+            instance = self._launch_reserved(in_use=True)
+
+        self._record_wait((time.monotonic() - start_time) * 1000)
+        return instance.browser, instance.context
+
+    def _take_free_locked(self, stale: List[BrowserInstance]) -> Optional[BrowserInstance]:
+        """
+        Взять свободный браузер (вызывать под self.lock)
+
+        Устаревшие свободные браузеры убираются из пула и складываются
+        в stale - закрывать их нужно уже вне блокировки.
+        """
+        for candidate in list(self.browsers):
+            if candidate.in_use:
+                continue
+            if self._is_browser_stale(candidate):
+                self.browsers.remove(candidate)
+                stale.append(candidate)
+                continue
+
+            candidate.in_use = True
+            candidate.last_used = datetime.now()
+            candidate.use_count += 1
+            self.total_acquisitions += 1
+
+            logger.info(
+                f"Browser acquired from pool "
+                f"(in_use: {sum(1 for b in self.browsers if b.in_use)}/{len(self.browsers)}, "
+                f"use_count: {candidate.use_count})"
+            )
+            return candidate
+        return None
+
+    def _launch_reserved(self, in_use: bool) -> BrowserInstance:
+        """Запустить браузер в заранее зарезервированный слот (вне блокировки)"""
+        try:
+            instance = self._create_browser()
+        except Exception:
+            with self._available:
+                self._launching -= 1
+                self._available.notify_all()
+            raise
+
+        with self._available:
+            self._launching -= 1
+            if in_use:
+                instance.in_use = True
+                instance.use_count = 1
+                self.total_acquisitions += 1
+            self.browsers.append(instance)
+            self._available.notify_all()
+            logger.info(f"New browser created (pool size: {len(self.browsers)}/{self.max_browsers})")
+
+        return instance
+
+    def _destroy_many(self, instances: List[BrowserInstance]):
+        """Закрыть несколько браузеров (вне блокировки)"""
+        for instance in instances:
+            try:
+                self._destroy_browser(instance)
+            except Exception as e:
+                logger.error(f"Error destroying browser: {e}")
+
+    def _record_wait(self, wait_ms: float):
+        """Учесть время ожидания acquire() в гистограмме"""
+        bucket = len(WAIT_HISTOGRAM_BUCKETS_MS)
+        for index, bound in enumerate(WAIT_HISTOGRAM_BUCKETS_MS):
+            if wait_ms <= bound:
+                bucket = index
+                break
+
+        with self.lock:
+            self._wait_buckets[bucket] += 1
+            self._wait_count += 1
+            self._wait_sum_ms += wait_ms
+            self._wait_max_ms = max(self._wait_max_ms, wait_ms)
 
     def release(self, browser: Browser):
         """
@@ -282,43 +402,101 @@ class BrowserPool:
         Args:
             browser: Браузер для возврата
         """
-        with self.lock:
+        with self._available:
             for instance in self.browsers:
                 if instance.browser == browser:
                     instance.in_use = False
                     self.total_releases += 1
+                    self._available.notify_all()
 
                     logger.info(
                         f"Browser released to pool "
                         f"(in_use: {sum(1 for b in self.browsers if b.in_use)}/{len(self.browsers)})"
                     )
+                    break
+            else:
+                logger.warning("Attempted to release browser that's not in pool")
+                return
+
+        self._maintain()
+
+    def recycle_stale(self) -> int:
+        """
+        Утилизировать устаревшие свободные браузеры
+
+        Returns:
+            Количество закрытых браузеров
+        """
+        with self._available:
+            # Не забираем браузеры у ожидающих - они сами разберутся в acquire()
+            stale = [b for b in self.browsers if not b.in_use and self._is_browser_stale(b)]
+            for instance in stale:
+                self.browsers.remove(instance)
+            if stale:
+                self._available.notify_all()
+
+        self._destroy_many(stale)
+        return len(stale)
+
+    def _ensure_warm(self):
+        """Дозапустить браузеры, чтобы свободных было не меньше min_warm"""
+        while self.playwright:
+            with self._available:
+                free = sum(1 for b in self.browsers if not b.in_use) + self._launching
+                has_room = len(self.browsers) + self._launching < self.max_browsers
+                if free >= self.min_warm or not has_room:
                     return
+                self._launching += 1
+
+            try:
+                self._launch_reserved(in_use=False)
+            except Exception as e:
+                logger.warning(f"Failed to prestart warm browser: {e}")
+                return
+
+    def _maintain(self):
+        """
+        Утилизация устаревших и прогрев браузеров (из acquire() и release())
+
+        Выполняется только в потоке-владельце и не чаще recycle_interval.
+        """
+        if threading.current_thread() is not self._owner_thread:
+            return
+        now = time.monotonic()
+        if now - self._last_maintenance < self.recycle_interval:
+            return
+        self._last_maintenance = now
 
-            logger.warning("Attempted to release browser that's not in pool")
+        try:
+            recycled = self.recycle_stale()
+            if recycled:
+                logger.info(f"Recycled {recycled} stale browser(s)")
+            self._ensure_warm()
+        except Exception as e:
+            logger.error(f"Browser pool maintenance error: {e}")
 
     def shutdown(self):
         """Закрыть все браузеры и Playwright"""
         logger.info("Shutting down browser pool...")
 
-        with self.lock:
-            # Закрываем все браузеры
-            for instance in self.browsers:
-                try:
-                    self._destroy_browser(instance)
-                except Exception as e:
-                    logger.error(f"Error destroying browser during shutdown: {e}")
-
+        with self._available:
+            instances = list(self.browsers)
             self.browsers.clear()
+            self._available.notify_all()
 
-            # Закрываем Playwright
-            if self.playwright:
-                try:
-                    self.playwright.stop()
-                    logger.info("✓ Playwright stopped")
-                except Exception as e:
-                    logger.error(f"Error stopping Playwright: {e}")
-                finally:
-                    self.playwright = None
+        # Закрываем все браузеры
+        self._destroy_many(instances)
+
+        # Закрываем Playwright
+        if self.playwright:
+            try:
+                self.playwright.stop()
+                logger.info("✓ Playwright stopped")
+            except Exception as e:
+                logger.error(f"Error stopping Playwright: {e}")
+            finally:
+                self.playwright = None
+                self._owner_thread = None
 
         logger.info(
             f"Browser pool shutdown complete. "
@@ -329,15 +507,32 @@ class BrowserPool:
     def get_stats(self) -> dict:
         """Получить статистику пула"""
         with self.lock:
+            histogram = {
+                f"le_{bound}ms": count
+                for bound, count in zip(WAIT_HISTOGRAM_BUCKETS_MS, self._wait_buckets)
+            }
+            histogram['inf'] = self._wait_buckets[-1]
+
             return {
                 'pool_size': len(self.browsers),
                 'max_browsers': self.max_browsers,
+                'min_warm': self.min_warm,
                 'browsers_in_use': sum(1 for b in self.browsers if b.in_use),
                 'browsers_free': sum(1 for b in self.browsers if not b.in_use),
+                'browsers_launching': self._launching,
+                'waiters': len(self._waiters),
                 'total_created': self.total_created,
                 'total_destroyed': self.total_destroyed,
                 'total_acquisitions': self.total_acquisitions,
                 'total_releases': self.total_releases,
+                'total_timeouts': self.total_timeouts,
+                'wait_time_ms': {
+                    'count': self._wait_count,
+                    'avg': round(self._wait_sum_ms / self._wait_count, 2) if self._wait_count else 0,
+                    'max': round(self._wait_max_ms, 2),
+                    'histogram': histogram
+                },
+                'pacing': self.pacing.get_stats(),
                 'browsers': [
                     {
                         'in_use': b.in_use,
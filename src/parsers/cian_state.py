@@ -0,0 +1,283 @@
+"""
+Быстрый путь парсинга Циана: встроенное состояние страницы вместо DOM
+
+Циан встраивает данные страницы в скрипт:
+
+    window._cianConfig['frontend-offer-card'] =
+        (window._cianConfig['frontend-offer-card'] || []).concat([{"key": "defaultState", "value": {...}}, ...]);
+
+Здесь находится только этот JSON (str.find + json raw_decode, без построения
+DOM) и через FieldMapper ('cian_state') приводится к тем же полям, что отдает
+HTML-парсер. Если состояния нет или в нем нет цены/площади, функции
+возвращают None - вызывающий код откатывается на BeautifulSoup.
+"""
+
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from .field_mapper import get_field_mapper
+
+logger = logging.getLogger(__name__)
+
+OFFER_CARD_APP = 'frontend-offer-card'
+OFFER_CARD_STATE_KEY = 'defaultState'
+SERP_APP = 'frontend-serp'
+SERP_STATE_KEY = 'initialState'
+
+# Поиск .concat( не дальше этого расстояния от маркера приложения
+_CONCAT_SEARCH_WINDOW = 300
+
+_decoder = json.JSONDecoder()
+
+MATERIAL_NAMES = {
+    'monolith': 'Монолитный',
+    'monolithBrick': 'Монолитно-кирпичный',
+    'brick': 'Кирпичный',
+    'panel': 'Панельный',
+    'block': 'Блочный',
+    'wood': 'Деревянный',
+    'stalin': 'Сталинский',
+    'old': 'Старый фонд',
+}
+
+PARKING_NAMES = {
+    'underground': 'Подземная',
+    'multilevel': 'Многоуровневая',
+    'ground': 'Наземная',
+    'open': 'Открытая',
+    'roof': 'На крыше',
+}
+
+
+def _iter_config_items(html: str, app_name: str) -> Iterator[Dict[str, Any]]:
+    """Элементы {key, value} из всех window._cianConfig['<app>'].concat([...])"""
+    marker = f"window._cianConfig['{app_name}']"
+    pos = 0
+    while True:
+        start = html.find(marker, pos)
+        if start < 0:
+            return
+
+        concat = html.find('.concat(', start, start + _CONCAT_SEARCH_WINDOW)
+        if concat < 0:
+            pos = start + len(marker)
+            continue
+
+        try:
+            items, end = _decoder.raw_decode(html, concat + len('.concat('))
+        except ValueError as e:
+            logger.debug(f"Embedded state of {app_name} is not valid JSON: {e}")
+            pos = concat + 1
+            continue
+
+        pos = end
+        if isinstance(items, list):
+            for item in items:
+                if isinstance(item, dict):
+                    yield item
+
+
+def extract_config_value(html: str, app_name: str, key: str) -> Optional[Any]:
+    """
+    Значение встроенного состояния приложения Циана по ключу
+
+    Args:
+        html: HTML страницы
+        app_name: Имя фронтенд-приложения ('frontend-offer-card', 'frontend-serp')
+        key: Ключ элемента ('defaultState', 'initialState')
+
+    Returns:
+        Декодированное значение или None
+    """
+    if not html:
+        return None
+    for item in _iter_config_items(html, app_name):
+        if item.get('key') == key:
+            return item.get('value')
+    return None
+
+
+def _format_number(value: float) -> str:
+    """54.3 -> '54,3', 54.0 -> '54' (как на сайте)"""
+    return f"{value:g}".replace('.', ',')
+
+
+def compose_title(rooms: Any, total_area: Optional[float], floor: Optional[int],
+                  floor_total: Optional[int]) -> str:
+    """Заголовок в формате Циана: '2-комн. квартира, 54,3 м², 5/9 этаж'"""
+    if rooms == 'студия':
+        parts = ['Студия']
+    elif rooms:
+        parts = [f"{rooms}-комн. квартира"]
+    else:
+        parts = ['Квартира']
+
+    if total_area:
+        parts.append(f"{_format_number(total_area)} м²")
+    if floor and floor_total:
+        parts.append(f"{floor}/{floor_total} этаж")
+    elif floor:
+        parts.append(f"{floor} этаж")
+    return ', '.join(parts)
+
+
+def _measure(field: str, unit: str):
+    """Форматтер числового поля data: '54,3 м²'"""
+    return lambda offer, data: f"{_format_number(data[field])} {unit}" if data.get(field) else None
+
+
+def _counts(*fields):
+    """Форматтер счетчиков offer: '1 совмещенный, 1 раздельный'"""
+    def format_counts(offer, data):
+        return ', '.join(f"{offer[field]} {name}" for field, name in fields if offer.get(field)) or None
+    return format_counts
+
+
+def _floor(offer: Dict, data: Dict) -> Optional[str]:
+    if data.get('floor') and data.get('floor_total'):
+        return f"{data['floor']} из {data['floor_total']}"
+    return None
+
+
+def _building(offer: Dict) -> Dict:
+    return offer.get('building') or {}
+
+
+# (подпись на странице, форматтер(offer, data) -> значение или None), в порядке страницы
+CHARACTERISTICS = (
+    ('Общая площадь', _measure('total_area', 'м²')),
+    ('Жилая площадь', _measure('living_area', 'м²')),
+    ('Площадь кухни', _measure('kitchen_area', 'м²')),
+    ('Этаж', _floor),
+    ('Год постройки', lambda offer, data: str(data['build_year']) if data.get('build_year') else None),
+    ('Тип дома', lambda offer, data: MATERIAL_NAMES.get(_building(offer).get('materialType'))),
+    ('Высота потолков', _measure('ceiling_height', 'м')),
+    ('Ремонт', lambda offer, data: data.get('renovation')),
+    ('Санузел', _counts(('combinedWcsCount', 'совмещенный'), ('separateWcsCount', 'раздельный'))),
+    ('Балкон/лоджия', _counts(('balconiesCount', 'балкон'), ('loggiasCount', 'лоджия'))),
+    ('Парковка', lambda offer, data: PARKING_NAMES.get((_building(offer).get('parking') or {}).get('type'))),
+    ('Жилой комплекс', lambda offer, data: data.get('residential_complex')),
+)
+
+
+def _build_characteristics(offer: Dict, data: Dict) -> Dict[str, str]:
+    """Характеристики с теми же подписями, что на странице (для _promote_key_fields и премиум-признаков)"""
+    chars = {}
+    for label, formatter in CHARACTERISTICS:
+        value = formatter(offer, data)
+        if value:
+            chars[label] = value
+    return chars
+
+
+def state_text(data: Dict) -> str:
+    """Текст для поиска премиум-признаков (аналог текста страницы)"""
+    parts = [
+        data.get('title') or '',
+        data.get('description') or '',
+        data.get('address') or '',
+        data.get('residential_complex') or '',
+    ]
+    parts.extend(f"{k} {v}" for k, v in (data.get('characteristics') or {}).items())
+    return ' '.join(parts).lower()
+
+
+def parse_offer_state(html: str, url: str) -> Optional[Dict]:
+    """
+    Данные детальной страницы из встроенного состояния
+
+    Args:
+        html: HTML детальной страницы
+        url: URL объявления
+
+    Returns:
+        Словарь в формате BaseCianParser.parse_detail_page или None
+        (состояния нет / нет цены или площади - нужен HTML fallback)
+    """
+    state = extract_config_value(html, OFFER_CARD_APP, OFFER_CARD_STATE_KEY)
+    offer_data = state.get('offerData') if isinstance(state, dict) else None
+    offer = offer_data.get('offer') if isinstance(offer_data, dict) else None
+    if not isinstance(offer, dict):
+        return None
+
+    data = get_field_mapper('cian_state').transform(offer)
+    if not data.get('price') or not data.get('total_area'):
+        logger.debug(f"Embedded state without price/area, falling back to HTML: {url[:60]}")
+        return None
+
+    data['url'] = url
+    data.setdefault('price_raw', data['price'])
+    if data.get('floor_total'):
+        data['total_floors'] = data['floor_total']
+    data['title'] = compose_title(data.get('rooms'), data.get('total_area'),
+                                  data.get('floor'), data.get('floor_total'))
+
+    for key, default in (('description', None), ('address', None), ('residential_complex', None),
+                         ('residential_complex_url', None), ('metro', []), ('images', [])):
+        data.setdefault(key, default)
+
+    data['characteristics'] = _build_characteristics(offer, data)
+
+    agent = offer_data.get('agent') or {}
+    data['seller'] = {'name': agent['name']} if isinstance(agent, dict) and agent.get('name') else {}
+
+    return data
+
+
+def offer_to_search_card(offer: Dict, base_url: str = 'https://www.cian.ru') -> Dict:
+    """Оффер из состояния выдачи -> карточка в формате PlaywrightParser._parse_listing_card"""
+    data = get_field_mapper('cian_state').transform(offer)
+
+    price = data.get('price') or data.get('price_raw')
+    area = data.get('total_area')
+    rooms = data.get('rooms')
+    metro = data.get('metro') or []
+    images = data.get('images') or []
+
+    url = data.get('url')
+    if not url and offer.get('cianId'):
+        url = f"{base_url}/sale/flat/{offer['cianId']}/"
+
+    return {
+        'title': compose_title(rooms, area, data.get('floor'), data.get('floor_total')),
+        'price': f"{int(price):,}".replace(',', ' ') + ' ₽' if price else None,
+        'price_per_sqm': round(price / area) if price and area else None,
+        'price_raw': int(price) if price else None,
+        'address': data.get('address'),
+        'metro': metro[0] if metro else None,
+        'area': f"{_format_number(area)} м²" if area else None,
+        'area_value': area,
+        'rooms': str(rooms) if rooms else None,
+        'floor': data.get('floor'),
+        'renovation': data.get('renovation'),
+        'url': url,
+        'image_url': images[0] if images else None,
+    }
+
+
+def parse_serp_state(html: str, base_url: str = 'https://www.cian.ru') -> Optional[List[Dict]]:
+    """
+    Карточки выдачи из встроенного состояния
+
+    Returns:
+        Список карточек или None (состояния нет - нужен HTML fallback)
+    """
+    state = extract_config_value(html, SERP_APP, SERP_STATE_KEY)
+    results = state.get('results') if isinstance(state, dict) else None
+    offers = results.get('offers') if isinstance(results, dict) else None
+    if not isinstance(offers, list):
+        return None
+
+    cards = []
+    for offer in offers:
+        if not isinstance(offer, dict):
+            continue
+        try:
+            card = offer_to_search_card(offer, base_url)
+        except (TypeError, ValueError, ZeroDivisionError) as e:
+            logger.debug(f"Skip malformed offer in search state: {e}")
+            continue
+        if card['url']:
+            cards.append(card)
+    return cards
@@ -55,12 +55,15 @@ class FieldMapper:
     - Вычисляемые поля
     """
 
-    def __init__(self, source_name: str):
+    def __init__(self, source_name: str, passthrough: bool = True):
         """
         Args:
             source_name: Имя источника ('cian', 'domclick', и т.д.)
+            passthrough: Копировать немаппленные поля источника как есть
+                (False - для сырого JSON источника с посторонними полями)
         """
         self.source_name = source_name
+        self.passthrough = passthrough
         self.mappings = {}
         self.transformers = {}
         self.defaults = {}
@@ -151,9 +154,10 @@ class FieldMapper:
                 result[target_field] = default_value
 
         # Копируем поля, которые уже в стандартном формате
-        for key, value in source_data.items():
-            if key not in self.mappings and key not in result:
-                result[key] = value
+        if self.passthrough:
+            for key, value in source_data.items():
+                if key not in self.mappings and key not in result:
+                    result[key] = value
 
         # Вычисляем material_quality на основе количества фотографий
         if 'material_quality' not in result and 'images' in result:
@@ -193,6 +197,116 @@ def create_cian_mapper() -> FieldMapper:
     return mapper
 
 
+def _state_float(value):
+    return float(str(value).replace(',', '.')) if value not in (None, '') else None
+
+
+def _state_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+def _state_currency(value):
+    return 'RUB' if str(value).lower() in ('rur', 'rub') else str(value).upper()
+
+
+# Подстрока materialType -> тип дома (первое совпадение)
+_STATE_HOUSE_TYPES = (
+    ('monolith', 'монолит'),
+    ('brick', 'кирпич'),
+    ('panel', 'панель'),
+    ('block', 'панель'),
+)
+
+
+def _state_house_type(material):
+    """Тип дома из materialType"""
+    material = str(material).lower()
+    return next((house_type for key, house_type in _STATE_HOUSE_TYPES if key in material), None)
+
+
+def _state_address(address_items):
+    """Адрес из geo.address (без станций метро)"""
+    if not isinstance(address_items, list):
+        return None
+    parts = [
+        item.get('fullName') or item.get('name')
+        for item in address_items
+        if isinstance(item, dict) and item.get('type') != 'metro'
+    ]
+    return ', '.join(p for p in parts if p) or None
+
+
+def _state_metro(undergrounds):
+    """Станции метро из geo.undergrounds"""
+    if not isinstance(undergrounds, list):
+        return None
+    return [u['name'] for u in undergrounds if isinstance(u, dict) and u.get('name')]
+
+
+def _state_photos(photos):
+    """URL фотографий (до 30, как в HTML-парсере)"""
+    if not isinstance(photos, list):
+        return None
+    urls = [p.get('fullUrl') or p.get('thumbnailUrl') for p in photos if isinstance(p, dict)]
+    return [u for u in urls if u][:30]
+
+
+_STATE_REPAIR_TYPES = {
+    'no': 'Без ремонта',
+    'cosmetic': 'Косметический',
+    'euro': 'Евроремонт',
+    'design': 'Дизайнерский',
+}
+
+# (поле состояния, поле стандарта, трансформер, значение по умолчанию)
+CIAN_STATE_FIELDS = (
+    # Цена
+    ('bargainTerms.priceRur', 'price', _state_float, None),
+    ('bargainTerms.price', 'price_raw', _state_float, None),
+    ('bargainTerms.currency', 'currency', _state_currency, 'RUB'),
+    # Площади (Циан отдает строками: "54.3")
+    ('totalArea', 'total_area', _state_float, None),
+    ('livingArea', 'living_area', _state_float, None),
+    ('kitchenArea', 'kitchen_area', _state_float, None),
+    # Комнаты: flatType важнее roomsCount (у студии roomsCount бывает 1)
+    ('roomsCount', 'rooms', _state_int, None),
+    ('flatType', 'rooms', lambda x: 'студия' if x == 'studio' else None, None),
+    # Этаж
+    ('floorNumber', 'floor', _state_int, None),
+    ('building.floorsCount', 'floor_total', _state_int, None),
+    # Дом
+    ('building.buildYear', 'build_year', _state_int, None),
+    ('building.materialType', 'house_type', _state_house_type, None),
+    ('ceilingHeight', 'ceiling_height', _state_float, None),
+    # Адрес и метро
+    ('geo.address', 'address', _state_address, None),
+    ('geo.undergrounds', 'metro', _state_metro, None),
+    # ЖК
+    ('newbuilding.name', 'residential_complex',
+     lambda x: str(x).replace('ЖК ', '').replace('«', '').replace('»', '').strip(), None),
+    # Описание и фото
+    ('description', 'description', None, None),
+    ('photos', 'images', _state_photos, None),
+    ('fullUrl', 'url', None, None),
+    # Ремонт
+    ('repairType', 'renovation', _STATE_REPAIR_TYPES.get, None),
+)
+
+
+def create_cian_state_mapper() -> FieldMapper:
+    """
+    Создать маппер для встроенного состояния страницы Циана
+
+    Циан встраивает в страницу JSON объявления (window._cianConfig, offerData.offer
+    на карточке и results.offers на выдаче) - маппер переводит его поля
+    в стандартный формат без разбора DOM (см. CIAN_STATE_FIELDS)
+    """
+    mapper = FieldMapper('cian', passthrough=False)
+    for source_field, target_field, transformer, default in CIAN_STATE_FIELDS:
+        mapper.add_mapping(source_field, target_field, transformer=transformer, default=default)
+    return mapper
+
+
 def create_domclick_mapper() -> FieldMapper:
     """
     Создать маппер для Домклика
@@ -575,6 +689,8 @@ def get_field_mapper(source_name: str) -> FieldMapper:
     if source_name not in _mappers_cache:
         if source_name == 'cian':
             _mappers_cache[source_name] = create_cian_mapper()
+        elif source_name == 'cian_state':
+            _mappers_cache[source_name] = create_cian_state_mapper()
         elif source_name == 'domclick':
             _mappers_cache[source_name] = create_domclick_mapper()
         elif source_name == 'avito':
@@ -0,0 +1,202 @@
+"""
+Адаптивная имитация поведения человека при загрузке страниц браузером
+
+Паузы после goto, движения мыши и скроллинг стоят 6-9 секунд на страницу,
+даже если страница загрузилась мгновенно и антибот не активен. Контроллер
+считает недавние исходы загрузок (ok / captcha / blocked) по домену и прокси
+в скользящем окне и включает имитацию, только когда доля капч/блокировок
+превышает порог. Иначе парсер опирается на сигналы готовности страницы
+(wait_for_selector).
+
+Контроллер общий для парсеров одного BrowserPool (pool.pacing), без пула -
+общий для процесса (get_pacing_controller).
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Исходы загрузки страницы
+OUTCOME_OK = 'ok'
+OUTCOME_CAPTCHA = 'captcha'
+OUTCOME_BLOCKED = 'blocked'
+
+# Доля капч/блокировок в окне, начиная с которой включается имитация
+DEFAULT_RISK_THRESHOLD = 0.1
+# Скользящее окно наблюдений (секунды)
+DEFAULT_WINDOW_SECONDS = 600.0
+# Максимум хранимых исходов на ключ (домен, прокси)
+MAX_EVENTS_PER_KEY = 200
+
+# Ключ "любой прокси": риск домена в целом
+ANY_PROXY = '*'
+
+
+class PacingController:
+    """
+    Решение "имитировать ли человека" по наблюдаемому риску блокировки
+
+    Использование:
+        pacing = get_pacing_controller()
+        if pacing.should_simulate(url, proxy):
+            ...  # паузы, мышь, скроллинг
+        pacing.record(url, proxy, OUTCOME_OK)
+        pacing.record_page(pacing_seconds, simulated)
+    """
+
+    def __init__(
+        self,
+        risk_threshold: float = DEFAULT_RISK_THRESHOLD,
+        window_seconds: float = DEFAULT_WINDOW_SECONDS,
+        adaptive: bool = True
+    ):
+        """
+        Args:
+            risk_threshold: Доля капч/блокировок, при которой включается имитация
+            window_seconds: Окно наблюдений (секунды)
+            adaptive: False - имитировать всегда (старое поведение)
+        """
+        self.risk_threshold = risk_threshold
+        self.window_seconds = window_seconds
+        self.adaptive = adaptive
+
+        self._lock = threading.Lock()
+        self._events: Dict[Tuple[str, str], Deque[Tuple[float, str]]] = {}
+
+        self.stats = {
+            'pages': 0,
+            'simulated_pages': 0,
+            'pacing_seconds_total': 0.0,
+            'outcomes': {OUTCOME_OK: 0, OUTCOME_CAPTCHA: 0, OUTCOME_BLOCKED: 0},
+        }
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        host = (urlsplit(url).hostname or '').lower()
+        # Регионы (spb.cian.ru, msk.cian.ru) защищены одинаково
+        return '.'.join(host.split('.')[-2:]) if host else ''
+
+    def _prune(self, events: Deque[Tuple[float, str]], now: float):
+        while events and events[0][0] < now - self.window_seconds:
+            events.popleft()
+
+    def record(self, url: str, proxy: Optional[str], outcome: str):
+        """Запомнить исход загрузки страницы"""
+        domain = self._domain(url)
+        now = time.monotonic()
+        with self._lock:
+            keys = {(domain, ANY_PROXY), (domain, proxy or ANY_PROXY)}
+            for key in keys:
+                events = self._events.get(key)
+                if events is None:
+                    events = self._events[key] = deque(maxlen=MAX_EVENTS_PER_KEY)
+                events.append((now, outcome))
+                self._prune(events, now)
+            self.stats['outcomes'][outcome] = self.stats['outcomes'].get(outcome, 0) + 1
+
+    def block_risk(self, url: str, proxy: Optional[str] = None) -> float:
+        """Доля капч/блокировок в окне (максимум из оценки прокси и домена в целом)"""
+        domain = self._domain(url)
+        now = time.monotonic()
+        risk = 0.0
+        with self._lock:
+            for key in {(domain, ANY_PROXY), (domain, proxy or ANY_PROXY)}:
+                events = self._events.get(key)
+                if not events:
+                    continue
+                self._prune(events, now)
+                if events:
+                    bad = sum(1 for _, outcome in events if outcome != OUTCOME_OK)
+                    risk = max(risk, bad / len(events))
+        return risk
+
+    def should_simulate(self, url: str, proxy: Optional[str] = None) -> bool:
+        """Нужна ли имитация человека для этой загрузки"""
+        if not self.adaptive:
+            return True
+        return self.block_risk(url, proxy) >= self.risk_threshold
+
+    def record_page(self, pacing_seconds: float, simulated: bool):
+        """Стоимость пауз одной страницы (для статистики)"""
+        with self._lock:
+            self.stats['pages'] += 1
+            self.stats['pacing_seconds_total'] += pacing_seconds
+            if simulated:
+                self.stats['simulated_pages'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self.stats.update({
+                'pages': 0,
+                'simulated_pages': 0,
+                'pacing_seconds_total': 0.0,
+                'outcomes': {OUTCOME_OK: 0, OUTCOME_CAPTCHA: 0, OUTCOME_BLOCKED: 0},
+            })
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            risk_by_domain = {}
+            for (domain, proxy), events in self._events.items():
+                if proxy != ANY_PROXY:
+                    continue
+                self._prune(events, now)
+                if events:
+                    bad = sum(1 for _, outcome in events if outcome != OUTCOME_OK)
+                    risk_by_domain[domain] = round(bad / len(events), 3)
+
+            pages = self.stats['pages']
+            return {
+                'adaptive': self.adaptive,
+                'risk_threshold': self.risk_threshold,
+                'pages': pages,
+                'simulated_pages': self.stats['simulated_pages'],
+                'pacing_seconds_total': round(self.stats['pacing_seconds_total'], 3),
+                'pacing_seconds_per_page': round(self.stats['pacing_seconds_total'] / pages, 3) if pages else 0.0,
+                'outcomes': dict(self.stats['outcomes']),
+                'risk_by_domain': risk_by_domain,
+            }
+
+
+class PageTimer:
+    """Паузы имитации в рамках одной страницы (считает суммарную стоимость)"""
+
+    def __init__(self, simulate: bool):
+        self.simulate = simulate
+        self.seconds = 0.0
+
+    def pause(self, low: float, high: float):
+        """Случайная пауза [low, high] - только в режиме имитации"""
+        if not self.simulate:
+            return
+        delay = random.uniform(low, high)
+        time.sleep(delay)
+        self.seconds += delay
+
+
+_controller: Optional[PacingController] = None
+_controller_lock = threading.Lock()
+
+
+def create_pacing_controller() -> PacingController:
+    """Контроллер с параметрами из настроек"""
+    from ..config import get_settings
+    settings = get_settings()
+    return PacingController(
+        risk_threshold=settings.PACING_RISK_THRESHOLD,
+        window_seconds=settings.PACING_WINDOW_SECONDS,
+        adaptive=settings.PACING_ADAPTIVE,
+    )
+
+
+def get_pacing_controller() -> PacingController:
+    """Общий для процесса контроллер (для парсеров без BrowserPool)"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = create_pacing_controller()
+        return _controller
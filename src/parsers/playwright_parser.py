@@ -9,7 +9,12 @@ from functools import wraps
 from playwright.sync_api import sync_playwright, Page, Browser, BrowserContext
 from bs4 import BeautifulSoup
 
-from .base_parser import BaseCianParser
+from .base_parser import BaseCianParser, search_query_hash, check_for_captcha_or_block
+from .resource_policy import get_resource_policy
+from .pacing import (
+    PageTimer, get_pacing_controller, OUTCOME_OK, OUTCOME_CAPTCHA, OUTCOME_BLOCKED
+)
+from .cian_state import parse_serp_state
 from ..exceptions import CaptchaError, ContentBlockedError
 
 logger = logging.getLogger(__name__)
@@ -636,17 +641,24 @@ class PlaywrightParser(BaseCianParser):
         cache=None,
         region: str = 'spb',
         browser_pool=None,
-        proxy_config: Optional[Dict] = None
+        proxy_config: Optional[Dict] = None,
+        tiered_fetch: bool = False,
+        http_timeout: int = 15,
+        page_fetcher: Optional[Callable[[str], Optional[str]]] = None
     ):
         """
         Args:
             headless: Запускать браузер в фоновом режиме
             delay: Задержка между запросами
-            block_resources: Блокировать картинки/шрифты для ускорения
+            block_resources: Блокировать лишние ресурсы (см. resource_policy)
             cache: PropertyCache instance (опционально)
             region: Регион поиска ('spb' или 'msk')
             browser_pool: BrowserPool instance (опционально, рекомендуется для production)
             proxy_config: Конфигурация прокси {'server': 'http://host:port', 'username': '...', 'password': '...'}
+            tiered_fetch: Сначала HTTP (curl_cffi, httpx), браузер - только при неудаче
+            http_timeout: Таймаут HTTP-уровней (секунды)
+            page_fetcher: Внешняя загрузка HTML (url -> html) вместо своего браузера,
+                например AsyncParsingService.fetch_page; браузер тогда не запускается
         """
         super().__init__(delay, cache=cache)
         self.headless = headless
@@ -658,6 +670,10 @@ class PlaywrightParser(BaseCianParser):
         self.using_pool = browser_pool is not None
         self.proxy_config = proxy_config
         self._own_context = False  # Флаг: контекст создан нами (для прокси)
+        self.page_fetcher = page_fetcher
+        self.tiered_fetcher = self._build_tiered_fetcher(http_timeout) if tiered_fetch else None
+        # Риск блокировок общий для парсеров одного пула (см. pacing)
+        self.pacing = getattr(browser_pool, 'pacing', None) or get_pacing_controller()
 
         # Полный маппинг регионов на коды ЦИАН (получено из API ЦИАН)
         self.region_codes = {
@@ -872,12 +888,9 @@ class PlaywrightParser(BaseCianParser):
             Object.defineProperty(navigator, 'languages', { get: () => ['ru-RU', 'ru', 'en-US', 'en'] });
         """)
         
-        # Блокируем ненужные ресурсы для ускорения
+        # Блокируем ненужные ресурсы для ускорения (и экономии трафика прокси)
         if self.block_resources:
-            self.context.route(
-                "**/*.{png,jpg,jpeg,gif,svg,webp,woff,woff2,ttf,mp4,mp3,pdf}",
-                lambda route: route.abort()
-            )
+            get_resource_policy().attach(self.context)
         
         logger.info(f"✓ Контекст создан с прокси: {self.proxy_config.get('server', 'unknown')}")
 
@@ -886,6 +899,9 @@ class PlaywrightParser(BaseCianParser):
         if self.browser:
             logger.warning("Браузер уже запущен")
             return
+        if self.page_fetcher is not None:
+            # Страницы грузит внешний браузер - свой не нужен
+            return
 
         try:
             # Если используем browser pool, получаем браузер из пула
@@ -1050,12 +1066,9 @@ class PlaywrightParser(BaseCianParser):
                 });
             """)
 
-            # Блокируем ненужные ресурсы для ускорения
+            # Блокируем ненужные ресурсы для ускорения (и экономии трафика прокси)
             if self.block_resources:
-                self.context.route(
-                    "**/*.{png,jpg,jpeg,gif,svg,webp,woff,woff2,ttf,mp4,mp3,pdf}",
-                    lambda route: route.abort()
-                )
+                get_resource_policy().attach(self.context)
 
             logger.info("Браузер запущен и готов к работе")
 
@@ -1126,56 +1139,65 @@ class PlaywrightParser(BaseCianParser):
         else:
             logger.info("Браузер закрыт")
 
-    def _check_for_captcha_or_block(self, html: str, url: str) -> None:
-        """
-        Проверяет HTML на наличие капчи или блокировки.
-        Вызывает исключение если обнаружена проблема.
+    def get_stats(self) -> Dict:
+        """Статистика парсера + счетчики запросов/трафика браузера"""
+        stats = super().get_stats()
+        stats['resources'] = get_resource_policy().get_stats()
+        if self.tiered_fetcher is not None:
+            stats['tiers'] = self.tiered_fetcher.get_stats()
+        stats['pacing'] = self.pacing.get_stats()
+        stats['rate_limiter'] = self.rate_limiter.get_stats()
+        return stats
+
+    def _record_pacing(self, url: str, proxy_server: Optional[str], outcome: str, timer: Optional[PageTimer]):
+        """Исход загрузки и стоимость пауз страницы -> контроллер и статистика парсера"""
+        self.pacing.record(url, proxy_server, outcome)
+        if timer is not None:
+            self.pacing.record_page(timer.seconds, timer.simulate)
+            self.stats['pacing_seconds'] += timer.seconds
+
+    def _build_tiered_fetcher(self, http_timeout: int):
+        """HTTP-уровни + браузер парсера как последний уровень (см. tiered_strategy)"""
+        from .strategies.tiered_strategy import (
+            TieredFetchStrategy, CallableStrategy, http_tiers, get_tier_learner
+        )
 
-        Args:
-            html: HTML контент страницы
-            url: URL для диагностики
+        def browser_fetch(url: str, max_retries: int = 5, **kwargs) -> Optional[str]:
+            return self._get_browser_page_content(url, max_retries)
 
-        Raises:
-            CaptchaError: если страница содержит активную капчу
-            ContentBlockedError: если контент заблокирован
-        """
-        html_lower = html.lower()
-
-        # Признаки активной капчи (не просто наличие скрипта, а блокирующей капчи)
-        captcha_blocking_signs = [
-            'g-recaptcha' in html_lower and 'offertitle' not in html_lower,
-            'captcha-form' in html_lower,
-            'please verify you are human' in html_lower,
-            'подтвердите, что вы не робот' in html_lower,
-            'пройдите проверку' in html_lower and 'offertitle' not in html_lower,
+        # Браузерный уровень берет токен лимитера сам, на каждую попытку
+        tiers = http_tiers(http_timeout) + [
+            ('browser', lambda: CallableStrategy('browser', browser_fetch, rate_limited=True))
         ]
+        return TieredFetchStrategy(
+            tiers,
+            learner=get_tier_learner(),
+            validator=self._check_for_captcha_or_block,
+            rate_limiter=self.rate_limiter
+        )
 
-        if any(captcha_blocking_signs):
-            logger.warning(f"Обнаружена блокирующая капча для {url}")
-            raise CaptchaError(url)
+    def _check_for_captcha_or_block(self, html: str, url: str) -> None:
+        """Проверка HTML на капчу/блокировку (см. check_for_captcha_or_block)"""
+        check_for_captcha_or_block(html, url)
 
-        # Признаки блокировки доступа
-        block_signs = [
-            'доступ заблокирован' in html_lower,
-            'access denied' in html_lower,
-            'доступ запрещен' in html_lower,
-            'вы заблокированы' in html_lower,
-        ]
+    def _get_page_content(self, url: str, max_retries: int = 5) -> Optional[str]:
+        """
+        Получить HTML контент: через уровни HTTP -> браузер (tiered_fetch) или сразу браузером
 
-        if any(block_signs):
-            logger.warning(f"Обнаружена блокировка доступа для {url}")
-            raise ContentBlockedError(url, reason="access_denied")
+        Args:
+            url: URL для загрузки
+            max_retries: Максимальное количество попыток браузера
 
-        # Проверка на пустую страницу (есть HTML но нет контента)
-        content_indicators = ['offertitle', 'offerprice', 'application/ld+json']
-        has_content = any(ind in html_lower for ind in content_indicators)
+        Returns:
+            HTML контент или None
+        """
+        if self.tiered_fetcher is None:
+            return self._get_browser_page_content(url, max_retries)
 
-        if not has_content and len(html) > 10000:
-            # Большая страница без контента - возможно редирект или ошибка
-            logger.warning(f"Страница загружена ({len(html)} bytes) но контент не найден: {url}")
-            raise ContentBlockedError(url, reason="no_content_found")
+        from .strategies.tiered_strategy import proxy_url
+        return self.tiered_fetcher.fetch_content(url, max_retries=max_retries, proxy=proxy_url(self.proxy_config))
 
-    def _get_page_content(self, url: str, max_retries: int = 5) -> Optional[str]:
+    def _get_browser_page_content(self, url: str, max_retries: int = 5) -> Optional[str]:
         """
         Получить HTML контент через Playwright с retry логикой
 
@@ -1189,13 +1211,17 @@ class PlaywrightParser(BaseCianParser):
         Raises:
             Exception: После max_retries неудачных попыток загрузки
         """
+        if self.page_fetcher is not None:
+            return self.page_fetcher(url)
         if not self.context:
             raise RuntimeError("Браузер не запущен. Используйте with context или вызовите .start()")
 
         last_error = None
+        proxy_server = self.proxy_config.get('server') if self.proxy_config else None
 
         for attempt in range(1, max_retries + 1):
             page: Page = None
+            timer = None
             try:
                 # PATCH: Rate limiting - случайная задержка между запросами
                 if attempt > 1:
@@ -1235,31 +1261,36 @@ class PlaywrightParser(BaseCianParser):
 
                 logger.info(f"Загрузка страницы (попытка {attempt}/{max_retries}): {url}")
 
-                # Загружаем страницу
+                # Имитация человека - только при наблюдаемом риске блокировки (см. pacing)
+                timer = PageTimer(self.pacing.should_simulate(url, proxy_server))
+
+                # Загружаем страницу (токен общего бюджета запросов к домену)
+                self.rate_limiter.acquire(url, proxy_server)
                 page.goto(url, wait_until='domcontentloaded', timeout=30000)
 
                 # Случайная задержка для имитации человека
-                time.sleep(random.uniform(2.0, 4.0))
+                timer.pause(2.0, 4.0)
 
-                # Имитация движения мыши (защита от антибота)
-                try:
-                    page.mouse.move(random.randint(100, 300), random.randint(100, 300))
-                    time.sleep(random.uniform(0.3, 0.6))
-                    page.mouse.move(random.randint(400, 600), random.randint(200, 400))
-                    time.sleep(random.uniform(0.2, 0.5))
-                except:
-                    pass
+                if timer.simulate:
+                    # Имитация движения мыши (защита от антибота)
+                    try:
+                        page.mouse.move(random.randint(100, 300), random.randint(100, 300))
+                        timer.pause(0.3, 0.6)
+                        page.mouse.move(random.randint(400, 600), random.randint(200, 400))
+                        timer.pause(0.2, 0.5)
+                    except:
+                        pass
 
-                # Имитация скроллинга (защита от антибота)
-                try:
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight / 4)")
-                    time.sleep(random.uniform(0.8, 1.5))
-                    page.evaluate("window.scrollTo(0, 0)")
-                    time.sleep(random.uniform(0.5, 1.0))
-                except:
-                    pass
+                    # Имитация скроллинга (защита от антибота)
+                    try:
+                        page.evaluate("window.scrollTo(0, document.body.scrollHeight / 4)")
+                        timer.pause(0.8, 1.5)
+                        page.evaluate("window.scrollTo(0, 0)")
+                        timer.pause(0.5, 1.0)
+                    except:
+                        pass
 
-                # Ждем появления контента
+                # Ждем появления контента (сигнал готовности вместо фиксированных пауз)
                 try:
                     page.wait_for_selector(
                         'h1, [data-mark="OfferTitle"], script[type="application/ld+json"]',
@@ -1269,7 +1300,7 @@ class PlaywrightParser(BaseCianParser):
                     logger.warning(f"Селекторы не найдены, но продолжаем: {e}")
 
                 # Дополнительное ожидание для динамического контента
-                time.sleep(random.uniform(1.0, 2.0))
+                timer.pause(1.0, 2.0)
 
                 html = page.content()
 
@@ -1279,11 +1310,14 @@ class PlaywrightParser(BaseCianParser):
                 # Проверка на капчу/блокировку в HTML
                 self._check_for_captcha_or_block(html, url)
 
-                logger.info(f"Страница загружена ({len(html)} символов)")
+                self._record_pacing(url, proxy_server, OUTCOME_OK, timer)
+                logger.info(f"Страница загружена ({len(html)} символов, паузы {timer.seconds:.1f}с)")
                 return html
 
             except (CaptchaError, ContentBlockedError) as e:
                 # Специфичные ошибки капчи/блокировки - увеличиваем задержку
+                outcome = OUTCOME_CAPTCHA if isinstance(e, CaptchaError) else OUTCOME_BLOCKED
+                self._record_pacing(url, proxy_server, outcome, timer)
                 last_error = e
                 logger.warning(f"Попытка {attempt}/{max_retries}: {type(e).__name__}")
                 if attempt < max_retries:
@@ -1316,6 +1350,38 @@ class PlaywrightParser(BaseCianParser):
         return None
 
     def parse_search_page(self, url: str) -> List[Dict]:
+        """
+        Парсинг страницы с результатами поиска с кэшированием
+
+        Кэшируются распарсенные карточки (не HTML) по каноническому хэшу
+        параметров запроса - каждый уровень каскада search_similar
+        при повторном анализе того же объекта обходится без браузера.
+
+        Args:
+            url: URL страницы поиска
+
+        Returns:
+            Список словарей с данными объявлений
+        """
+        query_hash = search_query_hash(url)
+
+        if self.cache:
+            cached_results = self.cache.get_search_results(query_hash)
+            if cached_results is not None:
+                self.stats['search_cache_hits'] += 1
+                logger.info(f"Search cache HIT ({len(cached_results)} карточек): {url}")
+                return cached_results
+            self.stats['search_cache_misses'] += 1
+
+        listings = self._parse_search_page_uncached(url)
+
+        # Пустую выдачу не кэшируем: это может быть блокировка или сбой загрузки
+        if self.cache and listings:
+            self.cache.set_search_results(query_hash, listings)
+
+        return listings
+
+    def _parse_search_page_uncached(self, url: str) -> List[Dict]:
         """
         Парсинг страницы с результатами поиска с адаптивными селекторами
 
@@ -1332,6 +1398,14 @@ class PlaywrightParser(BaseCianParser):
             logger.warning("DEBUG: _get_page_content вернул пустой HTML")
             return []
 
+        # Быстрый путь: офферы из встроенного состояния выдачи, без DOM
+        listings = parse_serp_state(html, self.base_url)
+        if listings is not None:
+            self.stats['state_parsed'] += 1
+            logger.info(f"Успешно спарсено {len(listings)} объявлений из состояния страницы")
+            return listings
+
+        self.stats['html_fallback'] += 1
         soup = BeautifulSoup(html, 'lxml')
 
         # Используем адаптивные селекторы для поиска карточек
@@ -2644,7 +2718,37 @@ class PlaywrightParser(BaseCianParser):
 
         return filtered
 
-    def search_similar(self, target_property: Dict, limit: int = 20) -> List[Dict]:
+    def _emit_level_results(
+        self,
+        on_results: Optional[Callable[[List[Dict]], Any]],
+        batch: List[Dict]
+    ):
+        """Передать новые результаты уровня потребителю (потоковый детальный парсинг)"""
+        if not on_results or not batch:
+            return
+        try:
+            on_results(batch)
+        except Exception as e:
+            logger.warning(f"on_results callback failed: {e}")
+
+    @staticmethod
+    def _stop_requested(should_stop: Optional[Callable[[], bool]]) -> bool:
+        """Внешний сигнал ранней остановки каскада (например, лимит аналогов уже набран)"""
+        if not should_stop:
+            return False
+        try:
+            return bool(should_stop())
+        except Exception as e:
+            logger.warning(f"should_stop callback failed: {e}")
+            return False
+
+    def search_similar(
+        self,
+        target_property: Dict,
+        limit: int = 20,
+        on_results: Optional[Callable[[List[Dict]], Any]] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[Dict]:
         """
         Многоуровневый поиск похожих квартир (ДОРАБОТКА #5)
 
@@ -2655,6 +2759,9 @@ class PlaywrightParser(BaseCianParser):
         Args:
             target_property: Целевой объект с полями price, total_area, rooms, metro, address
             limit: максимальное количество результатов
+            on_results: Callback, получающий новые результаты сразу после каждого уровня
+                (для детального парсинга параллельно с поиском)
+            should_stop: Callback ранней остановки каскада между уровнями
 
         Returns:
             Список похожих объявлений
@@ -2729,6 +2836,7 @@ class PlaywrightParser(BaseCianParser):
                     logger.info(f"   УРОВЕНЬ 0: Нашли достаточно аналогов в ЖК ({len(results_level0)} шт.)")
                     validated_level0 = self._validate_and_prepare_results(results_level0, limit, target_property=target_property)
                     final_results.extend(validated_level0)
+                    self._emit_level_results(on_results, validated_level0)
                     logger.info(f"   УРОВЕНЬ 0 ЗАВЕРШЁН: {len(validated_level0)} аналогов из того же ЖК")
                     logger.info("=" * 80)
                     return final_results[:limit]
@@ -2738,6 +2846,7 @@ class PlaywrightParser(BaseCianParser):
                     if results_level0:
                         validated_level0 = self._validate_and_prepare_results(results_level0, limit, target_property=target_property)
                         final_results.extend(validated_level0)
+                        self._emit_level_results(on_results, validated_level0)
                         logger.info(f"   Добавлено {len(validated_level0)} аналогов из ЖК")
             except Exception as e:
                 logger.warning(f"   УРОВЕНЬ 0: Ошибка поиска по ЖК - {e}")
@@ -2749,6 +2858,11 @@ class PlaywrightParser(BaseCianParser):
         # Самый точный способ найти аналоги - по geo-id улицы от ЦИАН
         # URL вида: /kupit-1-komnatnuyu-kvartiru-moskva-proizvodstvennaya-ulica-021905
         # ═══════════════════════════════════════════════════════════════════════════
+        if final_results and self._stop_requested(should_stop):
+            logger.info(f"Получен сигнал остановки после уровня 0 ({len(final_results)} шт.)")
+            logger.info("=" * 80)
+            return final_results[:limit]
+
         street_url = target_property.get('street_url', '')
         if street_url and len(final_results) < self.PREFERRED_RESULTS_THRESHOLD:
             logger.info(f"🏠 УРОВЕНЬ 0.5: Поиск по улице (street_url)")
@@ -2773,10 +2887,12 @@ class PlaywrightParser(BaseCianParser):
                     existing_urls = {r.get('url') for r in final_results}
                     new_street_results = [r for r in validated_street if r.get('url') not in existing_urls]
                     final_results.extend(new_street_results)
+                    self._emit_level_results(on_results, new_street_results)
                     logger.info(f"   УРОВЕНЬ 0.5: Добавлено {len(new_street_results)} аналогов с той же улицы (близкие дома)")
 
                     # Если достаточно аналогов - можно завершать
-                    if len(final_results) >= self.PREFERRED_RESULTS_THRESHOLD:
+                    if (len(final_results) >= self.PREFERRED_RESULTS_THRESHOLD
+                            or self._stop_requested(should_stop)):
                         logger.info(f"Найдено достаточно аналогов ({len(final_results)} шт.), поиск завершен")
                         logger.info("=" * 80)
                         return final_results[:limit]
@@ -3105,11 +3221,12 @@ class PlaywrightParser(BaseCianParser):
         # Валидация и добавление
         validated_level1 = self._validate_and_prepare_results(filtered_level1, limit, target_property=target_property)
         final_results.extend(validated_level1)
+        self._emit_level_results(on_results, validated_level1)
         logger.info(f"   УРОВЕНЬ 1: Добавлено {len(validated_level1)} валидных аналогов")
         logger.info("")
 
         # Проверяем, достаточно ли аналогов
-        if len(final_results) >= self.PREFERRED_RESULTS_THRESHOLD:
+        if len(final_results) >= self.PREFERRED_RESULTS_THRESHOLD or self._stop_requested(should_stop):
             logger.info(f"Найдено достаточно аналогов ({len(final_results)} шт.), поиск завершен")
             logger.info("=" * 80)
             return final_results[:limit]
@@ -3137,7 +3254,8 @@ class PlaywrightParser(BaseCianParser):
 
                 for house_variant in nearby_houses:
                     # Прерываем если уже достаточно аналогов
-                    if len(final_results) + len(new_results_level15) >= self.PREFERRED_RESULTS_THRESHOLD:
+                    if (len(final_results) + len(new_results_level15) >= self.PREFERRED_RESULTS_THRESHOLD
+                            or self._stop_requested(should_stop)):
                         logger.info(f"   Достаточно аналогов, прерываем поиск по домам")
                         break
 
@@ -3154,10 +3272,13 @@ class PlaywrightParser(BaseCianParser):
                         validated_house = self._validate_and_prepare_results(
                             results_house, limit=3, target_property=target_property
                         )
+                        new_house_results = []
                         for r in validated_house:
                             if r.get('url') not in existing_urls:
-                                new_results_level15.append(r)
+                                new_house_results.append(r)
                                 existing_urls.add(r.get('url'))
+                        new_results_level15.extend(new_house_results)
+                        self._emit_level_results(on_results, new_house_results)
 
                 final_results.extend(new_results_level15)
                 logger.info(f"   УРОВЕНЬ 1.5: Проверено {houses_checked} домов, найдено в {houses_with_results}")
@@ -3168,7 +3289,7 @@ class PlaywrightParser(BaseCianParser):
                 logger.info("")
 
         # Проверяем после уровня 1.5
-        if len(final_results) >= self.PREFERRED_RESULTS_THRESHOLD:
+        if len(final_results) >= self.PREFERRED_RESULTS_THRESHOLD or self._stop_requested(should_stop):
             logger.info(f"Найдено достаточно аналогов ({len(final_results)} шт.), поиск завершен")
             logger.info("=" * 80)
             return final_results[:limit]
@@ -3191,7 +3312,8 @@ class PlaywrightParser(BaseCianParser):
 
                 for metro_station in nearby_metros[1:]:  # Пропускаем исходную станцию
                     # Прерываем если достаточно аналогов
-                    if len(final_results) + len(new_results_level16) >= self.PREFERRED_RESULTS_THRESHOLD:
+                    if (len(final_results) + len(new_results_level16) >= self.PREFERRED_RESULTS_THRESHOLD
+                            or self._stop_requested(should_stop)):
                         logger.info(f"   Достаточно аналогов, прерываем поиск по метро")
                         break
 
@@ -3207,10 +3329,13 @@ class PlaywrightParser(BaseCianParser):
                         validated_metro = self._validate_and_prepare_results(
                             metro_results[:5], limit=5, target_property=target_property
                         )
+                        new_metro_results = []
                         for r in validated_metro:
                             if r.get('url') not in existing_urls:
-                                new_results_level16.append(r)
+                                new_metro_results.append(r)
                                 existing_urls.add(r.get('url'))
+                        new_results_level16.extend(new_metro_results)
+                        self._emit_level_results(on_results, new_metro_results)
 
                 final_results.extend(new_results_level16)
                 logger.info(f"   УРОВЕНЬ 1.6: Добавлено {len(new_results_level16)} аналогов с соседних станций")
@@ -0,0 +1,290 @@
+"""
+Единая политика блокировки ресурсов для всех контекстов Playwright
+
+Прокси тарифицируется за трафик, а загрузка страницы - основная стоимость
+каждого аналога. Политика подключается к контексту через context.route()
+и решает по каждому запросу:
+
+1. Домен из allowlist - блокируется только по типу ресурса
+2. Домен из denylist (аналитика, реклама, карты, beacon'ы) - блокируется
+3. Тип ресурса из профиля страницы (search / detail / pdf) - блокируется
+
+Профиль определяется по URL страницы, с которой пришел запрос (выдача
+cat.php и детальная карточка нуждаются в разном), либо задается явно
+при подключении (например, 'pdf' для рендеринга отчетов).
+
+Счетчики запросов и байт общие для процесса и попадают в get_stats() парсеров.
+"""
+
+import fnmatch
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+# Аналитика, реклама, карты и beacon'ы: данным объявления не нужны
+DEFAULT_DENY_DOMAINS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'mc.yandex.ru',
+    'mc.yandex.com',
+    'an.yandex.ru',
+    'yabs.yandex.ru',
+    'ads.adfox.ru',
+    'adfox.ru',
+    'top-fwz1.mail.ru',
+    'top.mail.ru',
+    'ad.mail.ru',
+    'vk.com/rtrg',
+    'connect.facebook.net',
+    'facebook.com/tr',
+    'hotjar.com',
+    'criteo.com',
+    'criteo.net',
+    'sentry.io',
+    'api-maps.yandex.ru',
+    'static-maps.yandex.ru',
+    '*.maps.yandex.net',
+)
+
+# Собственные домены CIAN: блокируются только по типу ресурса
+DEFAULT_ALLOW_DOMAINS = (
+    'cian.ru',
+    'cian.site',
+)
+
+# Типы ресурсов, блокируемые по профилю страницы
+DEFAULT_PROFILE_BLOCKED_TYPES = {
+    # Выдача: нужны только HTML и скрипты с состоянием страницы
+    'search': ('image', 'media', 'font', 'stylesheet', 'texttrack', 'manifest'),
+    'detail': ('image', 'media', 'font', 'texttrack', 'manifest'),
+    # PDF-отчет: шрифты, стили и картинки нужны, режем только трекеры
+    'pdf': (),
+}
+
+
+def classify_page_url(url: str) -> str:
+    """Тип страницы по URL: 'search' (выдача/ЖК) или 'detail'"""
+    if not url:
+        return 'detail'
+    parts = urlsplit(url)
+    if parts.path.startswith('/cat.php') or parts.path.startswith('/kupit-') or parts.netloc.startswith('zhk-'):
+        return 'search'
+    return 'detail'
+
+
+def _parse_patterns(patterns: Iterable[str]) -> List[Tuple[str, str]]:
+    """'host[/path-prefix]' -> [(host_pattern, path_prefix)]"""
+    parsed = []
+    for pattern in patterns:
+        pattern = pattern.strip().lower()
+        if not pattern:
+            continue
+        host, sep, path = pattern.partition('/')
+        parsed.append((host, sep + path if sep else ''))
+    return parsed
+
+
+def _matches(patterns: List[Tuple[str, str]], host: str, path: str) -> bool:
+    for host_pattern, path_prefix in patterns:
+        if '*' in host_pattern or '?' in host_pattern:
+            host_ok = fnmatch.fnmatch(host, host_pattern)
+        else:
+            # Домен совпадает сам или как родительский (mc.yandex.ru -> *.mc.yandex.ru)
+            host_ok = host == host_pattern or host.endswith('.' + host_pattern)
+        if host_ok and (not path_prefix or path.startswith(path_prefix)):
+            return True
+    return False
+
+
+class ResourceCounters:
+    """Потокобезопасные счетчики запросов и полученных байт по профилям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._profiles: Dict[str, Dict[str, int]] = {}
+            self._blocked_by_type: Dict[str, int] = {}
+            self._blocked_by_domain = 0
+
+    def _profile(self, profile: str) -> Dict[str, int]:
+        if profile not in self._profiles:
+            self._profiles[profile] = {'allowed': 0, 'blocked': 0, 'bytes_received': 0}
+        return self._profiles[profile]
+
+    def record_request(self, profile: str, resource_type: str, reason: Optional[str]):
+        with self._lock:
+            counters = self._profile(profile)
+            if reason is None:
+                counters['allowed'] += 1
+            else:
+                counters['blocked'] += 1
+                if reason == 'domain':
+                    self._blocked_by_domain += 1
+                else:
+                    self._blocked_by_type[resource_type] = self._blocked_by_type.get(resource_type, 0) + 1
+
+    def record_bytes(self, profile: str, size: int):
+        with self._lock:
+            self._profile(profile)['bytes_received'] += size
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            by_profile = {name: dict(c) for name, c in self._profiles.items()}
+            allowed = sum(c['allowed'] for c in by_profile.values())
+            blocked = sum(c['blocked'] for c in by_profile.values())
+            return {
+                'requests': allowed + blocked,
+                'allowed': allowed,
+                'blocked': blocked,
+                'blocked_ratio': round(blocked / (allowed + blocked), 3) if allowed + blocked else 0.0,
+                'bytes_received': sum(c['bytes_received'] for c in by_profile.values()),
+                'blocked_by_type': dict(self._blocked_by_type),
+                'blocked_by_domain': self._blocked_by_domain,
+                'by_profile': by_profile,
+            }
+
+
+class ResourcePolicy:
+    """
+    Политика перехвата запросов Playwright
+
+    Использование:
+        policy = get_resource_policy()
+        policy.attach(context)                      # sync API, профиль по URL страницы
+        await policy.attach_async(context, 'pdf')   # async API, фиксированный профиль
+    """
+
+    def __init__(
+        self,
+        profile_blocked_types: Optional[Dict[str, Iterable[str]]] = None,
+        deny_domains: Iterable[str] = DEFAULT_DENY_DOMAINS,
+        allow_domains: Iterable[str] = DEFAULT_ALLOW_DOMAINS
+    ):
+        """
+        Args:
+            profile_blocked_types: Блокируемые типы ресурсов по профилям
+            deny_domains: Паттерны доменов, которые блокируются всегда ('host', '*.host', 'host/path')
+            allow_domains: Паттерны доменов, которые не блокируются по домену
+        """
+        profiles = profile_blocked_types or DEFAULT_PROFILE_BLOCKED_TYPES
+        self.profile_blocked_types = {name: frozenset(types) for name, types in profiles.items()}
+        self._deny = _parse_patterns(deny_domains)
+        self._allow = _parse_patterns(allow_domains)
+        self.counters = ResourceCounters()
+
+    def decide(self, url: str, resource_type: str, profile: str) -> Optional[str]:
+        """
+        Решение по запросу
+
+        Returns:
+            None - пропустить, 'domain' / 'type' - причина блокировки
+        """
+        # Сам документ не блокируем никогда
+        if resource_type == 'document':
+            return None
+
+        parts = urlsplit(url)
+        if parts.scheme in ('data', 'blob', 'about'):
+            return None
+        host = (parts.hostname or '').lower()
+
+        if not _matches(self._allow, host, parts.path) and _matches(self._deny, host, parts.path):
+            return 'domain'
+
+        blocked_types = self.profile_blocked_types.get(profile, self.profile_blocked_types.get('detail', ()))
+        if resource_type in blocked_types:
+            return 'type'
+        return None
+
+    @staticmethod
+    def _request_profile(request, profile: Optional[str]) -> str:
+        if profile:
+            return profile
+        if request.resource_type == 'document' and request.is_navigation_request():
+            return classify_page_url(request.url)
+        try:
+            page_url = request.frame.url
+        except Exception:
+            page_url = request.headers.get('referer', '')
+        return classify_page_url(page_url)
+
+    def _on_response(self, response, profile: Optional[str]):
+        try:
+            size = int(response.headers.get('content-length', 0))
+        except (TypeError, ValueError):
+            size = 0
+        if size:
+            self.counters.record_bytes(self._request_profile(response.request, profile), size)
+
+    def attach(self, context, profile: Optional[str] = None):
+        """
+        Подключить политику к sync BrowserContext
+
+        Args:
+            context: playwright.sync_api.BrowserContext
+            profile: Фиксированный профиль или None (по URL страницы)
+        """
+        def handler(route):
+            request = route.request
+            request_profile = self._request_profile(request, profile)
+            reason = self.decide(request.url, request.resource_type, request_profile)
+            self.counters.record_request(request_profile, request.resource_type, reason)
+            if reason:
+                route.abort()
+            else:
+                route.continue_()
+
+        context.route('**/*', handler)
+        context.on('response', lambda response: self._on_response(response, profile))
+
+    async def attach_async(self, context, profile: Optional[str] = None):
+        """Подключить политику к async BrowserContext (см. attach)"""
+        async def handler(route):
+            request = route.request
+            request_profile = self._request_profile(request, profile)
+            reason = self.decide(request.url, request.resource_type, request_profile)
+            self.counters.record_request(request_profile, request.resource_type, reason)
+            if reason:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route('**/*', handler)
+        context.on('response', lambda response: self._on_response(response, profile))
+
+    def get_stats(self) -> Dict:
+        """Счетчики запросов/байт (байты - по Content-Length, оценка снизу)"""
+        return self.counters.snapshot()
+
+
+_policy: Optional[ResourcePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_resource_policy() -> ResourcePolicy:
+    """Общая для процесса политика, собранная из настроек"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            from ..config import get_settings
+            settings = get_settings()
+            _policy = ResourcePolicy(
+                profile_blocked_types={
+                    'search': settings.RESOURCE_BLOCK_TYPES_SEARCH,
+                    'detail': settings.RESOURCE_BLOCK_TYPES_DETAIL,
+                    'pdf': DEFAULT_PROFILE_BLOCKED_TYPES['pdf'],
+                },
+                deny_domains=DEFAULT_DENY_DOMAINS + tuple(settings.RESOURCE_DENY_DOMAINS),
+                allow_domains=DEFAULT_ALLOW_DOMAINS + tuple(settings.RESOURCE_ALLOW_DOMAINS),
+            )
+        return _policy
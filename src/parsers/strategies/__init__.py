@@ -6,14 +6,19 @@
 - Browser-light (Playwright + Stealth)
 - Browser-heavy (Nodriver)
 - Proxy rotation
+- Tiered (HTTP сначала, браузер при неудаче)
 """
 
 from .curl_cffi_strategy import CurlCffiStrategy
 from .httpx_strategy import HttpxStrategy
 from .playwright_stealth_strategy import PlaywrightStealthStrategy
+from .tiered_strategy import TieredFetchStrategy, TierLearner, get_tier_learner
 
 __all__ = [
     'CurlCffiStrategy',
     'HttpxStrategy',
     'PlaywrightStealthStrategy',
+    'TieredFetchStrategy',
+    'TierLearner',
+    'get_tier_learner',
 ]
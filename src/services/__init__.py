@@ -13,6 +13,7 @@ from .validation import (
     extract_cian_id,
 )
 from .lambda_client import LambdaParserClient, get_lambda_client, lambda_client
+from .portfolio import PortfolioValuation, load_portfolio_items, stream_portfolio
 
 __all__ = [
     'TelegramNotifier',
@@ -25,4 +26,7 @@ __all__ = [
     'LambdaParserClient',
     'get_lambda_client',
     'lambda_client',
+    'PortfolioValuation',
+    'load_portfolio_items',
+    'stream_portfolio',
 ]
@@ -0,0 +1,465 @@
+"""
+Прогретый сервис рендеринга PDF-отчетов
+
+Раньше каждый /api/export-report запускал новый Chromium через
+asyncio.run(async_playwright()), ждал networkidle и еще 2 секунды на шрифты.
+PdfRenderer держит один браузер и небольшой пул страниц в фоновом потоке с
+event loop (как AsyncParsingService):
+
+- браузер запускается при первом отчете и закрывается после простоя;
+- параллельно рендерится не больше `pages` отчетов, очередь ограничена
+  max_queue (при заполнении - PDFRendererOverloadedError);
+- стили, картинки и шрифты из static/ встраиваются в HTML (inline_static_assets),
+  поэтому ожидание сети не нужно: достаточно события load и document.fonts.ready.
+
+Готовые PDF кэшируются (PropertyCache, тип ключа 'report') по отпечатку
+данных отчета и версии шаблона (report_cache_key).
+
+Использование:
+    html = inline_static_assets(render_template('report.html', **data))
+    pdf_bytes = get_pdf_renderer().render(html)
+"""
+
+import asyncio
+import atexit
+import base64
+import concurrent.futures
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..exceptions import PDFGenerationError, PDFRendererOverloadedError
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+STATIC_DIR = PROJECT_ROOT / 'static'
+REPORT_TEMPLATE = PROJECT_ROOT / 'templates' / 'report.html'
+
+# Параметры page.pdf() - входят в версию шаблона (меняют итоговый файл)
+PDF_OPTIONS = {
+    'format': 'A4',
+    'margin': {
+        'top': '15mm',
+        'right': '12mm',
+        'bottom': '15mm',
+        'left': '12mm'
+    },
+    'print_background': True,
+    'prefer_css_page_size': False,
+    'display_header_footer': False,
+}
+
+# <link rel="stylesheet" href="/static/...">
+_STYLESHEET_RE = re.compile(
+    r'<link\b(?=[^>]*\brel=["\']stylesheet["\'])[^>]*\bhref=["\'](/static/[^"\']+)["\'][^>]*>',
+    re.IGNORECASE
+)
+# src="/static/..." (img, script) и url(/static/...) в CSS
+_SRC_RE = re.compile(r'\bsrc=(["\'])(/static/[^"\']+)\1', re.IGNORECASE)
+_CSS_URL_RE = re.compile(r'url\(\s*(["\']?)(/static/[^"\')]+)\1\s*\)', re.IGNORECASE)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ВСТРАИВАНИЕ РЕСУРСОВ
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _static_file(url_path: str, static_dir: Path) -> Optional[Path]:
+    """Файл static/ по URL-пути (None - нет файла или путь вне static/)"""
+    relative = url_path.split('?', 1)[0].split('#', 1)[0][len('/static/'):]
+    path = (static_dir / relative).resolve()
+    if static_dir.resolve() not in path.parents or not path.is_file():
+        return None
+    return path
+
+
+@lru_cache(maxsize=128)
+def _data_uri(path: Path, mtime: float) -> str:
+    mime = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    return f"data:{mime};base64,{base64.b64encode(path.read_bytes()).decode('ascii')}"
+
+
+def _inline_css_urls(css: str, static_dir: Path) -> str:
+    def replace(match):
+        path = _static_file(match.group(2), static_dir)
+        return f'url("{_data_uri(path, path.stat().st_mtime)}")' if path else match.group(0)
+    return _CSS_URL_RE.sub(replace, css)
+
+
+def inline_static_assets(html: str, static_dir: Path = STATIC_DIR) -> str:
+    """
+    Встроить ресурсы static/ в HTML отчета
+
+    Таблицы стилей становятся <style> (их url(...) - data URI), src картинок
+    и скриптов - data URI. Внешние URL не трогаются.
+    """
+    def replace_stylesheet(match):
+        path = _static_file(match.group(1), static_dir)
+        if path is None:
+            return match.group(0)
+        return f"<style>{_inline_css_urls(path.read_text(encoding='utf-8'), static_dir)}</style>"
+
+    def replace_src(match):
+        path = _static_file(match.group(2), static_dir)
+        if path is None:
+            return match.group(0)
+        return f'src="{_data_uri(path, path.stat().st_mtime)}"'
+
+    html = _STYLESHEET_RE.sub(replace_stylesheet, html)
+    html = _SRC_RE.sub(replace_src, html)
+    return _inline_css_urls(html, static_dir)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# КЭШ ГОТОВЫХ PDF
+# ═══════════════════════════════════════════════════════════════════════════
+
+@lru_cache(maxsize=1)
+def report_template_version() -> str:
+    """Версия отчета: шаблон, параметры PDF и код аналитики (оффер считается при экспорте)"""
+    from ..analytics.result_cache import analytics_code_version
+
+    digest = hashlib.sha1(REPORT_TEMPLATE.read_bytes())
+    digest.update(repr(sorted(PDF_OPTIONS.items())).encode('utf-8'))
+    digest.update(analytics_code_version().encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def report_cache_key(
+    analysis: Dict[str, Any],
+    target: Dict[str, Any],
+    comparables: List[Dict[str, Any]],
+    report_date: str
+) -> str:
+    """
+    Ключ кэша готового PDF
+
+    Args:
+        analysis: Результат анализа из сессии
+        target: Целевой объект
+        comparables: Аналоги, попадающие в отчет (без исключенных)
+        report_date: Дата отчета в том виде, в каком она печатается в PDF
+            (YYYY-MM-DD) - отчет из кэша не должен показывать чужую дату
+    """
+    from ..analytics.result_cache import fingerprint
+
+    return f"{report_template_version()}:" + fingerprint({
+        'analysis': analysis,
+        'target': target,
+        'comparables': comparables,
+        'date': report_date,
+    })
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# РЕНДЕРЕР
+# ═══════════════════════════════════════════════════════════════════════════
+
+class PdfRenderer:
+    """
+    Долгоживущий рендерер PDF с пулом страниц
+
+    Один поток с event loop владеет браузером и страницами. Sync-код (Flask
+    handlers) вызывает render() и ждет результат; параллелизм ограничен
+    размером пула страниц, очередь - max_queue.
+    """
+
+    # Период проверки простоя браузера (секунды)
+    IDLE_CHECK_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        pages: int = 2,
+        max_queue: int = 10,
+        queue_timeout: float = 5.0,
+        render_timeout: float = 30.0,
+        idle_timeout: float = 600.0,
+        headless: bool = True,
+        browser_factory: Optional[Callable[[], Any]] = None
+    ):
+        """
+        Args:
+            pages: Страниц в пуле (одновременных рендеров)
+            max_queue: Макс отчетов в очереди и в работе
+            queue_timeout: Сколько render() ждет места в очереди (секунды)
+            render_timeout: Timeout рендера одного отчета (секунды)
+            idle_timeout: Закрыть браузер после простоя (секунды, 0 - держать всегда)
+            headless: Headless режим
+            browser_factory: Корутина-фабрика (playwright, browser) для тестов
+        """
+        self.pages = max(1, pages)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.render_timeout = render_timeout
+        self.idle_timeout = idle_timeout
+        self.headless = headless
+        self._browser_factory = browser_factory or self._launch_browser
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+        # Состояние браузера (меняется только в потоке event loop)
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages: Optional[asyncio.Queue] = None
+        self._page_slots: Optional[asyncio.Semaphore] = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._active_jobs = 0
+        self._last_activity = time.monotonic()
+
+        self.stats = {
+            'rendered': 0,
+            'failed': 0,
+            'rejected': 0,
+            'browser_starts': 0,
+            'browser_idle_stops': 0,
+            'pages_created': 0,
+            'render_seconds_total': 0.0,
+        }
+
+    # ─────────────────────────────────────────────────────────────────
+    # Жизненный цикл
+    # ─────────────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Запуск потока с event loop (браузер стартует при первом отчете)"""
+        with self._lock:
+            if self._thread:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name='pdf-renderer', daemon=True)
+            self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._browser_lock = asyncio.Lock()
+        self._page_slots = asyncio.Semaphore(self.pages)
+        self._idle_pages = asyncio.Queue()
+        if self.idle_timeout > 0:
+            self._loop.create_task(self._idle_watch())
+        self._loop.run_forever()
+
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+    def close(self, timeout: float = 30.0):
+        """Закрытие браузера и остановка event loop"""
+        with self._lock:
+            if not self._thread:
+                return
+            thread, loop = self._thread, self._loop
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop_browser(), loop).result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Error closing PDF renderer: {e}")
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        loop.close()
+        with self._lock:
+            self._thread = None
+            self._loop = None
+
+    async def _launch_browser(self):
+        from playwright.async_api import async_playwright
+
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.launch(headless=self.headless)
+        except Exception:
+            await playwright.stop()
+            raise
+        return playwright, browser
+
+    async def _ensure_context(self):
+        async with self._browser_lock:
+            if self._browser is not None and not self._browser.is_connected():
+                logger.warning("PDF renderer: browser disconnected, restarting")
+                await self._stop_browser_locked()
+
+            if self._context is None:
+                from ..parsers.resource_policy import get_resource_policy
+
+                self._playwright, self._browser = await self._browser_factory()
+                self._context = await self._browser.new_context()
+                # Ресурсы отчета встроены в HTML, режем только трекеры
+                await get_resource_policy().attach_async(self._context, profile='pdf')
+                self.stats['browser_starts'] += 1
+            return self._context
+
+    async def _stop_browser(self):
+        async with self._browser_lock:
+            await self._stop_browser_locked()
+
+    async def _stop_browser_locked(self):
+        browser, playwright = self._browser, self._playwright
+        self._browser = self._context = self._playwright = None
+        while not self._idle_pages.empty():
+            self._idle_pages.get_nowait()
+        try:
+            if browser is not None:
+                await browser.close()
+        except Exception as e:
+            logger.debug(f"Error closing PDF browser: {e}")
+        try:
+            if playwright is not None:
+                await playwright.stop()
+        except Exception as e:
+            logger.debug(f"Error stopping playwright: {e}")
+
+    async def _idle_watch(self):
+        """Закрыть браузер после idle_timeout без отчетов (память между всплесками)"""
+        while True:
+            await asyncio.sleep(min(self.IDLE_CHECK_INTERVAL, self.idle_timeout))
+            idle = time.monotonic() - self._last_activity
+            if self._browser is not None and self._active_jobs == 0 and idle >= self.idle_timeout:
+                logger.info(f"PDF renderer idle for {idle:.0f}s, closing browser")
+                await self._stop_browser()
+                self.stats['browser_idle_stops'] += 1
+
+    # ─────────────────────────────────────────────────────────────────
+    # Рендер
+    # ─────────────────────────────────────────────────────────────────
+
+    async def _acquire_page(self):
+        context = await self._ensure_context()
+        while not self._idle_pages.empty():
+            page = self._idle_pages.get_nowait()
+            if not page.is_closed():
+                return page
+        self.stats['pages_created'] += 1
+        return await context.new_page()
+
+    async def _render(self, html: str) -> bytes:
+        async with self._page_slots:
+            self._active_jobs += 1
+            self._last_activity = time.monotonic()
+            page = None
+            try:
+                page = await self._acquire_page()
+                await page.set_content(html, wait_until='load', timeout=self.render_timeout * 1000)
+                await page.evaluate('document.fonts.ready.then(() => true)')
+                pdf_bytes = await page.pdf(**PDF_OPTIONS)
+            except Exception:
+                # Страница в неизвестном состоянии - в пул не возвращаем
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+                raise
+            else:
+                # Пул принадлежит текущему браузеру: после перезапуска страница не нужна
+                if self._context is not None and page.context is self._context:
+                    self._idle_pages.put_nowait(page)
+                return pdf_bytes
+            finally:
+                self._active_jobs -= 1
+                self._last_activity = time.monotonic()
+
+    def render(self, html: str) -> bytes:
+        """
+        Отрендерить HTML в PDF (sync)
+
+        Raises:
+            PDFRendererOverloadedError: Очередь заполнена дольше queue_timeout
+            PDFGenerationError: Ошибка или timeout рендера
+        """
+        self.start()
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.stats['rejected'] += 1
+            logger.warning(f"PDF render queue is full ({self.max_queue}), rejecting")
+            raise PDFRendererOverloadedError(self.max_queue)
+
+        started = time.monotonic()
+        future = asyncio.run_coroutine_threadsafe(self._render(html), self._loop)
+        try:
+            # Ожидание страницы из пула входит в общий timeout
+            pdf_bytes = future.result(timeout=self.render_timeout + self.queue_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.stats['failed'] += 1
+            raise PDFGenerationError('timeout')
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            raise PDFGenerationError(str(e) or type(e).__name__) from e
+        finally:
+            self._slots.release()
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.stats['rendered'] += 1
+            self.stats['render_seconds_total'] += elapsed
+        logger.info(f"PDF сгенерирован за {elapsed:.2f}s, размер: {len(pdf_bytes)} bytes")
+        return pdf_bytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'pages': self.pages,
+            'max_queue': self.max_queue,
+            'running': self.running,
+            'browser_running': self._browser is not None,
+            'active_jobs': self._active_jobs,
+        })
+        return stats
+
+
+_renderers: Dict[int, PdfRenderer] = {}
+_renderers_lock = threading.Lock()
+
+
+def get_pdf_renderer() -> PdfRenderer:
+    """
+    Общий для процесса рендерер PDF (параметры - из настроек)
+
+    После fork (gunicorn --preload) дочерний процесс создает свой рендерер.
+    """
+    pid = os.getpid()
+    with _renderers_lock:
+        renderer = _renderers.get(pid)
+        if renderer is None:
+            from ..config import get_settings
+            settings = get_settings()
+            renderer = _renderers[pid] = PdfRenderer(
+                pages=settings.PDF_RENDERER_PAGES,
+                max_queue=settings.PDF_RENDERER_MAX_QUEUE,
+                queue_timeout=settings.PDF_RENDERER_QUEUE_TIMEOUT,
+                render_timeout=settings.PDF_RENDER_TIMEOUT,
+                idle_timeout=settings.PDF_RENDERER_IDLE_TIMEOUT,
+            )
+        return renderer
+
+
+def shutdown_pdf_renderers():
+    """Остановить рендерер текущего процесса (atexit)"""
+    with _renderers_lock:
+        renderer = _renderers.pop(os.getpid(), None)
+    if renderer is not None:
+        renderer.close(timeout=10.0)
+
+
+atexit.register(shutdown_pdf_renderers)
@@ -0,0 +1,904 @@
+"""
+Пакетная оценка портфеля объектов
+
+Интерактивный путь (/api/parse → /api/find-similar → /api/analyze) оценивает
+один объект за сессию. Для ежемесячной переоценки портфеля (тысячи квартир)
+объекты проходят конвейер:
+
+1. Разбор входа: URL объявления или ручные данные (как /api/create-manual).
+2. Парсинг URL пачками в общем AsyncParsingService (прогретый браузер).
+3. Группировка по району (регион, ЖК/метро/улица, комнатность, площадь):
+   поиск аналогов выполняется один раз на группу, а детальные данные
+   аналогов - один раз на прогон (общий кэш URL → данные поверх Redis-кэша
+   парсеров).
+4. Анализ группы одной задачей пула процессов параллельно с поиском
+   следующих групп: аналоги валидируются и сводятся в ComparableTable один
+   раз, фильтры выбросов, медианы и интервалы считаются векторно сразу для
+   всех объектов группы (ComparableBatch), по объекту - только корректировки
+   справедливой цены.
+
+Результаты отдаются по мере готовности (NDJSON или CSV) вместе с метриками
+прогресса, пропускной способности и ошибок по этапам.
+
+Использование:
+    valuation = PortfolioValuation(cache=get_cache(), workers=4)
+    items = load_portfolio_items('portfolio.txt')
+    for chunk in stream_portfolio(valuation, items, fmt='ndjson'):
+        output.write(chunk)
+"""
+
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError as PydanticValidationError, validator
+
+from ..config.regions import detect_region_from_address, detect_region_from_url
+from ..exceptions import SSRFError, URLValidationError
+from .validation import sanitize_string, validate_url
+
+logger = logging.getLogger(__name__)
+
+# Форматы выгрузки результатов
+FORMATS = ('ndjson', 'csv')
+
+# Ширина корзины площади при группировке объектов по району (м²)
+AREA_BUCKET_M2 = 10
+
+# Колонки CSV (и порядок полей строки результата)
+CSV_FIELDS = [
+    'index', 'status', 'stage', 'error', 'input', 'url', 'address', 'region', 'rooms',
+    'total_area', 'current_price', 'fair_price', 'fair_price_per_sqm', 'price_diff_percent',
+    'ci95_lower', 'ci95_upper', 'market_median_per_sqm', 'comparables_found', 'comparables_used',
+    'search_group', 'analysis_ms',
+]
+
+# Этапы конвейера (для ошибок в строке результата и метрик)
+STAGES = ('input', 'parse', 'search', 'analyze')
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# РУЧНОЙ ВВОД
+# ═══════════════════════════════════════════════════════════════════════════
+
+class ManualPropertyInput(BaseModel):
+    """Валидация данных для ручного ввода объекта недвижимости"""
+    address: str = Field(..., min_length=5, max_length=500, description="Полный адрес")
+    price_raw: float = Field(..., gt=0, lt=1_000_000_000_000, description="Цена в рублях")
+    total_area: float = Field(..., gt=1, lt=10000, description="Общая площадь в м²")
+    rooms: str = Field(..., description="Количество комнат")
+    floor: str = Field(default='', max_length=20, description="Этаж в формате N/M")
+    living_area: Optional[float] = Field(default=None, gt=0, lt=10000, description="Жилая площадь в м²")
+    kitchen_area: Optional[float] = Field(default=None, gt=0, lt=500, description="Площадь кухни в м²")
+    repair_level: str = Field(default='стандартная', max_length=50)
+    view_type: str = Field(default='улица', max_length=50)
+
+    @validator('address')
+    def validate_address(cls, v):
+        """Санитизация адреса"""
+        v = sanitize_string(v, max_length=500)
+        if not v or len(v) < 5:
+            raise ValueError('Адрес слишком короткий')
+        # Блокируем SQL injection паттерны
+        dangerous_patterns = ['<script', 'javascript:', 'onerror=', 'onclick=', 'drop table', 'union select']
+        v_lower = v.lower()
+        for pattern in dangerous_patterns:
+            if pattern in v_lower:
+                raise ValueError('Адрес содержит недопустимые символы')
+        return v
+
+    @validator('rooms')
+    def validate_rooms(cls, v):
+        """Валидация комнат"""
+        allowed_values = ['Студия', '1', '2', '3', '4', '5', '5+']
+        if v not in allowed_values:
+            raise ValueError(f'Недопустимое значение для комнат: {v}. Разрешены: {allowed_values}')
+        return v
+
+    @validator('living_area')
+    def validate_living_area(cls, v, values):
+        """Проверка что жилая площадь не больше общей"""
+        if v and 'total_area' in values and v > values['total_area']:
+            raise ValueError('Жилая площадь не может быть больше общей')
+        return v
+
+    @validator('kitchen_area')
+    def validate_kitchen_area(cls, v, values):
+        """Проверка что площадь кухни не больше общей"""
+        if v and 'total_area' in values and v > values['total_area']:
+            raise ValueError('Площадь кухни не может быть больше общей')
+        return v
+
+
+def build_manual_property(validated: ManualPropertyInput) -> Dict[str, Any]:
+    """Данные объекта из валидированного ручного ввода (регион - по адресу, иначе msk)"""
+    property_data = {
+        'address': validated.address,
+        'price_raw': validated.price_raw,
+        'price': f"{int(validated.price_raw):,} ₽".replace(',', ' '),
+        'total_area': validated.total_area,
+        'area': f"{validated.total_area} м²",
+        'rooms': validated.rooms,
+        'floor': validated.floor,
+        'living_area': validated.living_area,
+        'kitchen_area': validated.kitchen_area,
+        'repair_level': validated.repair_level,
+        'view_type': validated.view_type,
+        'manual_input': True,
+        'title': f"{validated.rooms}-комн. квартира, {validated.total_area} м²",
+        'url': 'manual-input',  # Плейсхолдер для ручного ввода
+        'metro': [],
+        'residential_complex': None,
+        'characteristics': {}
+    }
+
+    # Определяем регион из адреса (поддержка всех регионов)
+    region = detect_region_from_address(validated.address)
+    if not region:
+        logger.warning("⚠️ Не удалось определить регион для ручного ввода, используем: msk")
+        region = 'msk'  # По умолчанию Москва
+
+    property_data['region'] = region
+    return property_data
+
+
+def resolve_search_region(target: Dict) -> str:
+    """Регион поиска аналогов: из данных целевого объекта, иначе по URL/адресу"""
+    # КРИТИЧНО: Используем регион, определенный при парсинге (не определяем заново!)
+    # Регион уже корректно определен по адресу в /api/parse
+    region = target.get('region')
+    if not region:
+        # Fallback: определяем по URL или адресу
+        target_url = target.get('url', '')
+        region = detect_region_from_url(target_url)
+        if not region:
+            address = target.get('address', '')
+            region = detect_region_from_address(address)
+            if not region:
+                logger.warning("⚠️ Не удалось определить регион, используем fallback: msk")
+                region = 'msk'
+
+    return region
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ВХОД
+# ═══════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class PortfolioTarget:
+    """Объект портфеля на пути по конвейеру"""
+    index: int
+    input: str
+    url: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    region: Optional[str] = None
+    group: Optional[str] = None
+    stage: Optional[str] = None
+    error: Optional[str] = None
+    comparables_found: int = 0
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def fail(self, stage: str, error: str):
+        self.stage = stage
+        self.error = error
+
+
+def load_portfolio_items(path: str) -> List[Any]:
+    """
+    Прочитать список объектов из файла
+
+    Форматы по расширению:
+    - .txt: URL по одному в строке (пустые строки и # - комментарии)
+    - .json: массив URL или объектов
+    - .ndjson/.jsonl: URL или объект в каждой строке
+    - .csv: колонка url или поля ручного ввода (address, price_raw, ...)
+    """
+    file_path = Path(path)
+    text = file_path.read_text(encoding='utf-8-sig')
+    suffix = file_path.suffix.lower()
+
+    if suffix == '.json':
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError('JSON-файл портфеля должен содержать массив объектов')
+        return items
+    if suffix in ('.ndjson', '.jsonl'):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if suffix == '.csv':
+        return [
+            row.get('url') if row.get('url') else {k: v for k, v in row.items() if v not in (None, '')}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    return [
+        line.strip() for line in text.splitlines()
+        if line.strip() and not line.strip().startswith('#')
+    ]
+
+
+def _prepare_target(index: int, item: Any) -> PortfolioTarget:
+    """Разбор элемента входа: URL (строка или {'url': ...}) или ручные данные"""
+    if isinstance(item, dict) and item.get('url') and not item.get('address'):
+        item = item['url']
+
+    if isinstance(item, str):
+        url = item.strip()
+        target = PortfolioTarget(index=index, input=url, url=url)
+        try:
+            validate_url(url)
+        except (URLValidationError, SSRFError) as e:
+            target.fail('input', str(e))
+        return target
+
+    if not isinstance(item, dict):
+        target = PortfolioTarget(index=index, input=str(item)[:200])
+        target.fail('input', 'Ожидается URL или объект с полями ручного ввода')
+        return target
+
+    target = PortfolioTarget(index=index, input=str(item.get('address', ''))[:200])
+    try:
+        validated = ManualPropertyInput(**{**item, 'rooms': str(item.get('rooms', ''))})
+    except PydanticValidationError as e:
+        target.fail('input', '; '.join(f"{err['loc'][0]}: {err['msg']}" for err in e.errors()))
+        return target
+    target.data = _split_floor(build_manual_property(validated))
+    target.region = target.data['region']
+    return target
+
+
+def _split_floor(property_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Этаж ручного ввода 'N/M' → floor и total_floors (пустой этаж не передается в анализ)"""
+    floor, _, total_floors = str(property_data.pop('floor') or '').partition('/')
+    if floor.strip().isdigit():
+        property_data['floor'] = int(floor)
+    if total_floors.strip().isdigit():
+        property_data['total_floors'] = int(total_floors)
+    return property_data
+
+
+def area_key(target: Dict[str, Any], region: str) -> str:
+    """
+    Ключ района для общего поиска аналогов
+
+    Объекты одного региона и локации (ЖК, иначе первое метро, иначе улица)
+    с той же комнатностью и близкой площадью получают один набор аналогов.
+    """
+    location = target.get('residential_complex') or ''
+    if not location:
+        metro = target.get('metro') or ''
+        if isinstance(metro, list):
+            metro = metro[0] if metro else ''
+        location = metro if isinstance(metro, str) else (metro.get('name', '') if isinstance(metro, dict) else '')
+    if not location:
+        parts = [part.strip() for part in str(target.get('address') or '').split(',') if part.strip()]
+        location = ', '.join(parts[:-1]) if len(parts) > 1 else ''.join(parts)
+
+    rooms = str(target.get('rooms') or '').strip().lower()
+    try:
+        area_bucket = int(float(target.get('total_area') or 0) // AREA_BUCKET_M2)
+    except (TypeError, ValueError):
+        area_bucket = 0
+    return f"{region}|{location.strip().lower()}|{rooms}|{area_bucket}"
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ПАРСИНГ И ПОИСК
+# ═══════════════════════════════════════════════════════════════════════════
+
+def parse_urls_with_service(service, urls: List[str], max_retries: int = 2) -> list:
+    """
+    Распарсить URL в AsyncParsingService пачками по одной волне
+
+    Пачка не больше max_concurrent (и очереди сервиса): каждая укладывается
+    в ожидание parse_many по умолчанию, рассчитанное на timeout_per_url.
+    """
+    results = []
+    chunk_size = max(1, min(service.max_concurrent, service.max_queue))
+    for start in range(0, len(urls), chunk_size):
+        results.extend(service.parse_many(urls[start:start + chunk_size], max_retries=max_retries))
+    return results
+
+
+def default_parser_factory(cache=None) -> Callable[[str, str], Any]:
+    """Фабрика парсеров для поиска: ЦИАН - PlaywrightParser, остальные источники - реестр"""
+    def factory(url: str, region: str):
+        from ..config import get_settings
+        from ..parsers import get_global_registry
+        from ..parsers.playwright_parser import PlaywrightParser
+
+        registry = get_global_registry(cache=cache)
+        source = registry.detect_source(url)
+        if source and source != 'cian':
+            parser = registry.get_parser(url=url)
+            if parser is None:
+                raise ValueError(f"Парсер для {source} не найден")
+            return parser
+
+        settings = get_settings()
+        return PlaywrightParser(
+            headless=True,
+            delay=1.0,
+            cache=cache,
+            region=region,
+            tiered_fetch=settings.PARSER_TIERED_FETCH,
+            http_timeout=settings.PARSER_HTTP_TIMEOUT
+        )
+    return factory
+
+
+class ComparableSearch:
+    """
+    Поиск аналогов для группы объектов с общим кэшем детальных данных
+
+    Карточки без цены и площади дочитываются детальным парсингом; данные
+    каждого URL запрашиваются один раз за прогон, даже если аналог попал
+    в несколько групп.
+    """
+
+    def __init__(
+        self,
+        parser_factory: Callable[[str, str], Any],
+        parse_fn: Callable[[List[str]], list],
+        search_type: str = 'city'
+    ):
+        self.parser_factory = parser_factory
+        self.parse_fn = parse_fn
+        self.search_type = search_type
+        self.details: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'details_parsed': 0, 'details_reused': 0, 'details_failed': 0}
+
+    def __call__(self, target: Dict[str, Any], region: str, limit: int) -> List[Dict[str, Any]]:
+        is_manual = target.get('manual_input') or target.get('url') == 'manual-input'
+        search_url = 'https://www.cian.ru/' if is_manual else (target.get('url') or 'https://www.cian.ru/')
+
+        with self.parser_factory(search_url, region) as parser:
+            similar = []
+            if self.search_type == 'building' and not is_manual and target.get('residential_complex'):
+                similar = parser.search_similar_in_building(target, limit=limit)
+            if not similar:
+                similar = parser.search_similar(target, limit=limit)
+
+        incomplete = [
+            c['url'] for c in similar
+            if c.get('url') and not (c.get('price') and c.get('total_area'))
+        ]
+        missing = list(OrderedDict.fromkeys(url for url in incomplete if url not in self.details))
+        self.stats['details_reused'] += len(incomplete) - len(missing)
+
+        for result in self.parse_fn(missing) if missing else []:
+            if result.ok and result.data:
+                self.details[result.url] = result.data
+                self.stats['details_parsed'] += 1
+            else:
+                self.stats['details_failed'] += 1
+
+        return [
+            {**c, **self.details[c['url']]} if c.get('url') in self.details else dict(c)
+            for c in similar
+        ]
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# АНАЛИЗ (выполняется в процессах пула)
+# ═══════════════════════════════════════════════════════════════════════════
+
+_worker_analyzer = None
+
+
+def _get_worker_analyzer():
+    """Анализатор процесса пула (создается один раз: сервис ставок, конфигурация)"""
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        from ..analytics.analyzer import RealEstateAnalyzer
+        _worker_analyzer = RealEstateAnalyzer(enable_tracking=False)
+    return _worker_analyzer
+
+
+def _fair_price_fields(fair_price: Dict[str, Any], market_median: Any, comparables_used: int) -> Dict[str, Any]:
+    interval = fair_price.get('confidence_interval_95') or {}
+    return {
+        'current_price': fair_price.get('current_price'),
+        'fair_price': _round(fair_price.get('fair_price_total')),
+        'fair_price_per_sqm': _round(fair_price.get('fair_price_per_sqm')),
+        'price_diff_percent': _round(fair_price.get('price_diff_percent'), 2),
+        'ci95_lower': _round(interval.get('lower')),
+        'ci95_upper': _round(interval.get('upper')),
+        'market_median_per_sqm': _round(market_median),
+        'comparables_used': comparables_used,
+    }
+
+
+def _comparable_models(comparables: List[Dict[str, Any]]) -> list:
+    """ComparableProperty аналогов; аналоги с некорректными данными пропускаются"""
+    from ..models.property import ComparableProperty, normalize_property_data
+
+    models = []
+    for comparable in comparables:
+        try:
+            models.append(ComparableProperty(**normalize_property_data(comparable)))
+        except (PydanticValidationError, ValueError, TypeError):
+            continue
+    return models
+
+
+def _group_batch(targets: List[Dict[str, Any]], comparables: list, options: Dict[str, Any]):
+    """ComparableBatch аналогов группы после фильтров анализатора (без собственного URL объекта)"""
+    import numpy as np
+
+    from ..analytics.comparable_table import ComparableBatch, ComparableTable
+    from ..analytics.data_validator import filter_valid_comparables
+
+    valid, _ = filter_valid_comparables(comparables, verbose=False)
+    table = ComparableTable.from_comparables(valid)
+    urls = np.array([getattr(comp, 'url', None) for comp in valid], dtype=object)
+    rows = np.array([
+        urls != target.get('url') if target.get('url') else np.ones(len(valid), dtype=bool)
+        for target in targets
+    ], dtype=bool).reshape(len(targets), len(valid))
+
+    batch = ComparableBatch(table, rows).without_iqr_outliers(min_rows=5)
+    if options.get('filter_outliers', True):
+        return batch.without_sigma_outliers()
+    return batch.restrict(~table.column('excluded'))
+
+
+def analyze_group(
+    targets: List[Dict[str, Any]],
+    comparables: List[Dict[str, Any]],
+    options: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Анализ группы объектов по общим аналогам (функция верхнего уровня - передается в пул)
+
+    Повторяет шаги RealEstateAnalyzer, влияющие на поля строки результата
+    (валидация, IQR-фильтр, фильтр ±3σ, медиана рынка, медианы параметров,
+    справедливая цена и ее интервал), но статистики считаются одной
+    операцией по всем объектам группы. Объект не может быть аналогом самому
+    себе: строки с его URL исключаются из его выборки.
+
+    Returns:
+        По элементу на объект: поля строки результата или {'error': сообщение}
+    """
+    import numpy as np
+
+    from ..analytics.fair_price_calculator import calculate_fair_price_with_medians
+    from ..analytics.median_calculator import calculate_medians_batch
+    from ..models.property import TargetProperty, normalize_property_data
+
+    options = options or {}
+    started = time.perf_counter()
+    use_median = options.get('use_median', True)
+
+    batch = _group_batch(targets, _comparable_models(comparables), options)
+    market_medians = batch.medians('price_per_sqm')
+    market_means, _ = batch.mean_stdev('price_per_sqm')
+    ci_lower, ci_upper = batch.confidence_intervals('price_per_sqm')
+    medians = calculate_medians_batch(batch)
+    sizes = batch.sizes()
+
+    results = []
+    for index, data in enumerate(targets):
+        try:
+            target = TargetProperty(**normalize_property_data(data))
+        except (PydanticValidationError, ValueError, TypeError) as e:
+            results.append({'error': str(e) or type(e).__name__})
+            continue
+        if not sizes[index]:
+            results.append({'error': 'Недостаточно аналогов для анализа'})
+            continue
+
+        base = market_medians[index] if use_median else market_means[index]
+        base = 0.0 if np.isnan(base) else float(base)
+        if not base:
+            fair_price = {'current_price': target.price, 'fair_price_total': 0, 'fair_price_per_sqm': 0,
+                          'price_diff_percent': 0}
+        else:
+            fair_price = calculate_fair_price_with_medians(
+                target=target,
+                comparables=batch.select(index).comparables,
+                base_price_per_sqm=base,
+                method='median' if use_median else 'mean',
+                medians=medians[index]
+            )
+            if target.total_area and sizes[index] >= 3:
+                # Как в анализаторе: интервал цены за м² аналогов, масштабированный на площадь
+                multiplier = fair_price.get('final_multiplier', 1.0)
+                fair_price['confidence_interval_95'] = {
+                    'lower': ci_lower[index] * multiplier * target.total_area,
+                    'upper': ci_upper[index] * multiplier * target.total_area,
+                }
+
+        market_median = None if np.isnan(market_medians[index]) else market_medians[index]
+        results.append(_fair_price_fields(fair_price, market_median or 0, int(sizes[index])))
+
+    elapsed_ms = (time.perf_counter() - started) * 1000 / max(len(targets), 1)
+    for result in results:
+        result.setdefault('analysis_ms', round(elapsed_ms, 1))
+    return results
+
+
+def analyze_target(
+    target: Dict[str, Any],
+    comparables: List[Dict[str, Any]],
+    options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Анализ одного объекта полным RealEstateAnalyzer (эталон для analyze_group)
+
+    Аналоги с некорректными данными пропускаются (в интерактивном анализе
+    они вызывают ошибку всего запроса).
+
+    Returns:
+        Поля строки результата (fair_price, ci95_*, comparables_used, ...)
+    """
+    from ..models.property import AnalysisRequest, TargetProperty, normalize_property_data
+
+    options = options or {}
+    started = time.perf_counter()
+
+    request = AnalysisRequest(
+        target_property=TargetProperty(**normalize_property_data(target)),
+        comparables=_comparable_models(comparables),
+        filter_outliers=options.get('filter_outliers', True),
+        use_median=options.get('use_median', True)
+    )
+    result = _get_worker_analyzer().analyze(request)
+
+    fields = _fair_price_fields(
+        result.fair_price_analysis or {},
+        (result.market_statistics or {}).get('all', {}).get('median'),
+        len(result.comparables)
+    )
+    fields['analysis_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return fields
+
+
+def _round(value: Any, digits: int = 0) -> Any:
+    if value is None:
+        return None
+    value = round(float(value), digits)
+    return int(value) if digits == 0 else value
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# КОНВЕЙЕР
+# ═══════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class PortfolioMetrics:
+    """Прогресс, пропускная способность и ошибки прогона"""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    failures_by_stage: Dict[str, int] = field(default_factory=lambda: {stage: 0 for stage in STAGES})
+    search_groups: int = 0
+    searches: int = 0
+    searches_shared: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def record(self, row: Dict[str, Any]):
+        if row['status'] == 'ok':
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            self.failures_by_stage[row['stage']] = self.failures_by_stage.get(row['stage'], 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        throughput = self.processed / elapsed * 60 if elapsed > 0 else 0.0
+        remaining = self.total - self.processed
+        return {
+            'total': self.total,
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'failures_by_stage': dict(self.failures_by_stage),
+            'progress_percent': round(self.processed / self.total * 100, 1) if self.total else 100.0,
+            'elapsed_s': round(elapsed, 1),
+            'throughput_per_min': round(throughput, 1),
+            'eta_s': round(remaining / throughput * 60, 1) if throughput and remaining else 0.0,
+            'search_groups': self.search_groups,
+            'searches': self.searches,
+            'searches_shared': self.searches_shared,
+        }
+
+
+class PortfolioValuation:
+    """
+    Пакетная оценка: парсинг → общий поиск по районам → анализ в пуле процессов
+
+    Все внешние шаги заменяемы (тесты, CLI без браузерного пула):
+        parse_fn(urls) -> [ParseResult]
+        search_fn(target, region, limit) -> [аналоги]
+        analyze_fn(targets, comparables, options) -> [поля результата или {'error': ...}]
+            (функция верхнего уровня модуля: передается в процессы пула;
+            одна задача на группу объектов с общими аналогами)
+    """
+
+    def __init__(
+        self,
+        cache=None,
+        comparables_limit: int = 20,
+        search_type: str = 'city',
+        workers: int = 2,
+        filter_outliers: bool = True,
+        use_median: bool = True,
+        parse_fn: Optional[Callable[[List[str]], list]] = None,
+        search_fn: Optional[Callable[[Dict, str, int], List[Dict]]] = None,
+        parser_factory: Optional[Callable[[str, str], Any]] = None,
+        analyze_fn: Callable[..., List[Dict[str, Any]]] = analyze_group,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            cache: PropertyCache (общий Redis-кэш страниц и поисковых выдач)
+            comparables_limit: Аналогов на группу
+            search_type: 'city' или 'building' (поиск в ЖК с fallback на город)
+            workers: Процессов анализа (0 - анализ в текущем процессе)
+            parse_fn: Парсинг URL (по умолчанию - общий AsyncParsingService)
+            search_fn: Поиск аналогов (по умолчанию - ComparableSearch)
+            parser_factory: Фабрика парсеров для поиска по умолчанию
+            analyze_fn: Анализ группы объектов (см. analyze_group)
+            on_progress: Callback со снимком метрик после каждого объекта
+        """
+        self.cache = cache
+        self.comparables_limit = comparables_limit
+        self.workers = max(0, workers)
+        self.options = {'filter_outliers': filter_outliers, 'use_median': use_median}
+        self.analyze_fn = analyze_fn
+        self.on_progress = on_progress
+
+        if parse_fn is None:
+            def parse_fn(urls: List[str]) -> list:
+                from ..parsers.async_parser import get_async_parsing_service
+                return parse_urls_with_service(get_async_parsing_service(cache), urls)
+        self.parse_fn = parse_fn
+
+        if search_fn is None:
+            search_fn = ComparableSearch(parser_factory or default_parser_factory(cache), parse_fn, search_type)
+        self.search_fn = search_fn
+        self.metrics = PortfolioMetrics()
+
+    # ─────────────────────────────────────────────────────────────────
+    # Этапы
+    # ─────────────────────────────────────────────────────────────────
+
+    def _parse_targets(self, targets: List[PortfolioTarget]):
+        """Парсинг URL-объектов (повторы URL в портфеле парсятся один раз)"""
+        pending = [t for t in targets if t.url and not t.failed]
+        urls = list(OrderedDict.fromkeys(t.url for t in pending))
+        if not urls:
+            return
+
+        try:
+            results = {result.url: result for result in self.parse_fn(urls)}
+        except Exception as e:
+            logger.error(f"Portfolio: парсинг объектов не удался: {e}", exc_info=True)
+            for target in pending:
+                target.fail('parse', str(e))
+            return
+
+        for target in pending:
+            result = results.get(target.url)
+            if result is None or not result.ok or not result.data:
+                target.fail('parse', (result.error_message or result.error_type) if result else 'no result')
+                continue
+
+            data = dict(result.data)
+            data.setdefault('url', target.url)
+            if not (data.get('price') or data.get('price_raw')) or not (data.get('total_area') or data.get('area')):
+                target.fail('parse', 'Не удалось извлечь цену и площадь из объявления')
+                continue
+            if not data.get('region'):
+                data['region'] = (
+                    detect_region_from_url(target.url)
+                    or detect_region_from_address(data.get('address', ''))
+                    or 'msk'
+                )
+            target.data = data
+            target.region = data['region']
+
+    def _group_targets(self, targets: List[PortfolioTarget]) -> Dict[str, List[PortfolioTarget]]:
+        groups: Dict[str, List[PortfolioTarget]] = OrderedDict()
+        for target in targets:
+            if target.failed:
+                continue
+            target.region = target.region or resolve_search_region(target.data)
+            target.group = area_key(target.data, target.region)
+            groups.setdefault(target.group, []).append(target)
+        return groups
+
+    def _search_group(self, group: List[PortfolioTarget]) -> Optional[List[Dict[str, Any]]]:
+        """Один поиск на группу (по первому объекту); ошибка помечает всю группу"""
+        self.metrics.searches += 1
+        self.metrics.searches_shared += len(group) - 1
+        leader = group[0]
+        try:
+            return self.search_fn(leader.data, leader.region, self.comparables_limit)
+        except Exception as e:
+            logger.warning(f"Portfolio: поиск аналогов для группы {leader.group} не удался: {e}")
+            for target in group:
+                target.fail('search', str(e))
+            return None
+
+    # ─────────────────────────────────────────────────────────────────
+    # Прогон
+    # ─────────────────────────────────────────────────────────────────
+
+    def _row(self, target: PortfolioTarget, analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = target.data or {}
+        row = {
+            'index': target.index,
+            'status': 'error' if target.failed else 'ok',
+            'stage': target.stage,
+            'error': target.error,
+            'input': target.input,
+            'url': target.url or data.get('url'),
+            'address': data.get('address'),
+            'region': target.region,
+            'rooms': data.get('rooms'),
+            'total_area': data.get('total_area'),
+            'comparables_found': target.comparables_found,
+            'search_group': target.group,
+        }
+        row.update(analysis or {})
+        self.metrics.record(row)
+        if self.on_progress:
+            try:
+                self.on_progress(self.metrics.snapshot())
+            except Exception as e:
+                logger.debug(f"Portfolio progress callback failed: {e}")
+        return row
+
+    def _finish_analysis(self, group: List[PortfolioTarget], future: Future) -> Iterator[Dict[str, Any]]:
+        try:
+            analyses = future.result()
+        except Exception as e:
+            analyses = [{'error': str(e) or type(e).__name__}] * len(group)
+
+        for target, analysis in zip(group, analyses):
+            if 'error' in analysis:
+                target.fail('analyze', analysis['error'])
+                yield self._row(target)
+            else:
+                yield self._row(target, analysis)
+
+    def run(self, items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Оценить объекты портфеля
+
+        Yields:
+            Строки результата в порядке готовности (поле index - позиция во входе)
+        """
+        targets = [_prepare_target(i, item) for i, item in enumerate(items)]
+        self.metrics = PortfolioMetrics(total=len(targets))
+
+        self._parse_targets(targets)
+        groups = self._group_targets(targets)
+        self.metrics.search_groups = len(groups)
+
+        for target in targets:
+            if target.failed:
+                yield self._row(target)
+
+        yield from self._analyze_groups(groups)
+
+    def _analyze_groups(self, groups: Dict[str, List[PortfolioTarget]]) -> Iterator[Dict[str, Any]]:
+        """Поиск аналогов по группам и анализ в пуле; строки отдаются по мере готовности"""
+        executor = self._create_executor()
+        pending: Dict[Future, List[PortfolioTarget]] = {}
+        try:
+            for group in groups.values():
+                comparables = self._search_group(group)
+                if comparables is None:
+                    for target in group:
+                        yield self._row(target)
+                    continue
+
+                for target in group:
+                    # Объект не может быть аналогом самому себе (исключается и в analyze_fn)
+                    target.comparables_found = sum(
+                        1 for c in comparables if not (target.url and c.get('url') == target.url)
+                    )
+                pending[self._submit(executor, group, comparables)] = group
+
+                # Готовые анализы отдаем, не дожидаясь поиска следующих групп
+                for future in [f for f in pending if f.done()]:
+                    yield from self._finish_analysis(pending.pop(future), future)
+
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from self._finish_analysis(pending.pop(future), future)
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            self.metrics.finished_at = time.monotonic()
+
+    def _create_executor(self) -> Optional[ProcessPoolExecutor]:
+        if not self.workers:
+            return None
+        # spawn: fork процесса с потоками браузерного пула и event loop небезопасен
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _submit(
+        self,
+        executor: Optional[ProcessPoolExecutor],
+        group: List[PortfolioTarget],
+        comparables: List[Dict]
+    ) -> Future:
+        targets = [target.data for target in group]
+        if executor is not None:
+            return executor.submit(self.analyze_fn, targets, comparables, self.options)
+
+        future: Future = Future()
+        try:
+            future.set_result(self.analyze_fn(targets, comparables, self.options))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.metrics.snapshot()
+        if isinstance(self.search_fn, ComparableSearch):
+            stats.update(self.search_fn.stats)
+        return stats
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ВЫГРУЗКА
+# ═══════════════════════════════════════════════════════════════════════════
+
+def stream_portfolio(
+    valuation: PortfolioValuation,
+    items: Iterable[Any],
+    fmt: str = 'ndjson',
+    progress_interval: float = 5.0
+) -> Iterator[str]:
+    """
+    Прогон портфеля, сериализованный построчно
+
+    NDJSON: строки {"type": "result", ...}, периодически {"type": "progress", ...}
+    и в конце {"type": "summary", ...}. CSV: заголовок и строки результатов
+    (метрики - через valuation.get_stats() / on_progress).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат {fmt}, допустимы: {', '.join(FORMATS)}")
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        yield buffer.getvalue()
+        for row in valuation.run(items):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            yield buffer.getvalue()
+        return
+
+    last_progress = time.monotonic()
+    for row in valuation.run(items):
+        yield json.dumps({'type': 'result', **row}, ensure_ascii=False, default=str) + '\n'
+        if time.monotonic() - last_progress >= progress_interval:
+            last_progress = time.monotonic()
+            yield json.dumps({'type': 'progress', **valuation.get_stats()}, ensure_ascii=False) + '\n'
+    yield json.dumps({'type': 'summary', **valuation.get_stats()}, ensure_ascii=False) + '\n'
@@ -5,15 +5,17 @@
 - Парсинг URL недвижимости
 - Поиск аналогов
 - Генерация отчетов
+- Пакетная оценка портфеля
 """
 
 from .queue import get_task_queue, get_task_status, init_task_queue
-from .tasks import parse_property_task, find_similar_task
+from .tasks import parse_property_task, find_similar_task, portfolio_valuation_task
 
 __all__ = [
     'init_task_queue',
     'get_task_queue',
     'get_task_status',
     'parse_property_task',
-    'find_similar_task'
+    'find_similar_task',
+    'portfolio_valuation_task'
 ]
@@ -77,11 +77,21 @@ def enqueue_task(func, *args, **kwargs) -> Optional[Job]:
     Args:
         func: Функция для выполнения
         *args: Аргументы функции
-        **kwargs: Именованные аргументы функции
+        **kwargs: Именованные аргументы функции; параметры RQ job_id,
+            job_timeout, result_ttl, failure_ttl в функцию не передаются
 
     Returns:
         Job объект или None если очередь недоступна
     """
+    rq_options = {
+        'job_timeout': kwargs.pop('job_timeout', 300),  # 5 минут
+        'result_ttl': kwargs.pop('result_ttl', 3600),  # Храним результат 1 час
+        'failure_ttl': kwargs.pop('failure_ttl', 3600),  # Храним ошибки 1 час
+    }
+    job_id = kwargs.pop('job_id', None)
+    if job_id:
+        rq_options['job_id'] = job_id
+
     queue = get_task_queue()
 
     if queue is None:
@@ -94,15 +104,7 @@ def enqueue_task(func, *args, **kwargs) -> Optional[Job]:
             raise
 
     try:
-        # Ставим в очередь с timeout 5 минут
-        job = queue.enqueue(
-            func,
-            *args,
-            **kwargs,
-            job_timeout=300,  # 5 минут
-            result_ttl=3600,  # Храним результат 1 час
-            failure_ttl=3600  # Храним ошибки 1 час
-        )
+        job = queue.enqueue(func, *args, **kwargs, **rq_options)
         logger.info(f"Task enqueued: {job.id} - {func.__name__}")
         return job
     except Exception as e:
@@ -150,6 +152,8 @@ def get_task_status(job_id: str) -> Dict[str, Any]:
         if hasattr(job, 'meta') and job.meta:
             status_info['progress'] = job.meta.get('progress', 0)
             status_info['message'] = job.meta.get('message', '')
+            if 'metrics' in job.meta:
+                status_info['metrics'] = job.meta['metrics']
 
         return status_info
 
@@ -161,7 +165,7 @@ def get_task_status(job_id: str) -> Dict[str, Any]:
         }
 
 
-def update_task_progress(job: Job, progress: int, message: str = ''):
+def update_task_progress(job: Job, progress: int, message: str = '', metrics: Optional[Dict[str, Any]] = None):
     """
     Обновить прогресс задачи
 
@@ -169,10 +173,13 @@ def update_task_progress(job: Job, progress: int, message: str = ''):
         job: Job объект
         progress: Прогресс в процентах (0-100)
         message: Сообщение о текущем статусе
+        metrics: Дополнительные метрики задачи (пропускная способность, ошибки)
     """
     try:
         job.meta['progress'] = progress
         job.meta['message'] = message
+        if metrics is not None:
+            job.meta['metrics'] = metrics
         job.save_meta()
         logger.debug(f"Task {job.id} progress: {progress}% - {message}")
     except Exception as e:
@@ -4,12 +4,16 @@
 Эти функции выполняются в фоне RQ воркером
 """
 import logging
-from typing import Dict, Any, List
+import os
+import time
+from typing import Dict, Any, List, Optional
 from rq import get_current_job
 
 from src.parsers import get_global_registry
 from src.cache import get_cache
+from src.services.portfolio import PortfolioValuation, stream_portfolio
 from src.utils.session_storage import get_session_storage
+from .queue import update_task_progress
 
 logger = logging.getLogger(__name__)
 
@@ -65,15 +69,11 @@ def parse_property_task(url: str, session_id: str) -> Dict[str, Any]:
 
         # Сохраняем в сессию
         session_storage = get_session_storage()
-        session_data = session_storage.get(session_id) or {}
-
-        session_data.update({
+        session_storage.update(session_id, {
             'target_property': data,
             'url': url,
             'last_updated': str(datetime.now())
-        })
-
-        session_storage.set(session_id, session_data)
+        }, create=True)
 
         if job:
             job.meta['progress'] = 100
@@ -150,15 +150,11 @@ def find_similar_task(
 
         # Сохраняем в сессию
         session_storage = get_session_storage()
-        session_data = session_storage.get(session_id) or {}
-
-        session_data.update({
+        session_storage.update(session_id, {
             'comparables': comparables,
             'search_completed': True,
             'last_updated': str(datetime.now())
-        })
-
-        session_storage.set(session_id, session_data)
+        }, create=True)
 
         if job:
             job.meta['progress'] = 100
@@ -182,5 +178,74 @@ def find_similar_task(
         }
 
 
+def portfolio_valuation_task(
+    items: List[Any],
+    output_path: str,
+    fmt: str = 'ndjson',
+    options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Асинхронная задача пакетной оценки портфеля
+
+    Результаты пишутся в output_path по мере готовности (файл можно читать
+    до завершения задачи), метрики прогона - в job.meta['metrics'].
+
+    Args:
+        items: URL объявлений и/или данные ручного ввода
+        output_path: Файл результатов
+        fmt: 'ndjson' или 'csv'
+        options: Параметры PortfolioValuation (workers, comparables_limit, search_type, ...)
+
+    Returns:
+        Итоговые метрики прогона
+    """
+    job = get_current_job()
+    logger.info(f"[Task {job.id if job else 'sync'}] Starting portfolio valuation: {len(items)} targets")
+
+    last_update = [0.0]
+
+    def on_progress(metrics: Dict[str, Any]):
+        # Не чаще раза в 2 секунды: save_meta - запрос к Redis
+        if job and (time.monotonic() - last_update[0] >= 2 or metrics['processed'] == metrics['total']):
+            last_update[0] = time.monotonic()
+            update_task_progress(
+                job,
+                int(metrics['progress_percent']),
+                f"Оценено {metrics['processed']} из {metrics['total']} (ошибок: {metrics['failed']})",
+                metrics
+            )
+
+    valuation = PortfolioValuation(cache=get_cache(), on_progress=on_progress, **(options or {}))
+
+    try:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in stream_portfolio(valuation, items, fmt=fmt):
+                output.write(chunk)
+                output.flush()
+
+        stats = valuation.get_stats()
+        if job:
+            update_task_progress(job, 100, 'Оценка завершена', stats)
+        logger.info(
+            f"[Task {job.id if job else 'sync'}] Portfolio valuation completed: "
+            f"{stats['succeeded']}/{stats['total']} ok, {stats['throughput_per_min']}/min"
+        )
+        return {
+            'success': True,
+            'output_path': output_path,
+            'format': fmt,
+            'metrics': stats
+        }
+
+    except Exception as e:
+        logger.error(f"[Task {job.id if job else 'sync'}] Portfolio valuation failed: {e}", exc_info=True)
+        return {
+            'success': False,
+            'error': str(e),
+            'metrics': valuation.get_stats()
+        }
+
+
 # Импорт datetime для timestamps
 from datetime import datetime
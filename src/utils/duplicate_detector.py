@@ -9,6 +9,12 @@
 2. Вероятный дубликат (90-99%) - то же самое, но цена ±10%
 3. Возможный дубликат (70-90%) - похожий адрес, площадь ±1м², цена ±15%
 
+Дедупликация списка (deduplicate_list) использует блокирующий индекс:
+признаки объекта (нормализованный адрес, площадь, цена, этаж) считаются
+один раз, а полное сравнение выполняется только внутри блоков
+"дом + комнаты (+ этаж)" и "источник + URL". Результат совпадает с попарным
+сравнением со всеми ранее принятыми объектами.
+
 Использование:
     >>> detector = DuplicateDetector()
     >>> is_dup, score = detector.is_duplicate(obj1, obj2)
@@ -17,7 +23,8 @@
 
 import re
 import logging
-from typing import Dict, List, Tuple, Optional
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple, Optional
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
@@ -52,6 +59,63 @@ class DuplicateMatch:
         }
 
 
+@dataclass
+class _PreparedObject:
+    """Предрассчитанные признаки объекта для сравнения (без повторных regex)"""
+    source: Any
+    url: Any
+    has_address: bool
+    street: str
+    house: str
+    corpus: str
+    area: Optional[float]
+    rooms: str
+    floor: Optional[int]
+    floors: Optional[int]
+    price: Any
+
+
+class _BlockingIndex:
+    """
+    Блокирующий индекс принятых объектов
+
+    Дубликат возможен только если совпадают дом и комнаты (этаж - если
+    указан у обоих), либо источник и URL. Улица в ключ не входит: адреса
+    с вложенными названиями улиц тоже считаются совпадающими.
+    """
+
+    def __init__(self):
+        # (house, rooms) -> floor|None -> индексы
+        self.address_blocks: Dict[Tuple[str, str], Dict[Optional[int], set]] = defaultdict(lambda: defaultdict(set))
+        # (source, url) -> индексы
+        self.url_blocks: Dict[Tuple[Any, Any], set] = defaultdict(set)
+
+    def add(self, idx: int, prepared: _PreparedObject):
+        if prepared.has_address:
+            self.address_blocks[(prepared.house, prepared.rooms)][prepared.floor].add(idx)
+        self.url_blocks[(prepared.source, prepared.url)].add(idx)
+
+    def remove(self, idx: int, prepared: _PreparedObject):
+        if prepared.has_address:
+            self.address_blocks[(prepared.house, prepared.rooms)][prepared.floor].discard(idx)
+        self.url_blocks[(prepared.source, prepared.url)].discard(idx)
+
+    def candidates(self, prepared: _PreparedObject) -> List[int]:
+        """Индексы кандидатов в порядке добавления"""
+        found = set(self.url_blocks.get((prepared.source, prepared.url), ()))
+
+        if prepared.has_address:
+            by_floor = self.address_blocks.get((prepared.house, prepared.rooms), {})
+            if prepared.floor is None:
+                for indices in by_floor.values():
+                    found.update(indices)
+            else:
+                found.update(by_floor.get(prepared.floor, ()))
+                found.update(by_floor.get(None, ()))
+
+        return sorted(found)
+
+
 class DuplicateDetector:
     """
     Детектор дубликатов объявлений недвижимости
@@ -168,6 +232,11 @@ class DuplicateDetector:
         comp1 = self.extract_address_components(addr1)
         comp2 = self.extract_address_components(addr2)
 
+        return self._score_address_components(comp1, comp2)
+
+    @staticmethod
+    def _score_address_components(comp1: Dict[str, str], comp2: Dict[str, str]) -> float:
+        """Оценка совпадения уже разобранных адресов 0-100%"""
         # Улица и дом ДОЛЖНЫ совпадать
         if comp1['street'] != comp2['street']:
             # Пытаемся найти общую часть
@@ -269,76 +338,126 @@ class DuplicateDetector:
         Returns:
             (is_duplicate, confidence, duplicate_type, differences)
         """
+        return self._compare_prepared(self._prepare(obj1), self._prepare(obj2), check_source)
+
+    def _prepare(self, obj: Dict) -> _PreparedObject:
+        """Один раз разобрать адрес, площадь, этаж и цену объекта"""
+        address = obj.get('address', '')
+        if address:
+            components = self.extract_address_components(address)
+        else:
+            components = {'street': '', 'house': '', 'corpus': ''}
+
+        # Пытаемся извлечь число из строки если нужно
+        area = obj.get('total_area') or obj.get('area')
+        if isinstance(area, str):
+            match = re.search(r'(\d+(?:\.\d+)?)', area)
+            area = float(match.group(1)) if match else None
+
+        floor, floors = self.extract_floor(obj.get('floor', ''))
+
+        price = obj.get('price_raw') or obj.get('price')
+        if isinstance(price, str):
+            match = re.search(r'(\d+(?:\s*\d+)*)', price.replace(' ', ''))
+            price = float(match.group(1)) if match else None
+
+        return _PreparedObject(
+            source=obj.get('source'),
+            url=obj.get('url'),
+            has_address=bool(address),
+            street=components['street'],
+            house=components['house'],
+            corpus=components['corpus'],
+            area=area,
+            rooms=str(obj.get('rooms', '')).strip(),
+            floor=floor or None,
+            floors=floors,
+            price=price
+        )
+
+    def _compare_prepared(
+        self,
+        p1: _PreparedObject,
+        p2: _PreparedObject,
+        check_source: bool = True
+    ) -> Tuple[bool, float, str, Dict]:
+        """Проверка на дубликат по предрассчитанным признакам (см. is_duplicate)"""
         # Если это один и тот же источник И одинаковый URL - пропускаем
-        if check_source and obj1.get('source') == obj2.get('source'):
-            if obj1.get('url') == obj2.get('url'):
+        if check_source and p1.source == p2.source:
+            if p1.url == p2.url:
                 return True, 100.0, 'exact', {}
 
+        not_duplicate = (False, 0.0, 'not_duplicate', {})
         differences = {}
 
         # 1. Сравнение адресов (критично)
-        address_score = self.compare_addresses(
-            obj1.get('address', ''),
-            obj2.get('address', '')
-        )
-
+        address_score = self._score_prepared_address(p1, p2)
         if address_score < 80.0:
-            return False, 0.0, 'not_duplicate', {}
+            return not_duplicate
 
         # 2. Сравнение площади (критично)
-        area1 = obj1.get('total_area') or obj1.get('area')
-        area2 = obj2.get('total_area') or obj2.get('area')
-
-        # Пытаемся извлечь число из строки если нужно
-        if isinstance(area1, str):
-            match = re.search(r'(\d+(?:\.\d+)?)', area1)
-            area1 = float(match.group(1)) if match else None
-        if isinstance(area2, str):
-            match = re.search(r'(\d+(?:\.\d+)?)', area2)
-            area2 = float(match.group(1)) if match else None
-
-        if not self.compare_areas(area1, area2, strict=False):
-            return False, 0.0, 'not_duplicate', {}
-
-        strict_area = self.compare_areas(area1, area2, strict=True)
-        if not strict_area:
-            differences['area'] = (area1, area2)
+        strict_area = self._match_area(p1, p2, differences)
+        if strict_area is None:
+            return not_duplicate
 
         # 3. Сравнение комнат (критично)
-        rooms1 = str(obj1.get('rooms', '')).strip()
-        rooms2 = str(obj2.get('rooms', '')).strip()
-
-        if rooms1 != rooms2:
+        if p1.rooms != p2.rooms:
             # Разное количество комнат - не дубликат
-            return False, 0.0, 'not_duplicate', {}
+            return not_duplicate
 
         # 4. Сравнение этажа (важно)
-        floor1, floors1 = self.extract_floor(obj1.get('floor', ''))
-        floor2, floors2 = self.extract_floor(obj2.get('floor', ''))
+        if not self._match_floor(p1, p2, differences):
+            return not_duplicate
 
-        if floor1 and floor2 and floor1 != floor2:
-            # Разные этажи - скорее всего не дубликат
-            return False, 0.0, 'not_duplicate', {}
+        # 5. Сравнение цены (может отличаться!)
+        price_match, price_diff = self.compare_prices(p1.price, p2.price)
+        if not price_match:
+            differences['price'] = (p1.price, p2.price)
 
-        if floors1 and floors2 and floors1 != floors2:
-            differences['floors'] = (floors1, floors2)
+        return self._classify_duplicate(address_score, strict_area, price_diff, differences)
 
-        # 5. Сравнение цены (может отличаться!)
-        price1 = obj1.get('price_raw') or obj1.get('price')
-        price2 = obj2.get('price_raw') or obj2.get('price')
+    def _score_prepared_address(self, p1: _PreparedObject, p2: _PreparedObject) -> float:
+        """Схожесть адресов (0 - адрес у одного из объектов не указан)"""
+        if not p1.has_address or not p2.has_address:
+            return 0.0
+        return self._score_address_components(
+            {'street': p1.street, 'house': p1.house, 'corpus': p1.corpus},
+            {'street': p2.street, 'house': p2.house, 'corpus': p2.corpus}
+        )
 
-        if isinstance(price1, str):
-            match = re.search(r'(\d+(?:\s*\d+)*)', price1.replace(' ', ''))
-            price1 = float(match.group(1)) if match else None
-        if isinstance(price2, str):
-            match = re.search(r'(\d+(?:\s*\d+)*)', price2.replace(' ', ''))
-            price2 = float(match.group(1)) if match else None
+    def _match_area(self, p1: _PreparedObject, p2: _PreparedObject, differences: Dict) -> Optional[bool]:
+        """
+        Сравнение площадей
 
-        price_match, price_diff = self.compare_prices(price1, price2)
-        if not price_match:
-            differences['price'] = (price1, price2)
+        Returns:
+            None - площади слишком разные (не дубликат), иначе совпадают ли строго
+        """
+        if not self.compare_areas(p1.area, p2.area, strict=False):
+            return None
 
-        # Определяем тип дубликата и confidence
+        strict_area = self.compare_areas(p1.area, p2.area, strict=True)
+        if not strict_area:
+            differences['area'] = (p1.area, p2.area)
+        return strict_area
+
+    def _match_floor(self, p1: _PreparedObject, p2: _PreparedObject, differences: Dict) -> bool:
+        """Сравнение этажа (False - разные этажи) и этажности (расхождение - в differences)"""
+        if p1.floor and p2.floor and p1.floor != p2.floor:
+            # Разные этажи - скорее всего не дубликат
+            return False
+
+        if p1.floors and p2.floors and p1.floors != p2.floors:
+            differences['floors'] = (p1.floors, p2.floors)
+        return True
+
+    def _classify_duplicate(
+        self,
+        address_score: float,
+        strict_area: bool,
+        price_diff: float,
+        differences: Dict
+    ) -> Tuple[bool, float, str, Dict]:
+        """Определяем тип дубликата и confidence"""
         if address_score >= 95 and strict_area and price_diff <= self.strict_price_tolerance:
             # Строгий дубликат (100%)
             return True, 100.0, 'strict', differences
@@ -370,10 +489,20 @@ class DuplicateDetector:
         Returns:
             Список найденных дубликатов с информацией
         """
+        prepared_new = self._prepare(new_obj)
+        candidates = ((idx, self._prepare(existing_obj)) for idx, existing_obj in enumerate(existing_objects))
+        return self._match_candidates(prepared_new, candidates)
+
+    def _match_candidates(
+        self,
+        prepared_new: _PreparedObject,
+        candidates: Iterable[Tuple[int, _PreparedObject]]
+    ) -> List[DuplicateMatch]:
+        """Сравнить объект с кандидатами (в порядке индексов) и собрать совпадения"""
         duplicates = []
 
-        for idx, existing_obj in enumerate(existing_objects):
-            is_dup, confidence, dup_type, differences = self.is_duplicate(new_obj, existing_obj)
+        for idx, prepared_existing in candidates:
+            is_dup, confidence, dup_type, differences = self._compare_prepared(prepared_new, prepared_existing)
 
             if is_dup:
                 # Определяем рекомендацию
@@ -418,15 +547,24 @@ class DuplicateDetector:
             (уникальные_объекты, удаленные_дубликаты)
         """
         unique_objects = []
+        unique_prepared: List[_PreparedObject] = []
         removed_duplicates = []
+        index = _BlockingIndex()
 
         for obj in objects:
-            # Ищем дубликаты среди уже добавленных уникальных
-            duplicates = self.find_duplicates(obj, unique_objects)
+            prepared = self._prepare(obj)
+
+            # Ищем дубликаты среди уже добавленных уникальных (только в своих блоках)
+            duplicates = self._match_candidates(
+                prepared,
+                ((idx, unique_prepared[idx]) for idx in index.candidates(prepared))
+            )
 
             if not duplicates:
                 # Нет дубликатов - добавляем
+                index.add(len(unique_objects), prepared)
                 unique_objects.append(obj)
+                unique_prepared.append(prepared)
             else:
                 # Есть дубликаты
                 strict_duplicates = [d for d in duplicates if d.duplicate_type == 'strict']
@@ -445,7 +583,10 @@ class DuplicateDetector:
                             # Новый объект дешевле - заменяем
                             logger.info(f"Заменяем дубликат на объект с лучшей ценой: {new_price} < {existing_price}")
                             removed_duplicates.append(existing_obj)
+                            index.remove(strict_dup.index, unique_prepared[strict_dup.index])
+                            index.add(strict_dup.index, prepared)
                             unique_objects[strict_dup.index] = obj
+                            unique_prepared[strict_dup.index] = prepared
                         else:
                             # Оставляем старый
                             logger.info(f"Пропускаем дубликат, существующий дешевле: {existing_price} <= {new_price}")
@@ -457,7 +598,9 @@ class DuplicateDetector:
                     # Только вероятные/возможные дубликаты - добавляем с меткой
                     obj['possible_duplicate'] = True
                     obj['duplicate_info'] = duplicates[0].to_dict()
+                    index.add(len(unique_objects), prepared)
                     unique_objects.append(obj)
+                    unique_prepared.append(prepared)
 
         logger.info(f"Дедупликация: было {len(objects)}, осталось {len(unique_objects)}, удалено {len(removed_duplicates)}")
 
@@ -6,18 +6,39 @@ Features:
 - TTL (Time To Live) support for both Redis and in-memory
 - LRU (Least Recently Used) eviction for in-memory storage
 - Automatic cleanup of expired sessions
+- Field-level storage: each section (target_property, analysis, ...) is a
+  separate Redis hash field and every comparable is its own field, so
+  endpoints read and atomically update only what they need
 """
 import os
 import json
 import logging
 import threading
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional
 from datetime import datetime, timedelta, date
 from collections import OrderedDict
 
+try:
+    from redis.exceptions import ResponseError, WatchError
+except ImportError:  # in-memory storage only
+    class ResponseError(Exception):
+        pass
+
+    class WatchError(Exception):
+        pass
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_TTL = 86400
+
+# Hash layout of session:{id}
+SCHEMA_FIELD = '_schema'
+SCHEMA_VERSION = '2'
+COMPARABLES_FIELD = 'comparables'
+COMPARABLES_COUNT_FIELD = '_comparables_count'
+COMPARABLE_PREFIX = 'comparable:'
+
 
 def serialize_for_json(obj):
     """Convert datetime and other non-JSON-serializable objects to strings"""
@@ -51,7 +72,8 @@ class SessionStorage:
             'hits': 0,
             'misses': 0,
             'evictions': 0,
-            'expirations': 0
+            'expirations': 0,
+            'conflicts': 0
         }
 
         self._init_redis()
@@ -123,9 +145,146 @@ class SessionStorage:
             self.stats['evictions'] += 1
             logger.debug(f"Evicted LRU session: {evicted_key}")
 
-    def set(self, session_id: str, data: Dict[str, Any], ttl: int = 86400) -> bool:
+    # ------------------------------------------------------------------
+    # Redis layout: one hash per session, one field per section
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    @staticmethod
+    def _encode(value: Any) -> str:
+        return json.dumps(serialize_for_json(value), ensure_ascii=False)
+
+    @classmethod
+    def _to_fields(cls, data: Dict[str, Any]) -> Dict[str, str]:
+        """Session dict -> hash fields (comparables are stored one per field)"""
+        fields = {}
+        for name, value in data.items():
+            if name == COMPARABLES_FIELD and isinstance(value, list):
+                fields[COMPARABLES_COUNT_FIELD] = str(len(value))
+                for index, comparable in enumerate(value):
+                    fields[f"{COMPARABLE_PREFIX}{index}"] = cls._encode(comparable)
+            else:
+                fields[name] = cls._encode(value)
+        return fields
+
+    @staticmethod
+    def _from_fields(raw: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """Hash fields -> session dict (inverse of _to_fields)"""
+        data = {}
+        comparables = {}
+        for name, value in raw.items():
+            if value is None or name in (SCHEMA_FIELD, COMPARABLES_COUNT_FIELD):
+                continue
+            if name.startswith(COMPARABLE_PREFIX):
+                comparables[int(name[len(COMPARABLE_PREFIX):])] = json.loads(value)
+            else:
+                data[name] = json.loads(value)
+
+        if raw.get(COMPARABLES_COUNT_FIELD) is not None:
+            count = int(raw[COMPARABLES_COUNT_FIELD])
+            data[COMPARABLES_FIELD] = [comparables[i] for i in range(count) if i in comparables]
+        return data
+
+    def _redis_call(self, session_id: str, operation):
+        """Run operation, converting a legacy JSON-string session to a hash on WRONGTYPE"""
+        try:
+            return operation()
+        except ResponseError as e:
+            if 'WRONGTYPE' not in str(e):
+                raise
+            self._migrate_legacy(session_id)
+            return operation()
+
+    def _migrate_legacy(self, session_id: str):
+        """Sessions written before field-level storage are a single JSON string"""
+        key = self._key(session_id)
+        with self.redis_client.pipeline() as pipe:
+            pipe.get(key)
+            pipe.ttl(key)
+            blob, ttl = pipe.execute()
+        if blob is None:
+            return
+        logger.info(f"Migrating session {session_id} to field-level storage")
+        self._redis_set(session_id, json.loads(blob), ttl if ttl and ttl > 0 else DEFAULT_TTL)
+
+    def _redis_set(self, session_id: str, data: Dict[str, Any], ttl: int):
+        key = self._key(session_id)
+        with self.redis_client.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={SCHEMA_FIELD: SCHEMA_VERSION, **self._to_fields(data)})
+            pipe.expire(key, ttl)
+            pipe.execute()
+
+    def _redis_transaction(self, session_id: str, apply):
+        """
+        Optimistic read-modify-write of one session hash (WATCH/MULTI)
+
+        apply(pipe, key) reads in immediate mode and returns (result, writes);
+        writes is a list of (method, args) queued after MULTI, None aborts.
+        """
+        key = self._key(session_id)
+
+        def run():
+            with self.redis_client.pipeline() as pipe:
+                while True:
+                    try:
+                        pipe.watch(key)
+                        result, writes = apply(pipe, key)
+                        if writes is None:
+                            pipe.unwatch()
+                            return result
+                        pipe.multi()
+                        for method, args in writes:
+                            getattr(pipe, method)(*args)
+                        pipe.execute()
+                        return result
+                    except WatchError:
+                        self.stats['conflicts'] += 1
+                        continue
+
+        return self._redis_call(session_id, run)
+
+    # ------------------------------------------------------------------
+    # In-memory helpers (caller holds self.lock)
+    # ------------------------------------------------------------------
+
+    def _memory_entry(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Live session dict with TTL check and LRU touch, None if missing"""
+        entry = self.memory_storage.get(session_id)
+        if entry is None:
+            return None
+
+        data, expires_at = entry
+        if datetime.now() >= expires_at:
+            del self.memory_storage[session_id]
+            self.stats['expirations'] += 1
+            return None
+
+        self.memory_storage.move_to_end(session_id)
+        return data
+
+    def _memory_touch(self, session_id: str, data: Dict[str, Any], ttl: int):
+        self.memory_storage[session_id] = (data, datetime.now() + timedelta(seconds=ttl))
+        self.memory_storage.move_to_end(session_id)
+
+    @staticmethod
+    def _copy_fields(data: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+        names = data.keys() if fields is None else [f for f in fields if f in data]
+        result = {name: data[name] for name in names}
+        if isinstance(result.get(COMPARABLES_FIELD), list):
+            result[COMPARABLES_FIELD] = list(result[COMPARABLES_FIELD])
+        return result
+
+    # ------------------------------------------------------------------
+    # Whole-session operations
+    # ------------------------------------------------------------------
+
+    def set(self, session_id: str, data: Dict[str, Any], ttl: int = DEFAULT_TTL) -> bool:
         """
-        Store session data
+        Store session data (replaces the whole session)
 
         Args:
             session_id: Session identifier
@@ -134,82 +293,98 @@ class SessionStorage:
         """
         try:
             if self.redis_client:
-                # Serialize datetime objects before storing
-                serialized_data = serialize_for_json(data)
-                # Store in Redis with TTL
-                self.redis_client.setex(
-                    f"session:{session_id}",
-                    ttl,
-                    json.dumps(serialized_data, ensure_ascii=False)
-                )
+                self._redis_set(session_id, data, ttl)
                 return True
             else:
                 # Store in memory with TTL and LRU
                 with self.lock:
-                    # Evict LRU if needed
-                    self._evict_lru()
-
-                    # Calculate expiration time
-                    expires_at = datetime.now() + timedelta(seconds=ttl)
+                    if session_id not in self.memory_storage:
+                        self._evict_lru()
 
                     # Store data with expiration (no need to serialize for memory)
-                    self.memory_storage[session_id] = (data, expires_at)
-
-                    # Move to end (most recently used)
-                    self.memory_storage.move_to_end(session_id)
+                    self._memory_touch(session_id, data, ttl)
 
                 return True
         except Exception as e:
             logger.error(f"Error storing session {session_id}: {e}")
             return False
 
-    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session data (checks TTL for in-memory storage)"""
+    def get(self, session_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get session data (checks TTL for in-memory storage)
+
+        Args:
+            session_id: Session identifier
+            fields: Only these top-level fields (None - whole session).
+                Missing fields are absent from the result.
+
+        Returns:
+            Session dict or None if the session does not exist
+        """
         try:
             if self.redis_client:
-                # Get from Redis
-                data = self.redis_client.get(f"session:{session_id}")
-                if data:
-                    self.stats['hits'] += 1
-                    return json.loads(data)
-                self.stats['misses'] += 1
-                return None
+                raw = self._redis_call(session_id, lambda: self._redis_read(session_id, fields))
+                if raw is None:
+                    self.stats['misses'] += 1
+                    return None
+                self.stats['hits'] += 1
+                return self._from_fields(raw)
             else:
-                # Get from memory with TTL check
                 with self.lock:
-                    if session_id not in self.memory_storage:
+                    data = self._memory_entry(session_id)
+                    if data is None:
                         self.stats['misses'] += 1
                         return None
-
-                    data, expires_at = self.memory_storage[session_id]
-
-                    # Check if expired
-                    if datetime.now() >= expires_at:
-                        # Expired - remove it
-                        del self.memory_storage[session_id]
-                        self.stats['expirations'] += 1
-                        self.stats['misses'] += 1
-                        return None
-
-                    # Update LRU order (move to end)
-                    self.memory_storage.move_to_end(session_id)
                     self.stats['hits'] += 1
-
-                    return data
+                    return self._copy_fields(data, fields)
         except Exception as e:
             logger.error(f"Error getting session {session_id}: {e}")
             return None
 
+    def _redis_read(self, session_id: str, fields: Optional[Iterable[str]]) -> Optional[Dict[str, Optional[str]]]:
+        key = self._key(session_id)
+        if fields is None:
+            return self.redis_client.hgetall(key) or None
+
+        names = [f for f in fields if f != COMPARABLES_FIELD]
+        want_comparables = COMPARABLES_FIELD in fields
+        if want_comparables:
+            names.append(COMPARABLES_COUNT_FIELD)
+
+        values = self.redis_client.hmget(key, [SCHEMA_FIELD, *names])
+        if values[0] is None:
+            return None
+        raw = dict(zip(names, values[1:]))
+
+        count = int(raw.get(COMPARABLES_COUNT_FIELD) or 0)
+        if want_comparables and count:
+            comparable_fields = [f"{COMPARABLE_PREFIX}{i}" for i in range(count)]
+            raw.update(zip(comparable_fields, self.redis_client.hmget(key, comparable_fields)))
+        return raw
+
+    def get_field(self, session_id: str, field: str, default: Any = None) -> Any:
+        """Get a single top-level field of the session"""
+        data = self.get(session_id, fields=[field])
+        if data is None:
+            return default
+        return data.get(field, default)
+
     def exists(self, session_id: str) -> bool:
         """Check if session exists (respects TTL)"""
-        # Use get() which checks TTL
-        return self.get(session_id) is not None
+        try:
+            if self.redis_client:
+                return bool(self.redis_client.exists(self._key(session_id)))
+            with self.lock:
+                return self._memory_entry(session_id) is not None
+        except Exception as e:
+            logger.error(f"Error checking session {session_id}: {e}")
+            return False
 
     def delete(self, session_id: str) -> bool:
         """Delete session"""
         try:
             if self.redis_client:
-                return bool(self.redis_client.delete(f"session:{session_id}"))
+                return bool(self.redis_client.delete(self._key(session_id)))
             else:
                 with self.lock:
                     if session_id in self.memory_storage:
@@ -220,19 +395,217 @@ class SessionStorage:
             logger.error(f"Error deleting session {session_id}: {e}")
             return False
 
-    def update(self, session_id: str, updates: Dict[str, Any]) -> bool:
-        """Update session data"""
-        try:
-            data = self.get(session_id)
-            if data is None:
-                return False
+    # ------------------------------------------------------------------
+    # Partial updates
+    # ------------------------------------------------------------------
+
+    def update(
+        self,
+        session_id: str,
+        updates: Dict[str, Any],
+        ttl: int = DEFAULT_TTL,
+        create: bool = False
+    ) -> bool:
+        """
+        Atomically overwrite the given top-level fields, keeping the others
+
+        Only the updated fields are written: other sections are never read
+        or re-serialized.
 
-            data.update(updates)
-            return self.set(session_id, data)
+        Args:
+            session_id: Session identifier
+            updates: Fields to overwrite
+            ttl: New time to live in seconds
+            create: Create the session if it does not exist
+
+        Returns:
+            False if the session does not exist (and create is False)
+        """
+        try:
+            if self.redis_client:
+                def apply(pipe, key):
+                    count_raw, schema = pipe.hmget(key, COMPARABLES_COUNT_FIELD, SCHEMA_FIELD)
+                    if schema is None and not create:
+                        return False, None
+
+                    writes = []
+                    if COMPARABLES_FIELD in updates and count_raw:
+                        stale = [f"{COMPARABLE_PREFIX}{i}" for i in range(int(count_raw))]
+                        writes.append(('hdel', (key, *stale)))
+                    mapping = {SCHEMA_FIELD: SCHEMA_VERSION, **self._to_fields(updates)}
+                    writes.append(('hset', (key, None, None, mapping)))
+                    writes.append(('expire', (key, ttl)))
+                    return True, writes
+
+                return self._redis_transaction(session_id, apply)
+            else:
+                with self.lock:
+                    data = self._memory_entry(session_id)
+                    if data is None:
+                        if not create:
+                            return False
+                        self._evict_lru()
+                        data = {}
+                    data.update(updates)
+                    self._memory_touch(session_id, data, ttl)
+                    return True
         except Exception as e:
             logger.error(f"Error updating session {session_id}: {e}")
             return False
 
+    def merge_field(
+        self,
+        session_id: str,
+        field: str,
+        updates: Dict[str, Any],
+        ttl: int = DEFAULT_TTL
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically merge keys into a dict-valued field (e.g. target_property)
+
+        Returns:
+            The merged field value, or None if the session does not exist
+        """
+        try:
+            if self.redis_client:
+                def apply(pipe, key):
+                    schema, raw = pipe.hmget(key, SCHEMA_FIELD, field)
+                    if schema is None:
+                        return None, None
+                    value = {**(json.loads(raw) if raw else {}), **updates}
+                    return value, [
+                        ('hset', (key, field, self._encode(value))),
+                        ('expire', (key, ttl)),
+                    ]
+
+                return self._redis_transaction(session_id, apply)
+            else:
+                with self.lock:
+                    data = self._memory_entry(session_id)
+                    if data is None:
+                        return None
+                    value = {**(data.get(field) or {}), **updates}
+                    data[field] = value
+                    self._memory_touch(session_id, data, ttl)
+                    return value
+        except Exception as e:
+            logger.error(f"Error merging {field} of session {session_id}: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Comparables (addressable one by one)
+    # ------------------------------------------------------------------
+
+    def get_comparables(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """All comparables of the session, None if the session does not exist"""
+        data = self.get(session_id, fields=[COMPARABLES_FIELD])
+        if data is None:
+            return None
+        return data.get(COMPARABLES_FIELD, [])
+
+    def get_comparable(self, session_id: str, index: int) -> Optional[Dict[str, Any]]:
+        """One comparable by index, None if the session or index does not exist"""
+        try:
+            if self.redis_client:
+                def read():
+                    count_raw, raw = self.redis_client.hmget(
+                        self._key(session_id), COMPARABLES_COUNT_FIELD, f"{COMPARABLE_PREFIX}{index}"
+                    )
+                    if raw is None or not 0 <= index < int(count_raw or 0):
+                        return None
+                    return json.loads(raw)
+
+                return self._redis_call(session_id, read)
+            with self.lock:
+                data = self._memory_entry(session_id)
+                comparables = (data or {}).get(COMPARABLES_FIELD) or []
+                return comparables[index] if 0 <= index < len(comparables) else None
+        except Exception as e:
+            logger.error(f"Error getting comparable {index} of session {session_id}: {e}")
+            return None
+
+    def append_comparable(
+        self,
+        session_id: str,
+        comparable: Dict[str, Any],
+        ttl: int = DEFAULT_TTL
+    ) -> Optional[int]:
+        """
+        Atomically append a comparable
+
+        Returns:
+            Index of the new comparable, or None if the session does not exist
+        """
+        try:
+            if self.redis_client:
+                def apply(pipe, key):
+                    schema, count_raw = pipe.hmget(key, SCHEMA_FIELD, COMPARABLES_COUNT_FIELD)
+                    if schema is None:
+                        return None, None
+                    index = int(count_raw or 0)
+                    return index, [
+                        ('hset', (key, None, None, {
+                            f"{COMPARABLE_PREFIX}{index}": self._encode(comparable),
+                            COMPARABLES_COUNT_FIELD: str(index + 1),
+                        })),
+                        ('expire', (key, ttl)),
+                    ]
+
+                return self._redis_transaction(session_id, apply)
+            else:
+                with self.lock:
+                    data = self._memory_entry(session_id)
+                    if data is None:
+                        return None
+                    comparables = data.setdefault(COMPARABLES_FIELD, [])
+                    comparables.append(comparable)
+                    self._memory_touch(session_id, data, ttl)
+                    return len(comparables) - 1
+        except Exception as e:
+            logger.error(f"Error appending comparable to session {session_id}: {e}")
+            return None
+
+    def update_comparable(
+        self,
+        session_id: str,
+        index: int,
+        updates: Dict[str, Any],
+        ttl: int = DEFAULT_TTL
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically merge keys into one comparable (e.g. {'excluded': True})
+
+        Returns:
+            The updated comparable, or None if the session or index does not exist
+        """
+        try:
+            if self.redis_client:
+                def apply(pipe, key):
+                    field = f"{COMPARABLE_PREFIX}{index}"
+                    count_raw, raw = pipe.hmget(key, COMPARABLES_COUNT_FIELD, field)
+                    if raw is None or not 0 <= index < int(count_raw or 0):
+                        return None, None
+                    comparable = {**json.loads(raw), **updates}
+                    return comparable, [
+                        ('hset', (key, field, self._encode(comparable))),
+                        ('expire', (key, ttl)),
+                    ]
+
+                return self._redis_transaction(session_id, apply)
+            else:
+                with self.lock:
+                    data = self._memory_entry(session_id)
+                    comparables = (data or {}).get(COMPARABLES_FIELD) or []
+                    if not 0 <= index < len(comparables):
+                        return None
+                    comparable = {**comparables[index], **updates}
+                    comparables[index] = comparable
+                    self._memory_touch(session_id, data, ttl)
+                    return comparable
+        except Exception as e:
+            logger.error(f"Error updating comparable {index} of session {session_id}: {e}")
+            return None
+
     def get_stats(self) -> dict:
         """Get storage statistics"""
         with self.lock if not self.redis_client else threading.Lock():
@@ -248,7 +621,8 @@ class SessionStorage:
                 'misses': self.stats['misses'],
                 'hit_rate_percent': round(hit_rate, 2),
                 'evictions': self.stats['evictions'],
-                'expirations': self.stats['expirations']
+                'expirations': self.stats['expirations'],
+                'conflicts': self.stats['conflicts']
             }
 
 
@@ -0,0 +1,125 @@
+"""
+Тесты кэша результатов /api/analyze: ключ по содержимому входов, hit без пересчета
+"""
+from unittest.mock import patch
+
+import pytest
+
+from src.analytics import result_cache
+from src.analytics.result_cache import analysis_cache_key
+from src.cache.redis_cache import PropertyCache
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def make_session(excluded_index=None):
+    return {
+        'target_property': {
+            'url': 'https://spb.cian.ru/sale/flat/900/',
+            'address': 'Санкт-Петербург, Невский проспект, 1',
+            'price_raw': 10_000_000,
+            'total_area': 50.0,
+            'rooms': '2',
+            'floor': 5,
+        },
+        'comparables': [
+            {
+                'url': f'https://spb.cian.ru/sale/flat/{900 + i}/',
+                'address': f'Санкт-Петербург, Невский проспект, {i}',
+                'price': 9_000_000 + i * 250_000,
+                'total_area': 48.0 + i,
+                'rooms': '2',
+                'floor': 2 + i,
+                'excluded': i == excluded_index,
+            }
+            for i in range(1, 9)
+        ],
+    }
+
+
+@pytest.fixture
+def analysis_cache():
+    cache = PropertyCache(enabled=False, namespace='test')
+    cache.enabled = True
+    cache.redis_client = fakeredis.FakeRedis()
+    cache._is_available = True
+    with patch('app_new.property_cache', cache):
+        yield cache
+    cache.redis_client.flushall()
+
+
+@pytest.fixture
+def offline():
+    with patch('src.analytics.analyzer.MarketRatesService', side_effect=RuntimeError('offline')):
+        yield
+
+
+class TestAnalysisCacheKey:
+
+    def test_stable_for_equal_inputs(self):
+        session = make_session()
+        reordered_target = dict(reversed(list(session['target_property'].items())))
+        assert (analysis_cache_key(session['target_property'], session['comparables'], True, True)
+                == analysis_cache_key(reordered_target, session['comparables'], True, True))
+
+    def test_changes_with_inputs(self):
+        session = make_session()
+        key = analysis_cache_key(session['target_property'], session['comparables'], True, True)
+
+        assert key != analysis_cache_key(session['target_property'], session['comparables'], False, True)
+        assert key != analysis_cache_key(session['target_property'], session['comparables'], True, False)
+        assert key != analysis_cache_key(session['target_property'], make_session(3)['comparables'], True, True)
+
+    def test_includes_analytics_code_version(self):
+        session = make_session()
+        key = analysis_cache_key(session['target_property'], session['comparables'], True, True)
+        assert key.startswith(result_cache.analytics_code_version() + ':')
+
+        with patch.object(result_cache, 'analytics_code_version', return_value='other'):
+            assert analysis_cache_key(session['target_property'], session['comparables'], True, True) != key
+
+
+class TestAnalyzeEndpointCache:
+
+    def analyze(self, client, session_id):
+        response = client.post('/api/analyze', json={'session_id': session_id})
+        assert response.status_code == 200
+        return response.get_json()
+
+    def test_repeated_analysis_is_served_from_cache(self, client, disable_rate_limiting, analysis_cache, offline):
+        import app_new
+        app_new.session_storage.set('analysis-cache-1', make_session())
+        app_new.session_storage.set('analysis-cache-2', make_session())
+
+        first = self.analyze(client, 'analysis-cache-1')
+        with patch('app_new.RealEstateAnalyzer') as analyzer_cls:
+            # Другая сессия с теми же данными получает тот же результат
+            second = self.analyze(client, 'analysis-cache-2')
+        analyzer_cls.assert_not_called()
+
+        assert (first['cached'], second['cached']) == (False, True)
+        assert second['analysis']['fair_price_analysis'] == first['analysis']['fair_price_analysis']
+        assert second['analysis']['housler_offer'] == first['analysis']['housler_offer']
+        assert app_new.session_storage.get('analysis-cache-2')['analysis']['fair_price_analysis'] == \
+            first['analysis']['fair_price_analysis']
+
+        stats = analysis_cache.get_stats()['by_type']['analysis']
+        assert (stats['keys'], stats['hits'], stats['misses']) == (1, 1, 1)
+
+    def test_changed_comparables_miss(self, client, disable_rate_limiting, analysis_cache, offline):
+        import app_new
+        app_new.session_storage.set('analysis-cache-3', make_session())
+        app_new.session_storage.set('analysis-cache-4', make_session(excluded_index=2))
+
+        assert self.analyze(client, 'analysis-cache-3')['cached'] is False
+        assert self.analyze(client, 'analysis-cache-4')['cached'] is False
+        assert self.analyze(client, 'analysis-cache-4')['cached'] is True
+
+    def test_disabled(self, client, disable_rate_limiting, analysis_cache, offline, monkeypatch):
+        import app_new
+        monkeypatch.setattr(app_new.settings, 'ANALYSIS_CACHE_ENABLED', False)
+        app_new.session_storage.set('analysis-cache-5', make_session())
+
+        assert self.analyze(client, 'analysis-cache-5')['cached'] is False
+        assert self.analyze(client, 'analysis-cache-5')['cached'] is False
+        assert analysis_cache.get_stats()['by_type']['analysis']['keys'] == 0
@@ -9,6 +9,8 @@ Focus on:
 import pytest
 from unittest.mock import Mock, patch
 from src.analytics.analyzer import RealEstateAnalyzer
+from src.analytics.liquidity_profile import build_liquidity_profile
+from src.analytics.median_calculator import calculate_medians_from_comparables
 from src.models.property import TargetProperty, ComparableProperty, AnalysisRequest, AnalysisResult
 
 
@@ -265,3 +267,63 @@ class TestEdgeCases:
         assert result is not None
         assert 'fair_price_total' in result.fair_price_analysis
         assert result.fair_price_analysis['fair_price_total'] > 0
+
+
+class TestAnalysisStages:
+    """Test memoized stage graph of the analyzer"""
+
+    @staticmethod
+    def _make_request(price_shift=0):
+        target = TargetProperty(
+            url="https://www.cian.ru/sale/flat/123/",
+            price=10_000_000,
+            total_area=50.0,
+            rooms=2,
+            floor=5,
+            address="Test"
+        )
+        comparables = [
+            ComparableProperty(
+                url=f"https://www.cian.ru/sale/flat/{i}/",
+                price=9_000_000 + i * 250_000 + price_shift,
+                total_area=48.0 + i,
+                rooms=2,
+                floor=2 + i,
+                address=f"Test {i}"
+            )
+            for i in range(1, 7)
+        ]
+        return AnalysisRequest(target_property=target, comparables=comparables, filter_outliers=False)
+
+    def test_each_stage_computed_once(self):
+        """Medians and market profile are computed once per analyze()"""
+        analyzer = RealEstateAnalyzer(enable_tracking=False)
+
+        with patch('src.analytics.analyzer.calculate_medians_from_comparables',
+                   wraps=calculate_medians_from_comparables) as medians_mock, \
+             patch('src.analytics.analyzer.build_liquidity_profile',
+                   wraps=build_liquidity_profile) as profile_mock:
+            analyzer.analyze(self._make_request())
+
+        assert medians_mock.call_count == 1
+        assert profile_mock.call_count == 1
+        assert analyzer.get_metrics()['cache_hits'] > 0
+
+    def test_stage_timings_reported(self):
+        """Every stage reports its wall time in metrics"""
+        analyzer = RealEstateAnalyzer(enable_tracking=False)
+        analyzer.analyze(self._make_request())
+
+        timings = analyzer.get_metrics()['stage_timings_ms']
+        assert set(timings) == set(RealEstateAnalyzer.STAGE_DEPENDENCIES)
+        assert all(value >= 0 for value in timings.values())
+
+    def test_stages_reset_between_requests(self):
+        """Memoized stages do not leak into the next analyze() call"""
+        analyzer = RealEstateAnalyzer(enable_tracking=False)
+        first = analyzer.analyze(self._make_request())
+        second = analyzer.analyze(self._make_request(price_shift=1_000_000))
+
+        assert second.market_statistics['all']['median'] > first.market_statistics['all']['median']
+        assert (second.fair_price_analysis['fair_price_total']
+                > first.fair_price_analysis['fair_price_total'])
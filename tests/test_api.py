@@ -3,6 +3,8 @@ Tests for API endpoints
 """
 import pytest
 import json
+import threading
+import time
 from unittest.mock import patch, Mock
 
 
@@ -348,6 +350,179 @@ class TestAnalyzeEndpoint:
         assert response.status_code in [400, 422]
 
 
+class TestFindSimilarStreamEndpoint:
+    """Tests for /api/find-similar/stream endpoint"""
+
+    @staticmethod
+    def _mock_parser(results):
+        parser = Mock()
+        parser.__enter__ = Mock(return_value=parser)
+        parser.__exit__ = Mock(return_value=None)
+        parser.search_similar = Mock(return_value=results)
+        parser.search_similar_in_building = Mock(return_value=[])
+        return parser
+
+    @staticmethod
+    def _comparables():
+        return [
+            {
+                'url': f'https://spb.cian.ru/sale/flat/{i}/',
+                'address': f'Санкт-Петербург, Невский проспект, д. {i} к. 1',
+                'price': 10_000_000 + i * 100_000,
+                'total_area': 50.0 + i,
+                'rooms': 2,
+                'floor': i
+            }
+            for i in range(1, 4)
+        ]
+
+    @staticmethod
+    def _create_session():
+        from src.utils.session_storage import get_session_storage
+        session_id = 'test-stream-session'
+        get_session_storage().set(session_id, {
+            'target_property': {
+                'url': 'https://spb.cian.ru/sale/flat/100/',
+                'address': 'Санкт-Петербург, Невский проспект, 100',
+                'price': 10_000_000,
+                'total_area': 50.0,
+                'rooms': 2,
+                'region': 'spb'
+            }
+        })
+        return session_id
+
+    @patch('app_new.get_parser_for_url')
+    def test_stream_ndjson(self, mock_get_parser, client, disable_rate_limiting):
+        """Comparables are streamed one by one, summary comes last and is saved to session"""
+        mock_get_parser.return_value = self._mock_parser(self._comparables())
+        session_id = self._create_session()
+
+        response = client.post(
+            '/api/find-similar/stream',
+            data=json.dumps({'session_id': session_id, 'search_type': 'city'}),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+        assert events[0]['event'] == 'started'
+        streamed = [e for e in events if e['event'] == 'comparable']
+        assert [e['index'] for e in streamed] == [0, 1, 2]
+        assert events[-1]['event'] == 'summary'
+        assert events[-1]['count'] == 3
+
+        from src.utils.session_storage import get_session_storage
+        assert len(get_session_storage().get(session_id)['comparables']) == 3
+
+    @patch('app_new.get_parser_for_url')
+    def test_stream_sse_skips_duplicates(self, mock_get_parser, client, disable_rate_limiting):
+        """SSE format; strict duplicates and repeated URLs are not streamed twice"""
+        comparables = self._comparables()
+        duplicate = dict(comparables[0], url='https://spb.cian.ru/sale/flat/999/')
+        mock_get_parser.return_value = self._mock_parser(comparables + [duplicate])
+        session_id = self._create_session()
+
+        response = client.post(
+            '/api/find-similar/stream',
+            data=json.dumps({'session_id': session_id, 'search_type': 'city'}),
+            content_type='application/json',
+            headers={'Accept': 'text/event-stream'}
+        )
+
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert body.count('event: comparable') == 3
+        assert body.rstrip().split('\n\n')[-1].startswith('event: summary')
+
+    @patch('app_new.get_parser_for_url')
+    def test_blocking_endpoint_returns_same_comparables(self, mock_get_parser, client, disable_rate_limiting):
+        """/api/find-similar shares the search pipeline with the streaming variant"""
+        mock_get_parser.return_value = self._mock_parser(self._comparables())
+        session_id = self._create_session()
+
+        response = client.post(
+            '/api/find-similar',
+            data=json.dumps({'session_id': session_id, 'search_type': 'city'}),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['count'] == 3
+        assert [c['url'] for c in data['comparables']] == [c['url'] for c in self._comparables()]
+
+    @patch('app_new._create_detail_pipeline', side_effect=RuntimeError('async service down'))
+    def test_stream_pipeline_failure_emits_error(self, mock_pipeline, client, disable_rate_limiting):
+        """A failure before the search starts still ends the stream with an error event"""
+        session_id = self._create_session()
+
+        response = client.post(
+            '/api/find-similar/stream',
+            data=json.dumps({'session_id': session_id, 'search_type': 'city'}),
+            content_type='application/json'
+        )
+
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+        assert [e['event'] for e in events] == ['started', 'error']
+        assert 'async service down' in events[-1]['details']
+
+    @patch('app_new.get_parser_for_url')
+    def test_stream_disconnect_stops_search(self, mock_get_parser, client, disable_rate_limiting):
+        """Closing the stream stops the search cascade; pages load via the async service, not pool browsers"""
+        stopped = threading.Event()
+
+        def search_similar(target, limit=20, on_results=None, should_stop=None):
+            deadline = time.monotonic() + 5
+            while not should_stop() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if should_stop():
+                stopped.set()
+            return []
+
+        parser = self._mock_parser([])
+        parser.search_similar = search_similar
+        mock_get_parser.return_value = parser
+        session_id = self._create_session()
+
+        response = client.post(
+            '/api/find-similar/stream',
+            data=json.dumps({'session_id': session_id, 'search_type': 'city'}),
+            content_type='application/json'
+        )
+        assert json.loads(next(iter(response.response)))['event'] == 'started'
+        response.close()
+
+        assert stopped.wait(timeout=5)
+        from app_new import property_cache
+        from src.parsers.async_parser import get_async_parsing_service
+        service = get_async_parsing_service(cache=property_cache)
+        assert mock_get_parser.call_args.kwargs['page_fetcher'] == service.fetch_page
+
+    def test_stream_invalid_session(self, client, disable_rate_limiting):
+        """Unknown session returns a plain JSON error, not a stream"""
+        response = client.post(
+            '/api/find-similar/stream',
+            data=json.dumps({'session_id': 'nonexistent'}),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('session_id', [12345, ['abc'], ''])
+    def test_stream_malformed_session_id(self, client, disable_rate_limiting, session_id):
+        """Non-string session_id is a client error"""
+        response = client.post(
+            '/api/find-similar/stream',
+            data=json.dumps({'session_id': session_id}),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 400
+
+
 class TestExcludeComparableEndpoint:
     """Tests for /api/exclude-comparable endpoint"""
 
@@ -384,6 +559,26 @@ class TestExcludeComparableEndpoint:
         updated_session = storage.get(session_id)
         assert updated_session['comparables'][0]['excluded'] is True
 
+    @pytest.mark.parametrize('index', [5, -1, None, '0'])
+    def test_exclude_invalid_index(self, client, disable_rate_limiting, index):
+        """Out-of-range or missing index is an error and changes nothing"""
+        from src.utils.session_storage import get_session_storage
+        storage = get_session_storage()
+
+        session_id = 'test-exclude-invalid'
+        storage.set(session_id, {'comparables': [{'price_raw': 5000000, 'excluded': False}]})
+
+        for endpoint in ('/api/exclude-comparable', '/api/include-comparable'):
+            response = client.post(
+                endpoint,
+                data=json.dumps({'session_id': session_id, 'index': index}),
+                content_type='application/json'
+            )
+
+            assert response.status_code == 400
+            assert response.get_json()['status'] == 'error'
+        assert storage.get(session_id)['comparables'] == [{'price_raw': 5000000, 'excluded': False}]
+
 
 class TestIncludeComparableEndpoint:
     """Tests for /api/include-comparable endpoint"""
@@ -0,0 +1,215 @@
+"""
+Тесты AsyncParsingService: прогретый браузер между запросами и backpressure
+
+Браузер не запускается: async парсер подменяется фейком через parser_factory
+"""
+import asyncio
+import threading
+
+import pytest
+
+from src.exceptions import ParserOverloadedError
+from src.parsers.async_parser import (
+    AsyncParsingService, ParseResult, StreamingDetailParser
+)
+
+
+class FakeAsyncParser:
+    def __init__(self, gate=None, fail_start=False, fail_fetch=False, delay=0.0):
+        self.gate = gate
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.fail_start = fail_start
+        self.fail_fetch = fail_fetch
+        self.started = 0
+        self.closed = 0
+        self.parsed = []
+        self.released = []
+        self.browser = None
+
+    async def start(self):
+        self.started += 1
+        if self.fail_start:
+            raise RuntimeError('browser crashed')
+
+    async def close(self):
+        self.closed += 1
+
+    async def _parse_with_timeout(self, url, timeout_per_url, max_retries):
+        if self.gate is not None:
+            while not self.gate.is_set():
+                await asyncio.sleep(0.01)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.parsed.append(url)
+        return ParseResult(url=url, ok=True, data={'url': url, 'price': 10_000_000, 'total_area': 50.0})
+
+    async def _acquire_context(self):
+        return object()
+
+    async def _release_context(self, context, healthy=True):
+        self.released.append(healthy)
+
+    async def _fetch_page_content(self, url, context):
+        if self.fail_fetch:
+            raise RuntimeError('navigation failed')
+        self.parsed.append(url)
+        return f'<html>{url}</html>'
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+
+def urls(*ids):
+    return [f'https://www.cian.ru/sale/flat/{i}/' for i in ids]
+
+
+@pytest.fixture
+def make_service():
+    services = []
+
+    def factory(parsers, **kwargs):
+        created = iter(parsers)
+        service = AsyncParsingService(idle_timeout=0, parser_factory=lambda: next(created), **kwargs)
+        services.append(service)
+        return service
+
+    yield factory
+    for service in services:
+        service.close(timeout=5)
+
+
+class TestWarmParser:
+
+    def test_browser_reused_across_batches(self, make_service):
+        fake = FakeAsyncParser()
+        service = make_service([fake])
+
+        first = service.parse_many(urls(1, 2))
+        second = service.parse_many(urls(3))
+
+        assert [r.ok for r in first + second] == [True, True, True]
+        assert [r.url for r in first] == urls(1, 2)
+        assert fake.started == 1
+        stats = service.get_stats()
+        assert stats['browser_starts'] == 1
+        assert stats['completed'] == 3
+        assert stats['browser_running'] is True
+
+    def test_disconnected_browser_is_restarted(self, make_service):
+        first, second = FakeAsyncParser(), FakeAsyncParser()
+        first.browser = FakeBrowser()
+        service = make_service([first, second])
+
+        service.parse_many(urls(1))
+        first.browser.connected = False
+        service.parse_many(urls(2))
+
+        assert first.closed == 1
+        assert second.parsed == urls(2)
+        assert service.get_stats()['browser_starts'] == 2
+
+    def test_start_failure_becomes_parse_error(self, make_service):
+        service = make_service([FakeAsyncParser(fail_start=True)])
+        [result] = service.parse_many(urls(1))
+        assert not result.ok
+        assert result.error_type == 'parse_error'
+
+    def test_close_stops_browser(self, make_service):
+        fake = FakeAsyncParser()
+        service = make_service([fake])
+        service.parse_many(urls(1))
+        service.close()
+        assert fake.closed == 1
+        assert not service.running
+
+
+class TestBackpressure:
+
+    def test_full_queue_rejects(self, make_service):
+        gate = threading.Event()
+        service = make_service([FakeAsyncParser(gate=gate)], max_queue=2, queue_timeout=0.05)
+
+        futures = service.submit_batch(urls(1, 2))
+        with pytest.raises(ParserOverloadedError) as exc:
+            service.submit(urls(3)[0])
+        assert exc.value.http_status == 503
+        assert service.get_stats()['rejected'] == 1
+
+        gate.set()
+        assert all(f.result(timeout=5).ok for f in futures)
+        # Места освободились - очередь снова принимает задачи
+        assert service.submit(urls(3)[0]).result(timeout=5).ok
+
+    def test_batch_is_all_or_nothing(self, make_service):
+        gate = threading.Event()
+        service = make_service([FakeAsyncParser(gate=gate)], max_queue=2, queue_timeout=0.05)
+
+        with pytest.raises(ParserOverloadedError):
+            service.submit_batch(urls(1, 2, 3))
+        gate.set()
+
+        assert service.parse_many(urls(4, 5))[1].ok
+
+    def test_parse_many_times_out_unfinished(self, make_service):
+        service = make_service([FakeAsyncParser(gate=threading.Event())])
+        [result] = service.parse_many(urls(1), timeout=0.1)
+        assert result.error_type == 'timeout'
+
+    def test_parse_many_waits_for_every_wave(self, make_service):
+        fake = FakeAsyncParser(delay=0.1)
+        service = make_service([fake], max_concurrent=2, queue_timeout=0.05)
+
+        # 6 URL при 2 параллельных - три волны, дольше двух timeout_per_url
+        results = service.parse_many(urls(1, 2, 3, 4, 5, 6), timeout_per_url=0.15)
+
+        assert [r.ok for r in results] == [True] * 6
+        assert fake.max_active == 2
+
+
+class TestFetchPage:
+
+    def test_fetch_uses_warm_browser(self, make_service):
+        fake = FakeAsyncParser()
+        service = make_service([fake])
+
+        assert service.fetch_page(urls(1)[0]) == f'<html>{urls(1)[0]}</html>'
+        service.parse_many(urls(2))
+
+        assert fake.started == 1
+        assert fake.released == [True]
+
+    def test_fetch_error_propagates_and_releases_context(self, make_service):
+        fake = FakeAsyncParser(fail_fetch=True)
+        service = make_service([fake])
+
+        with pytest.raises(RuntimeError, match='navigation failed'):
+            service.fetch_page(urls(1)[0])
+        assert fake.released == [False]
+
+
+def test_streaming_pool_marks_overloaded_urls():
+    """Пул поиска не ждет места в очереди: URL сверх очереди помечаются overloaded"""
+    gate = threading.Event()
+    service = AsyncParsingService(idle_timeout=0, max_queue=1, parser_factory=lambda: FakeAsyncParser(gate=gate))
+    try:
+        with StreamingDetailParser(limit=10, service=service) as pipeline:
+            pipeline.submit([{'url': u} for u in urls(1, 2)])
+            gate.set()
+            results, quality = pipeline.collect(urls(1, 2))
+
+        assert quality['successfully_parsed'] == 1
+        assert quality['error_breakdown'] == {'overloaded': 1}
+        assert pipeline.get_stats()['overloaded'] == 1
+        # Общий сервис переживает пул
+        assert service.running
+    finally:
+        service.close(timeout=5)
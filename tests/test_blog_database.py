@@ -0,0 +1,178 @@
+"""
+Тесты BlogDatabase и блога: соединения, WAL, счетчик просмотров, кэш HTML постов и sitemap
+"""
+import sqlite3
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from blog_database import BlogDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = BlogDatabase(str(tmp_path / 'blog.db'), view_flush_interval=3600)
+    database.create_post(slug='first', title='First', content='Text **bold**', excerpt='Intro')
+    yield database
+    database.close()
+
+
+def stored_views(db, slug):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute('SELECT view_count FROM blog_posts WHERE slug = ?', (slug,)).fetchone()[0]
+
+
+class TestConnections:
+
+    def test_connection_is_reused_per_thread(self, db):
+        conn = db._connection()
+        db.get_post_by_slug('first')
+        db.count_posts()
+        assert db._connection() is conn
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(db._connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
+        assert len(db._connections) == 2
+
+    def test_wal_mode(self, db):
+        assert db._connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db._connection().execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+    def test_close_reopens_on_next_use(self, db):
+        conn = db._connection()
+        db.close()
+        assert db.get_post_by_slug('first')['title'] == 'First'
+        assert db._connection() is not conn
+
+    def test_failed_write_is_rolled_back(self, db):
+        assert db.add_to_queue('https://example.com/a', 'A', 'rss') is not None
+        assert db.add_to_queue('https://example.com/a', 'A', 'rss') is None
+        # Соединение не осталось в открытой транзакции
+        assert not db._connection().in_transaction
+        assert db.get_queue_stats() == {'pending': 1, 'processing': 0, 'failed': 0, 'total': 1}
+
+
+class TestViewCounts:
+
+    def test_views_are_buffered_until_flush(self, db):
+        for _ in range(3):
+            db.increment_view_count('first')
+
+        assert stored_views(db, 'first') == 0
+        assert db.get_post_by_slug('first')['view_count'] == 3
+
+        assert db.flush_view_counts() == 3
+        assert stored_views(db, 'first') == 3
+        assert db.get_post_by_slug('first')['view_count'] == 3
+
+    def test_flush_after_interval(self, db):
+        db.view_flush_interval = 10
+        with patch('blog_database.time.monotonic', return_value=db._last_views_flush + 11):
+            db.increment_view_count('first')
+        assert stored_views(db, 'first') == 1
+
+    def test_zero_interval_writes_every_view(self, tmp_path):
+        db = BlogDatabase(str(tmp_path / 'blog.db'), view_flush_interval=0)
+        db.create_post(slug='post', title='Post', content='Text')
+        db.increment_view_count('post')
+        assert stored_views(db, 'post') == 1
+        db.close()
+
+    def test_close_flushes_pending_views(self, db):
+        db.increment_view_count('first')
+        db.close()
+        assert stored_views(db, 'first') == 1
+
+    def test_flush_error_drops_batch(self, db):
+        db.increment_view_count('first')
+        with patch.object(db, '_transaction', side_effect=sqlite3.OperationalError('readonly')):
+            assert db.flush_view_counts() == 0
+        assert db._pending_views == {}
+
+
+def test_blog_post_view_is_buffered(client, db):
+    with patch('blog_routes.blog_db', db):
+        assert client.get('/blog/first').status_code == 200
+        assert client.get('/blog/first').status_code == 200
+
+    assert stored_views(db, 'first') == 0
+    assert db._pending_views == {'first': 2}
+
+
+@pytest.fixture
+def blog_routes_db(db):
+    import blog_routes
+    blog_routes._sitemap_cache.clear()
+    with patch('blog_routes.blog_db', db):
+        yield db
+    blog_routes._sitemap_cache.clear()
+
+
+class TestRenderedContentCache:
+
+    def test_post_html_is_rendered_once_per_content(self, client, blog_routes_db):
+        import blog_routes
+        with patch('blog_routes.render_post_html', wraps=blog_routes.render_post_html) as render:
+            first = client.get('/blog/first')
+            second = client.get('/blog/first')
+            assert render.call_count == 1
+
+            with sqlite3.connect(blog_routes_db.db_path) as conn:
+                conn.execute("UPDATE blog_posts SET content = 'New *text*' WHERE slug = 'first'")
+            third = client.get('/blog/first')
+            assert render.call_count == 2
+
+        assert b'<strong>bold</strong>' in first.data and first.data == second.data
+        assert b'<em>text</em>' in third.data
+
+    def test_unknown_post_is_404(self, client, blog_routes_db):
+        assert client.get('/blog/missing').status_code == 404
+
+
+class TestSitemaps:
+
+    def test_blog_sitemap_uses_index_query_and_etag(self, client, blog_routes_db):
+        with patch.object(blog_routes_db, 'get_all_posts', side_effect=AssertionError('full posts loaded')):
+            response = client.get('/sitemap-blog-1.xml')
+            assert response.status_code == 200
+            assert b'<loc>https://housler.ru/blog/first</loc>' in response.data
+            assert response.headers['Last-Modified']
+
+            cached = client.get('/sitemap-blog-1.xml', headers={'If-None-Match': response.headers['ETag']})
+            assert cached.status_code == 304
+
+            blog_routes_db.create_post(slug='second', title='Second', content='Text')
+            changed = client.get('/sitemap-blog-1.xml', headers={'If-None-Match': response.headers['ETag']})
+            assert changed.status_code == 200
+            assert b'/blog/second</loc>' in changed.data
+
+    def test_sitemap_index_counts_pages(self, client, blog_routes_db):
+        response = client.get('/sitemap.xml')
+
+        assert response.status_code == 200
+        assert response.data.count(b'sitemap-blog-') == 1
+        assert client.get('/sitemap-blog-2.xml').status_code == 404
+
+    def test_main_sitemap_is_conditional(self, client, blog_routes_db):
+        response = client.get('/sitemap-main.xml')
+        cached = client.get('/sitemap-main.xml', headers={'If-Modified-Since': response.headers['Last-Modified']})
+
+        assert cached.status_code == 304
+
+
+def test_importing_routes_does_not_create_database(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [sys.executable, '-c', 'import blog_routes; assert blog_routes.blog_db is None'],
+        cwd=tmp_path, env={**os.environ, 'PYTHONPATH': root}, check=True
+    )
+
+    assert not list(tmp_path.glob('blog.db*'))
@@ -280,6 +280,171 @@ class TestBrowserPool:
         assert pool.playwright is None
         assert len(pool.browsers) == 0
 
+    def test_waiter_gets_released_browser_without_polling(self, mock_playwright):
+        """Test that a blocked acquire() is woken up by release()"""
+        pool = BrowserPool(max_browsers=1, recycle_interval=0)
+        pool.start()
+
+        browser, _ = pool.acquire()
+        result = {}
+
+        def waiter():
+            started = time.monotonic()
+            result['browser'], _ = pool.acquire(timeout=5.0)
+            result['waited'] = time.monotonic() - started
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.1)
+        pool.release(browser)
+        thread.join(timeout=5)
+
+        assert result['browser'] is browser
+        assert result['waited'] < 0.5  # no 0.5s polling step
+
+    def test_waiters_served_in_fifo_order(self, mock_playwright):
+        """Test that waiters acquire browsers in arrival order"""
+        pool = BrowserPool(max_browsers=1, recycle_interval=0)
+        pool.start()
+
+        browser, _ = pool.acquire()
+        order = []
+
+        def waiter(name):
+            acquired, _ = pool.acquire(timeout=5.0)
+            order.append(name)
+            pool.release(acquired)
+
+        threads = []
+        for name in ('first', 'second', 'third'):
+            thread = threading.Thread(target=waiter, args=(name,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)
+
+        pool.release(browser)
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert order == ['first', 'second', 'third']
+
+    def test_browser_launch_outside_lock(self, mock_playwright):
+        """Test that pool lock is not held while Chromium starts"""
+        pool = BrowserPool(max_browsers=2, recycle_interval=0)
+        pool.start()
+
+        lock_states = []
+        launch = pool.playwright.chromium.launch
+
+        def slow_launch(*args, **kwargs):
+            lock_states.append(pool.lock.locked())
+            return launch(*args, **kwargs)
+
+        pool.playwright.chromium.launch = slow_launch
+        pool.acquire()
+
+        assert lock_states == [False]
+
+    def test_min_warm_prestart(self, mock_playwright):
+        """Test that start() launches min_warm idle browsers"""
+        pool = BrowserPool(max_browsers=3, min_warm=2, recycle_interval=0)
+        pool.start()
+
+        assert pool.total_created == 2
+        assert pool.get_stats()['browsers_free'] == 2
+
+        pool.acquire()
+        assert pool.total_created == 2  # warm browser reused
+
+    def test_recycle_stale_browsers(self, mock_playwright):
+        """Test recycling of stale idle browsers with warm top-up"""
+        pool = BrowserPool(max_browsers=2, max_age_seconds=1, min_warm=1, recycle_interval=0)
+        pool.start()
+        assert pool.total_created == 1
+
+        time.sleep(1.1)
+        assert pool.recycle_stale() == 1
+        assert pool.total_destroyed == 1
+
+        pool._ensure_warm()
+        assert pool.get_stats()['browsers_free'] == 1
+        assert pool.total_created == 2
+
+    def test_release_maintains_pool_on_owner_thread(self, mock_playwright):
+        """Test that stale recycling and warm top-up run in release() of the owner thread only"""
+        pool = BrowserPool(max_browsers=2, max_age_seconds=1, min_warm=1, recycle_interval=0)
+        pool.start()
+        pool.playwright.chromium.launch.side_effect = lambda *args, **kwargs: MagicMock()
+        first, _ = pool.acquire()
+        second, _ = pool.acquire()
+        created = pool.total_created
+
+        time.sleep(1.1)
+        thread = threading.Thread(target=pool.release, args=(first,))
+        thread.start()
+        thread.join(timeout=5)
+        assert pool.total_destroyed == 0
+
+        pool.release(second)
+        assert pool.total_destroyed == 2
+        assert pool.total_created == created + 1
+        assert pool.get_stats()['browsers_free'] == 1
+
+    def test_acquire_maintains_pool_on_owner_thread(self, mock_playwright):
+        """Test that acquire() on the owner thread recycles stale idle browsers before taking one"""
+        pool = BrowserPool(max_browsers=2, max_age_seconds=1, min_warm=2, recycle_interval=0)
+        pool.start()
+        pool.playwright.chromium.launch.side_effect = lambda *args, **kwargs: MagicMock()
+        assert pool.total_created == 2
+
+        time.sleep(1.1)
+        pool.acquire()
+
+        assert pool.total_destroyed == 2
+        assert pool.total_created == 4
+
+    def test_acquire_from_other_thread_uses_calling_thread(self, mock_playwright):
+        """Test that acquire() from a non-owner thread touches Playwright only on that thread"""
+        pool = BrowserPool(max_browsers=2, max_age_seconds=1, min_warm=1, recycle_interval=0)
+        pool.start()
+        threads_before = set(threading.enumerate())
+        launched_on = []
+        pool.playwright.chromium.launch.side_effect = lambda *args, **kwargs: (
+            launched_on.append(threading.current_thread()) or MagicMock()
+        )
+        result = {}
+
+        def worker():
+            first, _ = pool.acquire(timeout=5.0)
+            result['second'], _ = pool.acquire(timeout=5.0)
+            result['thread'] = threading.current_thread()
+            result['first'] = first
+
+        time.sleep(1.1)
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join(timeout=5)
+
+        assert result['first'] is not result['second']
+        # Новый браузер запущен в вызывающем потоке, обслуживание там не выполняется
+        assert launched_on == [result['thread']] * 2
+        assert pool.total_destroyed == 1
+        assert set(threading.enumerate()) <= threads_before
+
+    def test_wait_time_histogram(self, mock_playwright):
+        """Test per-acquire wait-time histogram in stats"""
+        pool = BrowserPool(max_browsers=2, recycle_interval=0)
+        pool.start()
+
+        browser, _ = pool.acquire()
+        pool.release(browser)
+        pool.acquire()
+
+        wait_stats = pool.get_stats()['wait_time_ms']
+        assert wait_stats['count'] == 2
+        assert sum(wait_stats['histogram'].values()) == 2
+        assert wait_stats['max'] >= wait_stats['avg'] >= 0
+
 
 @pytest.mark.integration
 @pytest.mark.browser
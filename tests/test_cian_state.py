@@ -0,0 +1,159 @@
+"""
+Тесты быстрого пути: встроенное состояние страниц Циана (window._cianConfig)
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.parsers.cian_state import extract_config_value, parse_offer_state, parse_serp_state
+
+OFFER_URL = 'https://spb.cian.ru/sale/flat/301234567/'
+
+OFFER = {
+    'cianId': 301234567,
+    'bargainTerms': {'price': 12500000, 'priceRur': 12500000, 'currency': 'rur'},
+    'totalArea': '54.3',
+    'livingArea': '30',
+    'kitchenArea': '12.5',
+    'roomsCount': 2,
+    'flatType': 'rooms',
+    'floorNumber': 5,
+    'building': {'floorsCount': 9, 'buildYear': 2015, 'materialType': 'monolith',
+                 'parking': {'type': 'underground'}},
+    'ceilingHeight': '3.1',
+    'repairType': 'design',
+    'combinedWcsCount': 1,
+    'geo': {
+        'address': [
+            {'type': 'location', 'fullName': 'Санкт-Петербург'},
+            {'type': 'raion', 'fullName': 'р-н Петроградский'},
+            {'type': 'metro', 'fullName': 'Чкаловская'},
+            {'type': 'street', 'fullName': 'Петровский проспект'},
+            {'type': 'house', 'fullName': '20к1'},
+        ],
+        'undergrounds': [{'name': 'Чкаловская', 'time': 12}, {'name': 'Спортивная', 'time': 15}],
+    },
+    'newbuilding': {'name': 'ЖК «Петровская Доминанта»'},
+    'description': 'Квартира с видом на воду, консьерж.',
+    'photos': [{'fullUrl': f'https://images.cdn-cian.ru/{i}.jpg'} for i in range(12)],
+}
+
+
+def _page(app, key, value):
+    payload = json.dumps([{'key': 'config', 'value': {}}, {'key': key, 'value': value}], ensure_ascii=False)
+    return (
+        '<html><head><script>'
+        f"window._cianConfig['{app}'] = (window._cianConfig['{app}'] || []).concat({payload});"
+        '</script></head><body><h1>HTML title</h1>' + 'x' * 2000 + '</body></html>'
+    )
+
+
+def _offer_page(offer=OFFER):
+    return _page('frontend-offer-card', 'defaultState',
+                 {'offerData': {'offer': offer, 'agent': {'name': 'Агентство Х'}}})
+
+
+class TestOfferState:
+
+    def test_extract_config_value(self):
+        html = _offer_page()
+        assert extract_config_value(html, 'frontend-offer-card', 'defaultState')['offerData']['offer']['cianId'] == 301234567
+        assert extract_config_value(html, 'frontend-serp', 'initialState') is None
+        assert extract_config_value('<html></html>', 'frontend-offer-card', 'defaultState') is None
+
+    def test_offer_mapped_to_detail_fields(self):
+        data = parse_offer_state(_offer_page(), OFFER_URL)
+
+        assert data['url'] == OFFER_URL
+        assert data['source'] == 'cian'
+        assert data['price'] == 12500000.0
+        assert data['currency'] == 'RUB'
+        assert data['total_area'] == 54.3
+        assert data['kitchen_area'] == 12.5
+        assert data['rooms'] == 2
+        assert (data['floor'], data['floor_total'], data['total_floors']) == (5, 9, 9)
+        assert data['build_year'] == 2015
+        assert data['title'] == '2-комн. квартира, 54,3 м², 5/9 этаж'
+        assert data['address'] == 'Санкт-Петербург, р-н Петроградский, Петровский проспект, 20к1'
+        assert data['metro'] == ['Чкаловская', 'Спортивная']
+        assert data['residential_complex'] == 'Петровская Доминанта'
+        assert len(data['images']) == 12
+        assert data['characteristics']['Этаж'] == '5 из 9'
+        assert data['characteristics']['Тип дома'] == 'Монолитный'
+        assert data['ceiling_height'] == 3.1
+        assert data['characteristics']['Высота потолков'] == '3,1 м'
+        assert 'высота потолков' not in data
+        assert data['seller'] == {'name': 'Агентство Х'}
+        assert 'cianId' not in data  # сырые поля оффера не протекают
+
+    def test_studio(self):
+        offer = {**OFFER, 'flatType': 'studio', 'roomsCount': 1}
+        data = parse_offer_state(_offer_page(offer), OFFER_URL)
+        assert data['rooms'] == 'студия'
+        assert data['title'].startswith('Студия')
+
+    def test_incomplete_state_falls_back(self):
+        offer = {k: v for k, v in OFFER.items() if k != 'totalArea'}
+        assert parse_offer_state(_offer_page(offer), OFFER_URL) is None
+
+    def test_broken_json_falls_back(self):
+        html = "<script>window._cianConfig['frontend-offer-card'] = (x || []).concat([{\"key\": </script>"
+        assert parse_offer_state(html, OFFER_URL) is None
+
+
+class TestSerpState:
+
+    def test_offers_mapped_to_search_cards(self):
+        offers = [
+            {**OFFER, 'fullUrl': OFFER_URL},
+            {**OFFER, 'cianId': 42, 'flatType': 'studio', 'totalArea': '25'},
+            'garbage',
+        ]
+        cards = parse_serp_state(_page('frontend-serp', 'initialState', {'results': {'offers': offers}}))
+
+        assert len(cards) == 2
+        card = cards[0]
+        assert card['url'] == OFFER_URL
+        assert card['price'] == '12 500 000 ₽'
+        assert card['price_raw'] == 12500000
+        assert card['area'] == '54,3 м²'
+        assert card['area_value'] == 54.3
+        assert card['rooms'] == '2'
+        assert card['floor'] == 5
+        assert card['metro'] == 'Чкаловская'
+        assert card['price_per_sqm'] == round(12500000 / 54.3)
+        assert cards[1]['url'] == 'https://www.cian.ru/sale/flat/42/'
+        assert cards[1]['rooms'] == 'студия'
+
+    def test_missing_state(self):
+        assert parse_serp_state('<html><body></body></html>') is None
+
+
+class TestParserFastPath:
+
+    @pytest.fixture
+    def parser(self):
+        playwright_parser = pytest.importorskip('src.parsers.playwright_parser')
+        return playwright_parser.PlaywrightParser(headless=True, cache=None)
+
+    def test_detail_page_skips_dom(self, parser):
+        with patch.object(type(parser), '_get_page_content', return_value=_offer_page()), \
+                patch('src.parsers.base_parser.BeautifulSoup', side_effect=AssertionError('DOM built')):
+            data = parser.parse_detail_page(OFFER_URL)
+
+        assert data['total_area'] == 54.3
+        assert data['house_type'] == 'монолит'
+        assert data['парковка'] == 'подземная'
+        assert data['панорамные виды'] is True
+        assert data['охрана 24/7'] is True
+        assert parser.stats['state_parsed'] == 1
+        assert parser.stats['html_fallback'] == 0
+
+    def test_detail_page_html_fallback(self, parser):
+        html = '<html><body><h1 data-mark="OfferTitle">1-комн. квартира, 40 м²</h1></body></html>'
+        with patch.object(type(parser), '_get_page_content', return_value=html):
+            data = parser.parse_detail_page(OFFER_URL)
+
+        assert data['title'] == '1-комн. квартира, 40 м²'
+        assert parser.stats['html_fallback'] == 1
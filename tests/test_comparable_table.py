@@ -0,0 +1,220 @@
+"""
+Тесты ComparableTable и ComparableBatch: векторизованная статистика совпадает с модулем statistics
+"""
+import random
+import statistics
+
+import numpy as np
+import pytest
+from scipy import stats as scipy_stats
+
+from src.analytics.comparable_table import ComparableBatch, ComparableTable
+from src.analytics.confidence_interval import calculate_price_confidence
+from src.analytics.median_calculator import calculate_medians_batch, calculate_medians_from_comparables
+from src.analytics.statistical_analysis import (
+    calculate_data_quality, calculate_distribution_stats, detect_outliers_iqr
+)
+from src.models.property import ComparableProperty, TargetProperty
+
+
+def make_comparables(count, seed=0, outliers=0):
+    rng = random.Random(seed)
+    comparables = []
+    for i in range(count + outliers):
+        area = round(rng.uniform(35, 90), 1)
+        price_per_sqm = rng.uniform(180_000, 260_000) if i < count else rng.uniform(900_000, 1_000_000)
+        comparables.append(ComparableProperty(
+            url=f"https://www.cian.ru/sale/flat/{seed}{i}/",
+            price=round(area * price_per_sqm),
+            total_area=area,
+            living_area=round(area * rng.uniform(0.5, 0.7), 1) if i % 3 else None,
+            rooms=rng.randint(1, 3),
+            floor=rng.randint(1, 20),
+            total_floors=rng.choice([9, 12, 17, 25]),
+            build_year=rng.choice([None, 1975, 2005, 2019]),
+            bathrooms=rng.choice([None, 0, 1, 2]),
+            has_design=bool(i % 2),
+            repair_level=rng.choice(['косметический', 'евроремонт']),
+        ))
+    return comparables
+
+
+class TestComparableTable:
+
+    def test_missing_values_are_masked(self):
+        comparables = make_comparables(6)
+        table = ComparableTable.from_comparables(comparables)
+
+        assert table.present('living_area').tolist() == [c.living_area is not None for c in comparables]
+        assert table.present('bathrooms').tolist() == [c.bathrooms is not None for c in comparables]
+        assert table.truthy('bathrooms').tolist() == [bool(c.bathrooms) for c in comparables]
+        assert table.column('has_design').tolist() == [c.has_design for c in comparables]
+
+    @pytest.mark.parametrize('size', range(1, 16))
+    def test_median_and_quartiles_match_statistics(self, size):
+        comparables = make_comparables(size, seed=size)
+        table = ComparableTable.from_comparables(comparables)
+        prices = [c.price_per_sqm for c in comparables]
+        floors = [c.floor for c in comparables]
+
+        assert table.median('price_per_sqm') == statistics.median(prices)
+        # Медиана нечетной выборки целых остается int, как у statistics
+        assert table.median('floor') == statistics.median(floors)
+        assert type(table.median('floor')) is type(statistics.median(floors))
+        if size >= 2:
+            assert list(table.quartiles('price_per_sqm')) == statistics.quantiles(prices, n=4)
+
+    def test_select_keeps_rows_of_filtered_models(self):
+        comparables = make_comparables(8)
+        table = ComparableTable.from_comparables(comparables)
+        subset = table.select(comparables[2:5])
+        assert subset.comparables == comparables[2:5]
+        assert subset.column('price_per_sqm').tolist() == [c.price_per_sqm for c in comparables[2:5]]
+
+    def test_unknown_field_is_read_lazily(self):
+        comparables = make_comparables(3)
+        table = ComparableTable.from_comparables(comparables)
+        assert np.isnan(table.column('kitchen_area')).all()
+        assert table.median('kitchen_area') is None
+
+
+class TestStatisticalFunctions:
+    """Функции анализа дают те же результаты с готовой таблицей и без нее"""
+
+    def test_medians_match_list_based_calculation(self):
+        comparables = make_comparables(9, seed=3)
+        medians = calculate_medians_from_comparables(comparables)
+
+        assert medians['price_per_sqm'] == statistics.median([c.price_per_sqm for c in comparables])
+        assert medians['total_floors'] == statistics.median([c.total_floors for c in comparables])
+        assert medians['bathrooms'] == statistics.median(
+            [c.bathrooms for c in comparables if c.bathrooms is not None]
+        )
+        assert medians['living_area_percent'] == statistics.median([
+            c.living_area / c.total_area * 100 for c in comparables if c.living_area
+        ])
+        assert medians['repair_level'] == statistics.multimode([c.repair_level for c in comparables])[0]
+
+        table = ComparableTable.from_comparables(comparables)
+        assert calculate_medians_from_comparables(comparables, table=table) == medians
+
+    def test_iqr_filter(self):
+        comparables = make_comparables(12, seed=5, outliers=2)
+        valid, outliers = detect_outliers_iqr(comparables)
+
+        assert len(outliers) == 2
+        assert all(report['type'] == 'верхний' for report in outliers)
+        assert valid == comparables[:12]
+
+        q1, _, q3 = statistics.quantiles([c.price_per_sqm for c in comparables], n=4)
+        assert outliers[0]['bounds'] == (q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))
+
+    def test_data_quality(self):
+        comparables = make_comparables(10, seed=7)
+        prices = [c.price_per_sqm for c in comparables]
+        quality = calculate_data_quality(comparables)
+
+        assert quality['count'] == 10
+        assert quality['median'] == statistics.median(prices)
+        assert quality['mean'] == pytest.approx(statistics.mean(prices))
+        assert quality['std_dev'] == pytest.approx(statistics.stdev(prices))
+
+    def test_distribution_stats(self):
+        comparables = make_comparables(10, seed=13)
+        prices = [c.price_per_sqm for c in comparables]
+        stats = calculate_distribution_stats(comparables)
+
+        assert stats['count'] == 10
+        assert stats['median'] == statistics.median(prices)
+        assert [stats['q1'], stats['q2'], stats['q3']] == statistics.quantiles(prices, n=4)
+        assert stats['std_dev'] == pytest.approx(statistics.stdev(prices))
+
+        table = ComparableTable.from_comparables(comparables)
+        assert calculate_distribution_stats(comparables, table=table) == stats
+        assert calculate_distribution_stats(comparables[:1])['error']
+
+    def test_price_confidence(self):
+        comparables = make_comparables(10, seed=11)
+        target = TargetProperty(url="https://www.cian.ru/sale/flat/1/", price=10_000_000, total_area=50.0)
+        result = calculate_price_confidence(target, comparables)
+
+        prices = [c.price_per_sqm for c in comparables]
+        assert result['sample_size'] == 10
+        assert result['median_price'] == statistics.median(prices) * 50.0
+        assert result['inputs']['stdev_price_per_sqm'] == pytest.approx(statistics.stdev(prices))
+
+
+class TestComparableBatch:
+    """Статистики многих выборок одной таблицы совпадают с расчетом по каждой выборке"""
+
+    @pytest.fixture
+    def batch(self):
+        comparables = make_comparables(14, seed=21, outliers=2)
+        comparables[3].excluded = True
+        table = ComparableTable.from_comparables(comparables)
+        rng = np.random.default_rng(0)
+        rows = rng.random((6, len(table))) < 0.8
+        rows[0] = True
+        rows[1] = False
+        rows[2, 1:] = False
+        return ComparableBatch(table, rows)
+
+    def test_medians_and_quartiles(self, batch):
+        medians = batch.median_values('price_per_sqm')
+        floors = batch.median_values('floor')
+        q1, q2, q3 = batch.quartiles('price_per_sqm')
+
+        for i in range(len(batch)):
+            table = batch.select(i)
+            assert medians[i] == table.median('price_per_sqm')
+            assert floors[i] == table.median('floor')
+            quartiles = table.quartiles('price_per_sqm')
+            if quartiles is None:
+                assert np.isnan([q1[i], q2[i], q3[i]]).all()
+            else:
+                assert (q1[i], q2[i], q3[i]) == quartiles
+
+    def test_confidence_intervals(self, batch):
+        lower, upper = batch.confidence_intervals('price_per_sqm')
+
+        for i in range(len(batch)):
+            prices = batch.select(i).values('price_per_sqm')
+            if len(prices) < 2:
+                assert lower[i] == upper[i] == 0
+                continue
+            mean, stdev = statistics.mean(prices), statistics.stdev(prices)
+            margin = (upper[i] - lower[i]) / 2
+            assert (lower[i] + upper[i]) / 2 == pytest.approx(mean)
+            assert margin == pytest.approx(
+                scipy_stats.t.ppf(0.975, len(prices) - 1) * stdev / len(prices) ** 0.5
+            )
+
+    def test_iqr_filter_matches_detect_outliers(self, batch):
+        filtered = batch.without_iqr_outliers()
+
+        for i in range(len(batch)):
+            comparables = batch.select(i).comparables
+            valid, _ = detect_outliers_iqr(comparables)
+            assert filtered.select(i).comparables == valid
+
+    def test_sigma_filter_drops_excluded(self, batch):
+        filtered = batch.without_sigma_outliers()
+
+        for i in range(len(batch)):
+            comparables = batch.select(i).comparables
+            kept = filtered.select(i).comparables
+            if len(comparables) >= 2:
+                assert all(not c.excluded for c in kept)
+            else:
+                assert kept == comparables
+
+    def test_parameter_medians(self, batch):
+        medians = calculate_medians_batch(batch)
+
+        for i in range(len(batch)):
+            comparables = batch.select(i).comparables
+            assert medians[i] == calculate_medians_from_comparables(comparables)
+
+    def test_rows_must_match_table(self, batch):
+        with pytest.raises(ValueError):
+            ComparableBatch(batch.table, np.ones((2, len(batch.table) + 1), dtype=bool))
@@ -0,0 +1,106 @@
+"""
+Tests for DuplicateDetector blocked deduplication
+"""
+import copy
+import random
+
+import pytest
+
+from src.utils.duplicate_detector import DuplicateDetector
+
+
+def _naive_deduplicate(detector, objects, keep_best_price=True):
+    """Reference implementation: compare with every accepted object"""
+    unique_objects = []
+    removed = []
+
+    for obj in objects:
+        duplicates = detector.find_duplicates(obj, unique_objects)
+        if not duplicates:
+            unique_objects.append(obj)
+            continue
+
+        strict = [d for d in duplicates if d.duplicate_type == 'strict']
+        if strict:
+            existing = unique_objects[strict[0].index]
+            new_price = obj.get('price_raw') or obj.get('price') or float('inf')
+            existing_price = existing.get('price_raw') or existing.get('price') or float('inf')
+            if keep_best_price and new_price < existing_price:
+                removed.append(existing)
+                unique_objects[strict[0].index] = obj
+            else:
+                removed.append(obj)
+        else:
+            obj['possible_duplicate'] = True
+            obj['duplicate_info'] = duplicates[0].to_dict()
+            unique_objects.append(obj)
+
+    return unique_objects, removed
+
+
+def _random_listings(seed, count=150):
+    rng = random.Random(seed)
+    streets = ['ул. Ленина', 'Ленина', 'пр. Невский', 'Невский проспект', 'наб. Мойки', '']
+    listings = []
+    for i in range(count):
+        street = rng.choice(streets)
+        house = rng.choice(['10', '12', '12а', '7'])
+        corpus = rng.choice(['', ', к. 1', ', к. 2'])
+        address = rng.choice([f"{street}, д. {house}{corpus}".strip(', '), '', None])
+        listings.append({
+            'url': f"https://example.com/{rng.randint(1, count // 2)}",
+            'source': rng.choice(['cian', 'avito']),
+            'address': address,
+            'total_area': rng.choice([45.0, 45.3, 46.0, '45.5 м²', None]),
+            'rooms': rng.choice([1, 2, '2']),
+            'floor': rng.choice(['5/10', '5', '6 из 12', '', 0]),
+            'price': rng.choice([10_000_000, 10_100_000, 10_900_000, 11_800_000, 10_050_000]),
+        })
+    return listings
+
+
+class TestBlockedDeduplication:
+    """Blocked deduplicate_list must match the pairwise algorithm"""
+
+    @pytest.mark.parametrize('seed', range(5))
+    @pytest.mark.parametrize('keep_best_price', [True, False])
+    def test_matches_pairwise_reference(self, seed, keep_best_price):
+        detector = DuplicateDetector()
+        listings = _random_listings(seed)
+
+        expected_unique, expected_removed = _naive_deduplicate(
+            detector, copy.deepcopy(listings), keep_best_price
+        )
+        unique, removed = detector.deduplicate_list(copy.deepcopy(listings), keep_best_price)
+
+        assert unique == expected_unique
+        assert removed == expected_removed
+
+    def test_strict_duplicate_keeps_cheaper(self):
+        detector = DuplicateDetector()
+        listings = [
+            {'url': 'https://cian.ru/1', 'source': 'cian', 'address': 'ул. Ленина, д. 10, к. 1',
+             'total_area': 45.0, 'rooms': 2, 'floor': '5/10', 'price': 10_100_000},
+            {'url': 'https://avito.ru/1', 'source': 'avito', 'address': 'Ленина, д. 10, к. 1',
+             'total_area': 45.2, 'rooms': 2, 'floor': '5', 'price': 10_000_000},
+            {'url': 'https://avito.ru/2', 'source': 'avito', 'address': 'Ленина, д. 12, к. 1',
+             'total_area': 45.2, 'rooms': 2, 'floor': '5', 'price': 10_000_000},
+        ]
+
+        unique, removed = detector.deduplicate_list(listings)
+
+        assert [o['url'] for o in unique] == ['https://avito.ru/1', 'https://avito.ru/2']
+        assert [o['url'] for o in removed] == ['https://cian.ru/1']
+
+    def test_is_duplicate_parses_string_fields(self):
+        detector = DuplicateDetector()
+        obj1 = {'source': 'cian', 'url': 'a', 'address': 'ул. Ленина, д. 10, к. 2',
+                'total_area': '45.0 м²', 'rooms': 2, 'floor': '5/10', 'price': '10 000 000 ₽'}
+        obj2 = {'source': 'avito', 'url': 'b', 'address': 'Ленина, д. 10, к. 2',
+                'total_area': 45.0, 'rooms': 2, 'floor': '5 из 10', 'price': 10_050_000}
+
+        is_dup, confidence, dup_type, _ = detector.is_duplicate(obj1, obj2)
+
+        assert is_dup is True
+        assert dup_type == 'strict'
+        assert confidence == 100.0
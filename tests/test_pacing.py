@@ -0,0 +1,129 @@
+"""
+Тесты адаптивных пауз (PacingController) и их применения в PlaywrightParser
+
+Браузер не запускается: контекст и страница - заглушки, time.sleep подменен
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.exceptions import CaptchaError
+from src.parsers.pacing import (
+    PacingController, PageTimer, OUTCOME_OK, OUTCOME_CAPTCHA, OUTCOME_BLOCKED
+)
+
+URL = 'https://spb.cian.ru/sale/flat/123456/'
+OTHER_REGION_URL = 'https://msk.cian.ru/sale/flat/654321/'
+PAGE_HTML = '<html><h1 data-mark="OfferTitle">Квартира</h1>' + 'x' * 2000 + '</html>'
+CAPTCHA_HTML = '<html><form class="captcha-form"></form>' + 'x' * 2000 + '</html>'
+
+
+class TestPacingController:
+
+    def test_no_risk_no_simulation(self):
+        pacing = PacingController(risk_threshold=0.2)
+        assert not pacing.should_simulate(URL)
+        for _ in range(5):
+            pacing.record(URL, None, OUTCOME_OK)
+        assert not pacing.should_simulate(URL)
+
+    def test_captchas_enable_simulation_for_domain(self):
+        pacing = PacingController(risk_threshold=0.2)
+        for _ in range(3):
+            pacing.record(URL, None, OUTCOME_OK)
+        pacing.record(URL, None, OUTCOME_CAPTCHA)
+
+        assert pacing.block_risk(URL) == pytest.approx(0.25)
+        assert pacing.should_simulate(URL)
+        # Региональные поддомены - один домен
+        assert pacing.should_simulate(OTHER_REGION_URL)
+
+    def test_risk_per_proxy_raises_simulation_for_that_proxy(self):
+        pacing = PacingController(risk_threshold=0.5)
+        for _ in range(4):
+            pacing.record(URL, 'http://good:1', OUTCOME_OK)
+        pacing.record(URL, 'http://bad:1', OUTCOME_BLOCKED)
+
+        assert pacing.should_simulate(URL, 'http://bad:1')
+        assert not pacing.should_simulate(URL, 'http://good:1')
+
+    def test_old_events_leave_window(self):
+        pacing = PacingController(risk_threshold=0.1, window_seconds=60)
+        with patch('src.parsers.pacing.time.monotonic', return_value=1000.0):
+            pacing.record(URL, None, OUTCOME_CAPTCHA)
+        with patch('src.parsers.pacing.time.monotonic', return_value=1100.0):
+            assert pacing.block_risk(URL) == 0.0
+
+    def test_non_adaptive_always_simulates(self):
+        assert PacingController(adaptive=False).should_simulate(URL)
+
+    def test_page_cost_stats(self):
+        pacing = PacingController()
+        pacing.record_page(6.0, simulated=True)
+        pacing.record_page(0.0, simulated=False)
+        stats = pacing.get_stats()
+        assert stats['pages'] == 2
+        assert stats['simulated_pages'] == 1
+        assert stats['pacing_seconds_per_page'] == 3.0
+
+
+def test_page_timer_sleeps_only_when_simulating():
+    with patch('src.parsers.pacing.time.sleep') as sleep:
+        fast = PageTimer(simulate=False)
+        fast.pause(1.0, 2.0)
+        assert fast.seconds == 0.0
+        sleep.assert_not_called()
+
+        slow = PageTimer(simulate=True)
+        slow.pause(1.0, 2.0)
+        assert 1.0 <= slow.seconds <= 2.0
+        sleep.assert_called_once()
+
+
+class TestParserPacing:
+
+    @pytest.fixture
+    def parser(self):
+        PlaywrightParser = pytest.importorskip('src.parsers.playwright_parser').PlaywrightParser
+        parser = PlaywrightParser(headless=True)
+        parser.pacing = PacingController(risk_threshold=0.2)
+        parser.context = MagicMock()
+        return parser
+
+    def _page(self, parser, html):
+        page = MagicMock()
+        page.content.return_value = html
+        parser.context.new_page.return_value = page
+        return page
+
+    def test_fast_path_without_risk(self, parser):
+        page = self._page(parser, PAGE_HTML)
+        with patch('src.parsers.pacing.time.sleep') as sleep:
+            assert parser._get_page_content(URL) == PAGE_HTML
+
+        sleep.assert_not_called()
+        page.mouse.move.assert_not_called()
+        page.wait_for_selector.assert_called_once()
+        stats = parser.get_stats()
+        assert stats['pacing_seconds'] == 0.0
+        assert stats['pacing']['pages'] == 1
+        assert stats['pacing']['outcomes'][OUTCOME_OK] == 1
+
+    def test_simulation_under_risk(self, parser):
+        parser.pacing.record(URL, None, OUTCOME_CAPTCHA)
+        page = self._page(parser, PAGE_HTML)
+        with patch('src.parsers.pacing.time.sleep'):
+            parser._get_page_content(URL)
+
+        assert page.mouse.move.call_count == 2
+        assert parser.get_stats()['pacing_seconds'] > 0
+        assert parser.pacing.get_stats()['simulated_pages'] == 1
+
+    def test_captcha_is_recorded(self, parser):
+        self._page(parser, CAPTCHA_HTML)
+        with patch('src.parsers.pacing.time.sleep'), patch('src.parsers.playwright_parser.time.sleep'):
+            with pytest.raises(CaptchaError):
+                parser._get_page_content(URL, max_retries=1)
+
+        assert parser.pacing.get_stats()['outcomes'][OUTCOME_CAPTCHA] == 1
+        assert parser.pacing.should_simulate(URL)
@@ -0,0 +1,272 @@
+"""
+Тесты прогретого рендерера PDF: пул страниц, ограничение параллелизма, встраивание static/, кэш отчетов
+
+Браузер подменяется fake-объектами с async API Playwright
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from src.exceptions import PDFGenerationError, PDFRendererOverloadedError
+from src.services.pdf_renderer import PdfRenderer, inline_static_assets, report_cache_key
+
+
+class FakePage:
+
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+    async def set_content(self, html, wait_until, timeout):
+        assert wait_until == 'load'
+        self.context.browser.active += 1
+        self.context.browser.max_active = max(self.context.browser.max_active, self.context.browser.active)
+        try:
+            await asyncio.sleep(self.context.browser.delay)
+            if self.context.browser.gate is not None:
+                while not self.context.browser.gate.is_set():
+                    await asyncio.sleep(0.01)
+        finally:
+            self.context.browser.active -= 1
+        self.html = html
+
+    async def evaluate(self, expression):
+        return True
+
+    async def pdf(self, **options):
+        if 'FAIL' in self.html:
+            raise RuntimeError('render crashed')
+        return b'%PDF-' + self.html.encode('utf-8')
+
+
+class FakeContext:
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = []
+
+    async def route(self, pattern, handler):
+        pass
+
+    def on(self, event, callback):
+        pass
+
+    async def new_page(self):
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+
+class FakeBrowser:
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.gate = None
+        self.active = 0
+        self.max_active = 0
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    async def stop(self):
+        pass
+
+
+def make_renderer(browser, **kwargs):
+    async def factory():
+        return FakePlaywright(), browser
+    kwargs.setdefault('idle_timeout', 0)
+    return PdfRenderer(browser_factory=factory, **kwargs)
+
+
+@pytest.fixture
+def renderers():
+    created = []
+    yield created
+    for renderer in created:
+        renderer.close(timeout=5)
+
+
+class TestPdfRenderer:
+
+    def test_browser_and_page_are_reused(self, renderers):
+        browser = FakeBrowser()
+        renderer = make_renderer(browser)
+        renderers.append(renderer)
+
+        assert renderer.render('<p>one</p>') == b'%PDF-<p>one</p>'
+        assert renderer.render('<p>two</p>') == b'%PDF-<p>two</p>'
+
+        stats = renderer.get_stats()
+        assert (stats['browser_starts'], stats['pages_created'], stats['rendered']) == (1, 1, 2)
+
+    def test_concurrency_is_limited_by_page_pool(self, renderers):
+        browser = FakeBrowser(delay=0.05)
+        renderer = make_renderer(browser, pages=2, max_queue=10)
+        renderers.append(renderer)
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda i: renderer.render(f'<p>{i}</p>'), range(6)))
+
+        assert results == [f'%PDF-<p>{i}</p>'.encode() for i in range(6)]
+        assert browser.max_active == 2
+        assert renderer.get_stats()['pages_created'] == 2
+
+    def test_full_queue_is_rejected(self, renderers):
+        browser = FakeBrowser()
+        browser.gate = threading.Event()
+        renderer = make_renderer(browser, max_queue=1, queue_timeout=0.05)
+        renderers.append(renderer)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            first = pool.submit(renderer.render, '<p>slow</p>')
+            while browser.active == 0:
+                threading.Event().wait(0.01)
+
+            with pytest.raises(PDFRendererOverloadedError):
+                renderer.render('<p>rejected</p>')
+
+            browser.gate.set()
+            assert first.result(timeout=5) == b'%PDF-<p>slow</p>'
+
+        assert renderer.get_stats()['rejected'] == 1
+
+    def test_failed_page_is_not_returned_to_pool(self, renderers):
+        browser = FakeBrowser()
+        renderer = make_renderer(browser)
+        renderers.append(renderer)
+
+        with pytest.raises(PDFGenerationError):
+            renderer.render('FAIL')
+        renderer.render('<p>ok</p>')
+
+        pages = browser.contexts[0].pages
+        assert len(pages) == 2 and pages[0].closed
+        assert renderer.get_stats()['failed'] == 1
+
+    def test_disconnected_browser_is_restarted(self, renderers):
+        browsers = [FakeBrowser(), FakeBrowser()]
+
+        async def factory():
+            return FakePlaywright(), browsers[renderer.stats['browser_starts']]
+
+        renderer = PdfRenderer(browser_factory=factory, idle_timeout=0)
+        renderers.append(renderer)
+
+        renderer.render('<p>one</p>')
+        browsers[0].connected = False
+        renderer.render('<p>two</p>')
+
+        assert renderer.get_stats()['browser_starts'] == 2
+        assert len(browsers[1].contexts[0].pages) == 1
+
+
+def test_inline_static_assets(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'images').mkdir()
+    (static / 'images' / 'logo.png').write_bytes(b'\x89PNG')
+    (static / 'css' / 'report.css').write_text('h1 { background: url("/static/images/logo.png"); }')
+    (tmp_path / 'secret.css').write_text('secret')
+
+    html = inline_static_assets(
+        '<link rel="stylesheet" href="/static/css/report.css">'
+        '<link rel="stylesheet" href="/static/../secret.css">'
+        '<link rel="stylesheet" href="https://cdn.example.com/x.css">'
+        '<img src="/static/images/logo.png">'
+        '<div style="background: url(/static/images/missing.png)"></div>',
+        static_dir=static
+    )
+
+    assert '<style>h1 { background: url("data:image/png;base64,iVBORw==");' in html
+    assert '<img src="data:image/png;base64,iVBORw==">' in html
+    assert 'href="/static/../secret.css"' in html
+    assert 'https://cdn.example.com/x.css' in html
+    assert 'url(/static/images/missing.png)' in html
+
+
+def test_report_cache_key_depends_on_report_data():
+    analysis = {'fair_price_analysis': {'fair_price_total': 10_000_000}}
+    target = {'address': 'Санкт-Петербург'}
+    key = report_cache_key(analysis, target, [{'url': 'a'}], '2026-01-01')
+
+    assert key == report_cache_key(dict(analysis), dict(target), [{'url': 'a'}], '2026-01-01')
+    assert key != report_cache_key(analysis, target, [{'url': 'b'}], '2026-01-01')
+    assert key != report_cache_key({'fair_price_analysis': {'fair_price_total': 1}}, target, [{'url': 'a'}], '2026-01-01')
+    assert key != report_cache_key(analysis, target, [{'url': 'a'}], '2026-01-02')
+
+
+class TestExportReportEndpoint:
+
+    @pytest.fixture
+    def report_cache(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        from src.cache.redis_cache import PropertyCache
+
+        cache = PropertyCache(enabled=False, namespace='test')
+        cache.enabled = True
+        cache.redis_client = fakeredis.FakeRedis()
+        cache._is_available = True
+        with patch('app_new.property_cache', cache):
+            yield cache
+
+    def test_pdf_is_rendered_once_and_cached(self, client, report_cache, monkeypatch):
+        import app_new
+        monkeypatch.setattr(app_new, 'PLAYWRIGHT_AVAILABLE', True)
+        app_new.session_storage.set('pdf-report-1', {
+            'target_property': {'address': 'Санкт-Петербург, Невский проспект, 1', 'price': 10_000_000},
+            'comparables': [],
+            'analysis': {'fair_price_analysis': {'fair_price_total': 10_000_000}},
+        })
+
+        with patch('app_new.get_pdf_renderer') as get_renderer, \
+                patch('app_new.render_template', return_value='<html></html>') as render:
+            get_renderer.return_value.render.return_value = b'%PDF-1.4 fake'
+            first = client.get('/api/export-report/pdf-report-1')
+            second = client.get('/api/export-report/pdf-report-1')
+
+        assert first.mimetype == second.mimetype == 'application/pdf'
+        assert first.data == second.data == b'%PDF-1.4 fake'
+        get_renderer.return_value.render.assert_called_once()
+        # В отчете печатается только день - тот же, что в ключе кэша
+        assert render.call_args.kwargs['date'] == datetime.now().strftime('%Y-%m-%d')
+        assert report_cache.get_stats()['by_type']['report']['hits'] == 1
+
+    def test_overloaded_renderer_returns_503(self, client, report_cache, monkeypatch):
+        import app_new
+        monkeypatch.setattr(app_new, 'PLAYWRIGHT_AVAILABLE', True)
+        app_new.session_storage.set('pdf-report-2', {
+            'target_property': {'address': 'Санкт-Петербург'},
+            'comparables': [],
+            'analysis': {'fair_price_analysis': {}},
+        })
+
+        with patch('app_new.get_pdf_renderer') as get_renderer, \
+                patch('app_new.render_template', return_value='<html></html>'):
+            get_renderer.return_value.render.side_effect = PDFRendererOverloadedError(10)
+            response = client.get('/api/export-report/pdf-report-2')
+
+        assert response.status_code == 503
+        assert response.get_json()['error'] == 'PDF_RENDERER_OVERLOADED'
@@ -0,0 +1,347 @@
+"""
+Тесты пакетной оценки портфеля: общий поиск по районам, ошибки по этапам, выгрузка
+"""
+import csv
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.parsers.async_parser import ParseResult
+from src.services import portfolio
+from src.services.portfolio import (
+    ComparableSearch, PortfolioValuation, area_key, load_portfolio_items, stream_portfolio
+)
+from src.tasks.queue import enqueue_task
+
+BASE_URL = 'https://www.cian.ru/sale/flat/'
+
+
+def listing(listing_id, price=10_000_000, area=50.0, complex_name='ЖК Тестовый', rooms=2):
+    return {
+        'url': f'{BASE_URL}{listing_id}/',
+        'price': price,
+        'total_area': area,
+        'rooms': rooms,
+        'floor': 5,
+        'total_floors': 12,
+        'address': f'Санкт-Петербург, Невский проспект, {listing_id}',
+        'residential_complex': complex_name,
+        'region': 'spb',
+    }
+
+
+def make_comparables(prefix, count=8):
+    return [
+        listing(f'{prefix}{i}', price=9_000_000 + i * 250_000, area=48.0 + i)
+        for i in range(count)
+    ]
+
+
+class FakeParse:
+    """parse_fn: данные объявлений из словаря, отсутствующие URL - ошибка парсинга"""
+
+    def __init__(self, listings):
+        self.listings = {item['url']: item for item in listings}
+        self.calls = []
+
+    def __call__(self, urls):
+        self.calls.append(list(urls))
+        return [
+            ParseResult(url=url, ok=True, data=self.listings[url]) if url in self.listings
+            else ParseResult(url=url, ok=False, data={}, error_type='parse_error', error_message='not found')
+            for url in urls
+        ]
+
+
+class FakeSearch:
+
+    def __init__(self, fail_for=()):
+        self.calls = []
+        self.fail_for = fail_for
+
+    def __call__(self, target, region, limit):
+        self.calls.append(target['url'])
+        if target.get('residential_complex') in self.fail_for:
+            raise RuntimeError('captcha')
+        # Аналоги включают сам целевой объект - он должен быть исключен
+        return make_comparables(len(self.calls)) + [dict(target)]
+
+
+def failing_analyze(targets, comparables, options):
+    raise ValueError('broken')
+
+
+def fake_analyze(targets, comparables, options):
+    """Функция верхнего уровня модуля - импортируется процессами пула"""
+    return [
+        {'fair_price': 1_000_000, 'comparables_used': sum(c['url'] != target['url'] for c in comparables)}
+        for target in targets
+    ]
+
+
+@pytest.fixture(autouse=True)
+def offline_analyzer():
+    portfolio._worker_analyzer = None
+    with patch('src.analytics.analyzer.MarketRatesService', side_effect=RuntimeError('offline')):
+        yield
+    portfolio._worker_analyzer = None
+
+
+def run(items, **kwargs):
+    valuation = PortfolioValuation(workers=kwargs.pop('workers', 0), **kwargs)
+    return valuation, sorted(valuation.run(items), key=lambda row: row['index'])
+
+
+class TestPortfolioValuation:
+
+    def test_targets_in_same_area_share_one_search(self):
+        targets = [listing(1), listing(2, area=52.0), listing(3, complex_name='ЖК Другой')]
+        parse, search = FakeParse(targets), FakeSearch()
+
+        valuation, rows = run([t['url'] for t in targets], parse_fn=parse, search_fn=search)
+
+        assert [row['status'] for row in rows] == ['ok', 'ok', 'ok']
+        assert len(search.calls) == 2
+        assert rows[0]['search_group'] == rows[1]['search_group'] != rows[2]['search_group']
+        # Собственный URL объекта не попадает в его аналоги, соседний по группе - попадает
+        assert rows[0]['comparables_found'] == 8
+        assert rows[1]['comparables_found'] == 9
+        assert rows[0]['fair_price'] > 0
+        assert 0 < rows[0]['ci95_lower'] < rows[0]['ci95_upper']
+        assert parse.calls == [[t['url'] for t in targets]]
+
+        stats = valuation.get_stats()
+        assert stats['succeeded'] == 3
+        assert stats['searches'] == 2 and stats['searches_shared'] == 1
+        assert stats['progress_percent'] == 100.0
+
+    def test_failures_are_reported_per_stage(self):
+        targets = [listing(1), listing(2, complex_name='ЖК Капча')]
+        items = [
+            targets[0]['url'],
+            'http://localhost/admin',
+            f'{BASE_URL}404/',
+            targets[1]['url'],
+            {'address': 'x', 'price_raw': 1},
+        ]
+
+        valuation, rows = run(items, parse_fn=FakeParse(targets), search_fn=FakeSearch(fail_for=('ЖК Капча',)))
+
+        assert [(row['status'], row['stage']) for row in rows] == [
+            ('ok', None), ('error', 'input'), ('error', 'parse'), ('error', 'search'), ('error', 'input')
+        ]
+        assert rows[2]['error'] == 'not found'
+        assert valuation.get_stats()['failures_by_stage'] == {'input': 2, 'parse': 1, 'search': 1, 'analyze': 0}
+
+    def test_analysis_error_does_not_stop_the_run(self):
+        targets = [listing(1), listing(2)]
+        _, rows = run([t['url'] for t in targets], parse_fn=FakeParse(targets),
+                      search_fn=FakeSearch(), analyze_fn=failing_analyze)
+
+        assert [(row['stage'], row['error']) for row in rows] == [('analyze', 'broken')] * 2
+
+    def test_manual_targets(self):
+        manual = {
+            'address': 'Санкт-Петербург, улица Ленина, 10',
+            'price_raw': 15_000_000,
+            'total_area': 75.5,
+            'rooms': 2,
+            'floor': '5/12',
+        }
+        search = FakeSearch()
+        _, rows = run([manual], parse_fn=FakeParse([]), search_fn=search)
+
+        assert rows[0]['status'] == 'ok'
+        assert rows[0]['region'] == 'spb'
+        assert rows[0]['url'] == 'manual-input'
+        assert rows[0]['current_price'] == 15_000_000
+        assert search.calls == ['manual-input']
+
+    def test_process_pool(self):
+        targets = [listing(i, complex_name=f'ЖК {i % 2}') for i in range(4)]
+        _, rows = run([t['url'] for t in targets], workers=2, parse_fn=FakeParse(targets),
+                      search_fn=FakeSearch(), analyze_fn=fake_analyze)
+
+        assert [row['fair_price'] for row in rows] == [1_000_000] * 4
+        # Лидеры групп (0, 1) видят 8 аналогов, остальные - еще и лидера своей группы
+        assert [row['comparables_used'] for row in rows] == [8, 8, 9, 9]
+
+
+class TestGroupAnalysis:
+    """Векторный анализ группы совпадает с полным анализатором по каждому объекту"""
+
+    @staticmethod
+    def group():
+        comparables = [
+            dict(listing(f'g{i}', price=8_000_000 + i * 370_000, area=40.0 + i * 2.5), floor=1 + i % 9)
+            for i in range(12)
+        ]
+        # Выброс по цене и аналог, совпадающий с одним из объектов
+        comparables.append(listing('g-outlier', price=60_000_000, area=45.0))
+        targets = [listing(1), dict(comparables[4]), listing(2, price=14_000_000, area=61.0)]
+        return targets, comparables
+
+    @pytest.mark.parametrize('options', [
+        {'filter_outliers': True, 'use_median': True},
+        {'filter_outliers': False, 'use_median': False},
+    ])
+    def test_matches_single_target_analysis(self, options):
+        targets, comparables = self.group()
+
+        group = portfolio.analyze_group(targets, comparables, options)
+
+        for target, result in zip(targets, group):
+            own = [c for c in comparables if c['url'] != target['url']]
+            expected = portfolio.analyze_target(target, own, options)
+            for key in ('current_price', 'comparables_used', 'price_diff_percent'):
+                assert result[key] == expected[key]
+            for key in ('fair_price', 'fair_price_per_sqm', 'ci95_lower', 'ci95_upper', 'market_median_per_sqm'):
+                assert result[key] == pytest.approx(expected[key], abs=1)
+
+    def test_invalid_target_fails_alone(self):
+        targets, comparables = self.group()
+        targets[0] = dict(targets[0], total_area=-5)
+
+        group = portfolio.analyze_group(targets, comparables)
+
+        assert 'error' in group[0]
+        assert all(result['fair_price'] > 0 for result in group[1:])
+
+
+def test_comparable_search_parses_each_detail_url_once():
+    cards = [{'url': f'{BASE_URL}c{i}/', 'title': 'card'} for i in range(3)]
+    details = [listing(f'c{i}') for i in range(3)]
+
+    class Parser:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def search_similar(self, target, limit):
+            return [dict(card) for card in cards]
+
+    parse = FakeParse(details)
+    search = ComparableSearch(lambda url, region: Parser(), parse)
+
+    first = search(listing(1), 'spb', 20)
+    second = search(listing(2, complex_name='ЖК Другой'), 'spb', 20)
+
+    assert parse.calls == [[card['url'] for card in cards]]
+    assert first == second
+    assert first[0]['price'] == 10_000_000 and first[0]['title'] == 'card'
+    assert search.stats == {'details_parsed': 3, 'details_reused': 3, 'details_failed': 0}
+
+
+def test_parse_urls_with_service_chunks_by_concurrency():
+    class Service:
+        max_concurrent = 2
+        max_queue = 100
+
+        def __init__(self):
+            self.batches = []
+
+        def parse_many(self, urls, max_retries=2):
+            self.batches.append(list(urls))
+            return [ParseResult(url=url, ok=True, data={'url': url}) for url in urls]
+
+    service = Service()
+    urls = [f'{BASE_URL}{i}/' for i in range(5)]
+
+    results = portfolio.parse_urls_with_service(service, urls)
+
+    assert [result.url for result in results] == urls
+    assert [len(batch) for batch in service.batches] == [2, 2, 1]
+
+
+def test_area_key_buckets():
+    assert area_key(listing(1), 'spb') == area_key(listing(2, area=59.9), 'spb')
+    assert area_key(listing(1), 'spb') != area_key(listing(1, area=60.0), 'spb')
+    assert area_key(listing(1), 'spb') != area_key(listing(1, rooms=3), 'spb')
+
+    by_street = {'address': 'Москва, Тверская улица, 7', 'rooms': 1, 'total_area': 40}
+    assert area_key(by_street, 'msk') == area_key({**by_street, 'address': 'Москва, Тверская улица, 9'}, 'msk')
+
+
+def test_load_portfolio_items(tmp_path):
+    (tmp_path / 'p.txt').write_text(f'# comment\n{BASE_URL}1/\n\n{BASE_URL}2/\n', encoding='utf-8')
+    (tmp_path / 'p.ndjson').write_text(f'"{BASE_URL}1/"\n{{"address": "Москва"}}\n', encoding='utf-8')
+    (tmp_path / 'p.csv').write_text(f'url,address\n{BASE_URL}1/,\n,Москва\n', encoding='utf-8')
+
+    assert load_portfolio_items(str(tmp_path / 'p.txt')) == [f'{BASE_URL}1/', f'{BASE_URL}2/']
+    assert load_portfolio_items(str(tmp_path / 'p.ndjson')) == [f'{BASE_URL}1/', {'address': 'Москва'}]
+    assert load_portfolio_items(str(tmp_path / 'p.csv')) == [f'{BASE_URL}1/', {'address': 'Москва'}]
+
+
+class TestStreaming:
+
+    @pytest.fixture
+    def valuation(self):
+        targets = [listing(1), listing(2)]
+        return PortfolioValuation(workers=0, parse_fn=FakeParse(targets), search_fn=FakeSearch(),
+                                  analyze_fn=fake_analyze), [t['url'] for t in targets] + ['bad-url']
+
+    def test_ndjson(self, valuation):
+        valuation, items = valuation
+        lines = [json.loads(line) for line in ''.join(stream_portfolio(valuation, items)).splitlines()]
+
+        assert [line['type'] for line in lines] == ['result'] * 3 + ['summary']
+        assert lines[-1]['processed'] == 3 and lines[-1]['failed'] == 1
+        assert lines[-1]['throughput_per_min'] > 0
+
+    def test_csv(self, valuation):
+        valuation, items = valuation
+        rows = list(csv.DictReader(io.StringIO(''.join(stream_portfolio(valuation, items, fmt='csv')))))
+
+        assert len(rows) == 3
+        assert sorted(row['status'] for row in rows) == ['error', 'ok', 'ok']
+        assert {row['fair_price'] for row in rows if row['status'] == 'ok'} == {'1000000'}
+
+
+def test_enqueue_task_fallback_drops_rq_options():
+    with patch('src.tasks.queue.get_task_queue', return_value=None):
+        assert enqueue_task(lambda x: x * 2, 21, job_id='abc', job_timeout=10, result_ttl=5) == 42
+
+
+class TestPortfolioEndpoints:
+
+    HEADERS = {'X-Admin-Key': 'secret'}
+
+    @pytest.fixture(autouse=True)
+    def admin_key(self, monkeypatch):
+        monkeypatch.setenv('ADMIN_API_KEY', 'secret')
+
+    def test_requires_admin_key(self, client):
+        response = client.post('/api/portfolio/valuate', json={'items': [f'{BASE_URL}1/']})
+        assert response.status_code == 401
+
+    def test_large_portfolio_must_be_queued(self, client):
+        import app_new
+        items = [f'{BASE_URL}{i}/' for i in range(app_new.settings.PORTFOLIO_SYNC_MAX_TARGETS + 1)]
+        response = client.post('/api/portfolio/valuate', json={'items': items}, headers=self.HEADERS)
+        assert response.status_code == 413
+
+    def test_streams_results(self, client):
+        targets = [listing(1), listing(2)]
+
+        def make_valuation(**kwargs):
+            kwargs.update(workers=0, parse_fn=FakeParse(targets), search_fn=FakeSearch(), analyze_fn=fake_analyze)
+            return PortfolioValuation(**kwargs)
+
+        with patch('app_new.PortfolioValuation', side_effect=make_valuation):
+            response = client.post(
+                '/api/portfolio/valuate',
+                json={'items': [t['url'] for t in targets], 'format': 'csv'},
+                headers=self.HEADERS
+            )
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert len(list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))) == 2
+
+    def test_job_result_rejects_bad_id(self, client):
+        response = client.get('/api/portfolio/jobs/..%2Fsecret/result', headers=self.HEADERS)
+        assert response.status_code in (400, 404)
@@ -92,3 +92,35 @@ def test_probability_curve_slow_segment():
     slow_cumulative = slow_analyzer._calculate_cumulative_probability(slow_curve)
     assert pytest.approx(slow_cumulative[-1], rel=1e-3) == min(0.98, 0.35)
     assert slow_curve[0] < fast_curve[0]  # стартовая вероятность медленнее
+
+
+def test_probability_curve_reused_when_fair_price_moves(monkeypatch):
+    profile = {
+        'expected_dom_months': 4,
+        'probability_multiplier': 1.06,
+        'pricing_bias': 0.985,
+        'time_multiplier': 1.0,
+        'price_pressure_multiplier': 1.0
+    }
+    analyzer = _make_analyzer(profile)
+    monkeypatch.setattr(RealEstateAnalyzer, '_probability_curves', type(RealEstateAnalyzer._probability_curves)())
+
+    first = analyzer._calculate_monthly_probability(
+        'optimal', fair_price=10_000_000, start_price=10_047_000, base_probability=84.8
+    )
+    expected = analyzer._build_probability_curve('optimal', 1.0, 4, 1.06, 84.8, 14)
+
+    # Исключение аналога сдвинуло справедливую цену, но не сценарий и профиль рынка
+    calls = []
+    monkeypatch.setattr(analyzer, '_build_probability_curve', lambda *args: calls.append(args))
+    second = analyzer._calculate_monthly_probability(
+        'optimal', fair_price=10_300_000, start_price=10_348_410, base_probability=84.8
+    )
+
+    assert first == second == expected
+    assert calls == []
+
+    second.append(1.0)  # вызывающий код получает копию
+    assert analyzer._calculate_monthly_probability(
+        'optimal', fair_price=10_000_000, start_price=10_047_000, base_probability=84.8
+    ) == expected
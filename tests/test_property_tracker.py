@@ -0,0 +1,138 @@
+"""
+Тесты ограниченного PropertyTracker: LRU в памяти, прореживание событий, запись в хранилище
+"""
+import json
+
+import pytest
+
+from src.analytics.markdown_exporter import MarkdownExporter
+from src.analytics.property_tracker import (
+    EventType, JsonlLogStore, PropertyLog, PropertyTracker, SqliteLogStore, parse_event_sampling
+)
+
+
+def track(tracker, property_id, status='completed', events=0):
+    log = tracker.start_tracking(property_id, url=f'https://spb.cian.ru/sale/flat/{property_id}/')
+    log.fair_price_result = {'fair_price_total': 10_000_000}
+    for i in range(events):
+        log.add_event(EventType.DATA_EXTRACTED, f'event {i}')
+    if status != 'processing':
+        tracker.complete_property(property_id, status)
+    return log
+
+
+@pytest.fixture(params=['jsonl', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'jsonl':
+        return JsonlLogStore(str(tmp_path / 'logs' / 'tracker.jsonl'))
+    return SqliteLogStore(str(tmp_path / 'logs' / 'tracker.db'))
+
+
+class TestMemoryBounds:
+
+    def test_least_recently_used_log_is_evicted(self):
+        tracker = PropertyTracker(max_logs=2)
+        track(tracker, 'a')
+        track(tracker, 'b')
+        tracker.get_log('a')
+        track(tracker, 'c')
+
+        assert [log.property_id for log in tracker.get_all_logs()] == ['a', 'c']
+        assert tracker.get_log('b') is None
+        assert tracker.get_stats()['evicted'] == 1
+
+    def test_evicted_unfinished_log_is_counted(self):
+        tracker = PropertyTracker(max_logs=1)
+        track(tracker, 'a', status='processing')
+        track(tracker, 'b')
+
+        assert tracker.get_stats()['evicted_unfinished'] == 1
+
+    def test_events_are_capped_but_failures_kept(self):
+        tracker = PropertyTracker(max_events_per_log=3)
+        log = track(tracker, 'a', status='processing', events=10)
+        log.add_event(EventType.ERROR, 'boom')
+
+        # PARSING_STARTED + 2 события + ошибка сверх лимита
+        assert [e.event_type for e in log.events] == [
+            EventType.PARSING_STARTED, EventType.DATA_EXTRACTED, EventType.DATA_EXTRACTED, EventType.ERROR
+        ]
+        assert log.dropped_events == 8
+        assert log.to_dict()['dropped_events'] == 8
+
+    def test_event_sampling(self):
+        tracker = PropertyTracker(event_sampling=parse_event_sampling('data_extracted=0.25, bogus=1, warning=x'))
+        log = track(tracker, 'a', status='processing', events=8)
+
+        assert [e.message for e in log.events if e.event_type == EventType.DATA_EXTRACTED] == ['event 0', 'event 4']
+        assert log.dropped_events == 6
+
+
+def test_parse_event_sampling():
+    assert parse_event_sampling('') == {}
+    assert parse_event_sampling('DATA_EXTRACTED=0.1,warning=2,unknown=0.5') == {'data_extracted': 0.1, 'warning': 1.0}
+
+
+class TestSpill:
+
+    def test_completed_logs_survive_eviction(self, store):
+        tracker = PropertyTracker(max_logs=1, store=store)
+        track(tracker, 'a', events=2)
+        track(tracker, 'b', status='failed')
+        track(tracker, 'c', status='processing')
+        tracker.flush()
+
+        restored = tracker.get_log('a')
+        assert isinstance(restored, PropertyLog)
+        assert restored.fair_price_result == {'fair_price_total': 10_000_000}
+        assert [e.event_type for e in restored.events][-1] == EventType.DATA_EXTRACTED
+
+        assert [s.property_id for s in tracker.query()] == ['a', 'b', 'c']
+        assert [s.property_id for s in tracker.query(status='failed')] == ['b']
+        assert [s.property_id for s in tracker.query(limit=2)] == ['b', 'c']
+        assert tracker.get_summary()['total'] == 3
+        assert tracker.get_stats()['spilled'] == 2
+        tracker.close()
+
+    def test_rerun_replaces_stored_log(self, store):
+        tracker = PropertyTracker(store=store, spill_async=False)
+        track(tracker, 'a', status='failed')
+        track(tracker, 'a')
+
+        assert [(s.property_id, s.status) for s in tracker.query()] == [('a', 'completed')]
+        tracker.logs.clear()
+        assert [(s.property_id, s.status) for s in tracker.query()] == [('a', 'completed')]
+
+    def test_full_spill_queue_drops_log(self, tmp_path):
+        tracker = PropertyTracker(store=JsonlLogStore(str(tmp_path / 't.jsonl')), spill_queue_size=1)
+        # Поток записи остановлен, очередь занята - новый лог не помещается
+        tracker.close()
+        tracker._spill_queue.put_nowait(('pending', '{}'))
+
+        track(tracker, 'a')
+        assert tracker.get_stats()['spill_dropped'] == 1
+
+
+def test_export_to_json_includes_spilled_logs(tmp_path):
+    tracker = PropertyTracker(max_logs=1, store=JsonlLogStore(str(tmp_path / 't.jsonl')))
+    track(tracker, 'a')
+    track(tracker, 'b', status='processing')
+
+    tracker.export_to_json(str(tmp_path / 'export.json'))
+    data = json.loads((tmp_path / 'export.json').read_text(encoding='utf-8'))
+
+    assert data['total_properties'] == 2
+    assert [log['property_id'] for log in data['logs']] == ['a', 'b']
+    tracker.close()
+
+
+def test_markdown_summary_uses_query(tmp_path):
+    tracker = PropertyTracker(max_logs=1, store=SqliteLogStore(str(tmp_path / 't.db')), spill_async=False)
+    for property_id in ('a', 'b', 'c'):
+        track(tracker, property_id)
+
+    md = MarkdownExporter().export_tracker_summary(tracker, limit=2)
+
+    assert '**Всего объектов:** 3' in md
+    assert 'Показаны последние 2 из 3' in md
+    assert '| b |' in md and '| c |' in md and '| a |' not in md
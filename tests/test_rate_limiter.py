@@ -0,0 +1,126 @@
+"""
+Тесты DomainRateLimiter: token bucket в Redis (fakeredis) и локальный fallback
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.cache.redis_cache import PropertyCache
+from src.cache.rate_limiter import DomainRateLimiter
+
+fakeredis = pytest.importorskip('fakeredis')
+
+URL = 'https://spb.cian.ru/sale/flat/123456/'
+OTHER_REGION_URL = 'https://www.cian.ru/cat.php?region=1'
+
+
+def make_cache(server=None):
+    cache = PropertyCache(enabled=False, namespace='test')
+    cache.enabled = True
+    cache.redis_client = fakeredis.FakeRedis(server=server) if server else fakeredis.FakeRedis()
+    cache._is_available = True
+    return cache
+
+
+class TestLocalBucket:
+
+    def test_burst_then_waits(self):
+        limiter = DomainRateLimiter(rate=2.0, burst=3)
+        waits = [limiter.reserve(URL) for _ in range(5)]
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3] == pytest.approx(0.5, abs=0.05)
+        assert waits[4] == pytest.approx(1.0, abs=0.05)
+
+    def test_region_subdomains_share_budget(self):
+        limiter = DomainRateLimiter(rate=1.0, burst=1)
+        limiter.reserve(URL)
+        assert limiter.reserve(OTHER_REGION_URL) > 0
+
+    def test_per_proxy_buckets(self):
+        limiter = DomainRateLimiter(rate=1.0, burst=1, per_proxy=True)
+        limiter.reserve(URL, 'http://proxy-a:1')
+        assert limiter.reserve(URL, 'http://proxy-b:1') == 0.0
+        assert limiter.reserve(URL, 'http://proxy-a:1') > 0
+
+    def test_debt_is_capped_by_max_wait(self):
+        limiter = DomainRateLimiter(rate=1.0, burst=1, max_wait=2.0)
+        waits = [limiter.reserve(URL) for _ in range(10)]
+        assert max(waits) == pytest.approx(2.0, abs=0.05)
+
+    def test_disabled(self):
+        limiter = DomainRateLimiter(rate=0)
+        assert all(limiter.acquire(URL) == 0.0 for _ in range(10))
+        assert limiter.get_stats()['acquisitions'] == 0
+
+
+class TestRedisBucket:
+
+    def test_budget_shared_between_workers(self):
+        server = fakeredis.FakeServer()
+        worker_a = DomainRateLimiter(make_cache(server), rate=2.0, burst=2)
+        worker_b = DomainRateLimiter(make_cache(server), rate=2.0, burst=2)
+
+        assert worker_a.reserve(URL) == 0.0
+        assert worker_b.reserve(URL) == 0.0
+        assert worker_a.reserve(URL) > 0
+        assert worker_a.get_stats()['backend'] == 'redis'
+
+    def test_redis_error_falls_back_to_local(self):
+        cache = make_cache()
+        limiter = DomainRateLimiter(cache, rate=1.0, burst=1)
+        with patch.object(cache.redis_client, 'pipeline', side_effect=RedisConnectionError('down')):
+            assert limiter.reserve(URL) == 0.0
+            assert limiter.reserve(URL) > 0
+
+        stats = limiter.get_stats()
+        assert stats['redis_errors'] == 2
+        assert stats['local_fallbacks'] == 2
+
+
+class TestWaiting:
+
+    def test_acquire_sleeps_and_records_metrics(self):
+        limiter = DomainRateLimiter(rate=2.0, burst=1)
+        with patch('src.cache.rate_limiter.time.sleep') as sleep:
+            limiter.acquire(URL)
+            waited = limiter.acquire(URL)
+
+        sleep.assert_called_once()
+        assert waited == pytest.approx(0.5, abs=0.05)
+        stats = limiter.get_stats()
+        assert stats['acquisitions'] == 2
+        assert stats['waits'] == 1
+        assert stats['by_domain']['cian.ru']['acquisitions'] == 2
+        assert sum(stats['wait_histogram'].values()) == 2
+
+    def test_acquire_async(self):
+        limiter = DomainRateLimiter(rate=100.0, burst=1)
+
+        async def run():
+            return [await limiter.acquire_async(URL) for _ in range(3)]
+
+        waits = asyncio.run(run())
+        assert waits[0] == 0.0
+        assert waits[1] > 0
+
+    def test_acquire_async_reserves_off_event_loop(self):
+        limiter = DomainRateLimiter(cache=make_cache(), rate=100.0, burst=1)
+        threads = []
+        reserve = limiter._reserve_redis
+
+        def tracking_reserve(bucket):
+            threads.append(threading.current_thread())
+            return reserve(bucket)
+
+        async def run():
+            with patch.object(limiter, '_reserve_redis', side_effect=tracking_reserve):
+                await limiter.acquire_async(URL)
+            return threading.current_thread()
+
+        loop_thread = asyncio.run(run())
+        assert len(threads) == 1
+        assert threads[0] is not loop_thread
+        assert limiter.get_stats()['backend'] == 'redis'
@@ -0,0 +1,292 @@
+"""
+Тесты PropertyCache: счетчики по типам ключей, очистка через SCAN/UNLINK, формат значений, L1
+
+Redis подменяется fakeredis (тесты пропускаются, если он не установлен)
+"""
+import json
+import time
+
+import pytest
+
+from src.cache.codec import (
+    CODEC_JSON,
+    CODEC_JSON_ZLIB,
+    CODEC_JSON_ZSTD,
+    ZSTD_AVAILABLE,
+    CacheCodecError,
+    decode_value,
+    encode_value,
+)
+from src.cache.local_cache import LocalLRUCache
+from src.cache.redis_cache import PropertyCache
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def cache():
+    """PropertyCache поверх fakeredis"""
+    cache = PropertyCache(enabled=False, namespace='test')
+    cache.enabled = True
+    cache.redis_client = fakeredis.FakeRedis()
+    cache._is_available = True
+    yield cache
+    cache.redis_client.flushall()
+
+
+def _make_cache(client):
+    cache = PropertyCache(enabled=False, namespace='test')
+    cache.enabled = True
+    cache.redis_client = client
+    cache._is_available = True
+    return cache
+
+
+@pytest.fixture
+def l1_pair():
+    """Два воркера с L1 поверх одного fakeredis-сервера"""
+    server = fakeredis.FakeServer()
+    caches = [_make_cache(fakeredis.FakeRedis(server=server)) for _ in range(2)]
+    for c in caches:
+        c.enable_local_cache(max_items=10, ttl_seconds=60)
+    time.sleep(0.2)  # подписка на канал инвалидации
+    yield caches
+    for c in caches:
+        c.close()
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestCacheCounters:
+
+    def test_keys_counted_by_type(self, cache):
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+        cache.set_property('https://www.cian.ru/sale/flat/2/', {'price': 2})
+        cache.set_search_results('abc', [{'url': 'x'}])
+        cache.set_residential_complex('ЖК Тест', {'name': 'ЖК Тест'})
+
+        stats = cache.get_stats()
+
+        assert stats['total_keys'] == 4
+        assert stats['by_type']['property']['keys'] == 2
+        assert stats['by_type']['search']['keys'] == 1
+        assert stats['by_type']['complex']['keys'] == 1
+
+    def test_hits_and_misses_by_type(self, cache):
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+
+        assert cache.get_property('https://www.cian.ru/sale/flat/1/') == {'price': 1}
+        assert cache.get_property('https://www.cian.ru/sale/flat/2/') is None
+        assert cache.get_search_results('missing') is None
+
+        stats = cache.get_stats()
+
+        assert stats['by_type']['property']['hits'] == 1
+        assert stats['by_type']['property']['misses'] == 1
+        assert stats['by_type']['search']['misses'] == 1
+        assert stats['hit_rate'] == pytest.approx(33.33)
+
+    def test_stats_do_not_use_keys(self, cache, monkeypatch):
+        """get_stats() и clear_all() не вызывают блокирующий KEYS"""
+        def forbidden(*args, **kwargs):
+            raise AssertionError("KEYS must not be used")
+
+        monkeypatch.setattr(cache.redis_client, 'keys', forbidden)
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+
+        assert cache.get_stats()['total_keys'] == 1
+        assert cache.clear_all() >= 1
+
+    def test_expired_keys_drop_out_of_counters(self, cache):
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+        key = cache._make_key('property', 'https://www.cian.ru/sale/flat/1/')
+        cache.redis_client.zadd(cache._index_key('property'), {key: 1})  # истек давно
+
+        assert cache.get_stats()['by_type']['property']['keys'] == 0
+
+    def test_write_trims_expired_index_members(self, cache):
+        index_key = cache._index_key('property')
+        cache.redis_client.zadd(index_key, {f'{cache.namespace}:property:old{i}': i for i in range(1, 4)})
+
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+
+        assert cache.redis_client.zcard(index_key) == 1
+
+    def test_invalidate_updates_counter(self, cache):
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+
+        assert cache.invalidate_property('https://www.cian.ru/sale/flat/1/') is True
+        assert cache.get_stats()['by_type']['property']['keys'] == 0
+
+    def test_rebuild_index_picks_up_legacy_keys(self, cache):
+        """Ключи, записанные до появления индексов, попадают в счетчики после rebuild_index()"""
+        cache.redis_client.setex(cache._make_key('property', 'legacy'), 3600, '{}')
+
+        assert cache.get_stats()['total_keys'] == 0
+        assert cache.rebuild_index() == 1
+        assert cache.get_stats()['by_type']['property']['keys'] == 1
+
+
+class TestCacheClear:
+
+    def test_clear_by_pattern_in_batches(self, cache, monkeypatch):
+        monkeypatch.setattr(PropertyCache, 'SCAN_BATCH_SIZE', 3)
+        for i in range(10):
+            cache.set_property(f'https://www.cian.ru/sale/flat/{i}/', {'price': i})
+        cache.set_search_results('abc', [])
+
+        assert cache.clear_all('property:*') == 10
+
+        stats = cache.get_stats()
+        assert stats['by_type']['property']['keys'] == 0
+        assert stats['by_type']['search']['keys'] == 1
+        assert cache.get_search_results('abc') == []
+
+    def test_clear_does_not_touch_other_namespaces(self, cache):
+        cache.set_property('https://www.cian.ru/sale/flat/1/', {'price': 1})
+        cache.redis_client.set('other:property:1', '{}')
+
+        cache.clear_all()
+
+        assert cache.redis_client.get('other:property:1') == b'{}'
+
+
+class TestCacheCodec:
+
+    @staticmethod
+    def _large_property():
+        return {
+            'url': 'https://www.cian.ru/sale/flat/1/',
+            'description': 'Просторная квартира с видом на парк. ' * 100,
+            'characteristics': {f'Параметр {i}': f'Значение {i}' for i in range(50)},
+            'images': [f'https://images.cian.ru/{i}.jpg' for i in range(30)],
+        }
+
+    def test_large_values_compressed(self, cache):
+        data = self._large_property()
+        cache.set_property(data['url'], data)
+
+        raw = cache.redis_client.get(cache._make_key('property', data['url']))
+        assert raw[0] in (CODEC_JSON_ZLIB, CODEC_JSON_ZSTD)
+        assert cache.get_property(data['url']) == data
+
+        codec_stats = cache.get_stats()['codec']
+        assert codec_stats['compressed_writes'] == 1
+        assert codec_stats['compression_ratio'] > 2
+
+    def test_small_values_not_compressed(self, cache):
+        cache.set_property('https://www.cian.ru/sale/flat/2/', {'price': 1})
+
+        raw = cache.redis_client.get(cache._make_key('property', 'https://www.cian.ru/sale/flat/2/'))
+        assert raw[0] == CODEC_JSON
+
+    def test_legacy_plain_json_readable(self, cache):
+        """Записи старого формата (plain JSON-текст) читаются прозрачно"""
+        key = cache._make_key('property', 'https://www.cian.ru/sale/flat/3/')
+        cache.redis_client.set(key, json.dumps({'title': 'Квартира'}, ensure_ascii=False))
+
+        assert cache.get_property('https://www.cian.ru/sale/flat/3/') == {'title': 'Квартира'}
+
+    def test_corrupted_value_is_miss(self, cache):
+        key = cache._make_key('property', 'https://www.cian.ru/sale/flat/4/')
+        cache.redis_client.set(key, bytes([CODEC_JSON_ZLIB]) + b'not zlib')
+
+        assert cache.get_property('https://www.cian.ru/sale/flat/4/') is None
+
+    @pytest.mark.parametrize('compression', ['zlib', 'zstd', None])
+    def test_codec_roundtrip(self, compression):
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            pytest.skip("zstandard not installed")
+        data = self._large_property()
+
+        encoded = encode_value(data, compress_threshold=100, compression=compression)
+
+        assert decode_value(encoded) == data
+
+    def test_unknown_codec_rejected(self):
+        with pytest.raises(CacheCodecError):
+            decode_value(bytes([0x07]) + b'{}')
+
+
+class TestLocalLRUCache:
+
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRUCache(max_items=2, ttl_seconds=60)
+        lru.set('a', b'1')
+        lru.set('b', b'2')
+        assert lru.get('a') == b'1'  # 'a' становится самым свежим
+        lru.set('c', b'3')
+
+        assert lru.get('b') is None
+        assert lru.get('a') == b'1'
+        assert lru.get_stats()['evictions'] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr('src.cache.local_cache.time.monotonic', lambda: now[0])
+        lru = LocalLRUCache(max_items=10, ttl_seconds=5)
+        lru.set('a', b'1')
+        now[0] += 6
+
+        assert lru.get('a') is None
+        assert lru.get_stats()['expired'] == 1
+
+
+class TestCacheL1:
+
+    def test_l1_hit_skips_redis(self, l1_pair, monkeypatch):
+        cache = l1_pair[0]
+        url = 'https://www.cian.ru/sale/flat/1/'
+        cache.set_property(url, {'price': 1})
+
+        monkeypatch.setattr(cache.redis_client, 'get', lambda key: pytest.fail('Redis GET on L1 hit'))
+        value = cache.get_property(url)
+        value['price'] = 999  # мутация результата не портит L1
+
+        assert cache.get_property(url) == {'price': 1}
+        stats = cache.get_stats()
+        assert stats['by_type']['property']['l1_hits'] == 2
+        assert stats['by_type']['property']['l1_hit_rate'] == 100.0
+        assert stats['l1']['enabled'] is True
+        assert stats['l1']['items'] == 1
+
+    def test_l1_filled_on_redis_hit(self, l1_pair):
+        writer, reader = l1_pair
+        url = 'https://www.cian.ru/sale/flat/1/'
+        writer.set_property(url, {'price': 1})
+
+        assert reader.get_property(url) == {'price': 1}
+        assert reader.get_property(url) == {'price': 1}
+        by_type = reader.get_stats()['by_type']['property']
+        assert by_type['l1_misses'] == 1
+        assert by_type['l1_hits'] == 1
+
+    def test_write_invalidates_other_workers(self, l1_pair):
+        a, b = l1_pair
+        url = 'https://www.cian.ru/sale/flat/1/'
+        a.set_property(url, {'price': 1})
+        assert b.get_property(url) == {'price': 1}
+
+        a.set_property(url, {'price': 2})
+        assert _wait_for(lambda: b.get_property(url) == {'price': 2})
+
+        a.invalidate_property(url)
+        assert _wait_for(lambda: b.get_property(url) is None)
+
+    def test_clear_all_invalidates_other_workers(self, l1_pair):
+        a, b = l1_pair
+        a.set_search_results('abc', [{'url': 'x'}])
+        assert b.get_search_results('abc') == [{'url': 'x'}]
+
+        a.clear_all()
+        assert _wait_for(lambda: b.get_search_results('abc') is None)
+
+    def test_l1_disabled_by_default(self, cache):
+        assert cache.get_stats()['l1'] == {'enabled': False}
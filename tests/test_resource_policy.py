@@ -0,0 +1,151 @@
+"""
+Тесты политики блокировки ресурсов Playwright (без запуска браузера)
+"""
+import asyncio
+
+import pytest
+
+from src.parsers.resource_policy import ResourcePolicy, classify_page_url
+
+SEARCH_PAGE = 'https://spb.cian.ru/cat.php?deal_type=sale&offer_type=flat&region=2'
+DETAIL_PAGE = 'https://spb.cian.ru/sale/flat/123456/'
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type, page_url=None, headers=None):
+        self.url = url
+        self.resource_type = resource_type
+        self.headers = headers or {}
+        self._page_url = page_url
+
+    def is_navigation_request(self):
+        return self.resource_type == 'document'
+
+    @property
+    def frame(self):
+        if self._page_url is None:
+            raise RuntimeError('service worker request')
+        return type('Frame', (), {'url': self._page_url})()
+
+
+class FakeRoute:
+    def __init__(self, request):
+        self.request = request
+        self.outcome = None
+
+    def abort(self):
+        self.outcome = 'aborted'
+
+    def continue_(self):
+        self.outcome = 'continued'
+
+
+class FakeContext:
+    def __init__(self):
+        self.handlers = {}
+        self.routes = []
+
+    def route(self, pattern, handler):
+        self.routes.append((pattern, handler))
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+
+@pytest.fixture
+def policy():
+    return ResourcePolicy()
+
+
+class TestDecide:
+
+    def test_classify_page_url(self):
+        assert classify_page_url(SEARCH_PAGE) == 'search'
+        assert classify_page_url('https://zhk-severnaya-dolina.cian.ru/') == 'search'
+        assert classify_page_url(DETAIL_PAGE) == 'detail'
+
+    def test_document_never_blocked(self, policy):
+        assert policy.decide(DETAIL_PAGE, 'document', 'detail') is None
+
+    def test_trackers_blocked_by_domain(self, policy):
+        assert policy.decide('https://mc.yandex.ru/watch/123', 'script', 'detail') == 'domain'
+        assert policy.decide('https://www.googletagmanager.com/gtm.js', 'script', 'search') == 'domain'
+        assert policy.decide('https://core-renderer-tiles.maps.yandex.net/tiles?x=1', 'image', 'pdf') == 'domain'
+        assert policy.decide('https://vk.com/rtrg?p=1', 'xhr', 'detail') == 'domain'
+        assert policy.decide('https://vk.com/some-page', 'xhr', 'detail') is None
+
+    def test_allowlist_overrides_denylist(self):
+        policy = ResourcePolicy(deny_domains=['*.ru'], allow_domains=['cian.ru'])
+        assert policy.decide('https://api.cian.ru/state', 'xhr', 'detail') is None
+        assert policy.decide('https://example.ru/x.js', 'script', 'detail') == 'domain'
+
+    def test_profiles_block_different_types(self, policy):
+        css = 'https://static.cian.ru/main.css'
+        assert policy.decide(css, 'stylesheet', 'search') == 'type'
+        assert policy.decide(css, 'stylesheet', 'detail') is None
+        assert policy.decide('https://static.cian.ru/a.png', 'image', 'detail') == 'type'
+        assert policy.decide('https://static.cian.ru/a.png', 'image', 'pdf') is None
+        assert policy.decide('https://static.cian.ru/app.js', 'script', 'search') is None
+
+    def test_data_urls_pass(self, policy):
+        assert policy.decide('data:image/png;base64,AAAA', 'image', 'detail') is None
+
+
+class TestAttach:
+
+    def test_sync_route_handler_counts(self, policy):
+        context = FakeContext()
+        policy.attach(context)
+        pattern, handler = context.routes[0]
+        assert pattern == '**/*'
+
+        requests = [
+            FakeRequest(SEARCH_PAGE, 'document'),
+            FakeRequest('https://static.cian.ru/main.css', 'stylesheet', SEARCH_PAGE),
+            FakeRequest('https://mc.yandex.ru/watch/1', 'script', DETAIL_PAGE),
+            FakeRequest('https://static.cian.ru/app.js', 'script', None, {'referer': DETAIL_PAGE}),
+        ]
+        routes = [FakeRoute(r) for r in requests]
+        for route in routes:
+            handler(route)
+
+        assert [r.outcome for r in routes] == ['continued', 'aborted', 'aborted', 'continued']
+
+        response = type('Response', (), {'headers': {'content-length': '2048'}, 'request': requests[0]})()
+        context.handlers['response'](response)
+
+        stats = policy.get_stats()
+        assert stats['requests'] == 4
+        assert stats['blocked'] == 2
+        assert stats['blocked_by_type'] == {'stylesheet': 1}
+        assert stats['blocked_by_domain'] == 1
+        assert stats['by_profile']['search'] == {'allowed': 1, 'blocked': 1, 'bytes_received': 2048}
+        assert stats['by_profile']['detail']['allowed'] == 1
+
+    def test_async_route_handler_with_fixed_profile(self, policy):
+        class AsyncRoute(FakeRoute):
+            async def abort(self):
+                self.outcome = 'aborted'
+
+            async def continue_(self):
+                self.outcome = 'continued'
+
+        class AsyncContext(FakeContext):
+            async def route(self, pattern, handler):
+                self.routes.append((pattern, handler))
+
+        context = AsyncContext()
+        image = AsyncRoute(FakeRequest('https://cdn.example.com/chart.png', 'image', 'about:blank'))
+        tracker = AsyncRoute(FakeRequest('https://www.google-analytics.com/collect', 'xhr', 'about:blank'))
+
+        async def run():
+            await policy.attach_async(context, profile='pdf')
+            handler = context.routes[0][1]
+            await handler(image)
+            await handler(tracker)
+
+        asyncio.run(run())
+
+        assert image.outcome == 'continued'
+        assert tracker.outcome == 'aborted'
+        assert policy.get_stats()['by_profile']['pdf'] == {'allowed': 1, 'blocked': 1, 'bytes_received': 0}
@@ -0,0 +1,71 @@
+"""
+Тесты кэширования поисковой выдачи (PlaywrightParser.parse_search_page)
+
+Браузер не запускается: загрузка страницы подменяется, Redis - fakeredis
+"""
+from unittest.mock import patch
+
+import pytest
+
+from src.cache.redis_cache import PropertyCache
+from src.parsers.base_parser import search_query_hash
+
+fakeredis = pytest.importorskip('fakeredis')
+PlaywrightParser = pytest.importorskip('src.parsers.playwright_parser').PlaywrightParser
+
+SEARCH_URL = ('https://www.cian.ru/cat.php?deal_type=sale&offer_type=flat'
+              '&region=2&room2=1&minarea=40&maxarea=60')
+
+
+@pytest.fixture
+def cache():
+    cache = PropertyCache(enabled=False, namespace='test')
+    cache.enabled = True
+    cache.redis_client = fakeredis.FakeRedis()
+    cache._is_available = True
+    return cache
+
+
+@pytest.fixture
+def parser(cache):
+    return PlaywrightParser(headless=True, cache=cache)
+
+
+class TestSearchQueryHash:
+
+    def test_param_order_does_not_matter(self):
+        reordered = ('https://www.cian.ru/cat.php?maxarea=60&minarea=40&room2=1'
+                     '&region=2&offer_type=flat&deal_type=sale')
+        assert search_query_hash(SEARCH_URL) == search_query_hash(reordered)
+
+    def test_different_params_differ(self):
+        assert search_query_hash(SEARCH_URL) != search_query_hash(SEARCH_URL.replace('maxarea=60', 'maxarea=70'))
+        assert search_query_hash(SEARCH_URL) != search_query_hash(SEARCH_URL.replace('www.cian.ru', 'spb.cian.ru'))
+
+
+class TestSearchPageCache:
+
+    def test_repeated_search_served_from_cache(self, parser):
+        cards = [{'url': 'https://www.cian.ru/sale/flat/1/', 'title': '2-комн. квартира', 'price': 10_000_000}]
+        with patch.object(PlaywrightParser, '_parse_search_page_uncached', return_value=cards) as fetch:
+            assert parser.parse_search_page(SEARCH_URL) == cards
+            assert parser.parse_search_page(SEARCH_URL) == cards
+
+        assert fetch.call_count == 1
+        assert parser.stats['search_cache_hits'] == 1
+        assert parser.stats['search_cache_misses'] == 1
+
+    def test_empty_results_not_cached(self, parser):
+        with patch.object(PlaywrightParser, '_parse_search_page_uncached', return_value=[]) as fetch:
+            parser.parse_search_page(SEARCH_URL)
+            parser.parse_search_page(SEARCH_URL)
+
+        assert fetch.call_count == 2
+
+    def test_works_without_cache(self):
+        parser = PlaywrightParser(headless=True, cache=None)
+        with patch.object(PlaywrightParser, '_parse_search_page_uncached', return_value=[{'title': 'x'}]) as fetch:
+            parser.parse_search_page(SEARCH_URL)
+            parser.parse_search_page(SEARCH_URL)
+
+        assert fetch.call_count == 2
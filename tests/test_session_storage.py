@@ -396,6 +396,107 @@ class TestSessionStorageSingleton:
         assert data == {'value': 123}
 
 
+SESSION = {
+    'target_property': {'price': 10_000_000, 'total_area': 50.0},
+    'comparables': [{'url': 'a', 'price': 1}, {'url': 'b', 'price': 2}],
+    'step': 1,
+}
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def field_storage(request):
+    """Same field-level API on both backends"""
+    storage = SessionStorage(max_memory_sessions=10, cleanup_interval=10)
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        storage.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    storage.set('s', {**SESSION, 'comparables': list(SESSION['comparables'])})
+    return storage
+
+
+class TestFieldLevelStorage:
+    """Partial reads and atomic partial updates"""
+
+    def test_roundtrip(self, field_storage):
+        assert field_storage.get('s') == SESSION
+
+    def test_get_selected_fields(self, field_storage):
+        assert field_storage.get('s', fields=['target_property', 'missing']) == {
+            'target_property': SESSION['target_property']
+        }
+        assert field_storage.get_field('s', 'step') == 1
+        assert field_storage.get('nonexistent', fields=['step']) is None
+
+    def test_update_keeps_other_fields(self, field_storage):
+        assert field_storage.update('s', {'analysis': {'fair_price': 1}, 'step': 3})
+        data = field_storage.get('s')
+        assert data['analysis'] == {'fair_price': 1}
+        assert data['comparables'] == SESSION['comparables']
+
+    def test_update_replaces_comparables(self, field_storage):
+        field_storage.update('s', {'comparables': [{'url': 'c'}]})
+        assert field_storage.get_comparables('s') == [{'url': 'c'}]
+        assert field_storage.get_comparable('s', 1) is None
+
+    def test_update_create(self, field_storage):
+        assert not field_storage.update('new', {'step': 1})
+        assert field_storage.update('new', {'step': 1}, create=True)
+        assert field_storage.get('new') == {'step': 1}
+
+    def test_merge_field(self, field_storage):
+        merged = field_storage.merge_field('s', 'target_property', {'rooms': 2})
+        assert merged == {**SESSION['target_property'], 'rooms': 2}
+        assert field_storage.get_field('s', 'target_property') == merged
+        assert field_storage.merge_field('nonexistent', 'target_property', {}) is None
+
+    def test_append_comparable(self, field_storage):
+        assert field_storage.append_comparable('s', {'url': 'c'}) == 2
+        assert [c['url'] for c in field_storage.get_comparables('s')] == ['a', 'b', 'c']
+        assert field_storage.append_comparable('nonexistent', {'url': 'c'}) is None
+
+    def test_update_comparable(self, field_storage):
+        updated = field_storage.update_comparable('s', 1, {'excluded': True})
+        assert updated == {'url': 'b', 'price': 2, 'excluded': True}
+        assert field_storage.get_comparable('s', 1)['excluded'] is True
+        assert 'excluded' not in field_storage.get_comparable('s', 0)
+        assert field_storage.update_comparable('s', 5, {'excluded': True}) is None
+
+    def test_concurrent_appends_are_not_lost(self, field_storage):
+        threads = [
+            threading.Thread(target=field_storage.append_comparable, args=('s', {'url': f'x{i}'}))
+            for i in range(20)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(field_storage.get_comparables('s')) == 22
+
+
+def test_redis_comparable_update_writes_one_field():
+    fakeredis = pytest.importorskip('fakeredis')
+    storage = SessionStorage()
+    storage.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    storage.set('s', SESSION)
+
+    with patch.object(storage, '_to_fields', side_effect=AssertionError('full rewrite')):
+        storage.update_comparable('s', 0, {'excluded': True})
+    assert storage.redis_client.hget('session:s', 'comparable:0').count('excluded') == 1
+
+
+def test_redis_legacy_json_session_is_migrated():
+    fakeredis = pytest.importorskip('fakeredis')
+    import json
+    storage = SessionStorage()
+    storage.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    storage.redis_client.setex('session:old', 100, json.dumps(SESSION))
+
+    assert storage.get('old', fields=['step']) == {'step': 1}
+    assert storage.redis_client.type('session:old') == 'hash'
+    assert 0 < storage.redis_client.ttl('session:old') <= 100
+    assert storage.update_comparable('old', 0, {'excluded': True})['excluded'] is True
+
+
 @pytest.mark.integration
 class TestSessionStorageWithRedis:
     """Integration tests with Redis (if available)"""
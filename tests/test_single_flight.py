@@ -0,0 +1,177 @@
+"""
+Тесты single-flight: объединение одновременных загрузок одного URL
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.cache.redis_cache import PropertyCache
+from src.cache.single_flight import SingleFlight, get_single_flight
+
+URL = 'https://www.cian.ru/sale/flat/1/'
+
+
+@pytest.fixture
+def redis_cache():
+    fakeredis = pytest.importorskip('fakeredis')
+    cache = PropertyCache(enabled=False, namespace='test')
+    cache.enabled = True
+    cache.redis_client = fakeredis.FakeRedis()
+    cache._is_available = True
+    return cache
+
+
+class TestInProcess:
+
+    def test_threads_share_one_fetch(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'url': URL, 'price': 1}
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do(URL, fetch))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == [{'url': URL, 'price': 1}] * 5
+        assert len({id(r) for r in results}) == 5  # у каждого своя копия
+        assert flight.get_stats()['coalesced'] == 4
+        assert flight.get_stats()['in_flight'] == 0
+
+    def test_error_shared_with_waiters(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def fetch():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError('blocked')
+
+        def call():
+            try:
+                flight.do(URL, fetch)
+            except RuntimeError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+
+        assert len(errors) == 2
+
+    def test_coroutines_share_one_fetch(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'url': URL}
+
+        async def run():
+            return await asyncio.gather(*(flight.do_async(URL, fetch) for _ in range(4)))
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert results == [{'url': URL}] * 4
+
+    def test_process_wide_instance(self):
+        assert get_single_flight(None) is get_single_flight(None)
+
+
+class TestAcrossWorkers:
+
+    def test_waits_for_other_worker_result(self, redis_cache):
+        """Пока лок держит другой воркер, ждем его результат в кэше вместо своей загрузки"""
+        other_worker = SingleFlight(redis_cache)
+        token = other_worker._acquire(URL)
+        assert token is not None
+
+        flight = SingleFlight(redis_cache, poll_interval=0.02)
+        fetched = []
+
+        def publish():
+            time.sleep(0.1)
+            redis_cache.set_property(URL, {'url': URL, 'price': 2})
+            other_worker._release(URL, token)
+
+        threading.Thread(target=publish).start()
+        result = flight.do(URL, lambda: fetched.append(1), lookup=lambda: redis_cache.get_property(URL))
+
+        assert result == {'url': URL, 'price': 2}
+        assert fetched == []
+        assert flight.get_stats()['remote_hits'] == 1
+
+    def test_waiting_does_not_count_cache_misses(self, redis_cache):
+        """Ожидание чужого лока не опрашивает кэш - статистика hit/miss не искажается"""
+        other_worker = SingleFlight(redis_cache)
+        token = other_worker._acquire(URL)
+
+        def publish():
+            time.sleep(0.2)
+            redis_cache.set_property(URL, {'url': URL, 'price': 2})
+            other_worker._release(URL, token)
+
+        threading.Thread(target=publish).start()
+        flight = SingleFlight(redis_cache, poll_interval=0.01)
+        flight.do(URL, lambda: None, lookup=lambda: redis_cache.get_property(URL))
+
+        property_stats = redis_cache.get_stats()['by_type']['property']
+        assert (property_stats['hits'], property_stats['misses']) == (1, 0)
+
+    def test_async_redis_calls_run_off_the_event_loop(self, redis_cache):
+        other_worker = SingleFlight(redis_cache)
+        token = other_worker._acquire(URL)
+        threading.Timer(0.1, other_worker._release, args=(URL, token)).start()
+
+        flight = SingleFlight(redis_cache, poll_interval=0.02)
+        redis_threads = set()
+        exists = redis_cache.redis_client.exists
+
+        def tracked_exists(*args):
+            redis_threads.add(threading.current_thread())
+            return exists(*args)
+
+        redis_cache.redis_client.exists = tracked_exists
+
+        async def fetch():
+            return {'url': URL, 'fresh': True}
+
+        result = asyncio.run(flight.do_async(URL, fetch, lookup=lambda: redis_cache.get_property(URL)))
+
+        assert result == {'url': URL, 'fresh': True}
+        assert redis_threads and threading.current_thread() not in redis_threads
+
+    def test_fetches_after_lock_released_without_result(self, redis_cache):
+        """Другой воркер упал и отпустил лок - грузим сами"""
+        other_worker = SingleFlight(redis_cache)
+        token = other_worker._acquire(URL)
+        threading.Timer(0.1, other_worker._release, args=(URL, token)).start()
+
+        flight = SingleFlight(redis_cache, poll_interval=0.02)
+        result = flight.do(URL, lambda: {'url': URL, 'fresh': True}, lookup=lambda: redis_cache.get_property(URL))
+
+        assert result == {'url': URL, 'fresh': True}
+        assert redis_cache.redis_client.get(flight._lock_key(URL)) is None
+
+    def test_release_keeps_foreign_lock(self, redis_cache):
+        flight = SingleFlight(redis_cache)
+        token = flight._acquire(URL)
+        flight._release(URL, 'someone-else')
+
+        assert redis_cache.redis_client.get(flight._lock_key(URL)).decode() == token
@@ -0,0 +1,149 @@
+"""
+Тесты потокового детального парсинга (StreamingDetailParser)
+
+Браузер не запускается: async парсер подменяется фейком через parser_factory
+"""
+import asyncio
+import threading
+
+import pytest
+
+from src.parsers.async_parser import ParseResult, StreamingDetailParser
+
+
+class FakeAsyncParser:
+    """Фейковый async парсер: возвращает полные данные, опционально блокируется"""
+
+    def __init__(self, delay=0.0, gate=None, fail_urls=()):
+        self.delay = delay
+        self.gate = gate
+        self.fail_urls = set(fail_urls)
+        self.started = 0
+        self.closed = 0
+        self.parsed = []
+
+    async def start(self):
+        self.started += 1
+
+    async def close(self):
+        self.closed += 1
+
+    async def _parse_with_timeout(self, url, timeout_per_url, max_retries):
+        if self.gate is not None:
+            while not self.gate.is_set():
+                await asyncio.sleep(0.01)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.parsed.append(url)
+        if url in self.fail_urls:
+            return ParseResult(url=url, ok=False, data={'url': url}, error_type='timeout', retries_used=1)
+        return ParseResult(url=url, ok=True, data={'url': url, 'price': 10_000_000, 'total_area': 50.0})
+
+
+def _cards(*ids, complete=False):
+    cards = []
+    for i in ids:
+        card = {'url': f'https://www.cian.ru/sale/flat/{i}/'}
+        if complete:
+            card.update(price=9_000_000, total_area=45.0)
+        cards.append(card)
+    return cards
+
+
+class TestStreamingDetailParser:
+
+    def test_collect_merges_streamed_results(self):
+        """Результаты уровней парсятся по мере поступления и собираются в формате parse_multiple_urls_parallel"""
+        fake = FakeAsyncParser(fail_urls={'https://www.cian.ru/sale/flat/3/'})
+        with StreamingDetailParser(limit=10, parser_factory=lambda: fake) as pipeline:
+            assert pipeline.submit(_cards(1, 2)) == 2
+            assert pipeline.submit(_cards(2, 3)) == 1  # дубликат URL не парсится повторно
+            urls = [c['url'] for c in _cards(1, 2, 3)]
+            results, quality = pipeline.collect(urls)
+
+        assert [r['url'] for r in results] == urls
+        assert results[0]['price'] == 10_000_000
+        assert results[2]['parse_failed'] is True
+        assert quality['total_found'] == 3
+        assert quality['successfully_parsed'] == 2
+        assert quality['error_breakdown'] == {'timeout': 1}
+        assert quality['streaming']['scheduled'] == 3
+        assert fake.started == 1
+        assert fake.closed == 1
+
+    def test_browser_not_started_without_work(self):
+        """Если у всех карточек есть цена и площадь - браузер не запускается"""
+        fake = FakeAsyncParser()
+        with StreamingDetailParser(limit=2, parser_factory=lambda: fake) as pipeline:
+            assert pipeline.submit(_cards(1, 2, complete=True)) == 0
+            assert pipeline.satisfied
+
+        assert fake.started == 0
+
+    def test_early_stop_cancels_pending(self):
+        """Как только набран лимит полных аналогов - новые URL не ставятся, ожидающие отменяются"""
+        gate = threading.Event()
+        fake = FakeAsyncParser(gate=gate)
+        with StreamingDetailParser(limit=2, parser_factory=lambda: fake) as pipeline:
+            assert pipeline.submit(_cards(1, 2, 3)) == 3
+            assert not pipeline.satisfied
+
+            pipeline.submit(_cards(4, 5, complete=True))
+            assert pipeline.satisfied
+            assert pipeline.submit(_cards(6)) == 0
+
+            gate.set()
+            results, quality = pipeline.collect([])
+            stats = pipeline.get_stats()
+
+        assert results == []
+        assert stats['early_stopped'] is True
+        assert stats['cancelled'] == 3
+        assert fake.parsed == []
+
+    def test_collect_reschedules_required_urls(self):
+        """URL из итогового списка парсятся, даже если были отменены ранней остановкой"""
+        fake = FakeAsyncParser()
+        with StreamingDetailParser(limit=1, parser_factory=lambda: fake) as pipeline:
+            pipeline.submit(_cards(1, complete=True))
+            assert pipeline.submit(_cards(2)) == 0
+
+            results, quality = pipeline.collect([_cards(2)[0]['url']])
+
+        assert quality['successfully_parsed'] == 1
+        assert results[0]['total_area'] == 50.0
+
+    def test_submit_requires_start(self):
+        pipeline = StreamingDetailParser(parser_factory=FakeAsyncParser)
+        with pytest.raises(RuntimeError):
+            pipeline.submit(_cards(1))
+
+    def test_on_complete_reports_merged_cards(self):
+        """on_complete получает карточки из поиска сразу, а распарсенные - объединенными с карточкой"""
+        completed = []
+        fake = FakeAsyncParser()
+        with StreamingDetailParser(limit=10, parser_factory=lambda: fake,
+                                   on_complete=completed.append) as pipeline:
+            pipeline.submit(_cards(1, complete=True))
+            pipeline.submit([{'url': 'https://www.cian.ru/sale/flat/2/', 'metro': 'Невский проспект'}])
+            pipeline.collect(['https://www.cian.ru/sale/flat/2/'])
+
+        assert [c['url'] for c in completed] == [
+            'https://www.cian.ru/sale/flat/1/',
+            'https://www.cian.ru/sale/flat/2/',
+        ]
+        assert completed[1]['metro'] == 'Невский проспект'
+        assert completed[1]['total_area'] == 50.0
+
+    def test_on_complete_receives_snapshot(self):
+        """Изменения карточки после отправки (флаги дубликатов) не попадают в отданный аналог"""
+        completed = []
+        cards = _cards(1, complete=True)
+        with StreamingDetailParser(limit=10, parser_factory=FakeAsyncParser,
+                                   on_complete=completed.append) as pipeline:
+            pipeline.submit(cards)
+
+        cards[0]['possible_duplicate'] = True
+
+        assert completed == [{'url': 'https://www.cian.ru/sale/flat/1/', 'price': 9_000_000, 'total_area': 45.0}]
+        assert completed[0] is not cards[0]
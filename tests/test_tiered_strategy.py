@@ -0,0 +1,186 @@
+"""
+Тесты TieredFetchStrategy: HTTP сначала, эскалация только при неудаче
+
+Сеть и браузер не используются: уровни - фейковые стратегии
+"""
+import pytest
+
+from src.exceptions import CaptchaError
+from src.parsers.strategies.base_strategy import BaseParsingStrategy
+from src.parsers.strategies.tiered_strategy import (
+    TieredFetchStrategy, TierLearner, CallableStrategy, proxy_url
+)
+
+DETAIL_URL = 'https://spb.cian.ru/sale/flat/123456/'
+SEARCH_URL = 'https://spb.cian.ru/cat.php?deal_type=sale&offer_type=flat&region=2'
+
+DETAIL_HTML = (
+    "<html><script>window._cianConfig['frontend-offer-card'] = [];</script>"
+    + 'x' * 2000 + '</html>'
+)
+CAPTCHA_HTML = '<html><form class="captcha-form"></form>' + 'x' * 2000 + '</html>'
+STUB_HTML = '<html><div id="root"></div>' + 'x' * 2000 + '</html>'
+
+
+class FakeStrategy(BaseParsingStrategy):
+    def __init__(self, name, html=None, error=None):
+        super().__init__(name=name)
+        self.html = html
+        self.error = error
+        self.calls = []
+
+    def fetch_content(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        if self.error:
+            raise self.error
+        return self.html
+
+
+def make_fetcher(*strategies, learner=None):
+    tiers = [(s.name, (lambda s=s: s)) for s in strategies]
+    return TieredFetchStrategy(tiers, learner=learner or TierLearner(skip_after_failures=2, probe_every=3))
+
+
+class TestEscalation:
+
+    def test_cheapest_tier_wins(self):
+        http = FakeStrategy('http', DETAIL_HTML)
+        browser = FakeStrategy('browser', DETAIL_HTML)
+        fetcher = make_fetcher(http, browser)
+
+        assert fetcher.fetch_content(DETAIL_URL) == DETAIL_HTML
+        assert browser.calls == []
+        assert fetcher.get_stats()['escalations'] == 0
+
+    @pytest.mark.parametrize('http', [
+        FakeStrategy('http', CAPTCHA_HTML),
+        FakeStrategy('http', STUB_HTML),
+        FakeStrategy('http', None),
+        FakeStrategy('http', error=ConnectionError('reset')),
+    ])
+    def test_escalates_on_block_or_missing_content(self, http):
+        browser = FakeStrategy('browser', DETAIL_HTML)
+        fetcher = make_fetcher(http, browser)
+
+        assert fetcher.fetch_content(DETAIL_URL) == DETAIL_HTML
+        assert len(browser.calls) == 1
+        assert fetcher.get_stats()['escalations'] == 1
+
+    def test_last_tier_error_is_raised(self):
+        fetcher = make_fetcher(FakeStrategy('http', CAPTCHA_HTML), FakeStrategy('browser', CAPTCHA_HTML))
+        with pytest.raises(CaptchaError):
+            fetcher.fetch_content(DETAIL_URL)
+
+    def test_last_tier_returns_page_without_markers(self):
+        """Страница без маркеров (каталог ЖК) с браузера отдается как есть, без капчи"""
+        http = FakeStrategy('http', STUB_HTML)
+        fetcher = make_fetcher(http, FakeStrategy('browser', STUB_HTML))
+
+        assert fetcher.fetch_content(DETAIL_URL) == STUB_HTML
+        assert fetcher.get_stats()['tiers']['http']['insufficient'] == 1
+        assert make_fetcher(FakeStrategy('browser', '<html></html>')).fetch_content(DETAIL_URL) is None
+
+    def test_unavailable_tier_is_disabled(self):
+        def missing():
+            raise ImportError('curl_cffi не установлен')
+
+        browser = FakeStrategy('browser', DETAIL_HTML)
+        fetcher = TieredFetchStrategy([('curl_cffi', missing), ('browser', lambda: browser)])
+
+        assert fetcher.fetch_content(DETAIL_URL) == DETAIL_HTML
+        assert fetcher.fetch_content(DETAIL_URL) == DETAIL_HTML
+        stats = fetcher.get_stats()
+        assert 'curl_cffi' in stats['disabled_tiers']
+        assert stats['tiers']['curl_cffi']['requests'] == 0
+
+    def test_kwargs_passed_to_tiers(self):
+        http = FakeStrategy('http', DETAIL_HTML)
+        make_fetcher(http).fetch_content(DETAIL_URL, proxy='http://p:1')
+        assert http.calls[0][1] == {'proxy': 'http://p:1'}
+
+
+class TestLearning:
+
+    def test_doomed_tier_is_skipped_and_probed(self):
+        http = FakeStrategy('http', CAPTCHA_HTML)
+        browser = FakeStrategy('browser', DETAIL_HTML)
+        fetcher = make_fetcher(http, browser)
+
+        for _ in range(2):
+            fetcher.fetch_content(DETAIL_URL)
+        assert len(http.calls) == 2
+
+        # Два провала подряд: http пропускается, каждый 3-й пропуск - проба
+        for _ in range(3):
+            fetcher.fetch_content(DETAIL_URL)
+        assert len(http.calls) == 3
+        assert len(browser.calls) == 5
+        assert fetcher.get_stats()['tiers']['http']['skipped'] == 2
+
+    def test_learning_is_per_page_type(self):
+        http = FakeStrategy('http', CAPTCHA_HTML)
+        browser = FakeStrategy('browser', DETAIL_HTML)
+        fetcher = make_fetcher(http, browser)
+        for _ in range(2):
+            fetcher.fetch_content(DETAIL_URL)
+
+        fetcher.fetch_content(SEARCH_URL)
+        assert http.calls[-1][0] == SEARCH_URL
+
+    def test_success_resets_failures(self):
+        learner = TierLearner(skip_after_failures=2)
+        key = ('cian.ru', 'detail')
+        learner.record(key, 'http', success=False)
+        learner.record(key, 'http', success=True)
+        learner.record(key, 'http', success=False)
+        assert learner.should_try(key, 'http')
+
+    def test_learning_key_ignores_region_subdomain(self):
+        assert TieredFetchStrategy.learning_key(DETAIL_URL) == ('cian.ru', 'detail')
+        assert TieredFetchStrategy.learning_key(SEARCH_URL) == ('cian.ru', 'search')
+
+
+def test_callable_strategy_passes_kwargs():
+    seen = {}
+
+    def fetch(url, max_retries=5, **kwargs):
+        seen['max_retries'] = max_retries
+        return DETAIL_HTML
+
+    strategy = CallableStrategy('browser', fetch)
+    assert strategy.fetch_content(DETAIL_URL, max_retries=2) == DETAIL_HTML
+    assert seen['max_retries'] == 2
+
+
+def test_proxy_url():
+    assert proxy_url(None) is None
+    assert proxy_url({'server': 'http://host:8080'}) == 'http://host:8080'
+    assert proxy_url({'server': 'host:8080', 'username': 'u', 'password': 'p'}) == 'http://u:p@host:8080'
+
+
+def test_playwright_parser_uses_tiers_before_browser():
+    PlaywrightParser = pytest.importorskip('src.parsers.playwright_parser').PlaywrightParser
+    parser = PlaywrightParser(headless=True)
+    assert parser.tiered_fetcher is None
+
+    browser_calls = []
+    http = FakeStrategy('http', DETAIL_HTML)
+    browser = CallableStrategy('browser', lambda url, **kwargs: browser_calls.append(url))
+    parser.tiered_fetcher = make_fetcher(http, browser)
+
+    # Контекст браузера не запущен: HTTP-уровень обходится без него
+    assert parser._get_page_content(DETAIL_URL) == DETAIL_HTML
+    assert browser_calls == []
+    assert 'tiers' in parser.get_stats()
+
+
+def test_playwright_parser_page_fetcher_replaces_browser():
+    PlaywrightParser = pytest.importorskip('src.parsers.playwright_parser').PlaywrightParser
+    fetched = []
+    parser = PlaywrightParser(headless=True, page_fetcher=lambda url: fetched.append(url) or DETAIL_HTML)
+
+    # Внешняя загрузка: свой браузер не запускается
+    with parser:
+        assert parser.browser is None
+        assert parser._get_page_content(DETAIL_URL) == DETAIL_HTML
+    assert fetched == [DETAIL_URL]